@@ -8,7 +8,48 @@ MODEL_CONFIG = {
     'topic_modeling': {
         'n_topics': 10,
         'method': 'bertopic',
-        'language': 'multilingual'  # supports Arabic
+        'language': 'multilingual',  # supports Arabic
+        # 'bertopic' (النموذج الكامل) أو 'fast' (FastTopicModel: تشابه جيب التمام مع تضمينات الموضوعات، بدون BERTopic)
+        'runtime': 'bertopic',
+        'fast_model_dir': None,  # None = data/models/fast_topic_model (ناتج src/models/fast_topic_model.py)
+    },
+    'embedding': {
+        'model_name': 'paraphrase-multilingual-MiniLM-L12-v2',
+        'backend': 'torch',  # 'torch' (SentenceTransformer) أو 'onnx' (ONNX Runtime على المعالج)
+        'onnx_model_dir': None,  # None = data/models/onnx_encoder (ناتج src/models/onnx_encoder.py)
+        'onnx_use_quantized': True,  # استخدام نسخة int8 إذا كانت متاحة
+        'micro_batching': {
+            'enabled': False,  # تجميع الطلبات المتزامنة في دفعة encode واحدة (src/models/embedding_batcher.py)
+            'max_batch_size': 32,
+            'max_wait_ms': 5,
+        },
+    },
+    'analysis': {
+        # تشغيل فرعي الموضوعات والتجميع في analyze_new_problem بالتوازي (src/utils/branch_executor.py)
+        'concurrent_branches': False,
+        'branch_timeout_seconds': None,  # مهلة كل فرع بالثواني؛ None = بدون مهلة
+        'include_timings': False,  # إرفاق كتلة 'timings' (مقاطع زمنية لكل طلب) بنتيجة analyze_new_problem
+        'result_cache': {
+            'enabled': False,  # تخزين نتائج analyze_new_problem مؤقتًا (src/analysis/result_cache.py)
+            'ttl_seconds': 3600,
+            'max_items': 1024,
+            'sqlite_path': None,  # مسار قاعدة SQLite يتشاركها كل العمال على الجهاز؛ None = الذاكرة فقط
+        },
+    },
+    'serving': {
+        # خدمة HTTP للاستدلال (src/serving/inference_service.py)
+        'host': '127.0.0.1',
+        'port': 8000,
+        'workers': 4,  # عدد خيوط معالجة الطلبات المتزامنة (في كل عملية)
+        'processes': 2,  # عدد عمليات العمال في وضع pre-fork (src/serving/prefork_server.py)
+        'max_batch_size': 256,  # أقصى عدد مشاكل في طلب /analyze_batch
+        'top_n': 3,  # عدد التوصيات الافتراضي لكل فئة
+    },
+    'bulk_scoring': {
+        # إعادة التقييم الجماعية لقاعدة البيانات (src/analysis/bulk_scoring.py)
+        'batch_size': 512,  # عدد المشاكل في كل دفعة (وكل نقطة استئناف)
+        'n_workers': 2,  # عدد عمليات العمال؛ كل عملية تحمل النماذج مرة واحدة
+        'online_updates': False,  # تحديث مراكز K-Means من المشاكل المقيمة وحفظها في حزمة النموذج
     },
     'text_processing': {
         'max_features': 1000,
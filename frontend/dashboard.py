@@ -60,6 +60,7 @@ TRANSLATIONS = {
         "kmeans_cluster_label": "تصنيف عنقود K-Means:", "cluster_summary_label": "ملخص العنقود:",
         "bertopic_topic_label": "تصنيف موضوع BERTopic:", "topic_summary_label": "ملخص الموضوع:",
         "recommendations_header": "💡 التوصيات المقترحة",
+        "similar_problems_recommendations_label": "التوصيات من أقرب المشاكل التاريخية المشابهة:",
         "kmeans_recommendations_label": "التوصيات بناءً على عنقود K-Means المشابه:",
         "bertopic_recommendations_label": "التوصيات بناءً على موضوع BERTopic المشابه:",
         "no_specific_recommendations": "لم يتم العثور على توصيات محددة بناءً على التصنيفات الحالية.",
@@ -67,6 +68,7 @@ TRANSLATIONS = {
         "sidebar_about_header": "عن المشروع",
         "sidebar_about_info": "هذا التطبيق يستخدم نماذج التعلم الآلي لتحليل المشاكل وتقديم رؤى وتوصيات مبدئية للمساعدة في إدارتها بشكل أفضل.",
         "sidebar_how_it_works_header": "كيف يعمل؟",
+        "sidebar_readiness_header": "جاهزية النماذج",
         "sidebar_how_it_works_steps": """1.  أدخل تفاصيل المشكلة الجديدة.\n2.  يقوم النظام بمعالجة المدخلات.\n3.  يستخدم نموذج K-Means لتحديد عنقود المشاكل المشابهة.\n4.  يستخدم نموذج BERTopic لتحديد الموضوع الرئيسي للمشكلة.\n5.  يعرض ملخصًا لخصائص هذا العنقود والموضوع.\n6.  (اختياري) يقترح حلولاً أو دروسًا مستفادة من مشاكل تاريخية مشابهة.""",
         "loading_analyzer_once": "يتم الآن تحميل ProblemAnalyzer (يحدث مرة واحدة أو عند تغيير الكود)...",
         "loading_recommender_once": "يتم الآن تحميل RecommendationEngine (يحدث مرة واحدة أو عند تغيير الكود)...",
@@ -122,6 +124,7 @@ TRANSLATIONS = {
         "kmeans_cluster_label": "K-Means Cluster:", "cluster_summary_label": "Cluster Summary:",
         "bertopic_topic_label": "BERTopic Topic:", "topic_summary_label": "Topic Summary:",
         "recommendations_header": "💡 Suggested Recommendations",
+        "similar_problems_recommendations_label": "Based on the most similar past problems:",
         "kmeans_recommendations_label": "Based on similar K-Means Cluster:",
         "bertopic_recommendations_label": "Based on similar BERTopic Topic:",
         "no_specific_recommendations": "No specific recommendations found.",
@@ -129,6 +132,7 @@ TRANSLATIONS = {
         "sidebar_about_header": "About",
         "sidebar_about_info": "This app uses ML to analyze problems and provide insights.",
         "sidebar_how_it_works_header": "How It Works",
+        "sidebar_readiness_header": "Model Readiness",
         "sidebar_how_it_works_steps": "1. Enter problem details.\n2. System processes input.\n3. K-Means identifies similar problem clusters.\n4. BERTopic identifies the main topic.\n5. Summaries are displayed.\n6. (Optional) Suggestions from historical problems.",
         "loading_analyzer_once": "Loading ProblemAnalyzer...",
         "loading_recommender_once": "Loading RecommendationEngine...",
@@ -398,16 +402,8 @@ def load_analyzer_cached_i18n():
     print(get_translation(LANG_CODE, "loading_analyzer_once"))
     analyzer_obj = None
     try:
-        analyzer_obj = ProblemAnalyzer()
-        if not analyzer_obj or not analyzer_obj.clustering_model or not analyzer_obj.topic_model or \
-                not analyzer_obj.clustering_model.kmeans_model or \
-                not analyzer_obj.clustering_model.column_transformer or \
-                not analyzer_obj.clustering_model.sentence_model or \
-                not analyzer_obj.topic_model.model:
-            analyzer_error_msg = get_translation(LANG_CODE, "analyzer_load_fail_warning", details="some components")
-            print(analyzer_error_msg);
-            return None
-        if analyzer_obj.df_profile_data is None: print(get_translation(LANG_CODE, "profile_data_load_warning"))
+        # النماذج تُحمّل في الخلفية فتظهر الواجهة فورًا؛ أول تحليل ينتظر اكتمال التحميل إذا لزم
+        analyzer_obj = ProblemAnalyzer(loading_mode='background')
         print(get_translation(LANG_CODE, "analyzer_init_success"));
         return analyzer_obj
     except Exception as e_load_analyzer:
@@ -418,6 +414,13 @@ def load_analyzer_cached_i18n():
         return None
 
 
+def wait_for_analyzer_components(analyzer_obj) -> list:
+    """ينتظر اكتمال تحميل النماذج الأساسية ويعيد أسماء المكونات التي فشل تحميلها."""
+    if analyzer_obj.df_profile_data is None: print(get_translation(LANG_CODE, "profile_data_load_warning"))
+    return [name for name, component in (('clustering_model', analyzer_obj.clustering_model),
+                                         ('topic_model', analyzer_obj.topic_model)) if component is None]
+
+
 @st.cache_resource
 def load_recommender_cached_i18n():
     global recommender_error_msg;
@@ -604,8 +607,12 @@ if analyzer_instance:
                 'what_could_be_improved': None, 'recommendations_for_future': None, 'key_takeaways': None
             }
             with st.spinner(get_translation(LANG_CODE, "processing_problem_spinner")):
-                if analyzer_instance:
+                failed_components = wait_for_analyzer_components(analyzer_instance) if analyzer_instance else None
+                if analyzer_instance and not failed_components:
                     analysis_output = analyzer_instance.analyze_new_problem(problem_data_input)
+                elif failed_components:
+                    st.error(get_translation(LANG_CODE, "analyzer_load_fail_warning",
+                                             details=", ".join(failed_components))); analysis_output = {}
                 else:
                     st.error(get_translation(LANG_CODE, "app_components_load_fail")); analysis_output = {}
 
@@ -629,6 +636,10 @@ if analyzer_instance:
                     with st.spinner(get_translation(LANG_CODE, "searching_recommendations_spinner")):
                         recommendations_output = recommender_instance.get_recommendations(analysis_output)
 
+                    if recommendations_output.get("based_on_similar_problems"):
+                        st.markdown(f"**{get_translation(LANG_CODE, 'similar_problems_recommendations_label')}**")
+                        for rec in recommendations_output["based_on_similar_problems"]: st.write(f"- {rec}")
+
                     if recommendations_output.get("based_on_kmeans_cluster"):
                         st.markdown(f"**{get_translation(LANG_CODE, 'kmeans_recommendations_label')}**")
                         for rec in recommendations_output["based_on_kmeans_cluster"]: st.write(f"- {rec}")
@@ -645,7 +656,8 @@ if analyzer_instance:
                             else:
                                 st.warning(str(warning_tuple))  # Fallback for simple string warnings
 
-                    no_cluster_recs = not recommendations_output.get("based_on_kmeans_cluster")
+                    no_cluster_recs = not recommendations_output.get("based_on_kmeans_cluster") and \
+                        not recommendations_output.get("based_on_similar_problems")
                     no_topic_recs = not recommendations_output.get("based_on_bertopic_topic")
                     # Show "no specific recommendations" only if no specific recs AND no specific warnings were shown
                     # (general_warnings might include "noise topic" which explains lack of topic recs)
@@ -670,4 +682,15 @@ st.sidebar.header(get_translation(LANG_CODE, "sidebar_about_header"))
 st.sidebar.info(get_translation(LANG_CODE, "sidebar_about_info"))
 st.sidebar.markdown("---")
 st.sidebar.subheader(get_translation(LANG_CODE, "sidebar_how_it_works_header"))
-st.sidebar.markdown(get_translation(LANG_CODE, "sidebar_how_it_works_steps"))
\ No newline at end of file
+st.sidebar.markdown(get_translation(LANG_CODE, "sidebar_how_it_works_steps"))
+
+if analyzer_instance:
+    readiness_report = analyzer_instance.readiness()
+    st.sidebar.markdown("---")
+    st.sidebar.subheader(get_translation(LANG_CODE, "sidebar_readiness_header"))
+    readiness_icons = {'ready': '✅', 'loading': '⏳', 'pending': '⏸️', 'failed': '❌'}
+    for component_name, component_status in readiness_report['components'].items():
+        load_seconds = component_status['load_seconds']
+        load_seconds_str = f" ({load_seconds:.1f}s)" if load_seconds is not None else ""
+        st.sidebar.caption(f"{readiness_icons.get(component_status['state'], '')} {component_name}: "
+                           f"{component_status['state']}{load_seconds_str}")
\ No newline at end of file
@@ -0,0 +1,345 @@
+# src/analysis/bulk_scoring.py
+"""
+إعادة تقييم جماعية (offline) لكل المشاكل في قاعدة البيانات بعد تغير النماذج: عنقود K-Means وموضوع BERTopic
+لكل مشكلة، بدلًا من ملفات CSV الناتجة عن الدفاتر (problems_with_kmeans_clusters.csv، final_results_with_models.csv).
+
+    python src/analysis/bulk_scoring.py --workers 4 --batch-size 512
+    python src/analysis/bulk_scoring.py --export-csv data/processed/problem_labels.csv
+
+المشاكل تُقرأ من DatabaseConnector على دفعات مرتبة حسب المعرف، وكل دفعة تُحلل بـ ProblemAnalyzer.analyze_many
+(تنظيف، تضمين، تجميع، موضوعات كلها على دفعات) في عمليات عمال يحمل كل منها النماذج مرة واحدة.
+النتائج تُكتب في جدول problem_labels بقاعدة SQLite، ونقطة الاستئناف (آخر معرف مكتمل) تُحدّث في نفس المعاملة
+مع تسميات الدفعة، فالتشغيل المنقطع يستأنف من أول دفعة لم تُكتب دون تكرار أو فجوات.
+
+    python src/analysis/bulk_scoring.py --online-updates
+
+مع --online-updates (أو MODEL_CONFIG['bulk_scoring']['online_updates']) تُرسل ميزات كل دفعة مقيمة إلى
+ProblemClusteringModel في العملية الأم فتتحرك مراكز K-Means نحوها (OnlineClusteringUpdater، أرقام العناقيد ثابتة)،
+وتُحفظ المراكز المحدثة في حزمة النموذج وحالة التحديث في clustering_online_state بعد كل تشغيل، فتحملها الخدمة
+والعمليات الأخرى عند بدئها. تسميات التشغيل نفسه من النموذج قبل التحديث. إذا أظهر التقرير
+clustering_drift.needs_retrain=True فالانحراف تجاوز العتبة: شغّل python src/models/train_clustering.py ثم
+أعد التقييم بـ --restart (النموذج الجديد يلغي الحزمة المحدثة وحالة التحديث القديمة).
+"""
+import argparse
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from config.model_config import MODEL_CONFIG
+    from src.models.embedding_service import loaded_embedding_services
+except ImportError:
+    import sys
+
+    project_root_bulk_scoring = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_bulk_scoring not in sys.path:
+        sys.path.insert(0, project_root_bulk_scoring)
+    from config.model_config import MODEL_CONFIG
+    from src.models.embedding_service import loaded_embedding_services
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_LABELS_DB_PATH = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'processed', 'problem_labels.sqlite')
+BULK_SCORING_CONFIG = MODEL_CONFIG.get('bulk_scoring', {})
+
+LABELS_TABLE = 'problem_labels'
+CHECKPOINT_TABLE = 'scoring_checkpoint'
+
+# المحلل المحمل في كل عملية عامل (يُنشأ مرة واحدة في _init_worker)
+_WORKER_ANALYZER = None
+
+
+def load_default_analyzer():
+    """ProblemAnalyzer بتحميل فوري وبدون استدلال تجريبي (الدفعة الأولى تكفي للتهيئة)."""
+    from src.analysis.problem_analyzer import ProblemAnalyzer
+    return ProblemAnalyzer(loading_mode='eager', warm_up=False)
+
+
+def load_online_clustering_model():
+    """ProblemClusteringModel للتحديث المباشر في العملية الأم: مسار التنبؤ وحده، مع استئناف حالة التحديث."""
+    from src.models.clustering_model import ProblemClusteringModel
+    clustering_model = ProblemClusteringModel(load_embedding_model=False)
+    if clustering_model.inference_plan is not None:
+        clustering_model.enable_online_updates()
+    return clustering_model
+
+
+def _init_worker(analyzer_factory: Callable):
+    """يحمّل المحلل في عملية العامل، مع مخزن تضمينات للقراءة فقط من القرص."""
+    global _WORKER_ANALYZER
+    _WORKER_ANALYZER = analyzer_factory()
+    for embedding_service in loaded_embedding_services():
+        if embedding_service.cache is not None:
+            # عملية كاتبة واحدة لكل مجلد تخزين (انظر EmbeddingCache)؛ كل عامل ينشئ خدمته الخاصة، فيكتفي
+            # بالقراءة من القرص والتخزين في الذاكرة كما في prefork_server
+            embedding_service.cache.disk_writes_enabled = False
+
+
+def _label_value(value) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return None if pd.isna(value) else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _analyzer_model_version(analyzer) -> str:
+    model_version_fn = getattr(analyzer, '_model_version', None)
+    return model_version_fn() if callable(model_version_fn) else 'unknown'
+
+
+def score_problems(problems: list[dict], analyzer=None,
+                   include_cluster_features: bool = False) -> tuple[list[tuple], str, Optional[np.ndarray]]:
+    """
+    يحلل دفعة مشاكل ويعيد صفوف التسميات (problem_id، العنقود، الموضوع، الخطأ) مع نسخة النماذج، ومصفوفة
+    ميزات التجميع للمشاكل المصنفة إذا طُلبت (للتحديث المباشر للمراكز)، وإلا None.
+    تُستدعى في عملية العامل (analyzer=None يعني المحلل المحمل في _init_worker).
+    """
+    analyzer = analyzer or _WORKER_ANALYZER
+    analyses = analyzer.analyze_many(problems, include_cluster_features=True) if include_cluster_features \
+        else analyzer.analyze_many(problems)
+    rows = [(problem.get('problem_id'), _label_value(analysis.get('kmeans_cluster')),
+             _label_value(analysis.get('bertopic_topic')), analysis.get('error'))
+            for problem, analysis in zip(problems, analyses)]
+    features = [analysis['cluster_features'] for analysis in analyses if analysis.get('cluster_features') is not None]
+    return rows, _analyzer_model_version(analyzer), np.vstack(features) if features else None
+
+
+def problem_records(batch_df: pd.DataFrame) -> list[dict]:
+    """
+    صفوف الدفعة كقواميس مشاكل: صف واحد لكل problem_id (الربط مع جداول واحد-لكثير قد يكرر المشكلة)،
+    والقيم المفقودة تُحذف من القاموس.
+    """
+    batch_df = batch_df.drop_duplicates(subset='problem_id', keep='first')
+    return [{key: (value.item() if isinstance(value, np.generic) else value) for key, value in record.items()
+             if value is not None and not (np.isscalar(value) and pd.isna(value))}
+            for record in batch_df.to_dict(orient='records')]
+
+
+class BulkScoringJob:
+    """
+    مهمة إعادة تقييم قابلة للاستئناف. حالة المهمة كلها في قاعدة SQLite الناتجة:
+      - problem_labels(problem_id, kmeans_cluster, bertopic_topic, model_version, error, scored_at)
+      - scoring_checkpoint(job_name, last_problem_id, problems_scored, model_version, updated_at)
+    """
+
+    def __init__(self, connector, output_path: str = DEFAULT_LABELS_DB_PATH, job_name: str = 'default',
+                 batch_size: Optional[int] = None, n_workers: Optional[int] = None,
+                 analyzer_factory: Callable = load_default_analyzer, max_in_flight: Optional[int] = None,
+                 online_updates: Optional[bool] = None,
+                 clustering_model_factory: Callable = load_online_clustering_model):
+        """
+        Args:
+            connector: DatabaseConnector (أو أي كائن يوفر iter_problem_batches و count_problems).
+            output_path (str): مسار قاعدة SQLite للتسميات ونقطة الاستئناف.
+            job_name (str): اسم المهمة؛ لكل اسم نقطة استئناف مستقلة.
+            batch_size (int, optional): عدد المشاكل في كل دفعة. None = MODEL_CONFIG['bulk_scoring'].
+            n_workers (int, optional): عدد عمليات العمال. 0 = التقييم في العملية الحالية (بدون مجمع عمليات).
+            analyzer_factory (callable): دالة على مستوى الوحدة (قابلة للتسلسل) تنشئ المحلل في كل عامل.
+            max_in_flight (int, optional): أقصى عدد دفعات قيد التقييم في نفس الوقت (افتراضيًا ضعف عدد العمال)،
+                فلا تُقرأ قاعدة البيانات كلها إلى الذاكرة إذا كان التقييم أبطأ من القراءة.
+            online_updates (bool, optional): تحديث مراكز K-Means من ميزات الدفعات المقيمة وحفظها بعد التشغيل
+                (انظر وصف الوحدة). None = MODEL_CONFIG['bulk_scoring']['online_updates'].
+            clustering_model_factory (callable): تنشئ ProblemClusteringModel المُحدَّث في العملية الأم
+                (بعد enable_online_updates).
+        """
+        self.connector = connector
+        self.output_path = output_path
+        self.job_name = job_name
+        self.batch_size = batch_size or BULK_SCORING_CONFIG.get('batch_size', 512)
+        self.n_workers = BULK_SCORING_CONFIG.get('n_workers', 2) if n_workers is None else n_workers
+        self.analyzer_factory = analyzer_factory
+        self.max_in_flight = max_in_flight or max(2, 2 * self.n_workers)
+        self.online_updates = BULK_SCORING_CONFIG.get('online_updates', False) if online_updates is None \
+            else online_updates
+        self.clustering_model_factory = clustering_model_factory
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        self._connection = sqlite3.connect(output_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {LABELS_TABLE} (problem_id INTEGER PRIMARY KEY, kmeans_cluster INTEGER, "
+            "bertopic_topic INTEGER, model_version TEXT, error TEXT, scored_at REAL NOT NULL)")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (job_name TEXT PRIMARY KEY, last_problem_id INTEGER, "
+            "problems_scored INTEGER NOT NULL, model_version TEXT, updated_at REAL NOT NULL)")
+        self._connection.commit()
+
+    def checkpoint(self) -> Optional[dict]:
+        row = self._connection.execute(
+            f"SELECT last_problem_id, problems_scored, model_version, updated_at FROM {CHECKPOINT_TABLE} "
+            "WHERE job_name = ?", (self.job_name,)).fetchone()
+        if row is None:
+            return None
+        return {'last_problem_id': row[0], 'problems_scored': row[1], 'model_version': row[2], 'updated_at': row[3]}
+
+    def reset(self):
+        """يحذف نقطة الاستئناف (التسميات المكتوبة تبقى وتُستبدل عند إعادة تقييم نفس المشاكل)."""
+        self._connection.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE job_name = ?", (self.job_name,))
+        self._connection.commit()
+
+    def _write_batch(self, rows: list[tuple], model_version: str, last_problem_id, problems_scored: int):
+        """يكتب تسميات الدفعة ويقدم نقطة الاستئناف في معاملة واحدة."""
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {LABELS_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+                [(problem_id, cluster, topic, model_version, error, now)
+                 for problem_id, cluster, topic, error in rows])
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE} VALUES (?, ?, ?, ?, ?)",
+                (self.job_name, last_problem_id, problems_scored, model_version, now))
+
+    def _record_batches(self, after_problem_id) -> Iterable[tuple[list[dict], object]]:
+        for batch_df in self.connector.iter_problem_batches(self.batch_size, after_problem_id):
+            records = problem_records(batch_df)
+            if records:
+                yield records, records[-1]['problem_id']
+
+    def run(self, max_batches: Optional[int] = None) -> dict:
+        """
+        يقيّم كل المشاكل بعد نقطة الاستئناف. الدفعات تُرسل للعمال بالتوازي وتُكتب بترتيبها الأصلي،
+        فنقطة الاستئناف لا تتقدم أبدًا بعد دفعة لم تُكتب.
+
+        Args:
+            max_batches (int, optional): التوقف بعد هذا العدد من الدفعات (للتشغيل على مراحل).
+
+        Returns:
+            dict: عدد المشاكل المقيمة في هذا التشغيل والإجمالي، آخر معرف، المدة، والإنتاجية.
+        """
+        checkpoint = self.checkpoint()
+        after_problem_id = checkpoint['last_problem_id'] if checkpoint else None
+        problems_scored = checkpoint['problems_scored'] if checkpoint else 0
+        if checkpoint:
+            print(f"استئناف المهمة '{self.job_name}' بعد المشكلة رقم {after_problem_id} "
+                  f"({problems_scored} مشكلة مقيمة سابقًا).")
+        total_problems = self.connector.count_problems() if hasattr(self.connector, 'count_problems') else None
+        batches = self._record_batches(after_problem_id)
+        if max_batches is not None:
+            batches = (batch for _, batch in zip(range(max_batches), batches))
+
+        started_at = time.perf_counter()
+        scored_this_run = 0
+        last_version = checkpoint['model_version'] if checkpoint else None
+        clustering_model = self.clustering_model_factory() if self.online_updates else None
+        if clustering_model is not None and clustering_model.online_updater is None:
+            print("تحذير: التحديث المباشر للمراكز يتطلب خطة الاستدلال المترجمة لنموذج التجميع. تم تعطيله.")
+            clustering_model = None
+        include_cluster_features = clustering_model is not None
+        online_samples_this_run = 0
+        executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker,
+                                       initargs=(self.analyzer_factory,)) if self.n_workers > 0 else None
+        local_analyzer = self.analyzer_factory() if executor is None else None
+        in_flight = deque()
+
+        def write_oldest():
+            nonlocal problems_scored, scored_this_run, last_version, online_samples_this_run
+            future, last_problem_id = in_flight.popleft()
+            rows, model_version, cluster_features = future.result() if executor is not None else future
+            if last_version is not None and model_version != last_version:
+                print(f"تحذير: نسخة النماذج تغيرت ({last_version} -> {model_version}). التسميات السابقة من نسخة "
+                      f"مختلفة؛ استخدم --restart لإعادة تقييم كل المشاكل.")
+            last_version = model_version
+            problems_scored += len(rows)
+            scored_this_run += len(rows)
+            self._write_batch(rows, model_version, last_problem_id, problems_scored)
+            if clustering_model is not None and cluster_features is not None:
+                clustering_model.update_online_from_features(cluster_features)
+                online_samples_this_run += len(cluster_features)
+            elapsed = time.perf_counter() - started_at
+            rate = scored_this_run / elapsed if elapsed else 0.0
+            progress = f"{problems_scored}/{total_problems}" if total_problems else str(problems_scored)
+            print(f"تم تقييم {progress} مشكلة (آخر معرف {last_problem_id}، {rate:.1f} مشكلة/ثانية).")
+
+        try:
+            for records, last_problem_id in batches:
+                if executor is not None:
+                    in_flight.append((executor.submit(score_problems, records, None, include_cluster_features),
+                                      last_problem_id))
+                else:
+                    in_flight.append((score_problems(records, local_analyzer, include_cluster_features),
+                                      last_problem_id))
+                while len(in_flight) >= self.max_in_flight or (executor is None and in_flight):
+                    write_oldest()
+            while in_flight:
+                write_oldest()
+        except KeyboardInterrupt:
+            print(f"\nتم إيقاف المهمة. آخر دفعة مكتملة محفوظة؛ أعد التشغيل للاستئناف بعد المشكلة "
+                  f"رقم {(self.checkpoint() or {}).get('last_problem_id')}.")
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            # تحديثات الدفعات المكتوبة تُحفظ حتى عند الإيقاف، مثل نقطة الاستئناف
+            drift_report = clustering_model.save_online_updates() \
+                if clustering_model is not None and online_samples_this_run else None
+
+        elapsed = time.perf_counter() - started_at
+        final_checkpoint = self.checkpoint() or {}
+        summary = {'job_name': self.job_name, 'scored_this_run': scored_this_run,
+                   'problems_scored': final_checkpoint.get('problems_scored', 0),
+                   'last_problem_id': final_checkpoint.get('last_problem_id'),
+                   'model_version': final_checkpoint.get('model_version'), 'seconds': round(elapsed, 3),
+                   'problems_per_second': round(scored_this_run / elapsed, 2) if elapsed else 0.0}
+        if drift_report is not None:
+            summary['clustering_drift'] = {'samples_this_run': online_samples_this_run,
+                                           **{key: drift_report[key] for key in
+                                              ('n_samples_seen', 'max_relative_drift', 'inertia_ratio',
+                                               'needs_retrain')}}
+            if drift_report['needs_retrain']:
+                print("تحذير: انحراف نموذج التجميع تجاوز العتبة. شغّل python src/models/train_clustering.py "
+                      "ثم أعد التقييم بـ --restart.")
+        return summary
+
+    def labels(self) -> pd.DataFrame:
+        return pd.read_sql_query(f"SELECT * FROM {LABELS_TABLE} ORDER BY problem_id", self._connection)
+
+    def export_csv(self, csv_path: str) -> int:
+        """يصدر التسميات إلى CSV (نفس أسماء أعمدة final_results_with_models.csv: cluster_kmeans، bertopic_topic)."""
+        labels_df = self.labels().rename(columns={'kmeans_cluster': 'cluster_kmeans'})
+        labels_df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        print(f"تم تصدير {len(labels_df)} تسمية إلى: {csv_path}")
+        return len(labels_df)
+
+    def close(self):
+        self._connection.close()
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="إعادة تقييم جماعية قابلة للاستئناف لكل المشاكل في قاعدة البيانات.")
+    parser.add_argument('--db-path', default=None, help="قاعدة بيانات المشاكل (افتراضيًا من config/database_config.py).")
+    parser.add_argument('--output', default=DEFAULT_LABELS_DB_PATH, help="قاعدة SQLite للتسميات ونقطة الاستئناف.")
+    parser.add_argument('--job-name', default='default')
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help="عدد عمليات العمال (0 = في العملية الحالية).")
+    parser.add_argument('--max-batches', type=int, default=None)
+    parser.add_argument('--restart', action='store_true', help="تجاهل نقطة الاستئناف والبدء من أول مشكلة.")
+    parser.add_argument('--export-csv', default=None, help="تصدير التسميات إلى CSV بعد الانتهاء.")
+    parser.add_argument('--online-updates', action='store_true', default=None,
+                        help="تحديث مراكز K-Means من المشاكل المقيمة وحفظها في حزمة النموذج.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    import json
+
+    from src.data_processing.database_connector import DatabaseConnector
+
+    args = _parse_args()
+    db_connector = DatabaseConnector(args.db_path)
+    job = BulkScoringJob(db_connector, output_path=args.output, job_name=args.job_name,
+                         batch_size=args.batch_size, n_workers=args.workers, online_updates=args.online_updates)
+    try:
+        if args.restart:
+            job.reset()
+        print(json.dumps(job.run(max_batches=args.max_batches), ensure_ascii=False, indent=2))
+        if args.export_csv:
+            job.export_csv(args.export_csv)
+    finally:
+        job.close()
+        db_connector.close_connection()
@@ -0,0 +1,108 @@
+# src/analysis/featurisation.py
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.utils.text_processing import preprocess_text_pipeline, language_detection_sample, detect_sample_language
+    from src.utils.feature_engineering_utils import parse_cost_value, parse_time_to_implement
+    from src.utils.tracing import span
+except ImportError:
+    import sys
+
+    project_root_featurisation = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_featurisation not in sys.path:
+        sys.path.insert(0, project_root_featurisation)
+    from src.utils.text_processing import preprocess_text_pipeline, language_detection_sample, detect_sample_language
+    from src.utils.feature_engineering_utils import parse_cost_value, parse_time_to_implement
+    from src.utils.tracing import span
+
+# الميزات الرقمية المشتقة من حقول نصية حرة: اسم الميزة -> (الحقل المصدر، دالة التحليل)
+PARSED_NUMERIC_FIELDS = {
+    'estimated_cost_numeric': ('estimated_cost', parse_cost_value),
+    'overall_budget_numeric': ('overall_budget', parse_cost_value),
+    'estimated_time_days': ('estimated_time_to_implement', parse_time_to_implement),
+}
+
+
+class ProblemFeaturisationContext:
+    """
+    سياق تجهيز ميزات لطلب واحد (مشكلة واحدة): كل حقل نصي يُنظف مرة واحدة فقط، ونص الموضوعات ونص التجميع
+    يُركّبان من نتائج الحقول المحفوظة بدلًا من تنظيف نصين مدمجين يتكرر فيهما العنوان والوصف.
+
+    اكتشاف اللغة يبقى على النص المدمج (نفس عينة preprocess_text_pipeline)، ثم يُنظف كل حقل باللغة
+    المكتشفة؛ وبما أن خطوات التنظيف تعمل على مستوى الكلمة، فالنتيجة هي نفسها نتيجة تنظيف النص المدمج.
+    التكلفة والوقت يُحللان مرة واحدة أيضًا (numeric_inputs).
+
+    للتحليل الجماعي يمكن تمرير نفس قاموسي التخزين لكل السياقات فيُنظف الحقل المتكرر بين المشاكل مرة واحدة.
+    """
+
+    def __init__(self, problem_data: dict, cleaned_fields_cache: Optional[dict] = None,
+                 language_cache: Optional[dict] = None):
+        """
+        Args:
+            problem_data (dict): بيانات المشكلة (بنفس مفاتيح analyze_new_problem).
+            cleaned_fields_cache (dict, optional): (نص الحقل، اللغة) -> النص النظيف، مشترك بين السياقات.
+            language_cache (dict, optional): عينة اكتشاف اللغة -> اللغة، مشترك بين السياقات.
+        """
+        self.problem_data = problem_data
+        self._cleaned_fields = cleaned_fields_cache if cleaned_fields_cache is not None else {}
+        self._languages = language_cache if language_cache is not None else {}
+        self._raw_fields: dict[str, str] = {}
+        self._cleaned_texts: dict[tuple, str] = {}
+        self._numeric_inputs: Optional[dict] = None
+
+    def raw_field(self, field: str) -> str:
+        """قيمة الحقل كنص بدون مسافات طرفية ("" إذا كان مفقودًا)."""
+        if field not in self._raw_fields:
+            value = self.problem_data.get(field, '')
+            self._raw_fields[field] = str(value).strip() if pd.notna(value) else ''
+        return self._raw_fields[field]
+
+    def combined_raw_text(self, fields: list[str]) -> str:
+        return " ".join(filter(None, (self.raw_field(field) for field in fields)))
+
+    def text_language(self, fields: list[str]) -> str:
+        """لغة النص المدمج للحقول ("" إذا كان فارغًا). النصوص التي لها نفس العينة تشارك نتيجة الاكتشاف."""
+        sample_text = language_detection_sample(self.combined_raw_text(fields))
+        if sample_text not in self._languages:
+            with span('text.language_detect'):
+                self._languages[sample_text] = detect_sample_language(sample_text)
+        return self._languages[sample_text]
+
+    def cleaned_field(self, field: str, language_code: str) -> str:
+        key = (self.raw_field(field), language_code)
+        if key not in self._cleaned_fields:
+            with span('text.clean_field'):
+                self._cleaned_fields[key] = preprocess_text_pipeline(key[0], language_code=language_code) \
+                    if key[0] else ''
+        return self._cleaned_fields[key]
+
+    def cleaned_text(self, fields: list[str]) -> str:
+        """النص النظيف للحقول المدمجة (يعادل preprocess_text_pipeline على النص المدمج)."""
+        fields_key = tuple(fields)
+        if fields_key not in self._cleaned_texts:
+            language_code = self.text_language(fields)
+            cleaned_parts = [self.cleaned_field(field, language_code) for field in fields] if language_code else []
+            self._cleaned_texts[fields_key] = " ".join(" ".join(cleaned_parts).split())
+        return self._cleaned_texts[fields_key]
+
+    @property
+    def numeric_inputs(self) -> dict:
+        """الميزات الرقمية المحللة من التكلفة والميزانية ووقت التنفيذ (NaN إذا تعذر التحليل)."""
+        if self._numeric_inputs is None:
+            self._numeric_inputs = {feature: parser(self.problem_data.get(source_field))
+                                    for feature, (source_field, parser) in PARSED_NUMERIC_FIELDS.items()}
+        return self._numeric_inputs
+
+    def numeric_value(self, feature: str) -> float:
+        """قيمة ميزة رقمية: المحللة من نص حر إن وُجدت، وإلا القيمة المباشرة من بيانات المشكلة."""
+        if feature in PARSED_NUMERIC_FIELDS:
+            return self.numeric_inputs[feature]
+        value = self.problem_data.get(feature, np.nan)
+        try:
+            return float(value) if pd.notna(value) else np.nan
+        except (ValueError, TypeError):
+            return np.nan
@@ -3,13 +3,23 @@ import pandas as pd
 import numpy as np
 import os
 import re
-from collections import Counter
+import threading
+import time
+from typing import Optional
 
 try:
     from src.models.clustering_model import ProblemClusteringModel
     from src.models.topic_modeling import ProblemTopicModel
-    from src.utils.text_processing import preprocess_text_pipeline
-    from src.utils.feature_engineering_utils import parse_cost_value, parse_time_to_implement
+    from src.models.fast_topic_model import FastTopicModel, DEFAULT_FAST_TOPIC_MODEL_DIR
+    from config.model_config import MODEL_CONFIG
+    from src.utils.lazy_loading import LazyComponent, STATE_READY
+    from src.analysis.profile_index import GroupProfileIndex
+    from src.analysis.featurisation import ProblemFeaturisationContext, PARSED_NUMERIC_FIELDS
+    from src.analysis.result_cache import AnalysisResultCache, artifact_fingerprint
+    from src.models.clustering_model import DEFAULT_REDUCER_PATH
+    from src.models.inference_plan import DEFAULT_CLUSTERING_BUNDLE_DIR, MANIFEST_FILENAME
+    from src.utils.branch_executor import run_branches, tune_torch_threads, BRANCH_OK
+    from src.utils.tracing import span, trace_request, traced
 except ImportError:
     import sys
 
@@ -20,8 +30,16 @@ except ImportError:
         sys.path.insert(0, project_root_analyzer)
     from src.models.clustering_model import ProblemClusteringModel
     from src.models.topic_modeling import ProblemTopicModel
-    from src.utils.text_processing import preprocess_text_pipeline
-    from src.utils.feature_engineering_utils import parse_cost_value, parse_time_to_implement
+    from src.models.fast_topic_model import FastTopicModel, DEFAULT_FAST_TOPIC_MODEL_DIR
+    from config.model_config import MODEL_CONFIG
+    from src.utils.lazy_loading import LazyComponent, STATE_READY
+    from src.analysis.profile_index import GroupProfileIndex
+    from src.analysis.featurisation import ProblemFeaturisationContext, PARSED_NUMERIC_FIELDS
+    from src.analysis.result_cache import AnalysisResultCache, artifact_fingerprint
+    from src.models.clustering_model import DEFAULT_REDUCER_PATH
+    from src.models.inference_plan import DEFAULT_CLUSTERING_BUNDLE_DIR, MANIFEST_FILENAME
+    from src.utils.branch_executor import run_branches, tune_torch_threads, BRANCH_OK
+    from src.utils.tracing import span, trace_request, traced
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 MODELS_DIR = os.path.join(PROJECT_ROOT, 'data', 'models')
@@ -32,6 +50,20 @@ CT_PREPROCESSOR_PATH_FOR_EMBEDDINGS = os.path.join(MODELS_DIR, 'ct_num_cat_embed
 BERTOPIC_MODEL_PATH = os.path.join(MODELS_DIR, 'bertopic_model.pkl')
 FINAL_RESULTS_DATA_PATH = os.path.join(PROCESSED_DATA_DIR, 'final_results_with_models.csv')
 
+# الحقول النصية التي تُدمج لنص التجميع (نفس حقول combined_text_for_nlp في DataPreprocessor)
+CLUSTERING_TEXT_FIELDS = [
+    'title', 'description_initial', 'refined_problem_statement_final', 'stakeholders_involved',
+    'initial_impact_assessment', 'problem_source', 'active_listening_notes', 'key_questions_asked',
+    'initial_hypotheses', 'key_findings_from_analysis', 'potential_root_causes_list', 'solution_description',
+    'justification_for_choice', 'what_went_well', 'what_could_be_improved', 'recommendations_for_future',
+    'key_takeaways'
+]
+# الحقول النصية التي تُدمج لنص تحليل الموضوعات (BERTopic)
+TOPIC_TEXT_FIELDS = ['title', 'description_initial', 'refined_problem_statement_final']
+
+LOADING_MODES = ('eager', 'background', 'lazy')
+WARM_UP_TEXT = "نص تجريبي لتهيئة النموذج"
+
 
 class ProblemAnalyzer:
     def __init__(self,
@@ -39,95 +71,217 @@ class ProblemAnalyzer:
                  ct_path: str = CT_PREPROCESSOR_PATH_FOR_EMBEDDINGS,  # *** استخدام المسار الصحيح ***
                  bertopic_path: str = BERTOPIC_MODEL_PATH,
                  profile_data_path: str = FINAL_RESULTS_DATA_PATH,
-                 embedding_model_name_for_clustering: str = 'paraphrase-multilingual-MiniLM-L12-v2'
+                 embedding_model_name_for_clustering: str = 'paraphrase-multilingual-MiniLM-L12-v2',
+                 loading_mode: str = 'eager',
+                 warm_up: bool = True,
+                 concurrent_branches: Optional[bool] = None,
+                 branch_timeout_seconds: Optional[float] = None,
+                 result_cache: Optional[AnalysisResultCache] = None,
+                 include_timings: Optional[bool] = None
                  ):
-        print("--- تهيئة ProblemAnalyzer ---")
-        self.clustering_model = None
-        self.topic_model = None
-        self.df_profile_data = None
+        """
+        Args:
+            loading_mode (str): طريقة تحميل المكونات (النماذج وبيانات الملفات التعريفية):
+                'eager' تحميل متزامن داخل __init__ (السلوك الأصلي)،
+                'background' تحميل في خيوط خلفية فيعود __init__ فورًا،
+                'lazy' تحميل كل مكون عند أول استخدام.
+                في جميع الحالات يؤدي الوصول إلى مكون لم يكتمل تحميله إلى انتظار تحميله.
+            warm_up (bool): تشغيل استدلال تجريبي بعد التحميل لتهيئة النواة (torch/numba) قبل أول طلب.
+            concurrent_branches (bool, optional): تشغيل فرع الموضوعات وفرع التجميع في analyze_new_problem
+                بالتوازي على مجمع خيوط مشترك، مع عزل أخطاء كل فرع. None = القيمة في MODEL_CONFIG['analysis'].
+            branch_timeout_seconds (float, optional): مهلة كل فرع في الوضع المتوازي. الفرع المتجاوز يُترك
+                بنتيجته الافتراضية ويُسجل في 'branch_errors'. None = القيمة في MODEL_CONFIG['analysis'].
+            result_cache (AnalysisResultCache, optional): ذاكرة مؤقتة لنتائج analyze_new_problem. None = تُنشأ
+                حسب MODEL_CONFIG['analysis']['result_cache'] (معطلة افتراضيًا).
+            include_timings (bool, optional): إرفاق كتلة 'timings' (المقاطع الزمنية المتداخلة للطلب) بنتيجة
+                analyze_new_problem. None = القيمة في MODEL_CONFIG['analysis']. المدرجات التكرارية الإجمالية
+                لكل مقطع تُجمع دائمًا (src/utils/tracing.py: get_latency_summary).
+        """
+        if loading_mode not in LOADING_MODES:
+            raise ValueError(f"طريقة التحميل '{loading_mode}' غير مدعومة. الخيارات: {LOADING_MODES}")
+        print(f"--- تهيئة ProblemAnalyzer (طريقة التحميل: {loading_mode}) ---")
+        analysis_config = MODEL_CONFIG.get('analysis', {})
+        self.concurrent_branches = analysis_config.get('concurrent_branches', False) \
+            if concurrent_branches is None else concurrent_branches
+        self.branch_timeout_seconds = analysis_config.get('branch_timeout_seconds') \
+            if branch_timeout_seconds is None else branch_timeout_seconds
+        # ملفات النماذج والبيانات التي تحدد نسخة النتائج المخزنة مؤقتًا
+        topic_config = MODEL_CONFIG.get('topic_modeling', {})
+        self._artifact_paths = [kmeans_path, ct_path, bertopic_path, profile_data_path, DEFAULT_REDUCER_PATH,
+                                os.path.join(DEFAULT_CLUSTERING_BUNDLE_DIR, MANIFEST_FILENAME),
+                                os.path.join(topic_config.get('fast_model_dir') or DEFAULT_FAST_TOPIC_MODEL_DIR,
+                                             MANIFEST_FILENAME)]
+        cache_config = analysis_config.get('result_cache', {})
+        if result_cache is None and cache_config.get('enabled', False):
+            result_cache = AnalysisResultCache(self._model_version, ttl_seconds=cache_config.get('ttl_seconds', 3600),
+                                               max_items=cache_config.get('max_items', 1024),
+                                               sqlite_path=cache_config.get('sqlite_path'))
+        self.result_cache = result_cache
+        self.include_timings = analysis_config.get('include_timings', False) \
+            if include_timings is None else include_timings
+        self._clustering_component = LazyComponent(
+            'clustering_model', lambda: self._load_clustering_model(kmeans_path, ct_path,
+                                                                    embedding_model_name_for_clustering))
+        self._topic_component = LazyComponent(
+            'topic_model', lambda: self._load_topic_model(bertopic_path, embedding_model_name_for_clustering))
+        self._profile_component = LazyComponent('profile_data', lambda: self._load_profile_data(profile_data_path))
+        self._warm_up_component = LazyComponent('warm_up', self._warm_up) \
+            if warm_up and loading_mode != 'lazy' else None
+        # (فهرس BERTopic، بيانات الملفات التعريفية، الفهرس مع الأحجام التاريخية) — انظر _get_topic_catalogue
+        self._topic_catalogue_state = None
+        # (بيانات الملفات التعريفية، فهرس العناقيد، فهرس الموضوعات) — انظر _get_profile_indexes
+        self._profile_index_state = None
 
-        try:
-            print("تحميل نموذج التجميع (K-Means)...")
-            temp_clustering_model = ProblemClusteringModel(
-                kmeans_model_path=kmeans_path,
-                ct_preprocessor_path=ct_path,
-                embedding_model_name=embedding_model_name_for_clustering
-            )
-            if not all([temp_clustering_model.kmeans_model,
-                        temp_clustering_model.column_transformer,
-                        temp_clustering_model.sentence_model]):
-                raise RuntimeError("فشل تحميل واحد أو أكثر من مكونات ProblemClusteringModel.")
-            self.clustering_model = temp_clustering_model
-            print("تم تحميل وتهيئة clustering_model بنجاح في ProblemAnalyzer.")
-        except Exception as e_cluster:
-            print(f"خطأ فادح أثناء تهيئة ProblemClusteringModel داخل ProblemAnalyzer: {e_cluster}")
-            # لا تقم بتعيين self.clustering_model إذا حدث خطأ، سيبقى None
+        if loading_mode == 'eager':
+            self._load_all_components()
+        elif loading_mode == 'background':
+            threading.Thread(target=self._load_all_components, name='problem-analyzer-loader', daemon=True).start()
+        print("--- اكتملت تهيئة ProblemAnalyzer (مع التحقق من الأخطاء) ---")
 
-        try:
-            print("\nتحميل نموذج تحليل الموضوعات (BERTopic)...")
-            temp_topic_model = ProblemTopicModel(model_path=bertopic_path)
-            if not temp_topic_model.model:
-                raise RuntimeError("فشل تحميل نموذج BERTopic بشكل كامل.")
-            self.topic_model = temp_topic_model
-            print("تم تحميل وتهيئة topic_model بنجاح في ProblemAnalyzer.")
-        except Exception as e_topic:
-            print(f"خطأ فادح أثناء تهيئة ProblemTopicModel داخل ProblemAnalyzer: {e_topic}")
+    def _load_all_components(self):
+        # المكونات الثلاثة تُحمّل بالتوازي؛ الاستدلال التجريبي يبدأ بعد اكتمالها
+        components = [self._clustering_component, self._topic_component, self._profile_component]
+        for component in components:
+            component.start_background()
+        for component in components:
+            component.get()
+        if self._profile_component.is_ready:
+            self._get_profile_indexes()
+        if self._topic_component.is_ready:
+            self._get_topic_catalogue()
+        if self._warm_up_component is not None:
+            self._warm_up_component.get()
 
-        try:
-            if os.path.exists(profile_data_path):
-                date_columns_to_parse_profiles = ['date_identified', 'date_closed', 'date_chosen',
-                                                  'start_date_planned', 'end_date_planned',
-                                                  'start_date_actual', 'end_date_actual']
-                self.df_profile_data = pd.read_csv(profile_data_path, parse_dates=date_columns_to_parse_profiles)
-                print(f"تم تحميل بيانات الملفات التعريفية من: {profile_data_path}")
-            else:
-                print(f"تحذير: ملف البيانات للملفات التعريفية '{profile_data_path}' غير موجود.")
-        except Exception as e_profile:
-            print(f"تحذير: خطأ أثناء تحميل بيانات الملفات التعريفية: {e_profile}")
+    @staticmethod
+    def _load_clustering_model(kmeans_path: str, ct_path: str, embedding_model_name: str):
+        print("تحميل نموذج التجميع (K-Means)...")
+        clustering_model = ProblemClusteringModel(
+            kmeans_model_path=kmeans_path,
+            ct_preprocessor_path=ct_path,
+            embedding_model_name=embedding_model_name
+        )
+        if not clustering_model.is_loaded:
+            raise RuntimeError("فشل تحميل واحد أو أكثر من مكونات ProblemClusteringModel.")
+        print("تم تحميل وتهيئة clustering_model بنجاح في ProblemAnalyzer.")
+        return clustering_model
 
-        print("--- اكتملت تهيئة ProblemAnalyzer (مع التحقق من الأخطاء) ---")
+    @staticmethod
+    def _load_topic_model(bertopic_path: str, embedding_model_name: str):
+        topic_config = MODEL_CONFIG.get('topic_modeling', {})
+        fast_model_dir = topic_config.get('fast_model_dir') or DEFAULT_FAST_TOPIC_MODEL_DIR
+        if topic_config.get('runtime', 'bertopic') == 'fast':
+            if FastTopicModel.export_exists(fast_model_dir):
+                print("\nتحميل نموذج الموضوعات الخفيف (بدون BERTopic)...")
+                topic_model = FastTopicModel(fast_model_dir, embedding_model_name=embedding_model_name)
+                if not topic_model.is_loaded:
+                    raise RuntimeError("فشل تحميل نموذج الموضوعات الخفيف.")
+                return topic_model
+            print(f"تحذير: ملفات نموذج الموضوعات الخفيف غير موجودة في '{fast_model_dir}'، سيُستخدم BERTopic.")
+        print("\nتحميل نموذج تحليل الموضوعات (BERTopic)...")
+        topic_model = ProblemTopicModel(model_path=bertopic_path, embedding_model_name=embedding_model_name)
+        if not topic_model.is_loaded:
+            raise RuntimeError("فشل تحميل نموذج BERTopic بشكل كامل.")
+        print("تم تحميل وتهيئة topic_model بنجاح في ProblemAnalyzer.")
+        return topic_model
+
+    @staticmethod
+    def _load_profile_data(profile_data_path: str):
+        if not os.path.exists(profile_data_path):
+            print(f"تحذير: ملف البيانات للملفات التعريفية '{profile_data_path}' غير موجود.")
+            return None
+        date_columns_to_parse_profiles = ['date_identified', 'date_closed', 'date_chosen',
+                                          'start_date_planned', 'end_date_planned',
+                                          'start_date_actual', 'end_date_actual']
+        df_profile_data = pd.read_csv(profile_data_path, parse_dates=date_columns_to_parse_profiles)
+        print(f"تم تحميل بيانات الملفات التعريفية من: {profile_data_path}")
+        return df_profile_data
+
+    def _warm_up(self) -> dict:
+        """
+        استدلال تجريبي واحد على كل فرع (التضمين، K-Means، BERTopic) حتى تُدفع كلفة التهيئة الكسولة
+        في torch/numba هنا وليس في أول طلب حقيقي. لا يمر عبر ذاكرة التضمينات المؤقتة.
+        """
+        timings = {}
+        clustering_model = self.clustering_model
+        if clustering_model is not None and clustering_model.embedding_service is not None:
+            started_at = time.perf_counter()
+            embeddings = clustering_model.embedding_service.warm_up()
+            timings['embedding_seconds'] = round(time.perf_counter() - started_at, 3)
+            if embeddings is not None and clustering_model.inference_plan is not None:
+                started_at = time.perf_counter()
+                clustering_model.predict_arrays(
+                    np.full((1, len(clustering_model.inference_plan.numerical_features)), np.nan),
+                    np.full((1, len(clustering_model.inference_plan.categorical_features)), None, dtype=object),
+                    embeddings[:1])
+                timings['clustering_seconds'] = round(time.perf_counter() - started_at, 3)
+        topic_model = self.topic_model
+        if topic_model is not None and topic_model.is_loaded:
+            started_at = time.perf_counter()
+            topic_model.get_topics_for_texts([WARM_UP_TEXT])
+            timings['topic_seconds'] = round(time.perf_counter() - started_at, 3)
+        print(f"اكتمل الاستدلال التجريبي (warm-up): {timings}")
+        return timings
+
+    # --- المكونات (تُحمّل عند أول وصول إذا لم تكن قد حُمّلت) ---
+    @property
+    def clustering_model(self):
+        return self._clustering_component.get()
+
+    @clustering_model.setter
+    def clustering_model(self, value):
+        self._clustering_component.set(value)
+
+    @property
+    def topic_model(self):
+        return self._topic_component.get()
+
+    @topic_model.setter
+    def topic_model(self, value):
+        self._topic_component.set(value)
+
+    @property
+    def df_profile_data(self):
+        return self._profile_component.get()
+
+    @df_profile_data.setter
+    def df_profile_data(self, value):
+        self._profile_component.set(value)
+
+    def readiness(self) -> dict:
+        """
+        تقرير جاهزية لكل مكون (الحالة، زمن التحميل بالثواني، رسالة الخطأ) دون انتظار أو بدء أي تحميل.
+        'ready' تكون True فقط عندما تكون كل المكونات (والاستدلال التجريبي إن فُعّل) جاهزة.
+        """
+        components = {component.name: component.status() for component in
+                      (self._clustering_component, self._topic_component, self._profile_component,
+                       self._warm_up_component) if component is not None}
+        return {'ready': all(status['state'] == STATE_READY for status in components.values()),
+                'components': components}
 
     # ... (بقية دوال الكلاس: _prepare_input_data_for_clustering, _get_cluster_profile_summary,
     #      _get_topic_profile_summary, analyze_new_problem كما هي في الرد السابق الذي نجح معك) ...
     #      سأقوم بتضمينها كاملة للتأكيد
-    def _prepare_input_data_for_clustering(self, problem_data: dict) -> pd.DataFrame:
+    def _build_clustering_frame(self, contexts: list[ProblemFeaturisationContext]) -> pd.DataFrame:
+        """
+        يبني DataFrame واحدًا (صف لكل مشكلة) بالأعمدة التي يتوقعها clustering_model.predict:
+        النص النظيف، الميزات الرقمية (التكلفة/الوقت المحللة في سياق كل مشكلة) والميزات الفئوية.
+        """
+        processed_texts = [context.cleaned_text(CLUSTERING_TEXT_FIELDS) for context in contexts]
+        input_df_data = {self.clustering_model.text_feature_col: processed_texts}
+        for nf in self.clustering_model.numerical_features:
+            if nf == 'processed_text_length':
+                input_df_data[nf] = [len(text.split()) for text in processed_texts]
+            else:
+                input_df_data[nf] = [context.numeric_value(nf) for context in contexts]
+        for cf in self.clustering_model.categorical_features:
+            input_df_data[cf] = [context.problem_data.get(cf) for context in contexts]
+        return pd.DataFrame(input_df_data)
+
+    def _prepare_input_data_for_clustering(self, context: ProblemFeaturisationContext) -> pd.DataFrame:
         print("بدء _prepare_input_data_for_clustering (النسخة المحسنة)...")
-        text_fields_to_combine = [
-            problem_data.get('title', ''), problem_data.get('description_initial', ''),
-            problem_data.get('refined_problem_statement_final', ''), problem_data.get('stakeholders_involved', ''),
-            problem_data.get('initial_impact_assessment', ''), problem_data.get('problem_source', ''),
-            problem_data.get('active_listening_notes', ''), problem_data.get('key_questions_asked', ''),
-            problem_data.get('initial_hypotheses', ''), problem_data.get('key_findings_from_analysis', ''),
-            problem_data.get('potential_root_causes_list', ''), problem_data.get('solution_description', ''),
-            problem_data.get('justification_for_choice', ''), problem_data.get('what_went_well', ''),
-            problem_data.get('what_could_be_improved', ''), problem_data.get('recommendations_for_future', ''),
-            problem_data.get('key_takeaways', '')
-        ]
-        combined_raw_text = " ".join(
-            filter(None, [str(t).strip() for t in text_fields_to_combine if pd.notna(t) and str(t).strip() != '']))
-        processed_text_for_clustering = preprocess_text_pipeline(combined_raw_text)
-        input_df_data = {}
-        input_df_data[self.clustering_model.text_feature_col] = [processed_text_for_clustering]
+        df_for_prediction = self._build_clustering_frame([context])
         expected_numerical_features = self.clustering_model.numerical_features
-        if 'estimated_cost_numeric' in expected_numerical_features:
-            input_df_data['estimated_cost_numeric'] = [parse_cost_value(problem_data.get('estimated_cost'))]
-        if 'overall_budget_numeric' in expected_numerical_features:
-            input_df_data['overall_budget_numeric'] = [parse_cost_value(problem_data.get('overall_budget'))]
-        if 'estimated_time_days' in expected_numerical_features:
-            input_df_data['estimated_time_days'] = [
-                parse_time_to_implement(problem_data.get('estimated_time_to_implement'))]
-        if 'processed_text_length' in expected_numerical_features:
-            input_df_data['processed_text_length'] = [len(processed_text_for_clustering.split())]
-        for nf in expected_numerical_features:
-            if nf not in input_df_data:
-                input_df_data[nf] = [problem_data.get(nf, np.nan)]
-                try:
-                    input_df_data[nf] = [float(input_df_data[nf][0]) if pd.notna(input_df_data[nf][0]) else np.nan]
-                except (ValueError, TypeError):
-                    input_df_data[nf] = [np.nan]
         expected_categorical_features = self.clustering_model.categorical_features
-        for cf in expected_categorical_features: input_df_data[cf] = [problem_data.get(cf)]
-        df_for_prediction = pd.DataFrame(input_df_data)
         print("DataFrame قبل إرساله إلى clustering_model.predict (بعد التحويلات الأولية):")
         cols_to_print_debug = [col for col in (expected_numerical_features + expected_categorical_features + [
             self.clustering_model.text_feature_col]) if col in df_for_prediction.columns]
@@ -137,111 +291,244 @@ class ProblemAnalyzer:
             print("لا توجد أعمدة محددة للطباعة أو أن df_for_prediction فارغ.")
         return df_for_prediction
 
+    def _get_profile_indexes(self) -> tuple[GroupProfileIndex, GroupProfileIndex]:
+        """
+        فهرسا الملفات التعريفية للعناقيد والموضوعات (GroupProfileIndex)، يُبنيان مرة واحدة من df_profile_data
+        ويُعاد بناؤهما فقط إذا استُبدلت البيانات (مقارنة بالهوية is).
+        """
+        df_profile = self.df_profile_data
+        state = self._profile_index_state
+        if state is not None and state[0] is df_profile:
+            return state[1], state[2]
+        started_at = time.perf_counter()
+        cluster_index = GroupProfileIndex(df_profile, 'cluster_kmeans')
+        topic_index = GroupProfileIndex(df_profile, 'bertopic_topic')
+        self._profile_index_state = (df_profile, cluster_index, topic_index)
+        if df_profile is not None:
+            print(f"تم بناء فهارس الملفات التعريفية ({len(cluster_index.profiles)} عنقود، "
+                  f"{len(topic_index.profiles)} موضوع) في {time.perf_counter() - started_at:.2f} ثانية.")
+        return cluster_index, topic_index
+
+    @traced('profile.cluster_summary')
     def _get_cluster_profile_summary(self, cluster_id: int) -> str:
         if self.df_profile_data is None or 'cluster_kmeans' not in self.df_profile_data.columns:
             return "بيانات الملفات التعريفية للعناقيد غير متاحة."
-        cluster_data = self.df_profile_data[self.df_profile_data['cluster_kmeans'] == cluster_id]
-        if cluster_data.empty: return f"لا توجد مشاكل تاريخية معروفة تنتمي للعنقود K-Means رقم {cluster_id}."
-        num_problems = len(cluster_data)
+        profile = self._get_profile_indexes()[0].get(cluster_id)
+        if profile is None: return f"لا توجد مشاكل تاريخية معروفة تنتمي للعنقود K-Means رقم {cluster_id}."
+        num_problems = profile['size']
         summary_parts = [f"**العنقود {cluster_id}** (يضم **{num_problems}** مشكلة/مشاكل تاريخية مشابهة):"]
         numerical_profile = []
-        if 'estimated_cost_numeric' in cluster_data and cluster_data['estimated_cost_numeric'].notna().any():
-            avg_cost = cluster_data['estimated_cost_numeric'].mean()
+        if 'estimated_cost_numeric' in profile['means']:
+            avg_cost = profile['means']['estimated_cost_numeric']
             numerical_profile.append(f"متوسط التكلفة المقدرة ~ **{avg_cost:.2f}**")
-        if 'estimated_time_days' in cluster_data and cluster_data['estimated_time_days'].notna().any():
-            avg_time = cluster_data['estimated_time_days'].mean()
+        if 'estimated_time_days' in profile['means']:
+            avg_time = profile['means']['estimated_time_days']
             numerical_profile.append(f"متوسط وقت التنفيذ المقدر ~ **{avg_time:.2f} يوم**")
         if numerical_profile: summary_parts.append("- " + "، ".join(numerical_profile) + ".")
         categorical_profile_parts = []
-        categorical_cols_for_profile = ['domain', 'complexity_level', 'status', 'problem_source']
-        for col in categorical_cols_for_profile:
-            if col in cluster_data and cluster_data[col].notna().any():
-                value_counts = cluster_data[col].value_counts(normalize=True)
-                top_values = value_counts.head(2)
-                col_profile_parts = []
-                for val, प्रतिशत in top_values.items():
-                    if val != 'Unknown' and प्रतिशत * 100 > 10:
-                        col_profile_parts.append(f"{val} (بنسبة {प्रतिशत * 100:.0f}%)")
-                if col_profile_parts: categorical_profile_parts.append(
-                    f"{col.replace('_', ' ').capitalize()}: {', '.join(col_profile_parts)}")
+        for col, top_values in profile['top_values'].items():
+            col_profile_parts = []
+            for val, प्रतिशत in top_values:
+                if val != 'Unknown' and प्रतिशत * 100 > 10:
+                    col_profile_parts.append(f"{val} (بنسبة {प्रतिशत * 100:.0f}%)")
+            if col_profile_parts: categorical_profile_parts.append(
+                f"{col.replace('_', ' ').capitalize()}: {', '.join(col_profile_parts)}")
         if categorical_profile_parts: summary_parts.append(
             "- الخصائص الفئوية الشائعة: " + "؛ ".join(categorical_profile_parts) + ".")
-        if 'processed_text' in cluster_data:
-            cluster_texts = cluster_data['processed_text'].dropna().loc[
-                cluster_data['processed_text'].astype(str).str.strip() != '']
-            if not cluster_texts.empty:
-                full_cluster_text = " ".join(cluster_texts)
-                words = full_cluster_text.split()
-                if words:
-                    top_keywords = [word for word, count in Counter(words).most_common(7)]
-                    if top_keywords: summary_parts.append(
-                        f"- أهم الكلمات المفتاحية في نصوص هذا العنقود: **{', '.join(top_keywords)}**.")
+        top_keywords = [word for word, count in profile['keywords']]
+        if top_keywords: summary_parts.append(
+            f"- أهم الكلمات المفتاحية في نصوص هذا العنقود: **{', '.join(top_keywords)}**.")
         if len(summary_parts) == 1: return summary_parts[
             0] + " لا توجد خصائص مميزة إضافية بارزة مسجلة لهذا العنقود حاليًا."
         return "\n".join(summary_parts)
 
+    def _get_topic_catalogue(self) -> dict[int, dict]:
+        """
+        فهرس الموضوعات من ProblemTopicModel مع 'historical_size' (عدد المشاكل التاريخية لكل موضوع
+        في df_profile_data، من فهرس الملفات التعريفية للموضوعات). يُعاد بناؤه فقط إذا تغير فهرس النموذج
+        أو بيانات الملفات التعريفية (مقارنة بالهوية is).
+        """
+        topic_model, df_profile = self.topic_model, self.df_profile_data
+        model_catalogue = topic_model.topic_catalogue if topic_model is not None else {}
+        state = self._topic_catalogue_state
+        if state is not None and state[0] is model_catalogue and state[1] is df_profile:
+            return state[2]
+        historical_sizes = None  # None = غير محدد (لا توجد بيانات ملفات تعريفية بعمود bertopic_topic)
+        if df_profile is not None and 'bertopic_topic' in df_profile.columns:
+            historical_sizes = self._get_profile_indexes()[1].sizes()
+        catalogue = {topic_id: {**entry, 'historical_size': historical_sizes.get(topic_id, 0)
+                                if historical_sizes is not None else None}
+                     for topic_id, entry in model_catalogue.items()}
+        self._topic_catalogue_state = (model_catalogue, df_profile, catalogue, historical_sizes)
+        return catalogue
+
+    @traced('profile.topic_summary')
     def _get_topic_profile_summary(self, topic_id: int) -> str:
-        if self.topic_model is None or self.topic_model.model is None: return "نموذج تحليل الموضوعات غير محمل."
+        if self.topic_model is None or not self.topic_model.is_loaded: return "نموذج تحليل الموضوعات غير محمل."
         try:
-            num_problems_in_topic_str = "غير محدد"
-            if self.df_profile_data is not None and 'bertopic_topic' in self.df_profile_data.columns:
-                num_problems_in_topic = len(
-                    self.df_profile_data[self.df_profile_data['bertopic_topic'] == int(topic_id)])
-                num_problems_in_topic_str = str(num_problems_in_topic)
+            entry = self._get_topic_catalogue().get(int(topic_id))
+            historical_sizes = self._topic_catalogue_state[3]
+            historical_size = historical_sizes.get(int(topic_id), 0) if historical_sizes is not None else None
+            num_problems_in_topic_str = str(historical_size) if historical_size is not None else "غير محدد"
             if topic_id == -1: return f"المشكلة لم تتطابق مع موضوع محدد (صُنفت كموضوع ضوضاء/غير مميز، يضم {num_problems_in_topic_str} مشكلة تاريخية)."
-            keywords_scores = self.topic_model.get_keywords_for_topic(topic_id)
+            keywords_scores = entry['keywords'] if entry is not None else []
             if not keywords_scores: return f"لا توجد كلمات رئيسية مميزة للموضوع رقم {topic_id} (يضم {num_problems_in_topic_str} مشكلة تاريخية)."
             keywords = [word for word, score in keywords_scores[:5]]
             keywords_str = "، ".join(keywords)
-            topic_name_representation = f"موضوع {topic_id}"
-            try:
-                topic_info_single = self.topic_model.model.get_topic_info(topic_id)
-                if topic_info_single is not None and not topic_info_single.empty:
-                    topic_name_representation = topic_info_single['Name'].iloc[0].replace("_", " ").strip()
-            except:
-                pass
+            topic_name_representation = entry['name'].replace("_", " ").strip() or f"موضوع {topic_id}"
             return (f"**الموضوع {topic_id}** (الاسم التمثيلي: '{topic_name_representation}'):\n"
                     f"- يضم **{num_problems_in_topic_str}** مشكلة تاريخية مشابهة.\n"
                     f"- أهم الكلمات الدالة: **{keywords_str}**.")
         except Exception as e:
             return f"خطأ في استخلاص ملخص الموضوع {topic_id}: {e}"
 
+    def _embed_texts_for_branches(self, topic_texts: list[str], cluster_texts: list[str], batch_size: int = 32):
+        """
+        يضمّن نصوص الموضوعات ونصوص التجميع في استدعاء واحد لخدمة التضمين المشتركة
+        (النصوص المتطابقة تُمرر للنموذج مرة واحدة فقط).
+        يعيد (تضمينات الموضوعات، تضمينات التجميع)، وأي منهما قد يكون None إذا لم يتوفر.
+        """
+        if self.clustering_model is None or self.clustering_model.embedding_service is None \
+                or not self.clustering_model.embedding_service.is_available:
+            return None, None
+        if not topic_texts and not cluster_texts:
+            return None, None
+        embeddings = self.clustering_model.embedding_service.encode(list(topic_texts) + list(cluster_texts),
+                                                                    batch_size=batch_size)
+        if embeddings.size == 0:
+            return None, None
+        topic_embeddings = embeddings[:len(topic_texts)] if topic_texts else None
+        cluster_embeddings = embeddings[len(topic_texts):] if cluster_texts else None
+        return topic_embeddings, cluster_embeddings
+
+    def _embed_request_texts(self, cleaned_text_for_topic: str, df_for_clustering: pd.DataFrame):
+        needs_topic = bool(self.topic_model and self.topic_model.is_loaded and cleaned_text_for_topic.strip())
+        needs_cluster = not df_for_clustering.empty and \
+            self.clustering_model.text_feature_col in df_for_clustering.columns
+        topic_texts = [cleaned_text_for_topic] if needs_topic else []
+        cluster_texts = df_for_clustering[self.clustering_model.text_feature_col].astype(str).tolist() \
+            if needs_cluster else []
+        return self._embed_texts_for_branches(topic_texts, cluster_texts)
+
+    @staticmethod
+    def _empty_analysis_result(problem_data) -> dict:
+        return {"input_problem_data": problem_data, "kmeans_cluster": None, "bertopic_topic": None,
+                "problem_embedding": None,
+                "cluster_profile_summary": "لم يتم تحميل أو إنشاء ملف تعريف العنقود.",
+                "topic_profile_summary": "لم يتم تحميل أو إنشاء ملف تعريف الموضوع."}
+
+    def _model_version(self) -> str:
+        """
+        نسخة النماذج لمفاتيح الذاكرة المؤقتة: بصمة ملفات النماذج والبيانات، مع عدد التحديثات المباشرة
+        لمراكز K-Means (إن فُعّلت) لأنها تغير النتائج دون تغيير أي ملف.
+        """
+        version = artifact_fingerprint(self._artifact_paths)
+        if self._clustering_component.is_ready:
+            online_updater = getattr(self._clustering_component.get(), 'online_updater', None)
+            if online_updater is not None:
+                version += f"+online{online_updater.n_updates}"
+        return version
+
+    def _cache_key_fields(self) -> list[str]:
+        """حقول المشكلة التي يعتمد عليها التحليل (وحدها تدخل في مفتاح الذاكرة المؤقتة)."""
+        fields = CLUSTERING_TEXT_FIELDS + TOPIC_TEXT_FIELDS + \
+            [source_field for source_field, _ in PARSED_NUMERIC_FIELDS.values()]
+        if self.clustering_model is not None:
+            fields += self.clustering_model.numerical_features + self.clustering_model.categorical_features
+        return fields
+
     def analyze_new_problem(self, problem_data: dict) -> dict:
-        analysis_results = {"input_problem_data": problem_data, "kmeans_cluster": None, "bertopic_topic": None,
-                            "cluster_profile_summary": "لم يتم تحميل أو إنشاء ملف تعريف العنقود.",
-                            "topic_profile_summary": "لم يتم تحميل أو إنشاء ملف تعريف الموضوع."}
+        with trace_request('analyze_new_problem') as trace:
+            analysis_results = self._analyze_with_result_cache(problem_data)
+        if self.include_timings:
+            analysis_results["timings"] = trace.timings()
+        return analysis_results
+
+    def _analyze_with_result_cache(self, problem_data: dict) -> dict:
+        if self.result_cache is None or not isinstance(problem_data, dict) or not problem_data:
+            return self._analyze_new_problem(problem_data)
+        # إعادة التشغيل في Streamlit والنقر المزدوج والطلبات المكررة تعطي نفس المفتاح
+        with span('analysis.cache_lookup'):
+            cache_key = self.result_cache.make_key(problem_data, self._cache_key_fields())
+            cached_results = self.result_cache.get(cache_key)
+        if cached_results is not None:
+            print("تم استرجاع نتيجة التحليل من الذاكرة المؤقتة.")
+            return {"input_problem_data": problem_data, **cached_results}
+        analysis_results = self._analyze_new_problem(problem_data)
+        # النتائج الناقصة (خطأ أو فرع لم يكتمل) لا تُخزن
+        if "error" not in analysis_results and "branch_errors" not in analysis_results:
+            self.result_cache.put(cache_key, {key: value for key, value in analysis_results.items()
+                                              if key != "input_problem_data"})
+        return analysis_results
+
+    def _analyze_new_problem(self, problem_data: dict) -> dict:
+        analysis_results = self._empty_analysis_result(problem_data)
         if not isinstance(problem_data, dict) or not problem_data:
             analysis_results["error"] = "بيانات المشكلة المدخلة غير صالحة."
             return analysis_results
         print(f"\n--- بدء تحليل مشكلة جديدة بعنوان: \"{problem_data.get('title', 'بدون عنوان')}\" ---")
-        text_fields_for_topic = [problem_data.get('title', ''), problem_data.get('description_initial', ''),
-                                 problem_data.get('refined_problem_statement_final', '')]
-        combined_raw_text_for_topic = " ".join(
-            filter(None, [str(t).strip() for t in text_fields_for_topic if pd.notna(t) and str(t).strip() != '']))
-        cleaned_text_for_topic = preprocess_text_pipeline(combined_raw_text_for_topic)
-        if self.topic_model and self.topic_model.model:
+        # كل حقل نصي يُنظف مرة واحدة ويُعاد استخدامه في نص الموضوعات ونص التجميع
+        with span('analysis.featurisation'):
+            context = ProblemFeaturisationContext(problem_data)
+            cleaned_text_for_topic = context.cleaned_text(TOPIC_TEXT_FIELDS)
+            df_for_clustering = self._prepare_input_data_for_clustering(context) \
+                if self.clustering_model else pd.DataFrame()
+        with span('analysis.embedding'):
+            topic_embeddings, cluster_embeddings = self._embed_request_texts(cleaned_text_for_topic,
+                                                                             df_for_clustering)
+        if cluster_embeddings is not None and len(cluster_embeddings) > 0:
+            # يستخدمه RecommendationEngine للبحث عن أقرب المشاكل التاريخية
+            analysis_results["problem_embedding"] = cluster_embeddings[0]
+        branches = {
+            'topic': lambda: self._analyze_topic_branch(cleaned_text_for_topic, topic_embeddings),
+            'cluster': lambda: self._analyze_cluster_branch(df_for_clustering, cluster_embeddings),
+        }
+        if self.concurrent_branches:
+            # الفرعان مستقلان ويقضيان معظم وقتهما في شيفرة أصلية تحرر GIL: زمن الطلب ~ زمن الفرع الأبطأ
+            tune_torch_threads(len(branches))
+            for name, outcome in run_branches(branches, timeout_seconds=self.branch_timeout_seconds).items():
+                if outcome['status'] == BRANCH_OK:
+                    analysis_results.update(outcome['value'])
+                else:
+                    print(f"تحذير: فرع '{name}' لم يكتمل ({outcome['status']}): {outcome['error']}")
+                    analysis_results.setdefault("branch_errors", {})[name] = outcome['error']
+        else:
+            for branch in branches.values():
+                analysis_results.update(branch())
+        print("--- اكتمل تحليل المشكلة ---")
+        return analysis_results
+
+    @traced('analysis.topic_branch')
+    def _analyze_topic_branch(self, cleaned_text_for_topic: str, topic_embeddings) -> dict:
+        """فرع BERTopic في analyze_new_problem. يعيد المفاتيح التي يحدّثها في نتيجة التحليل."""
+        branch_results = {}
+        if self.topic_model and self.topic_model.is_loaded:
             if cleaned_text_for_topic.strip():
-                topics, _ = self.topic_model.get_topics_for_texts([cleaned_text_for_topic])
+                topics, _ = self.topic_model.get_topics_for_texts([cleaned_text_for_topic],
+                                                                  embeddings=topic_embeddings)
                 if topics is not None and len(topics) > 0:
-                    analysis_results["bertopic_topic"] = topics[0]
+                    branch_results["bertopic_topic"] = topics[0]
                     print(f"موضوع BERTopic المتوقع: {topics[0]}")
-                    analysis_results["topic_profile_summary"] = self._get_topic_profile_summary(topics[0])
+                    branch_results["topic_profile_summary"] = self._get_topic_profile_summary(topics[0])
                 else:
                     print("BERTopic لم يتمكن من تحديد موضوع للنص.")
             else:
                 print("النص المعالج لـ BERTopic فارغ، لا يمكن تحديد الموضوع.")
         else:
             print("نموذج BERTopic غير محمل، لا يمكن تحديد الموضوعات.")
-        df_for_clustering = self._prepare_input_data_for_clustering(problem_data)
-        if self.clustering_model and self.clustering_model.kmeans_model:
-            if not df_for_clustering.empty and \
-                    self.clustering_model.column_transformer and \
-                    self.clustering_model.sentence_model:  # *** تحقق من sentence_model هنا ***
-                cluster_prediction = self.clustering_model.predict(df_for_clustering)
+        return branch_results
+
+    @traced('analysis.cluster_branch')
+    def _analyze_cluster_branch(self, df_for_clustering: pd.DataFrame, cluster_embeddings) -> dict:
+        """فرع K-Means في analyze_new_problem. يعيد المفاتيح التي يحدّثها في نتيجة التحليل."""
+        branch_results = {}
+        if self.clustering_model:
+            if not df_for_clustering.empty and self.clustering_model.is_loaded:
+                cluster_prediction = self.clustering_model.predict(df_for_clustering, embeddings=cluster_embeddings)
                 if cluster_prediction.size > 0:
-                    analysis_results["kmeans_cluster"] = cluster_prediction[0]
+                    branch_results["kmeans_cluster"] = cluster_prediction[0]
                     print(f"عنقود K-Means المتوقع: {cluster_prediction[0]}")
-                    analysis_results["cluster_profile_summary"] = self._get_cluster_profile_summary(
+                    branch_results["cluster_profile_summary"] = self._get_cluster_profile_summary(
                         cluster_prediction[0])
                 else:
                     print("K-Means لم يتمكن من التنبؤ بعنقود.")
@@ -249,8 +536,94 @@ class ProblemAnalyzer:
                 print("البيانات المدخلة لـ K-Means فارغة أو مكونات المعالجة/التضمين غير محملة.")
         else:
             print("نموذج K-Means غير محمل، لا يمكن التنبؤ بالعنقود.")
-        print("--- اكتمل تحليل المشكلة ---")
-        return analysis_results
+        return branch_results
+
+    @traced('analyze_many')
+    def analyze_many(self, problems: list[dict], batch_size: int = 64,
+                     include_cluster_features: bool = False) -> list[dict]:
+        """
+        يحلل قائمة من المشاكل دفعة واحدة (لإعادة التقييم الجماعي) بدلًا من استدعاء
+        analyze_new_problem لكل مشكلة: DataFrame تجميع واحد، تنظيف كل حقل مميز مرة واحدة،
+        تضمين على دفعات، ثم استدعاء واحد لكل من ColumnTransformer/K-Means و BERTopic.transform.
+
+        Args:
+            problems (list[dict]): قائمة قواميس المشاكل (بنفس مفاتيح analyze_new_problem).
+            batch_size (int): حجم دفعات التضمين.
+            include_cluster_features (bool): إرفاق 'cluster_features' (صف الميزات الكامل الذي صُنف به العنقود،
+                inference_plan.build_features) بكل نتيجة، لتحديث المراكز مباشرة في عملية أخرى.
+
+        Returns:
+            list[dict]: نتيجة تحليل لكل مشكلة بنفس ترتيب المدخلات وبنفس شكل نتيجة analyze_new_problem.
+        """
+        if not isinstance(problems, list):
+            problems = list(problems)
+        all_results = [self._empty_analysis_result(problem) for problem in problems]
+        valid_positions = []
+        for position, problem in enumerate(problems):
+            if isinstance(problem, dict) and problem:
+                valid_positions.append(position)
+            else:
+                all_results[position]["error"] = "بيانات المشكلة المدخلة غير صالحة."
+        if not valid_positions:
+            return all_results
+        valid_problems = [problems[position] for position in valid_positions]
+        print(f"\n--- بدء التحليل الجماعي لـ {len(valid_problems)} مشكلة ---")
+
+        # قواميس التخزين مشتركة بين سياقات الدفعة: الحقل المتكرر بين المشاكل يُنظف مرة واحدة
+        cleaned_fields_cache, language_cache = {}, {}
+        contexts = [ProblemFeaturisationContext(problem, cleaned_fields_cache, language_cache)
+                    for problem in valid_problems]
+        topic_model_ready = bool(self.topic_model and self.topic_model.is_loaded)
+        cleaned_topic_texts = [context.cleaned_text(TOPIC_TEXT_FIELDS) for context in contexts]
+        topic_rows = [i for i, text in enumerate(cleaned_topic_texts) if text.strip()] if topic_model_ready else []
+
+        clustering_ready = bool(self.clustering_model and self.clustering_model.is_loaded)
+        df_for_clustering = self._build_clustering_frame(contexts) if clustering_ready else pd.DataFrame()
+        cluster_texts = df_for_clustering[self.clustering_model.text_feature_col].astype(str).tolist() \
+            if clustering_ready else []
+
+        topic_embeddings, cluster_embeddings = self._embed_texts_for_branches(
+            [cleaned_topic_texts[i] for i in topic_rows], cluster_texts, batch_size=batch_size)
+        if cluster_embeddings is not None and len(cluster_embeddings) == len(valid_problems):
+            for i, position in enumerate(valid_positions):
+                all_results[position]["problem_embedding"] = cluster_embeddings[i]
+
+        # ملخصات الملفات التعريفية تُحسب مرة واحدة لكل عنقود/موضوع مميز
+        topic_summaries, cluster_summaries = {}, {}
+        if topic_rows:
+            topics, _ = self.topic_model.get_topics_for_texts([cleaned_topic_texts[i] for i in topic_rows],
+                                                              embeddings=topic_embeddings)
+            if topics is not None and len(topics) == len(topic_rows):
+                for i, topic_id in zip(topic_rows, topics):
+                    result = all_results[valid_positions[i]]
+                    result["bertopic_topic"] = topic_id
+                    if topic_id not in topic_summaries:
+                        topic_summaries[topic_id] = self._get_topic_profile_summary(topic_id)
+                    result["topic_profile_summary"] = topic_summaries[topic_id]
+            else:
+                print("BERTopic لم يتمكن من تحديد الموضوعات للدفعة.")
+
+        if clustering_ready and not df_for_clustering.empty:
+            cluster_predictions = self.clustering_model.predict(df_for_clustering, embeddings=cluster_embeddings)
+            if cluster_predictions.size == len(valid_problems):
+                for i, cluster_id in enumerate(cluster_predictions):
+                    result = all_results[valid_positions[i]]
+                    result["kmeans_cluster"] = cluster_id
+                    if cluster_id not in cluster_summaries:
+                        cluster_summaries[cluster_id] = self._get_cluster_profile_summary(cluster_id)
+                    result["cluster_profile_summary"] = cluster_summaries[cluster_id]
+            else:
+                print("K-Means لم يتمكن من التنبؤ بعناقيد الدفعة.")
+            inference_plan = getattr(self.clustering_model, 'inference_plan', None) if include_cluster_features else None
+            if inference_plan is not None and cluster_embeddings is not None:
+                cluster_features = inference_plan.build_features(
+                    df_for_clustering[inference_plan.numerical_features].to_numpy(dtype=np.float64),
+                    df_for_clustering[inference_plan.categorical_features].to_numpy(dtype=object),
+                    cluster_embeddings)
+                for i, position in enumerate(valid_positions):
+                    all_results[position]["cluster_features"] = cluster_features[i]
+        print(f"--- اكتمل التحليل الجماعي لـ {len(valid_problems)} مشكلة ---")
+        return all_results
 
 
 # --- مثال للاستخدام (للاختبار) ---
@@ -259,8 +632,8 @@ if __name__ == '__main__':
     if not os.path.exists(FINAL_RESULTS_DATA_PATH):
         print(f"تحذير شديد: ملف البيانات للملفات التعريفية '{FINAL_RESULTS_DATA_PATH}' غير موجود!")
     analyzer = ProblemAnalyzer(profile_data_path=FINAL_RESULTS_DATA_PATH)
-    if analyzer.clustering_model and analyzer.clustering_model.kmeans_model and analyzer.clustering_model.sentence_model and \
-            analyzer.topic_model and analyzer.topic_model.model:  # تحقق شامل أكثر
+    if analyzer.clustering_model and analyzer.clustering_model.is_loaded and \
+            analyzer.topic_model and analyzer.topic_model.is_loaded:  # تحقق شامل أكثر
         new_problem_1 = {
             'title': 'الشبكة بطيئة جدا في قسم المحاسبة',
             'description_initial': 'يشتكي الموظفون في قسم المحاسبة من بطء شديد في الوصول إلى الملفات. المشكلة بدأت منذ أسبوع.',
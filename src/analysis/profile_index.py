@@ -0,0 +1,119 @@
+# src/analysis/profile_index.py
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# الأعمدة التي تُلخص في الملفات التعريفية للعناقيد والموضوعات
+PROFILE_NUMERICAL_COLUMNS = ['estimated_cost_numeric', 'estimated_time_days']
+PROFILE_CATEGORICAL_COLUMNS = ['domain', 'complexity_level', 'status', 'problem_source']
+PROFILE_TEXT_COLUMN = 'processed_text'
+
+
+def _normalize_group_id(group_id):
+    """3 و 3.0 و np.int32(3) مفتاح واحد (عمود العنقود قد يُقرأ float إذا احتوى قيمًا مفقودة)."""
+    try:
+        as_float = float(group_id)
+    except (TypeError, ValueError):
+        return group_id
+    return int(as_float) if as_float.is_integer() else as_float
+
+
+class GroupProfileIndex:
+    """
+    ملفات تعريفية مسبقة الحساب لكل مجموعة (عنقود K-Means أو موضوع BERTopic) في بيانات المشاكل التاريخية:
+    عدد المشاكل، متوسطات الأعمدة الرقمية، أكثر القيم الفئوية شيوعًا (بنسبها)، وعدد مرات ظهور كل كلمة
+    في النصوص المعالجة.
+
+    يُبنى مرة واحدة بتمريرة groupby واحدة لكل نوع إحصاء ومصفوفة تكرارات متفرقة (مجموعة × كلمة)،
+    فيصبح ملخص المجموعة في مسار الطلبات بحثًا في قاموس بدلًا من تصفية كل البيانات التاريخية.
+    """
+
+    def __init__(self, df: pd.DataFrame, group_col: str, n_keywords: int = 7, n_top_values: int = 2,
+                 numerical_columns: list[str] = None, categorical_columns: list[str] = None,
+                 text_column: str = PROFILE_TEXT_COLUMN):
+        """
+        Args:
+            df (pd.DataFrame): بيانات الملفات التعريفية (مثل final_results_with_models.csv).
+            group_col (str): عمود المجموعة ('cluster_kmeans' أو 'bertopic_topic').
+            n_keywords (int): عدد الكلمات الأكثر تكرارًا المحفوظة لكل مجموعة.
+            n_top_values (int): عدد القيم الأكثر شيوعًا المحفوظة لكل عمود فئوي.
+        """
+        self.group_col = group_col
+        self.n_keywords = n_keywords
+        self.profiles: dict = {}
+        self.vocabulary = np.array([], dtype=object)
+        self.term_counts = None  # مصفوفة CSR (مجموعة × كلمة)
+        self._row_by_group = {}
+        self._first_positions = np.array([], dtype=np.int64)
+        if df is None or group_col not in df.columns:
+            return
+        numerical_columns = [col for col in (numerical_columns or PROFILE_NUMERICAL_COLUMNS) if col in df.columns]
+        categorical_columns = [col for col in (categorical_columns or PROFILE_CATEGORICAL_COLUMNS)
+                               if col in df.columns]
+        grouped = df.groupby(group_col, sort=True)
+
+        for group_id, size in grouped.size().items():
+            self.profiles[_normalize_group_id(group_id)] = {'size': int(size), 'means': {}, 'top_values': {},
+                                                            'keywords': []}
+        if numerical_columns:
+            means = grouped[numerical_columns].mean()
+            for group_id, row in means.iterrows():
+                self.profiles[_normalize_group_id(group_id)]['means'] = \
+                    {col: float(value) for col, value in row.items() if pd.notna(value)}
+        for col in categorical_columns:
+            # عدّ (مجموعة، قيمة) بترتيب أول ظهور ثم ترتيب مستقر تنازليًا، فتبقى القيم المتعادلة بنفس
+            # ترتيب value_counts على بيانات المجموعة وحدها
+            value_counts = df.groupby([group_col, col], sort=False).size()
+            group_totals = value_counts.groupby(level=0).transform('sum')
+            top_counts = value_counts.sort_values(ascending=False, kind='stable').groupby(level=0).head(n_top_values)
+            for (group_id, value), count in top_counts.items():
+                self.profiles[_normalize_group_id(group_id)]['top_values'].setdefault(col, []).append(
+                    (value, float(count / group_totals[(group_id, value)])))
+        if text_column in df.columns:
+            self._build_term_counts(df[group_col], df[text_column])
+
+    def _build_term_counts(self, group_values: pd.Series, texts: pd.Series):
+        valid = group_values.notna() & texts.notna() & (texts.astype(str).str.strip() != '')
+        group_ids = [_normalize_group_id(group_id) for group_id in group_values[valid]]
+        self._row_by_group = {group_id: row for row, group_id in enumerate(dict.fromkeys(group_ids))}
+        term_ids: dict[str, int] = {}
+        group_rows, term_columns = [], []
+        for group_id, text in zip(group_ids, texts[valid].astype(str)):
+            row = self._row_by_group[group_id]
+            for word in text.split():
+                group_rows.append(row)
+                term_columns.append(term_ids.setdefault(word, len(term_ids)))
+        self.vocabulary = np.array(list(term_ids), dtype=object)
+        n_groups, n_terms = len(self._row_by_group), len(term_ids)
+        # مفتاح (مجموعة، كلمة) واحد لكل ظهور؛ np.unique يعطي التكرار وموضع أول ظهور مرتبين كـ CSR.
+        # موضع أول ظهور يكسر التعادل في التكرار كما يفعل Counter.most_common على نص المجموعة المدمج.
+        pair_keys = np.array(group_rows, dtype=np.int64) * max(n_terms, 1) + np.array(term_columns, dtype=np.int64)
+        unique_keys, first_positions, counts = np.unique(pair_keys, return_index=True, return_counts=True)
+        rows = unique_keys // max(n_terms, 1)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_groups))])
+        self.term_counts = sparse.csr_matrix(
+            (counts.astype(np.int32), (unique_keys % max(n_terms, 1)).astype(np.int32), indptr),
+            shape=(n_groups, n_terms))
+        self._first_positions = first_positions
+        for group_id in self._row_by_group:
+            if group_id in self.profiles:
+                self.profiles[group_id]['keywords'] = self.top_terms(group_id, self.n_keywords)
+
+    def top_terms(self, group_id, n: int = 7) -> list[tuple[str, int]]:
+        """أكثر n كلمة تكرارًا في نصوص المجموعة مع عدد مرات ظهورها."""
+        row = self._row_by_group.get(_normalize_group_id(group_id))
+        if row is None or self.term_counts is None:
+            return []
+        start, end = self.term_counts.indptr[row], self.term_counts.indptr[row + 1]
+        counts, columns = self.term_counts.data[start:end], self.term_counts.indices[start:end]
+        order = np.lexsort((self._first_positions[start:end], -counts))[:n]
+        return [(self.vocabulary[columns[i]], int(counts[i])) for i in order]
+
+    def get(self, group_id) -> Optional[dict]:
+        """الملف التعريفي للمجموعة ({'size', 'means', 'top_values', 'keywords'}) أو None إذا لم تكن معروفة."""
+        return self.profiles.get(_normalize_group_id(group_id))
+
+    def sizes(self) -> dict:
+        return {group_id: profile['size'] for group_id, profile in self.profiles.items()}
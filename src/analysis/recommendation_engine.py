@@ -1,8 +1,23 @@
 # src/analysis/recommendation_engine.py
+import heapq
 import pandas as pd
 import numpy as np
 import os
 
+try:
+    from src.analysis.profile_index import _normalize_group_id
+    from src.models.vector_index import ProblemVectorIndex, DEFAULT_VECTOR_INDEX_DIR, META_FILENAME
+    from src.utils.tracing import traced
+except ImportError:
+    import sys
+
+    project_root_rec = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_rec not in sys.path:
+        sys.path.insert(0, project_root_rec)
+    from src.analysis.profile_index import _normalize_group_id
+    from src.models.vector_index import ProblemVectorIndex, DEFAULT_VECTOR_INDEX_DIR, META_FILENAME
+    from src.utils.tracing import traced
+
 # --- تعريف مسارات الملفات ---
 # نفترض أن هذا الملف موجود في src/analysis/
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -17,12 +32,118 @@ HISTORICAL_DATA_WITH_ALL_RESULTS_PATH = os.path.join(PROCESSED_DATA_DIR, 'final_
 # هذا المسار لم يعد ضروريًا كقيمة افتراضية إذا استخدمنا المسار المدمج
 # HISTORICAL_DATA_WITH_CLUSTERS_PATH = os.path.join(PROCESSED_DATA_DIR, 'problems_with_kmeans_clusters.csv')
 
+# حقول الدروس المستفادة ووصف كل منها في نص التوصية
+LESSON_FIELDS = {
+    'what_went_well': "ما سار على ما يرام سابقًا",
+    'what_could_be_improved': "ما كان يمكن تحسينه سابقًا",
+    'recommendations_for_future': "توصيات للمستقبل من مشاكل مشابهة"
+}
+SOLUTION_FIELD = 'solution_description'
+
+
+def _format_recommendations(values_by_field: dict) -> list:
+    """نصوص التوصيات: الحلول السابقة أولًا ثم الدروس المستفادة بترتيب LESSON_FIELDS."""
+    recommendations = [f"الحل المقترح/المختار سابقًا: '{sol}'" for sol in values_by_field.get(SOLUTION_FIELD, [])]
+    for field, desc in LESSON_FIELDS.items():
+        recommendations.extend(f"{desc}: '{lesson}'" for lesson in values_by_field.get(field, []))
+    return recommendations
+
+
+class GroupRecommendationIndex:
+    """
+    فهرس مقلوب (مجموعة -> توصيات) لعمود تجميع واحد ('cluster_kmeans' أو 'bertopic_topic') في البيانات التاريخية.
+
+    لكل مجموعة ولكل حقل (الحل والدروس المستفادة) قائمة القيم غير الفارغة بدون تكرار وبترتيب أول ظهور،
+    مع موضع ومعرف مشكلة أول ظهور، وموضع أول ظهور من مشكلة مختلفة. استبعاد المشكلة الحالية يصبح بذلك
+    تصفية على القيم القليلة التي ظهرت أولًا فيها، فتكلفة الطلب O(top_n) مهما كبرت البيانات التاريخية،
+    والنتيجة مطابقة لتصفية DataFrame المجموعة (== و !=) ثم dropna/strip/unique.
+    """
+
+    def __init__(self, df: pd.DataFrame, group_col: str, fields: list = None):
+        self.group_col = group_col
+        self.entries: dict = {}  # مجموعة -> حقل -> [(موضع أول ظهور، القيمة، معرف مشكلته، موضع بديل، معرفه)]
+        self.sizes: dict = {}  # مجموعة -> عدد الصفوف
+        self._rows_per_problem: dict = {}  # (مجموعة، معرف مشكلة) -> عدد الصفوف
+        if df is None or group_col not in df.columns:
+            return
+        fields = [field for field in (fields or [SOLUTION_FIELD, *LESSON_FIELDS]) if field in df.columns]
+        valid_groups = df[group_col].notna().to_numpy()
+        group_keys = pd.Series([_normalize_group_id(group_id) for group_id in df[group_col].to_numpy()[valid_groups]],
+                               index=np.flatnonzero(valid_groups), dtype=object)
+        for group_id, size in group_keys.value_counts(sort=False).items():
+            self.sizes[group_id] = int(size)
+        problem_ids = df['problem_id'].to_numpy(dtype=object) if 'problem_id' in df.columns \
+            else np.full(len(df), None, dtype=object)
+        for (group_id, problem_id), count in pd.DataFrame(
+                {'group': group_keys.to_numpy(), 'problem_id': problem_ids[group_keys.index]}
+        ).value_counts(dropna=False, sort=False).items():
+            self._rows_per_problem[(group_id, problem_id)] = int(count)
+        for field in fields:
+            self._index_field(field, df[field], group_keys, problem_ids)
+
+    def _index_field(self, field: str, column: pd.Series, group_keys: pd.Series, problem_ids: np.ndarray):
+        values = column.to_numpy()[group_keys.index]
+        valid = pd.notna(values)
+        positions = group_keys.index[valid]
+        texts = pd.Series(values[valid], dtype=object).astype(str)
+        non_empty = (texts.str.strip() != '').to_numpy()
+        rows = pd.DataFrame({'group': group_keys.to_numpy()[valid][non_empty], 'value': texts.to_numpy()[non_empty],
+                             'problem_id': problem_ids[positions[non_empty]], 'position': positions[non_empty]})
+        if rows.empty:
+            return
+        first = rows.drop_duplicates(['group', 'value'], keep='first')
+        # أول ظهور من مشكلة غير مشكلة الظهور الأول (يحل محله إذا استُبعدت تلك المشكلة)
+        first_problem_ids = rows.groupby(['group', 'value'], sort=False)['problem_id'].transform('first')
+        other_rows = rows[(rows['problem_id'] != first_problem_ids).to_numpy()]
+        alternates = other_rows.drop_duplicates(['group', 'value'], keep='first').set_index(['group', 'value'])
+        alternate_lookup = dict(zip(alternates.index, zip(alternates['position'], alternates['problem_id'])))
+        for group_id, value, problem_id, position in first.itertuples(index=False):
+            alternate_position, alternate_problem_id = alternate_lookup.get((group_id, value), (None, None))
+            self.entries.setdefault(group_id, {}).setdefault(field, []).append(
+                (position, value, problem_id, alternate_position, alternate_problem_id))
+
+    def count_rows(self, group_id, exclude_problem_id=None) -> int:
+        """عدد صفوف المجموعة بعد استبعاد صفوف exclude_problem_id."""
+        group_id = _normalize_group_id(group_id)
+        size = self.sizes.get(group_id, 0)
+        if exclude_problem_id is not None:
+            size -= self._rows_per_problem.get((group_id, exclude_problem_id), 0)
+        return size
+
+    @staticmethod
+    def _top_values(entries: list, top_n: int, exclude_problem_id) -> list:
+        selected, delayed = [], []  # delayed: كومة (الموضع البديل، القيمة) للقيم التي ظهرت أولًا في المشكلة المستبعدة
+        for position, value, problem_id, alternate_position, _ in entries:
+            while delayed and delayed[0][0] < position and len(selected) < top_n:
+                selected.append(heapq.heappop(delayed)[1])
+            if len(selected) >= top_n:
+                break
+            if exclude_problem_id is not None and problem_id == exclude_problem_id:
+                if alternate_position is not None:
+                    heapq.heappush(delayed, (alternate_position, value))
+            else:
+                selected.append(value)
+        while delayed and len(selected) < top_n:
+            selected.append(heapq.heappop(delayed)[1])
+        return selected
+
+    def recommendations(self, group_id, top_n: int, exclude_problem_id=None) -> list:
+        """نصوص التوصيات لمجموعة، بنفس ترتيب وصيغة _extract_recommendations_from_df."""
+        entries_by_field = self.entries.get(_normalize_group_id(group_id), {})
+        return _format_recommendations({field: self._top_values(entries, top_n, exclude_problem_id)
+                                        for field, entries in entries_by_field.items()})
+
 
 class RecommendationEngine:
     # *** استخدام المتغير المعرف أعلاه كقيمة افتراضية ***
-    def __init__(self, historical_data_path: str = HISTORICAL_DATA_WITH_ALL_RESULTS_PATH):
+    def __init__(self, historical_data_path: str = HISTORICAL_DATA_WITH_ALL_RESULTS_PATH,
+                 vector_index_dir: str = DEFAULT_VECTOR_INDEX_DIR):
         print("--- تهيئة RecommendationEngine ---")
         self.historical_data = None
+        self.vector_index = None
+        self._position_by_problem_id = None
+        self._positions_of_first_rows = None
+        self.group_indexes = {}  # عمود التجميع -> GroupRecommendationIndex
         try:
             date_columns_to_parse_rec = ['date_identified', 'date_closed', 'date_chosen',
                                          'start_date_planned', 'end_date_planned',
@@ -46,38 +167,81 @@ class RecommendationEngine:
         except Exception as e:
             print(f"خطأ أثناء تحميل البيانات التاريخية: {e}")
 
+        if self.historical_data is not None:
+            self._load_vector_index(vector_index_dir)
+            self._build_group_indexes()
         print("--- اكتملت تهيئة RecommendationEngine ---")
 
+    def _load_vector_index(self, vector_index_dir: str):
+        """يحمل فهرس أقرب الجيران (إن وجد) ويبني جدول problem_id -> رقم الصف في البيانات التاريخية."""
+        if 'problem_id' not in self.historical_data.columns:
+            return
+        if not os.path.exists(os.path.join(vector_index_dir, META_FILENAME)):
+            print(f"تحذير: فهرس المتجهات غير موجود في '{vector_index_dir}'. "
+                  f"التوصيات ستعتمد على العنقود/الموضوع فقط (python src/models/vector_index.py لبنائه).")
+            return
+        try:
+            self.vector_index = ProblemVectorIndex.load(vector_index_dir)
+            problem_ids = self.historical_data['problem_id']
+            first_rows = ~problem_ids.duplicated()
+            self._position_by_problem_id = pd.Index(problem_ids[first_rows].to_numpy())
+            self._positions_of_first_rows = np.flatnonzero(first_rows.to_numpy())
+            print(f"تم تحميل فهرس المتجهات: {len(self.vector_index)} مشكلة تاريخية.")
+        except Exception as e:
+            print(f"تحذير: تعذر تحميل فهرس المتجهات من '{vector_index_dir}': {e}")
+            self.vector_index = None
+
+    def _build_group_indexes(self):
+        """يبني الفهرس المقلوب لكل عمود تجميع موجود (مرة واحدة عند التحميل بدلًا من تصفية البيانات في كل طلب)."""
+        for group_col in ('cluster_kmeans', 'bertopic_topic'):
+            if group_col in self.historical_data.columns:
+                self.group_indexes[group_col] = GroupRecommendationIndex(self.historical_data, group_col)
+        for group_col, group_index in self.group_indexes.items():
+            print(f"تم بناء فهرس التوصيات لـ '{group_col}': {len(group_index.sizes)} مجموعة.")
+
+    @traced('recommendation.group_lookup')
+    def _recommendations_for_group(self, group_col: str, group_id, top_n: int, exclude_problem_id=None):
+        """يعيد (عدد المشاكل في المجموعة بعد الاستبعاد، التوصيات) من الفهرس المقلوب."""
+        group_index = self.group_indexes[group_col]
+        n_rows = group_index.count_rows(group_id, exclude_problem_id)
+        if n_rows == 0:
+            return 0, []
+        return n_rows, group_index.recommendations(group_id, top_n, exclude_problem_id)
+
+    @traced('recommendation.vector_search')
+    def find_similar_problems(self, problem_embedding, k: int = 20, exclude_problem_id=None) -> pd.DataFrame:
+        """
+        يعيد أقرب k مشاكل تاريخية (تشابه cosine) كـ DataFrame مرتب تنازليًا مع عمود 'similarity'.
+        يعيد DataFrame فارغًا إذا لم يتوفر الفهرس أو التضمين.
+        """
+        if self.vector_index is None or problem_embedding is None:
+            return pd.DataFrame()
+        exclude_ids = [exclude_problem_id] if exclude_problem_id is not None else None
+        neighbour_ids, scores = self.vector_index.search(problem_embedding, k=k, exclude_ids=exclude_ids)[0]
+        index_positions = self._position_by_problem_id.get_indexer(neighbour_ids)
+        found = index_positions >= 0  # معرفات في الفهرس لم تعد موجودة في البيانات التاريخية تُتجاهل
+        similar_df = self.historical_data.iloc[self._positions_of_first_rows[index_positions[found]]].copy()
+        similar_df['similarity'] = scores[found]
+        return similar_df
+
+    @traced('recommendation.extract')
     def _extract_recommendations_from_df(self, df_similar: pd.DataFrame, top_n: int) -> list:
         """دالة مساعدة لاستخلاص وتنسيق التوصيات من DataFrame لمشاكل مشابهة."""
-        recommendations = []
         if df_similar.empty:
-            return recommendations
-
-        if 'solution_description' in df_similar.columns:
-            # التأكد من أن القيم نصية قبل تطبيق .str (لتجنب خطأ مع float NaN مثلاً)
-            valid_solutions = df_similar['solution_description'].dropna().astype(str)
-            past_solutions = valid_solutions.loc[valid_solutions.str.strip() != ''].unique()
-            if len(past_solutions) > 0:
-                recs = [f"الحل المقترح/المختار سابقًا: '{sol}'" for sol in past_solutions[:top_n]]
-                recommendations.extend(recs)
-
-        lessons_fields = {
-            'what_went_well': "ما سار على ما يرام سابقًا",
-            'what_could_be_improved': "ما كان يمكن تحسينه سابقًا",
-            'recommendations_for_future': "توصيات للمستقبل من مشاكل مشابهة"
-        }
-        for field, desc in lessons_fields.items():
+            return []
+
+        values_by_field = {}
+        for field in (SOLUTION_FIELD, *LESSON_FIELDS):
             if field in df_similar.columns:
-                valid_lessons = df_similar[field].dropna().astype(str)
-                lessons = valid_lessons.loc[valid_lessons.str.strip() != ''].unique()
-                if len(lessons) > 0:
-                    recs = [f"{desc}: '{lesson}'" for lesson in lessons[:top_n]]
-                    recommendations.extend(recs)
-        return recommendations
-
-    def get_recommendations(self, problem_analysis_results: dict, top_n: int = 3) -> dict:
+                # التأكد من أن القيم نصية قبل تطبيق .str (لتجنب خطأ مع float NaN مثلاً)
+                valid_values = df_similar[field].dropna().astype(str)
+                values_by_field[field] = valid_values.loc[valid_values.str.strip() != ''].unique()[:top_n]
+        return _format_recommendations(values_by_field)
+
+    @traced('recommendation.get_recommendations')
+    def get_recommendations(self, problem_analysis_results: dict, top_n: int = 3, n_neighbors: int = 20) -> dict:
         recommendations_output = {
+            "based_on_similar_problems": [],
             "based_on_kmeans_cluster": [],
             "based_on_bertopic_topic": [],
             "general_warnings": []
@@ -94,25 +258,31 @@ class RecommendationEngine:
 
         current_problem_id = problem_analysis_results.get("input_problem_data", {}).get("problem_id")
 
+        # --- 0. توصيات من أقرب المشاكل التاريخية (فهرس المتجهات) ---
+        similar_problems_nn = self.find_similar_problems(problem_analysis_results.get("problem_embedding"),
+                                                         k=n_neighbors, exclude_problem_id=current_problem_id)
+        if not similar_problems_nn.empty:
+            print(f"تم العثور على {len(similar_problems_nn)} مشكلة تاريخية مشابهة عبر فهرس المتجهات.")
+            recommendations_output["based_on_similar_problems"] = self._extract_recommendations_from_df(
+                similar_problems_nn, top_n)
+
         # --- 1. توصيات بناءً على عنقود K-Means ---
         kmeans_cluster = problem_analysis_results.get("kmeans_cluster")
         if kmeans_cluster is not None and 'cluster_kmeans' in self.historical_data.columns:
             print(f"\nالبحث عن توصيات بناءً على عنقود K-Means رقم: {kmeans_cluster}")
-            # التأكد أن current_problem_id ليس None قبل المقارنة
-            if current_problem_id is not None:
-                similar_problems_k = self.historical_data[
-                    (self.historical_data['cluster_kmeans'] == kmeans_cluster) &
-                    (self.historical_data['problem_id'] != current_problem_id)
-                    ]
-            else:  # إذا لم يكن للمشكلة الجديدة ID، قارن بكل المشاكل في العنقود
-                similar_problems_k = self.historical_data[
-                    (self.historical_data['cluster_kmeans'] == kmeans_cluster)
-                ]
-
-            if not similar_problems_k.empty:
-                print(f"تم العثور على {len(similar_problems_k)} مشكلة مشابهة في نفس عنقود K-Means.")
-                recommendations_output["based_on_kmeans_cluster"] = self._extract_recommendations_from_df(
-                    similar_problems_k, top_n)
+            # أقرب الجيران في نفس العنقود (مرتبين حسب التشابه) إن وجدوا، وإلا كل مشاكل العنقود
+            nn_in_cluster = similar_problems_nn[similar_problems_nn['cluster_kmeans'] == kmeans_cluster] \
+                if not similar_problems_nn.empty else similar_problems_nn
+            if not nn_in_cluster.empty:
+                n_similar_k = len(nn_in_cluster)
+                recommendations_k = self._extract_recommendations_from_df(nn_in_cluster, top_n)
+            else:  # كل مشاكل العنقود من الفهرس، باستثناء المشكلة الحالية إذا كان لها ID
+                n_similar_k, recommendations_k = self._recommendations_for_group(
+                    'cluster_kmeans', kmeans_cluster, top_n, exclude_problem_id=current_problem_id)
+
+            if n_similar_k:
+                print(f"تم العثور على {n_similar_k} مشكلة مشابهة في نفس عنقود K-Means.")
+                recommendations_output["based_on_kmeans_cluster"] = recommendations_k
             else:
                 recommendations_output["general_warnings"].append(
                     f"لم يتم العثور على مشاكل أخرى في عنقود K-Means رقم {kmeans_cluster} (باستثناء المشكلة الحالية إذا كان لها ID).")
@@ -127,20 +297,18 @@ class RecommendationEngine:
                 bertopic_id_val) >= 0 and 'bertopic_topic' in self.historical_data.columns:
             bertopic_id = int(bertopic_id_val)  # تأكد أنه int
             print(f"\nالبحث عن توصيات بناءً على موضوع BERTopic رقم: {bertopic_id}")
-            if current_problem_id is not None:
-                similar_problems_b = self.historical_data[
-                    (self.historical_data['bertopic_topic'] == bertopic_id) &
-                    (self.historical_data['problem_id'] != current_problem_id)
-                    ]
+            nn_in_topic = similar_problems_nn[similar_problems_nn['bertopic_topic'] == bertopic_id] \
+                if not similar_problems_nn.empty else similar_problems_nn
+            if not nn_in_topic.empty:
+                n_similar_b = len(nn_in_topic)
+                recommendations_b = self._extract_recommendations_from_df(nn_in_topic, top_n)
             else:
-                similar_problems_b = self.historical_data[
-                    (self.historical_data['bertopic_topic'] == bertopic_id)
-                ]
-
-            if not similar_problems_b.empty:
-                print(f"تم العثور على {len(similar_problems_b)} مشكلة مشابهة في نفس موضوع BERTopic.")
-                recommendations_output["based_on_bertopic_topic"] = self._extract_recommendations_from_df(
-                    similar_problems_b, top_n)
+                n_similar_b, recommendations_b = self._recommendations_for_group(
+                    'bertopic_topic', bertopic_id, top_n, exclude_problem_id=current_problem_id)
+
+            if n_similar_b:
+                print(f"تم العثور على {n_similar_b} مشكلة مشابهة في نفس موضوع BERTopic.")
+                recommendations_output["based_on_bertopic_topic"] = recommendations_b
             else:
                 recommendations_output["general_warnings"].append(
                     f"لم يتم العثور على مشاكل أخرى في موضوع BERTopic رقم {bertopic_id} (باستثناء المشكلة الحالية إذا كان لها ID).")
@@ -151,7 +319,8 @@ class RecommendationEngine:
             recommendations_output["general_warnings"].append(
                 "البيانات التاريخية لا تحتوي على تصنيفات موضوعات BERTopic.")
 
-        if not recommendations_output["based_on_kmeans_cluster"] and not recommendations_output[
+        if not recommendations_output["based_on_similar_problems"] and \
+                not recommendations_output["based_on_kmeans_cluster"] and not recommendations_output[
             "based_on_bertopic_topic"]:
             if not recommendations_output["general_warnings"]:
                 recommendations_output["general_warnings"].append(
@@ -0,0 +1,233 @@
+# src/analysis/result_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_RESULT_CACHE_PATH = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'cache', 'analysis_results.sqlite')
+
+# كل كم ثانية يُعاد فحص ملفات النماذج (os.stat) لاكتشاف تغيرها
+_VERSION_RECHECK_SECONDS = 5.0
+
+
+def _canonical_value(value):
+    """قيمة موحدة للمفتاح: نص بدون مسافات طرفية، والقيم الفارغة/المفقودة كلها None."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.strip() or None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    return value if isinstance(value, (int, float, bool)) else str(value).strip() or None
+
+
+def canonical_input_hash(problem_data: dict, fields: list[str], model_version: str) -> str:
+    """
+    بصمة sha256 للحقول ذات الصلة فقط (بترتيب ثابت) مع نسخة النماذج، فالمشكلتان اللتان تختلفان في
+    حقول لا يستخدمها التحليل أو في مسافات طرفية فقط تعطيان نفس المفتاح.
+    """
+    canonical_fields = {field: _canonical_value(problem_data.get(field)) for field in sorted(set(fields))}
+    payload = json.dumps({'fields': canonical_fields, 'model_version': model_version},
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def artifact_fingerprint(paths: list[str]) -> str:
+    """بصمة (المسار، الحجم، وقت التعديل) لملفات النماذج؛ تتغير عند استبدال أي ملف أو إنشائه أو حذفه."""
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha1("\n".join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+# --- التحويل إلى JSON والعكس (بدون pickle) ---
+def _encode_result(value):
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': value.tolist(), 'dtype': str(value.dtype)}
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        return value.item()
+    if isinstance(value, dict):
+        return {key: _encode_result(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_result(item) for item in value]
+    return value
+
+
+def _decode_result(value):
+    if isinstance(value, dict):
+        if '__ndarray__' in value:
+            return np.asarray(value['__ndarray__'], dtype=value['dtype'])
+        return {key: _decode_result(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_result(item) for item in value]
+    return value
+
+
+class AnalysisResultCache:
+    """
+    ذاكرة تخزين مؤقت لنتائج analyze_new_problem على مستويين:
+      1. LRU في الذاكرة مع مدة صلاحية (TTL) لكل مدخل.
+      2. (اختياري) قاعدة SQLite على القرص تتشاركها كل عمليات العمال على نفس الجهاز (وضع WAL).
+
+    المفتاح بصمة الحقول ذات الصلة مع نسخة النماذج (model_version_fn)، فتغير ملف نموذج يعني مفاتيح
+    جديدة تلقائيًا؛ وعند اكتشاف نسخة جديدة تُحذف المدخلات القديمة من المستويين.
+
+    المستويان يحفظان صيغة JSON نفسها، وكل قراءة تفك نسخة جديدة منها: المستدعي الذي يعدّل النتيجة
+    (القوائم والقواميس المتداخلة و problem_embedding) لا يغير ما تعيده القراءات التالية.
+    """
+
+    def __init__(self, model_version_fn: Callable[[], str], ttl_seconds: float = 3600.0, max_items: int = 1024,
+                 sqlite_path: Optional[str] = None):
+        """
+        Args:
+            model_version_fn: دالة تعيد نسخة النماذج الحالية (مثل artifact_fingerprint لملفات النماذج).
+                تُستدعى مرة كل بضع ثوانٍ على الأكثر.
+            ttl_seconds (float): مدة صلاحية المدخل بالثواني.
+            max_items (int): أقصى عدد مدخلات في الذاكرة.
+            sqlite_path (str, optional): مسار قاعدة SQLite للمستوى المشترك. None لتعطيله.
+        """
+        self.model_version_fn = model_version_fn
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self.sqlite_path = sqlite_path
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()  # المفتاح -> (وقت الحفظ، JSON)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # اتصال SQLite لكل خيط
+        self._model_version: Optional[str] = None
+        self._version_checked_at = 0.0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        if sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS analysis_results ("
+                "key TEXT PRIMARY KEY, model_version TEXT NOT NULL, created_at REAL NOT NULL, value TEXT NOT NULL)")
+            self._connection().commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.sqlite_path, timeout=10.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # --- نسخة النماذج ---
+    @property
+    def model_version(self) -> str:
+        return self.refresh_model_version()
+
+    def refresh_model_version(self) -> str:
+        """يعيد نسخة النماذج، ويبطل المدخلات القديمة إذا تغيرت (الفحص الفعلي مرة كل بضع ثوانٍ على الأكثر)."""
+        now = time.monotonic()
+        if self._model_version is None or now - self._version_checked_at >= _VERSION_RECHECK_SECONDS:
+            version = self.model_version_fn()
+            self._version_checked_at = now
+            if self._model_version is not None and version != self._model_version:
+                print("تغيرت ملفات النماذج: سيتم إبطال نتائج التحليل المخزنة مؤقتًا.")
+                self.invalidate(keep_version=version)
+            self._model_version = version
+        return self._model_version
+
+    def make_key(self, problem_data: dict, fields: list[str]) -> str:
+        return canonical_input_hash(problem_data, fields, self.model_version)
+
+    # --- القراءة والكتابة ---
+    def get(self, key: str) -> Optional[dict]:
+        self.refresh_model_version()
+        now = time.time()
+        encoded = None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    encoded = entry[1]
+                else:
+                    del self._memory[key]
+        if encoded is not None:
+            return _decode_result(json.loads(encoded))
+        if self.sqlite_path:
+            row = self._connection().execute(
+                "SELECT created_at, value FROM analysis_results WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl_seconds)).fetchone()
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.disk_hits += 1
+                return _decode_result(json.loads(row[1]))
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key: str, created_at: float, encoded: str):
+        with self._lock:
+            self._memory[key] = (created_at, encoded)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def put(self, key: str, result: dict):
+        created_at = time.time()
+        encoded = json.dumps(_encode_result(result), ensure_ascii=False)
+        self._remember(key, created_at, encoded)
+        with self._lock:
+            self.stores += 1
+        if self.sqlite_path:
+            connection = self._connection()
+            connection.execute("INSERT OR REPLACE INTO analysis_results VALUES (?, ?, ?, ?)",
+                               (key, self.model_version, created_at, encoded))
+            connection.commit()
+
+    def invalidate(self, keep_version: Optional[str] = None):
+        """يحذف كل المدخلات (أو كل ما لا يطابق keep_version في القرص) ويفرغ الذاكرة."""
+        with self._lock:
+            self._memory.clear()
+            self.invalidations += 1
+        if self.sqlite_path:
+            connection = self._connection()
+            if keep_version is None:
+                connection.execute("DELETE FROM analysis_results")
+            else:
+                connection.execute("DELETE FROM analysis_results WHERE model_version != ?", (keep_version,))
+            connection.commit()
+
+    def purge_expired(self) -> int:
+        """يحذف المدخلات المنتهية الصلاحية من القرص. يعيد عدد الصفوف المحذوفة."""
+        if not self.sqlite_path:
+            return 0
+        connection = self._connection()
+        deleted = connection.execute("DELETE FROM analysis_results WHERE created_at < ?",
+                                     (time.time() - self.ttl_seconds,)).rowcount
+        connection.commit()
+        return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                    'stores': self.stores, 'invalidations': self.invalidations,
+                    'memory_items': len(self._memory), 'model_version': self._model_version}
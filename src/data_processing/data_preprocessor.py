@@ -4,12 +4,14 @@ import numpy as np
 import os
 import logging
 from datetime import datetime
-import re  # استيراد re لاستخدامه في الدوال المساعدة
 
 # تأكد من أن مسارات الاستيراد صحيحة
 try:
     from src.data_processing.database_connector import DatabaseConnector
     from src.utils.text_processing import preprocess_text_pipeline
+    # المحلل الموحد لقيم التكلفة والوقت (نسخة واحدة مشتركة مع ProblemAnalyzer)
+    from src.utils.feature_engineering_utils import (parse_cost_value, parse_time_to_implement,
+                                                     parse_cost_series, parse_time_series)
 except ImportError:
     import sys
 
@@ -19,103 +21,12 @@ except ImportError:
         sys.path.insert(0, project_root_preprocessor)
     from src.data_processing.database_connector import DatabaseConnector
     from src.utils.text_processing import preprocess_text_pipeline
+    from src.utils.feature_engineering_utils import (parse_cost_value, parse_time_to_implement,
+                                                     parse_cost_series, parse_time_series)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-# --- دوال مساعدة لتحويل القيم ---
-def parse_cost_value(cost_str: str) -> float:
-    """
-    محاولة تحليل قيمة التكلفة من نص وتحويلها إلى رقم.
-    """
-    if pd.isna(cost_str) or cost_str == '':
-        return np.nan
-
-    cost_str = str(cost_str).lower()  # توحيد حالة الأحرف
-    numeric_value = np.nan
-
-    # 1. البحث عن الأرقام (بما في ذلك الكسور العشرية)
-    #    مثال: "5 دولار", "20-50 ريال", "25000"
-    numbers_found = re.findall(r'\d+\.?\d*', cost_str)
-
-    if numbers_found:
-        if len(numbers_found) == 1:
-            numeric_value = float(numbers_found[0])
-        elif len(numbers_found) > 1 and (
-                '-' in cost_str or 'الى' in cost_str or 'إلى' in cost_str):  # التعامل مع النطاقات
-            try:
-                # أخذ متوسط النطاق
-                numeric_value = (float(numbers_found[0]) + float(numbers_found[-1])) / 2
-            except ValueError:
-                numeric_value = float(numbers_found[0])  # إذا فشل، خذ الرقم الأول
-        else:  # إذا كان هناك عدة أرقام غير مرتبطة بنطاق واضح، خذ الأول كافتراض
-            numeric_value = float(numbers_found[0])
-
-        # يمكن إضافة منطق تحويل عملات هنا إذا لزم الأمر لاحقًا
-        # حاليًا، نحن فقط نستخلص القيمة الرقمية
-
-    else:  # إذا لم يتم العثور على أرقام، تحقق من الكلمات الوصفية
-        if "عالي" in cost_str or "مرتفع" in cost_str:
-            numeric_value = 10000.0  # قيمة تقديرية لعالي (يمكن تعديلها)
-        elif "متوسط" in cost_str:
-            numeric_value = 5000.0  # قيمة تقديرية لمتوسط
-        elif "منخفض" in cost_str:
-            numeric_value = 1000.0  # قيمة تقديرية لمنخفض
-        # يمكنك إضافة المزيد من الكلمات المفتاحية هنا
-
-    return numeric_value
-
-
-def parse_time_to_implement(time_str: str) -> float:
-    """
-    محاولة تحليل وقت التنفيذ من نص وتحويله إلى عدد الأيام.
-    """
-    if pd.isna(time_str) or time_str == '':
-        return np.nan
-
-    time_str = str(time_str).lower()
-    days = np.nan
-
-    # 1. التعامل مع "فوري"
-    if "فوري" in time_str:
-        return 0.0  # أو 1.0 إذا كنت تعتبر "فوري" يستغرق يومًا واحدًا كحد أدنى
-
-    # 2. البحث عن الأرقام والوحدات
-    numbers_found = re.findall(r'\d+\.?\d*', time_str)
-
-    value1 = None
-    value2 = None
-
-    if numbers_found:
-        value1 = float(numbers_found[0])
-        if len(numbers_found) > 1 and ('-' in time_str or 'الى' in time_str or 'إلى' in time_str):
-            value2 = float(numbers_found[-1])
-            # أخذ متوسط النطاق
-            avg_value = (value1 + value2) / 2
-        else:
-            avg_value = value1
-    else:  # لا توجد أرقام، قد يكون نصًا وصفيًا آخر غير "فوري"
-        return np.nan
-
-    # تحديد الوحدة وتحويلها إلى أيام
-    if "شهر" in time_str or "اشهر" in time_str or "أشهر" in time_str:
-        days = avg_value * 30  # افتراض الشهر 30 يومًا
-    elif "اسبوع" in time_str or "أسبوع" in time_str or "اسابيع" in time_str or "أسابيع" in time_str:
-        days = avg_value * 7
-    elif "يوم" in time_str or "ايام" in time_str or "أيام" in time_str:
-        days = avg_value
-    elif "ساعه" in time_str or "ساعة" in time_str or "ساعات" in time_str:
-        days = avg_value / 24
-    elif "دقيقه" in time_str or "دقيقة" in time_str or "دقائق" in time_str:
-        days = avg_value / (24 * 60)
-    else:  # إذا لم يتم تحديد وحدة واضحة وكان هناك رقم، نفترض أنها أيام (أو نتركها NaN)
-        # هذا يعتمد على السياق، قد يكون من الأفضل تركها NaN إذا لم تكن الوحدة واضحة
-        # days = avg_value # افتراض أيام إذا لم تذكر وحدة
-        return np.nan  # أكثر أمانًا إذا لم تكن الوحدة واضحة
-
-    return days
-
-
 class DataPreprocessor:
     def __init__(self, db_connector: DatabaseConnector):
         self.db_connector = db_connector
@@ -166,16 +77,18 @@ class DataPreprocessor:
             logging.info("تم تحويل العمود 'sentiment_score' إلى رقمي.")
 
         # --- تحويل الأعمدة المالية والزمنية ---
+        # المحلل المشترك مع وقت الاستدلال (feature_engineering_utils) يحلل القيم الرقمية كنصها كما في
+        # المحلل السابق هنا، فعمود تكلفة قرأه pandas كأرقام يبقى بقيمه؛ وفي الاستدلال صار 2500 يعطي 2500.0 لا NaN
         if 'estimated_cost' in df.columns:
-            df['estimated_cost_numeric'] = df['estimated_cost'].apply(parse_cost_value)
+            df['estimated_cost_numeric'] = parse_cost_series(df['estimated_cost'])
             logging.info("تم إنشاء العمود 'estimated_cost_numeric'.")
 
         if 'overall_budget' in df.columns:
-            df['overall_budget_numeric'] = df['overall_budget'].apply(parse_cost_value)
+            df['overall_budget_numeric'] = parse_cost_series(df['overall_budget'])
             logging.info("تم إنشاء العمود 'overall_budget_numeric'.")
 
         if 'estimated_time_to_implement' in df.columns:
-            df['estimated_time_days'] = df['estimated_time_to_implement'].apply(parse_time_to_implement)
+            df['estimated_time_days'] = parse_time_series(df['estimated_time_to_implement'])
             logging.info("تم إنشاء العمود 'estimated_time_days'.")
 
         logging.info("اكتمل تحويل أنواع البيانات.")
@@ -2,7 +2,7 @@
 import pandas as pd
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import logging
 import os
 
@@ -102,15 +102,14 @@ class DatabaseConnector:
             logging.error(f"خطأ عام أثناء استخراج البيانات: {e}")
             raise # أو إرجاع DataFrame فارغ: return pd.DataFrame()
 
-    def extract_problems_data(self, limit: int = None) -> pd.DataFrame:
-        """
-        استخراج بيانات المشاكل مع المعلومات المرتبطة بها كما في الكود الأصلي.
-        """
+    @staticmethod
+    def _problems_query() -> str:
+        """استعلام المشاكل مع المعلومات المرتبطة بها (بدون WHERE أو ORDER BY، ليُضافا حسب الحاجة)."""
         # الاستعلام الذي قدمته يبدو جيدًا وشاملاً.
         # تأكد من أن جميع أسماء الجداول والأعمدة تتطابق تمامًا مع مخطط قاعدة بيانات SQLite.
         # SQLite قد يكون حساسًا لحالة الأحرف بشكل مختلف عن PostgreSQL في بعض الإعدادات.
         # GROUP_CONCAT متاح في SQLite، وهو جيد.
-        query = """
+        return """
         SELECT
             p.id AS problem_id,
             p.title,
@@ -172,8 +171,13 @@ class DatabaseConnector:
         LEFT JOIN lesson_learned ll ON p.id = ll.problem_id
         -- لا نحتاج GROUP BY p.id إذا كان كل مشكلة لها بالكثير صف واحد من كل جدول مرتبط (علاقة واحد لواحد أو واحد لكثير مع اختيار واحد)
         -- إذا كانت هناك علاقات كثير لكثير قد تؤدي لتكرار، ستحتاج GROUP BY p.id وربما GROUP_CONCAT لباقي الحقول النصية المجمعة
-        ORDER BY p.id -- جيد للاتساق
         """
+
+    def extract_problems_data(self, limit: int = None) -> pd.DataFrame:
+        """
+        استخراج بيانات المشاكل مع المعلومات المرتبطة بها كما في الكود الأصلي.
+        """
+        query = self._problems_query() + "        ORDER BY p.id -- جيد للاتساق\n"
         # تعديل محتمل: إذا كان الربط بـ potential_root_cause من خلال cause_analysis يؤدي لصفوف متعددة للمشكلة الواحدة،
         # ستحتاج إلى GROUP BY p.id واستخدام GROUP_CONCAT للحقول النصية من الجداول المربوطة (مثل ps.solution_description إذا كان يمكن أن يكون هناك أكثر من حل مقترح مرتبط بطريقة ما قبل الاختيار).
         # ومع ذلك، بناءً على `cs.proposed_solution_id = ps.id`، يبدو أنك تربط حلاً مقترحًا *واحدًا* محددًا تم اختياره.
@@ -183,6 +187,38 @@ class DatabaseConnector:
 
         return self.extract_data(query)
 
+    def count_problems(self) -> int:
+        """عدد المشاكل في جدول problem."""
+        self._ensure_connected()
+        with self.engine.connect() as connection:
+            return int(connection.execute(text("SELECT COUNT(*) FROM problem")).scalar() or 0)
+
+    def extract_problems_batch(self, batch_size: int, after_problem_id: Optional[int] = None) -> pd.DataFrame:
+        """
+        دفعة من بيانات المشاكل بترقيم المفاتيح (keyset): أول batch_size مشكلة معرفها أكبر من after_problem_id.
+        التصفية على معرفات المشاكل (وليس على الصفوف) فلا تنقسم صفوف المشكلة الواحدة بين دفعتين،
+        وتكلفة كل دفعة لا تزيد مع التقدم في الجدول كما يحدث مع OFFSET.
+        """
+        ids_filter = "SELECT id FROM problem WHERE id > :after_problem_id ORDER BY id LIMIT :batch_size" \
+            if after_problem_id is not None else "SELECT id FROM problem ORDER BY id LIMIT :batch_size"
+        query = self._problems_query() + f"        WHERE p.id IN ({ids_filter})\n        ORDER BY p.id\n"
+        params = {'batch_size': int(batch_size)}
+        if after_problem_id is not None:
+            params['after_problem_id'] = after_problem_id
+        return self.extract_data(query, params=params)
+
+    def iter_problem_batches(self, batch_size: int = 1000,
+                             after_problem_id: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """يمرر جدول المشاكل كاملًا على دفعات مرتبة حسب المعرف، بدءًا مما بعد after_problem_id (للاستئناف)."""
+        while True:
+            batch_df = self.extract_problems_batch(batch_size, after_problem_id)
+            if batch_df.empty:
+                return
+            yield batch_df
+            after_problem_id = batch_df['problem_id'].max()
+            if hasattr(after_problem_id, 'item'):
+                after_problem_id = after_problem_id.item()
+
     def extract_kpi_data(self) -> pd.DataFrame:
         """
         استخراج بيانات مؤشرات الأداء.
@@ -3,14 +3,25 @@ import pandas as pd
 import numpy as np
 import os
 import joblib
+from typing import Optional
 from scipy.sparse import hstack, csr_matrix  # لا يزال مفيدًا إذا كان CT ينتج متفرقًا
 
-# *** استيراد جديد ***
+# نموذج التضمين يأتي من خدمة مشتركة على مستوى العملية (نسخة واحدة من الأوزان مع ProblemTopicModel)
 try:
-    from sentence_transformers import SentenceTransformer
+    from src.models.embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL_NAME
+    from src.models.inference_plan import CompiledClusteringPlan, DEFAULT_CLUSTERING_BUNDLE_DIR, source_fingerprints
+    from src.models.online_clustering import OnlineClusteringUpdater, DEFAULT_ONLINE_STATE_DIR
+    from src.utils.tracing import span, traced
 except ImportError:
-    print("تحذير: مكتبة SentenceTransformer غير مثبتة. pip install sentence-transformers")
-    SentenceTransformer = None
+    import sys
+
+    project_root_clustering = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_clustering not in sys.path:
+        sys.path.insert(0, project_root_clustering)
+    from src.models.embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL_NAME
+    from src.models.inference_plan import CompiledClusteringPlan, DEFAULT_CLUSTERING_BUNDLE_DIR, source_fingerprints
+    from src.models.online_clustering import OnlineClusteringUpdater, DEFAULT_ONLINE_STATE_DIR
+    from src.utils.tracing import span, traced
 
 # المسارات الافتراضية للمكونات الجديدة
 DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -18,6 +29,8 @@ DEFAULT_MODELS_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models')
 DEFAULT_KMEANS_PATH = os.path.join(DEFAULT_MODELS_DIR, 'kmeans_model.pkl')  # نفس اسم ملف النموذج
 # *** اسم ملف ColumnTransformer الجديد الذي يعالج الميزات الرقمية والفئوية فقط ***
 DEFAULT_CT_PATH = os.path.join(DEFAULT_MODELS_DIR, 'ct_num_cat_embeddings_preprocessor.pkl')
+# مقلل الأبعاد (PCA / إسقاط عشوائي) بين الميزات و K-Means، اختياري (يُنشأ بـ train_clustering --reduction)
+DEFAULT_REDUCER_PATH = os.path.join(DEFAULT_MODELS_DIR, 'clustering_reducer.pkl')
 
 
 # لم نعد نحتاج إلى TFIDF_VECTORIZER_PATH هنا
@@ -26,17 +39,32 @@ class ProblemClusteringModel:
     def __init__(self,
                  kmeans_model_path: str = DEFAULT_KMEANS_PATH,
                  ct_preprocessor_path: str = DEFAULT_CT_PATH,
-                 embedding_model_name: str = 'paraphrase-multilingual-MiniLM-L12-v2'):
+                 embedding_model_name: str = DEFAULT_EMBEDDING_MODEL_NAME,
+                 bundle_dir: str = DEFAULT_CLUSTERING_BUNDLE_DIR,
+                 reducer_path: str = DEFAULT_REDUCER_PATH,
+                 load_embedding_model: bool = True):
         """
         تهيئة نموذج التجميع.
         Args:
             kmeans_model_path (str): مسار ملف نموذج K-Means المحفوظ.
             ct_preprocessor_path (str): مسار ملف ColumnTransformer (للميزات الرقمية/الفئوية) المحفوظ.
             embedding_model_name (str): اسم أو مسار نموذج تضمين الجمل من SentenceTransformer.
+            bundle_dir (str): مجلد حزمة النموذج بدون pickle (manifest.json + .npy). إذا وُجد يُحمّل منه
+                النموذج عبر mmap بدلًا من ملفات joblib (python src/models/inference_plan.py لإنشائه)، ما لم
+                تُمرر مسارات joblib غير الافتراضية أو تكن ملفات joblib قد تغيرت بعد تصدير الحزمة.
+            reducer_path (str): مسار مقلل الأبعاد المحفوظ. يُطبق تلقائيًا قبل K-Means إذا كان الملف موجودًا.
+            load_embedding_model (bool): False لتحميل مسار التنبؤ وحده (مثل تحديث المراكز من ميزات جاهزة
+                في update_online_from_features) دون نموذج التضمين.
         """
         self.kmeans_model = None
         self.column_transformer = None
-        self.sentence_model = None  # *** كائن لنموذج التضمين ***
+        self.reducer = None  # مقلل الأبعاد (اختياري) المدرب مع K-Means
+        self.embedding_service = None  # خدمة التضمين المشتركة
+        self.sentence_model = None  # *** كائن لنموذج التضمين (نفس النسخة المشتركة في الخدمة) ***
+        self.inference_plan = None  # خطة NumPy مترجمة من CT + K-Means (مسار سريع لـ predict)
+        self.online_updater = None  # تحديثات mini-batch للمراكز من المشاكل الجديدة (enable_online_updates)
+        self.online_state_dir = None
+        self.bundle_dir = bundle_dir
         self.embedding_model_name = embedding_model_name
 
         self.numerical_features = []
@@ -45,21 +73,18 @@ class ProblemClusteringModel:
 
 
         try:
-            print(f"محاولة تحميل نموذج K-Means من: {kmeans_model_path}")
-            self.kmeans_model = joblib.load(kmeans_model_path)
-            print("تم تحميل نموذج K-Means بنجاح.")
-
-            print(f"محاولة تحميل ColumnTransformer (num/cat) من: {ct_preprocessor_path}")
-            self.column_transformer = joblib.load(ct_preprocessor_path)
-            print("تم تحميل ColumnTransformer (num/cat) بنجاح.")
-            self._extract_feature_names_from_ct()
-
-            if SentenceTransformer:
-                print(f"محاولة تحميل نموذج تضمين الجمل: {self.embedding_model_name}")
-                self.sentence_model = SentenceTransformer(self.embedding_model_name)
-                print("تم تحميل نموذج تضمين الجمل بنجاح.")
-            else:
-                print("خطأ: مكتبة SentenceTransformer غير متاحة. لا يمكن تحميل نموذج التضمين.")
+            # الحزمة تُفضّل فقط عندما لا تُمرر مسارات joblib صريحة (غير الافتراضية)
+            prefer_bundle = os.path.abspath(kmeans_model_path) == os.path.abspath(DEFAULT_KMEANS_PATH) and \
+                os.path.abspath(ct_preprocessor_path) == os.path.abspath(DEFAULT_CT_PATH)
+            self._load_predictor(kmeans_model_path, ct_preprocessor_path, bundle_dir, reducer_path, prefer_bundle)
+            if not load_embedding_model:
+                print("تم تحميل مسار التنبؤ لنموذج التجميع (بدون نموذج التضمين).")
+                return
+
+            self.embedding_service = get_embedding_service(self.embedding_model_name)
+            self.sentence_model = self.embedding_service.model
+            if self.sentence_model is None:
+                print("خطأ: نموذج التضمين غير متاح في الخدمة المشتركة.")
                 # قد ترغب في إثارة استثناء هنا إذا كان هذا حرجًا
 
             print("اكتمل تحميل جميع مكونات نموذج التجميع (بما في ذلك نموذج التضمين).")
@@ -69,6 +94,36 @@ class ProblemClusteringModel:
         except Exception as e:
             print(f"خطأ عام أثناء تحميل مكونات النموذج: {e}")
 
+    def _load_predictor(self, kmeans_model_path: str, ct_preprocessor_path: str, bundle_dir: str,
+                        reducer_path: str, prefer_bundle: bool = True):
+        """
+        يحمّل مسار التنبؤ: الحزمة (mmap) إذا فُضّلت ووُجدت وطابقت بصمتها ملفات joblib الحالية،
+        وإلا ملفات joblib نفسها (ثم تُترجم إلى خطة NumPy).
+        """
+        if prefer_bundle and CompiledClusteringPlan.bundle_exists(bundle_dir):
+            stale_reason = CompiledClusteringPlan.stale_bundle_reason(bundle_dir, kmeans_model_path,
+                                                                      ct_preprocessor_path, reducer_path)
+            if stale_reason is None:
+                self._load_bundle(bundle_dir)
+                return
+            print(f"تحذير: لن تُستخدم حزمة نموذج التجميع في '{bundle_dir}': {stale_reason}. "
+                  f"سيتم التحميل من ملفات joblib (أعد التصدير: python src/models/inference_plan.py).")
+        print(f"محاولة تحميل نموذج K-Means من: {kmeans_model_path}")
+        self.kmeans_model = joblib.load(kmeans_model_path)
+        print("تم تحميل نموذج K-Means بنجاح.")
+
+        print(f"محاولة تحميل ColumnTransformer (num/cat) من: {ct_preprocessor_path}")
+        self.column_transformer = joblib.load(ct_preprocessor_path)
+        print("تم تحميل ColumnTransformer (num/cat) بنجاح.")
+        self._extract_feature_names_from_ct()
+        if reducer_path and os.path.exists(reducer_path):
+            self.reducer = joblib.load(reducer_path)
+            print(f"تم تحميل مقلل الأبعاد ({type(self.reducer).__name__}) من: {reducer_path}")
+        self._compile_inference_plan()
+        if self.inference_plan is not None:
+            self.inference_plan.source_fingerprints = source_fingerprints(kmeans_model_path, ct_preprocessor_path,
+                                                                          reducer_path)
+
     def _extract_feature_names_from_ct(self):
         if self.column_transformer:
             try:
@@ -84,6 +139,117 @@ class ProblemClusteringModel:
             except Exception as e:
                 print(f"خطأ أثناء استخلاص أسماء الميزات من ColumnTransformer: {e}")
 
+    def _load_bundle(self, bundle_dir: str):
+        print(f"محاولة تحميل حزمة نموذج التجميع (بدون pickle) من: {bundle_dir}")
+        self.inference_plan = CompiledClusteringPlan.load(bundle_dir, mmap=True)
+        self.numerical_features = self.inference_plan.numerical_features
+        self.categorical_features = self.inference_plan.categorical_features
+        if self.inference_plan.embedding_model_name and \
+                self.inference_plan.embedding_model_name != self.embedding_model_name:
+            print(f"تحذير: الحزمة مدربة بتضمينات '{self.inference_plan.embedding_model_name}' "
+                  f"وليس '{self.embedding_model_name}'.")
+        print(f"تم تحميل حزمة نموذج التجميع بنجاح ({self.inference_plan.n_clusters} عنقود).")
+
+    def export_bundle(self, bundle_dir: str = DEFAULT_CLUSTERING_BUNDLE_DIR) -> str:
+        """يصدّر النموذج المحمل إلى حزمة manifest.json + .npy (بدون pickle)."""
+        if self.inference_plan is None:
+            raise RuntimeError("لا توجد خطة استدلال مترجمة لتصديرها.")
+        self.inference_plan.embedding_model_name = self.embedding_model_name
+        return self.inference_plan.save(bundle_dir)
+
+    @property
+    def is_loaded(self) -> bool:
+        """True إذا توفر نموذج التضمين ومسار تنبؤ (حزمة مترجمة أو K-Means + ColumnTransformer)."""
+        has_predictor = self.inference_plan is not None or \
+            (self.kmeans_model is not None and self.column_transformer is not None)
+        return has_predictor and self.sentence_model is not None
+
+    def _compile_inference_plan(self):
+        try:
+            self.inference_plan = CompiledClusteringPlan.compile(self.column_transformer, self.kmeans_model,
+                                                                 embedding_model_name=self.embedding_model_name,
+                                                                 reducer=self.reducer)
+            print("تم تجميع خطة الاستدلال (NumPy) لـ ColumnTransformer + K-Means.")
+        except Exception as e:
+            print(f"تحذير: تعذر تجميع خطة الاستدلال السريعة، سيُستخدم مسار sklearn: {e}")
+            self.inference_plan = None
+
+    def predict_arrays(self, numerical: np.ndarray, categorical, embeddings: np.ndarray) -> np.ndarray:
+        """
+        مسار سريع دون pandas/sklearn: يتنبأ بالعناقيد مباشرة من مصفوفات الميزات الخام.
+        numerical بترتيب self.numerical_features و categorical بترتيب self.categorical_features.
+        """
+        if self.inference_plan is None:
+            raise RuntimeError("خطة الاستدلال المترجمة غير متاحة لهذا النموذج.")
+        return self.inference_plan.predict_arrays(numerical, categorical, embeddings)
+
+    def enable_online_updates(self, initial_counts=None, state_dir: Optional[str] = DEFAULT_ONLINE_STATE_DIR,
+                              **updater_kwargs) -> OnlineClusteringUpdater:
+        """
+        يفعّل تحديث المراكز تدريجيًا من المشاكل المصنفة حديثًا (update_online) مع مراقبة الانحراف.
+        initial_counts: عدد المشاكل التاريخية لكل عنقود (مثلًا value_counts لعمود cluster_kmeans).
+        state_dir: مجلد حالة التحديث؛ إذا احتوى حالة محفوظة لنفس النموذج (save_online_updates) تُستأنف منها.
+        """
+        if self.inference_plan is None:
+            raise RuntimeError("التحديث المباشر يتطلب خطة الاستدلال المترجمة.")
+        if self.online_updater is None:
+            if self.kmeans_model is not None and 'reference_inertia' not in updater_kwargs \
+                    and getattr(self.kmeans_model, 'inertia_', None) is not None \
+                    and initial_counts is not None and np.sum(initial_counts) > 0:
+                # inertia_ في sklearn مجموع على كل بيانات التدريب؛ المراقبة تستخدم المتوسط لكل مشكلة
+                updater_kwargs['reference_inertia'] = float(self.kmeans_model.inertia_) / float(np.sum(initial_counts))
+            self.online_updater = OnlineClusteringUpdater(self.inference_plan, initial_counts=initial_counts,
+                                                          **updater_kwargs)
+            self.online_state_dir = state_dir
+            if state_dir and self.online_updater.load_state(state_dir):
+                print(f"تم استئناف حالة التحديث المباشر من '{state_dir}' "
+                      f"({self.online_updater.n_samples_seen} مشكلة سابقة).")
+        return self.online_updater
+
+    def update_online_from_features(self, features: np.ndarray) -> dict:
+        """مثل update_online لكن من مصفوفة ميزات كاملة جاهزة (inference_plan.build_features)."""
+        report = (self.online_updater or self.enable_online_updates()).partial_fit(features)
+        if self.kmeans_model is not None:
+            self.kmeans_model.cluster_centers_ = np.array(self.inference_plan.centroids)
+        return report
+
+    def save_online_updates(self, bundle_dir: Optional[str] = None, state_dir: Optional[str] = None) -> dict:
+        """
+        يحفظ المراكز المحدثة في حزمة النموذج (التي تحملها الخدمة والعمليات الأخرى عند بدئها) وحالة التحديث
+        في state_dir، فلا تضيع التحديثات عند إعادة التشغيل. بصمة ملفات joblib المصدر تبقى كما هي في الحزمة،
+        فتُفضّل الحزمة المحدثة على ملفات joblib إلى أن يعاد التدريب.
+
+        عند needs_retrain=True في التقرير المعاد: شغّل python src/models/train_clustering.py؛ إعادة التدريب
+        تكتب ملفات joblib جديدة (وحزمة جديدة) فتتغير البصمة، وتُهمل الحزمة المحدثة القديمة وحالة التحديث.
+        """
+        if self.online_updater is None:
+            raise RuntimeError("التحديث المباشر غير مفعل (enable_online_updates).")
+        bundle_dir = bundle_dir or self.bundle_dir
+        state_dir = state_dir or self.online_state_dir or DEFAULT_ONLINE_STATE_DIR
+        self.export_bundle(bundle_dir)
+        self.online_updater.save_state(state_dir)
+        report = self.online_updater.drift_report()
+        print(f"تم حفظ المراكز المحدثة ({report['n_samples_seen']} مشكلة) في '{bundle_dir}' وحالة التحديث في "
+              f"'{state_dir}'.")
+        return report
+
+    def update_online(self, new_problems_df: pd.DataFrame, embeddings: np.ndarray = None) -> dict:
+        """
+        يحدّث مراكز العناقيد من دفعة مشاكل مصنفة حديثًا (أرقام العناقيد تبقى كما هي).
+        يعيد تقرير الانحراف؛ needs_retrain=True يعني أن التدريب الكامل أصبح ضروريًا.
+        """
+        updater = self.online_updater or self.enable_online_updates()
+        if embeddings is None or len(embeddings) != len(new_problems_df):
+            embeddings = self.embedding_service.encode(new_problems_df[self.text_feature_col].astype(str).tolist())
+        report = updater.update_from_arrays(
+            new_problems_df[self.inference_plan.numerical_features].to_numpy(dtype=np.float64),
+            new_problems_df[self.inference_plan.categorical_features].to_numpy(dtype=object),
+            np.asarray(embeddings))
+        if self.kmeans_model is not None:
+            # إبقاء مسار sklearn الاحتياطي متسقًا مع المراكز المحدثة
+            self.kmeans_model.cluster_centers_ = np.array(self.inference_plan.centroids)
+        return report
+
     def _preprocess_single_problem_data(self, problem_data_df: pd.DataFrame) -> pd.DataFrame:
         df = problem_data_df.copy()
         for col in self.numerical_features:
@@ -100,8 +266,17 @@ class ProblemClusteringModel:
         # لا نحتاج لملء text_feature_col هنا لأن SentenceTransformer سيتعامل مع النصوص الفارغة
         return df
 
-    def predict(self, new_problems_df: pd.DataFrame) -> np.ndarray:
-        if not all([self.kmeans_model, self.column_transformer, self.sentence_model]):
+    @traced('clustering.predict')
+    def predict(self, new_problems_df: pd.DataFrame, embeddings: np.ndarray = None) -> np.ndarray:
+        """
+        يتنبأ بعناقيد K-Means لمشاكل جديدة.
+
+        Args:
+            new_problems_df (pd.DataFrame): بيانات المشاكل (الميزات الرقمية/الفئوية + العمود النصي النظيف).
+            embeddings (np.ndarray, optional): تضمينات محسوبة مسبقًا لنصوص text_feature_col بنفس ترتيب الصفوف.
+                إذا تم تمريرها لا يُستدعى نموذج التضمين مرة أخرى.
+        """
+        if not self.is_loaded:
             print("خطأ: النموذج أو أحد مكونات المعالجة/التضمين غير محمل. لا يمكن التنبؤ.")
             return np.array([])
         if not isinstance(new_problems_df, pd.DataFrame) or new_problems_df.empty:
@@ -119,19 +294,46 @@ class ProblemClusteringModel:
             print(f"خطأ: العمود النصي '{self.text_feature_col}' مفقود.")
             return np.array([])
 
+        if self.inference_plan is not None:
+            if embeddings is not None and len(embeddings) == len(new_problems_df):
+                text_embeddings_new = np.asarray(embeddings)
+            else:
+                text_embeddings_new = self.embedding_service.encode(
+                    new_problems_df[self.text_feature_col].astype(str).tolist())
+            try:
+                numerical_values = new_problems_df[self.inference_plan.numerical_features].to_numpy(
+                    dtype=np.float64)
+                categorical_values = new_problems_df[self.inference_plan.categorical_features].to_numpy(
+                    dtype=object)
+                with span('clustering.compiled_plan'):
+                    cluster_predictions = self.inference_plan.predict_arrays(numerical_values, categorical_values,
+                                                                             text_embeddings_new)
+                print(f"تم التنبؤ بـ {len(cluster_predictions)} عنقود(عناقيد) عبر خطة الاستدلال المترجمة.")
+                return cluster_predictions
+            except (ValueError, TypeError) as e:
+                if self.kmeans_model is None or self.column_transformer is None:
+                    print(f"خطأ أثناء التنبؤ عبر حزمة نموذج التجميع: {e}")
+                    return np.array([])
+                print(f"تحذير: فشل مسار الاستدلال السريع ({e})، سيُستخدم مسار sklearn.")
+                embeddings = text_embeddings_new
+
         df_preprocessed_light = self._preprocess_single_problem_data(new_problems_df)
 
         try:
-            num_cat_features_transformed = self.column_transformer.transform(df_preprocessed_light)
+            with span('clustering.column_transformer'):
+                num_cat_features_transformed = self.column_transformer.transform(df_preprocessed_light)
             print(f"تم تطبيق ColumnTransformer (num/cat). أبعاد الميزات: {num_cat_features_transformed.shape}")
         except Exception as e:
             print(f"خطأ أثناء تطبيق ColumnTransformer: {e}")
             return np.array([])
 
-        print(f"إنشاء تضمينات للنصوص الجديدة باستخدام: {self.embedding_model_name}...")
-        texts_to_embed_new = df_preprocessed_light[self.text_feature_col].astype(str).tolist()
-        text_embeddings_new = self.sentence_model.encode(texts_to_embed_new,
-                                                         show_progress_bar=False)  # لا حاجة لشريط تقدم لمشكلة واحدة عادة
+        if embeddings is not None and len(embeddings) == len(df_preprocessed_light):
+            print("استخدام تضمينات محسوبة مسبقًا (لن يتم استدعاء نموذج التضمين).")
+            text_embeddings_new = np.asarray(embeddings)
+        else:
+            print(f"إنشاء تضمينات للنصوص الجديدة باستخدام: {self.embedding_model_name}...")
+            texts_to_embed_new = df_preprocessed_light[self.text_feature_col].astype(str).tolist()
+            text_embeddings_new = self.embedding_service.encode(texts_to_embed_new)
         print(f"تم إنشاء تضمينات النصوص. أبعاد مصفوفة التضمينات: {text_embeddings_new.shape}")
 
         # دمج الميزات: نفترض أن num_cat_features_transformed مصفوفة numpy كثيفة
@@ -150,6 +352,12 @@ class ProblemClusteringModel:
             print(f"  أبعاد text_embed: {text_embeddings_new.shape}")
             return np.array([])
 
+        if self.reducer is not None:
+            with span('clustering.reducer'):
+                final_features_for_prediction = self.reducer.transform(final_features_for_prediction).astype(
+                    np.float32)
+            print(f"تم تقليل الأبعاد ({type(self.reducer).__name__}): {final_features_for_prediction.shape}")
+
         if hasattr(self.kmeans_model, 'n_features_in_') and \
                 final_features_for_prediction.shape[1] != self.kmeans_model.n_features_in_:
             print(f"خطأ: عدد الميزات في البيانات الجديدة ({final_features_for_prediction.shape[1]}) "
@@ -157,7 +365,8 @@ class ProblemClusteringModel:
             return np.array([])
 
         print("التنبؤ بتسميات العناقيد...")
-        cluster_predictions = self.kmeans_model.predict(final_features_for_prediction)
+        with span('clustering.kmeans'):
+            cluster_predictions = self.kmeans_model.predict(final_features_for_prediction)
         print(f"تم التنبؤ بـ {len(cluster_predictions)} عنقود(عناقيد).")
         return cluster_predictions
 
@@ -168,7 +377,7 @@ if __name__ == '__main__':
 
     clustering_model_embed = ProblemClusteringModel()
 
-    if clustering_model_embed.kmeans_model and clustering_model_embed.column_transformer and clustering_model_embed.sentence_model:
+    if clustering_model_embed.is_loaded:
         print("\n--- إعداد بيانات اختبار مشابهة لما لدينا ---")
 
         if clustering_model_embed.numerical_features and clustering_model_embed.categorical_features:
@@ -0,0 +1,209 @@
+# src/models/embedding_batcher.py
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+
+# عدد القياسات الأخيرة المحفوظة لحساب نسب زمن الانتظار (p50/p99)
+_METRICS_WINDOW = 1000
+
+
+class AsyncEmbeddingBatcher:
+    """
+    طابور تجميع ديناميكي (micro-batching) أمام نموذج التضمين.
+
+    الطلبات المتزامنة (مثل عدة مستخدمين للوحة التحكم في نفس اللحظة) تُجمع لمدة أقصاها
+    max_wait_ms أو حتى الوصول إلى max_batch_size نص، ثم تُضمّن في استدعاء encode واحد،
+    وتُعاد لكل مستدعٍ الصفوف الخاصة به عبر future.
+
+    يمكن استخدامه من كود async مباشرة (await encode) أو من كود متزامن/خيوط متعددة
+    بعد start_in_thread() عبر encode_threadsafe().
+    """
+
+    def __init__(self, encode_fn: Callable[[list[str]], np.ndarray],
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        Args:
+            encode_fn: دالة متزامنة تحول قائمة نصوص إلى مصفوفة تضمينات بنفس الترتيب.
+            max_batch_size (int): الحد الأقصى لعدد النصوص في الدفعة الواحدة.
+            max_wait_ms (float): أقصى زمن انتظار (بالمللي ثانية) لتجميع طلبات إضافية بعد أول طلب.
+        """
+        self._encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        # خيط واحد للتضمين حتى لا تتنافس الدفعات على المعالج
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embedding-batcher')
+
+        self._metrics_lock = threading.Lock()
+        self._batches_total = 0
+        self._texts_total = 0
+        self._requests_total = 0
+        self._max_queue_depth = 0
+        self._batch_size_histogram = Counter()
+        self._queue_wait_ms = deque(maxlen=_METRICS_WINDOW)
+        self._encode_ms = deque(maxlen=_METRICS_WINDOW)
+
+    # --- دورة الحياة ---
+    async def start(self):
+        """يبدأ عامل التجميع على حلقة الأحداث الحالية."""
+        if self._worker is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """يوقف عامل التجميع ويُفشل أي طلبات معلقة."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        queued = []
+        while not self._queue.empty():
+            queued.append(self._queue.get_nowait())
+        self._fail_stopped_requests(queued)
+
+    @staticmethod
+    def _fail_stopped_requests(items: list):
+        for _, future, _ in items:
+            if not future.done():
+                future.set_exception(RuntimeError("تم إيقاف طابور التضمين قبل معالجة الطلب."))
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def start_in_thread(self):
+        """يشغل حلقة أحداث خاصة بالطابور في خيط خلفي (للاستخدام من كود متزامن)."""
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def _run_loop():
+                asyncio.set_event_loop(loop)
+                loop.run_until_complete(self.start())
+                started.set()
+                loop.run_forever()
+
+            thread = threading.Thread(target=_run_loop, name='embedding-batcher-loop', daemon=True)
+            thread.start()
+            started.wait()
+            self._thread = thread
+
+    def shutdown(self):
+        """يوقف الحلقة الخلفية التي بدأها start_in_thread."""
+        if self._thread is None or self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._executor.shutdown(wait=False)
+
+    # --- الواجهة العامة ---
+    async def encode(self, texts: list[str]) -> np.ndarray:
+        """يضيف النصوص إلى الطابور وينتظر تضميناتها (بنفس الترتيب)."""
+        if self._worker is None:
+            await self.start()
+        future = self._loop.create_future()
+        await self._queue.put((list(texts), future, time.perf_counter()))
+        with self._metrics_lock:
+            self._requests_total += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return await future
+
+    def encode_threadsafe(self, texts: list[str], timeout: Optional[float] = None) -> np.ndarray:
+        """نسخة متزامنة من encode يمكن استدعاؤها من أي خيط بعد start_in_thread()."""
+        if self._thread is None:
+            self.start_in_thread()
+        return asyncio.run_coroutine_threadsafe(self.encode(texts), self._loop).result(timeout)
+
+    def metrics(self) -> dict:
+        """مقاييس لضبط نافذة التجميع: عمق الطابور، أحجام الدفعات، وأزمنة الانتظار والتضمين."""
+        with self._metrics_lock:
+            waits = np.array(self._queue_wait_ms) if self._queue_wait_ms else np.array([0.0])
+            encodes = np.array(self._encode_ms) if self._encode_ms else np.array([0.0])
+            return {
+                'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+                'max_queue_depth': self._max_queue_depth,
+                'requests_total': self._requests_total,
+                'batches_total': self._batches_total,
+                'texts_total': self._texts_total,
+                'avg_batch_size': self._texts_total / self._batches_total if self._batches_total else 0.0,
+                'batch_size_histogram': dict(sorted(self._batch_size_histogram.items())),
+                'queue_wait_ms_p50': float(np.percentile(waits, 50)),
+                'queue_wait_ms_p99': float(np.percentile(waits, 99)),
+                'encode_ms_p50': float(np.percentile(encodes, 50)),
+                'encode_ms_p99': float(np.percentile(encodes, 99)),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+            }
+
+    # --- العامل ---
+    async def _collect_batch(self, pending: list):
+        """يملأ pending (قائمة المستدعي) بطلبات الدفعة، فيبقى ما أُخذ من الطابور معروفًا عند الإلغاء."""
+        pending.append(await self._queue.get())
+        n_texts = len(pending[0][0])
+        deadline = self._loop.time() + self.max_wait_ms / 1000.0
+        while n_texts < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            n_texts += len(item[0])
+
+    async def _run(self):
+        while True:
+            pending = []
+            try:
+                await self._collect_batch(pending)
+                batch_start = time.perf_counter()
+                texts = [text for item_texts, _, _ in pending for text in item_texts]
+                embeddings = await self._loop.run_in_executor(self._executor, self._encode_fn, texts)
+            except asyncio.CancelledError:
+                # stop() لا يرى إلا ما بقي في الطابور؛ طلبات الدفعة الجارية تُفشل هنا وإلا انتظر مستدعوها للأبد
+                self._fail_stopped_requests(pending)
+                raise
+            except Exception as e:
+                for _, future, _ in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            encode_ms = (time.perf_counter() - batch_start) * 1000
+
+            offset = 0
+            for item_texts, future, _ in pending:
+                if not future.done():
+                    future.set_result(embeddings[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+            with self._metrics_lock:
+                self._batches_total += 1
+                self._texts_total += len(texts)
+                self._batch_size_histogram[len(texts)] += 1
+                self._encode_ms.append(encode_ms)
+                for _, _, enqueued_at in pending:
+                    self._queue_wait_ms.append((batch_start - enqueued_at) * 1000)
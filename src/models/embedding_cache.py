@@ -0,0 +1,211 @@
+# src/models/embedding_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+try:
+    import fcntl  # قفل الملفات بين العمليات (Linux/Unix)
+except ImportError:
+    fcntl = None
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_EMBEDDING_CACHE_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'cache', 'embeddings')
+
+VECTORS_FILENAME = 'vectors.f32'  # ملف متجهات float32 متتالية (append-only)
+INDEX_FILENAME = 'index.tsv'  # سطر لكل متجه: <hash>\t<رقم الصف>
+META_FILENAME = 'meta.json'
+LOCK_FILENAME = '.lock'
+
+
+def embedding_cache_key(text: str, model_name: str) -> str:
+    """مفتاح التخزين المؤقت: بصمة sha1 لاسم النموذج مع النص."""
+    return hashlib.sha1(f"{model_name}\x00{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    ذاكرة تخزين مؤقت للتضمينات على مستويين:
+      1. LRU محدود الحجم في الذاكرة.
+      2. مخزن على القرص: ملف متجهات float32 يُضاف إليه فقط ويُقرأ عبر np.memmap،
+         مع فهرس (مفتاح -> رقم الصف) يُحمّل عند البدء، فتبقى النتائج بعد إعادة التشغيل.
+
+    الإضافة إلى القرص تتم تحت قفل fcntl.flock على المجلد، ورقم أول صف جديد يُحسب من حجم ملف المتجهات
+    الفعلي أثناء القفل، فلا تتداخل صفوف عدة عمليات تكتب في نفس المجلد (على الأنظمة بلا fcntl يبقى الأمان
+    بين الخيوط فقط). كل عملية ترى ما كتبته العمليات الأخرى بعد إعادة التحميل فقط. العمليات التي لا يلزمها
+    الحفظ (مثل عمال خادم pre-fork) تضبط disk_writes_enabled = False فتقرأ من القرص وتخزن الجديد في الذاكرة فقط.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = DEFAULT_EMBEDDING_CACHE_DIR,
+                 max_memory_items: int = 10000):
+        self.model_name = model_name
+        safe_model_dir = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.cache_dir = os.path.join(cache_dir, safe_model_dir)
+        self.max_memory_items = max_memory_items
+        self.dim = None
+
+        self._memory = OrderedDict()
+        self._row_index = {}
+        self._vectors = None  # np.memmap للقراءة، يُعاد فتحه عند نمو الملف
+        self._n_rows_on_disk = 0
+        self._lock = threading.Lock()
+        self.disk_writes_enabled = True
+        self.hits = 0
+        self.misses = 0
+
+        self._vectors_path = os.path.join(self.cache_dir, VECTORS_FILENAME)
+        self._index_path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        self._meta_path = os.path.join(self.cache_dir, META_FILENAME)
+        self._lock_path = os.path.join(self.cache_dir, LOCK_FILENAME)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_disk_index()
+        except OSError as e:
+            print(f"تحذير: تعذر تهيئة مخزن التضمينات على القرص '{self.cache_dir}': {e}")
+
+    # --- القرص ---
+    def _load_disk_index(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('model_name') != self.model_name:
+            # اسمان مختلفان قد ينتهيان إلى نفس المجلد؛ الكتابة هنا ستفسد مخزن النموذج الآخر
+            print(f"تحذير: مخزن التضمينات في '{self.cache_dir}' يخص نموذجًا آخر. سيتم تجاهله "
+                  f"وتعطيل الكتابة إليه.")
+            self.disk_writes_enabled = False
+            return
+        self.dim = int(meta['dim'])
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        n_complete_rows = 0
+        if os.path.exists(self._vectors_path):
+            # صف ناقص في النهاية (كتابة متقطعة) يُتجاهل هنا، وتحذفه الإضافة التالية تحت القفل
+            n_complete_rows = os.path.getsize(self._vectors_path) // row_bytes
+        if os.path.exists(self._index_path):
+            key_by_row = {}
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) != 2 or not parts[1].isdigit():
+                        continue  # سطر ناقص من كتابة متقطعة
+                    row = int(parts[1])
+                    if row < n_complete_rows:  # الفهرس يُكتب بعد المتجه، لذا نتجاهل ما لا يقابله متجه كامل
+                        # صف أُعيد استخدامه بعد حذف صف ناقص: آخر سطر في الفهرس هو صاحبه
+                        self._row_index.pop(key_by_row.get(row), None)
+                        key_by_row[row] = parts[0]
+                        self._row_index[parts[0]] = row
+        self._n_rows_on_disk = n_complete_rows
+        print(f"تم تحميل فهرس مخزن التضمينات: {len(self._row_index)} متجه من '{self.cache_dir}'.")
+
+    def _disk_vectors(self) -> Optional[np.ndarray]:
+        if self._n_rows_on_disk == 0 or self.dim is None:
+            return None
+        if self._vectors is None or self._vectors.shape[0] < self._n_rows_on_disk:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                      shape=(self._n_rows_on_disk, self.dim))
+        return self._vectors
+
+    def _ensure_meta(self, dim: int) -> bool:
+        """
+        (تحت قفل المجلد) ينشئ meta.json لمخزن جديد، أو يتحقق من أن ما كتبته عملية أخرى يخص نفس النموذج
+        والأبعاد. يعيد False ويعطل الكتابة إلى القرص إذا لم يتطابقا.
+        """
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('model_name') != self.model_name or int(meta['dim']) != dim:
+                print(f"تحذير: مخزن التضمينات في '{self.cache_dir}' يخص نموذجًا آخر أو أبعادًا أخرى "
+                      f"({meta.get('model_name')}, {meta.get('dim')}). تم تعطيل الكتابة إليه.")
+                self.disk_writes_enabled = False
+                return False
+        else:
+            # ملفات متجهات/فهرس بلا meta.json بقايا مخزن غير مكتمل: نبدأ مخزنًا جديدًا
+            for path in (self._vectors_path, self._index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            with open(self._meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'model_name': self.model_name, 'dim': dim, 'dtype': 'float32'}, f)
+        self.dim = dim
+        return True
+
+    def _append_to_disk(self, keys: list[str], vectors: np.ndarray):
+        with open(self._lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)  # يُحرر عند إغلاق الملف
+            if not self._ensure_meta(int(vectors.shape[1])):
+                return
+            # رقم أول صف من حجم الملف الفعلي (قد تكون عمليات أخرى أضافت صفوفًا)، مع حذف أي صف ناقص
+            row_bytes = self.dim * np.dtype(np.float32).itemsize
+            file_size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            first_row = file_size // row_bytes
+            with open(self._vectors_path, 'ab') as f:
+                if file_size != first_row * row_bytes:
+                    f.truncate(first_row * row_bytes)
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self._index_path, 'a', encoding='utf-8') as f:
+                f.writelines(f"{key}\t{first_row + i}\n" for i, key in enumerate(keys))
+        for i, key in enumerate(keys):
+            self._row_index[key] = first_row + i
+        self._n_rows_on_disk = first_row + len(keys)
+
+    # --- الذاكرة ---
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # --- الواجهة العامة ---
+    def get_many(self, texts: list[str]) -> list[Optional[np.ndarray]]:
+        """يعيد لكل نص متجهه المخزن (float32) أو None إذا لم يكن في التخزين المؤقت."""
+        results = []
+        with self._lock:
+            for text in texts:
+                key = embedding_cache_key(text, self.model_name)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                else:
+                    row = self._row_index.get(key)
+                    disk_vectors = self._disk_vectors() if row is not None else None
+                    if disk_vectors is not None:
+                        vector = np.array(disk_vectors[row])
+                        self._remember(key, vector)
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, texts: list[str], vectors: np.ndarray):
+        """يخزن متجهات نصوص جديدة في الذاكرة وعلى القرص (النصوص المخزنة مسبقًا تُتجاهل)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(texts) != len(vectors):
+            return
+        with self._lock:
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                print(f"تحذير: أبعاد التضمين ({vectors.shape[1]}) لا تطابق أبعاد المخزن ({self.dim}). لن يتم التخزين.")
+                return
+            new_keys, new_rows, seen_keys = [], [], set()
+            for text, vector in zip(texts, vectors):
+                key = embedding_cache_key(text, self.model_name)
+                self._remember(key, vector)
+                if key not in self._row_index and key not in seen_keys:
+                    seen_keys.add(key)
+                    new_keys.append(key)
+                    new_rows.append(vector)
+            if new_keys and self.disk_writes_enabled:
+                try:
+                    self._append_to_disk(new_keys, np.vstack(new_rows))
+                except OSError as e:
+                    print(f"تحذير: تعذرت الكتابة إلى مخزن التضمينات على القرص: {e}")
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses,
+                'memory_items': len(self._memory), 'disk_items': len(self._row_index)}
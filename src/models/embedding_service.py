@@ -0,0 +1,223 @@
+# src/models/embedding_service.py
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+try:
+    from config.model_config import MODEL_CONFIG
+    from src.models.embedding_cache import EmbeddingCache, DEFAULT_EMBEDDING_CACHE_DIR
+    from src.utils.tracing import span, traced
+except ImportError:
+    import sys
+
+    project_root_embedding = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_embedding not in sys.path:
+        sys.path.insert(0, project_root_embedding)
+    from config.model_config import MODEL_CONFIG
+    from src.models.embedding_cache import EmbeddingCache, DEFAULT_EMBEDDING_CACHE_DIR
+    from src.utils.tracing import span, traced
+
+EMBEDDING_CONFIG = MODEL_CONFIG.get('embedding', {})
+# نفس نموذج التضمين المستخدم في تدريب K-Means و BERTopic (02_model_training.ipynb)
+DEFAULT_EMBEDDING_MODEL_NAME = EMBEDDING_CONFIG.get('model_name', 'paraphrase-multilingual-MiniLM-L12-v2')
+DEFAULT_EMBEDDING_BACKEND = EMBEDDING_CONFIG.get('backend', 'torch')
+EMBEDDING_BACKENDS = ('torch', 'onnx')
+
+
+class EmbeddingService:
+    """
+    خدمة تضمين مشتركة على مستوى العملية (process-wide).
+    نسخة واحدة فقط من أوزان نموذج التضمين في الذاكرة، يستخدمها كل من
+    ProblemClusteringModel و ProblemTopicModel بدلًا من تحميل نسخة لكل منهما.
+
+    الواجهة الخلفية (backend) تُختار من MODEL_CONFIG['embedding']:
+      - 'torch': SentenceTransformer (PyTorch).
+      - 'onnx': OnnxSentenceEncoder (ONNX Runtime، مع تكميم int8 اختياري) دون استيراد torch.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL_NAME,
+                 cache_dir: Optional[str] = DEFAULT_EMBEDDING_CACHE_DIR,
+                 backend: str = DEFAULT_EMBEDDING_BACKEND):
+        """
+        Args:
+            model_name (str): اسم أو مسار نموذج SentenceTransformer.
+            cache_dir (str, optional): مجلد ذاكرة التضمينات المؤقتة على القرص. None لتعطيل التخزين المؤقت.
+            backend (str): 'torch' أو 'onnx'.
+        """
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"واجهة التضمين '{backend}' غير مدعومة. الخيارات: {EMBEDDING_BACKENDS}")
+        self.model_name = model_name
+        self.backend = backend
+        self.model = None
+        # مفتاح التخزين المؤقت يتضمن الواجهة الخلفية لأن تضمينات int8 تختلف قليلًا عن PyTorch
+        cache_namespace = model_name if backend == 'torch' else f"{model_name}@{backend}"
+        self.cache = EmbeddingCache(cache_namespace, cache_dir=cache_dir) if cache_dir else None
+        self.batcher = None
+        if backend == 'onnx':
+            self._load_onnx_model()
+        else:
+            self._load_torch_model()
+        micro_batching = EMBEDDING_CONFIG.get('micro_batching', {})
+        if micro_batching.get('enabled') and self.is_available:
+            self.enable_micro_batching(micro_batching.get('max_batch_size', 32),
+                                       micro_batching.get('max_wait_ms', 5))
+
+    def _load_torch_model(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            print("تحذير: مكتبة SentenceTransformer غير مثبتة. pip install sentence-transformers")
+            return
+        try:
+            print(f"محاولة تحميل نموذج تضمين الجمل (خدمة مشتركة): {self.model_name}")
+            self.model = SentenceTransformer(self.model_name)
+            print("تم تحميل نموذج تضمين الجمل بنجاح.")
+        except Exception as e:
+            print(f"خطأ أثناء تحميل نموذج تضمين الجمل '{self.model_name}': {e}")
+            self.model = None
+
+    def _load_onnx_model(self):
+        try:
+            from src.models.onnx_encoder import OnnxSentenceEncoder, DEFAULT_ONNX_ENCODER_DIR
+        except ImportError as e:
+            print(f"تحذير: تعذر استيراد واجهة ONNX (pip install onnxruntime tokenizers): {e}")
+            return
+        onnx_model_dir = EMBEDDING_CONFIG.get('onnx_model_dir') or DEFAULT_ONNX_ENCODER_DIR
+        try:
+            encoder = OnnxSentenceEncoder(onnx_model_dir,
+                                          use_quantized=EMBEDDING_CONFIG.get('onnx_use_quantized', True))
+            if encoder.model_name != self.model_name:
+                print(f"تحذير: نموذج ONNX في '{onnx_model_dir}' مُصدّر من '{encoder.model_name}' "
+                      f"وليس من '{self.model_name}'. لن يتم استخدامه.")
+                return
+            self.model = encoder
+            print("تم تحميل نموذج تضمين الجمل (ONNX Runtime) بنجاح.")
+        except Exception as e:
+            print(f"خطأ أثناء تحميل نموذج التضمين عبر ONNX Runtime: {e}")
+            self.model = None
+
+    @property
+    def is_available(self) -> bool:
+        return self.model is not None
+
+    @property
+    def sentence_transformer(self):
+        """كائن SentenceTransformer المشترك إذا كانت الواجهة الخلفية 'torch'، وإلا None."""
+        return self.model if self.backend == 'torch' else None
+
+    def enable_micro_batching(self, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        يوجه النصوص غير الموجودة في التخزين المؤقت عبر AsyncEmbeddingBatcher، فتُجمع طلبات
+        الخيوط المتزامنة (جلسات لوحة التحكم) في استدعاء encode واحد للنموذج.
+        """
+        if self.batcher is not None:
+            return self.batcher
+        from src.models.embedding_batcher import AsyncEmbeddingBatcher
+        self.batcher = AsyncEmbeddingBatcher(lambda texts: self._encode_with_model(texts, max_batch_size),
+                                             max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.batcher.start_in_thread()
+        print(f"تم تفعيل تجميع طلبات التضمين: حتى {max_batch_size} نص أو {max_wait_ms} مللي ثانية.")
+        return self.batcher
+
+    def disable_micro_batching(self):
+        if self.batcher is not None:
+            self.batcher.shutdown()
+            self.batcher = None
+
+    def batching_metrics(self) -> dict:
+        """مقاييس طابور التجميع (عمق الطابور وأحجام الدفعات)، أو قاموس فارغ إذا كان التجميع معطلًا."""
+        return self.batcher.metrics() if self.batcher is not None else {}
+
+    def warm_up(self) -> Optional[np.ndarray]:
+        """
+        استدعاء تجريبي للنموذج مباشرة (دون ذاكرة التضمينات المؤقتة) لتهيئة النواة الكسولة
+        في torch/ONNX Runtime قبل أول طلب حقيقي. يعيد التضمينات الناتجة أو None عند الفشل.
+        """
+        if not self.is_available:
+            return None
+        try:
+            return self._encode_with_model(["نص تجريبي لتهيئة النموذج", "warm-up sentence"], batch_size=2)
+        except Exception as e:
+            print(f"تحذير: فشل الاستدلال التجريبي لنموذج التضمين: {e}")
+            return None
+
+    @traced('embedding.encode')
+    def encode(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+        """
+        يحول قائمة نصوص إلى مصفوفة تضمينات (float32) بنفس ترتيب المدخلات.
+        النصوص المكررة داخل نفس الاستدعاء تُمرر للنموذج مرة واحدة فقط،
+        والنصوص الموجودة في ذاكرة التضمينات المؤقتة لا تُمرر للنموذج إطلاقًا.
+
+        Args:
+            texts (list[str]): النصوص المراد تضمينها.
+            batch_size (int): حجم الدفعة الممررة إلى encode الخاص بالنموذج.
+
+        Returns:
+            np.ndarray: مصفوفة بأبعاد (len(texts), embedding_dim)، أو مصفوفة فارغة عند الفشل.
+        """
+        if not self.is_available:
+            print("خطأ: نموذج التضمين غير محمل. لا يمكن إنشاء التضمينات.")
+            return np.array([])
+        if not texts:
+            return np.array([])
+
+        texts = [str(text) for text in texts]
+        unique_positions = {}
+        inverse = np.empty(len(texts), dtype=np.intp)
+        for i, text in enumerate(texts):
+            inverse[i] = unique_positions.setdefault(text, len(unique_positions))
+        unique_texts = list(unique_positions)
+
+        cached_vectors = self.cache.get_many(unique_texts) if self.cache else [None] * len(unique_texts)
+        missing_positions = [i for i, vector in enumerate(cached_vectors) if vector is None]
+        if missing_positions:
+            missing_texts = [unique_texts[i] for i in missing_positions]
+            with span('embedding.model'):
+                if self.batcher is not None:
+                    new_embeddings = self.batcher.encode_threadsafe(missing_texts)
+                else:
+                    new_embeddings = self._encode_with_model(missing_texts, batch_size)
+            for position, vector in zip(missing_positions, new_embeddings):
+                cached_vectors[position] = vector
+            if self.cache:
+                self.cache.put_many(missing_texts, new_embeddings)
+        return np.vstack(cached_vectors)[inverse]
+
+    def _encode_with_model(self, texts: list[str], batch_size: int) -> np.ndarray:
+        embeddings = self.model.encode(texts, batch_size=batch_size,
+                                       show_progress_bar=False, convert_to_numpy=True)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        return embeddings
+
+
+_SERVICES: dict[tuple[str, str], EmbeddingService] = {}
+_SERVICES_LOCK = threading.Lock()
+
+
+def loaded_embedding_services() -> list[EmbeddingService]:
+    """خدمات التضمين المنشأة في هذه العملية (لتجهيزها قبل fork مثلًا)."""
+    with _SERVICES_LOCK:
+        return list(_SERVICES.values())
+
+
+def get_embedding_service(model_name: str = DEFAULT_EMBEDDING_MODEL_NAME,
+                          cache_dir: Optional[str] = DEFAULT_EMBEDDING_CACHE_DIR,
+                          backend: str = DEFAULT_EMBEDDING_BACKEND) -> EmbeddingService:
+    """
+    يعيد خدمة التضمين المشتركة لاسم النموذج والواجهة الخلفية المحددين (ينشئها عند أول طلب فقط).
+    cache_dir يؤخذ بعين الاعتبار عند الإنشاء الأول فقط.
+    """
+    service_key = (model_name, backend)
+    service = _SERVICES.get(service_key)
+    if service is not None:
+        return service
+    with _SERVICES_LOCK:
+        service = _SERVICES.get(service_key)
+        if service is None:
+            service = EmbeddingService(model_name, cache_dir=cache_dir, backend=backend)
+            _SERVICES[service_key] = service
+    return service
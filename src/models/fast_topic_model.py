@@ -0,0 +1,300 @@
+# src/models/fast_topic_model.py
+"""
+تشغيل خفيف لتحديد الموضوعات دون BERTopic/UMAP/HDBSCAN.
+
+خطوة التصدير (مرة واحدة بعد التدريب، تحتاج BERTopic):
+    python src/models/fast_topic_model.py --bertopic-path data/models/bertopic_model.pkl
+
+تحفظ في data/models/fast_topic_model/:
+    manifest.json (الإعدادات، فهرس الموضوعات، عتبة الضوضاء، نسبة التطابق مع النموذج الكامل)،
+    topic_ids.npy، topic_embeddings.npy، c_tf_idf.npz (مصفوفة متفرقة)، vocabulary.npy.
+
+وقت التشغيل: FastTopicModel يعين لكل نص الموضوع الأقرب بتشابه جيب التمام (cosine) بين تضمين النص
+وتضمينات الموضوعات، بعملية ضرب مصفوفات NumPy واحدة.
+"""
+import argparse
+import json
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.models.embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL_NAME
+    from src.utils.tracing import span, traced
+except ImportError:
+    import sys
+
+    project_root_fast_topic = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_fast_topic not in sys.path:
+        sys.path.insert(0, project_root_fast_topic)
+    from src.models.embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL_NAME
+    from src.utils.tracing import span, traced
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_FAST_TOPIC_MODEL_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models', 'fast_topic_model')
+
+EXPORT_FORMAT = 'fast-topic-model'
+EXPORT_FORMAT_VERSION = 1
+MANIFEST_FILENAME = 'manifest.json'
+NOISE_TOPIC_ID = -1
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _nearest_topics(embeddings: np.ndarray, topic_embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """يعيد (فهرس أقرب صف في topic_embeddings، تشابه جيب التمام معه) لكل تضمين."""
+    similarities = _normalize_rows(embeddings) @ topic_embeddings.T
+    nearest = np.argmax(similarities, axis=1)
+    return nearest, similarities[np.arange(len(nearest)), nearest]
+
+
+def calibrate_outlier_threshold(embeddings: np.ndarray, reference_topics: np.ndarray, topic_ids: np.ndarray,
+                                topic_embeddings: np.ndarray) -> tuple[Optional[float], float]:
+    """
+    يختار عتبة التشابه التي تحتها يُعين النص كضوضاء (-1) بحيث تعظم نسبة التطابق مع الموضوعات المرجعية
+    (موضوعات النموذج الكامل). يعيد (العتبة أو None إذا كان الأفضل عدم التعيين كضوضاء، نسبة التطابق).
+    """
+    nearest, similarities = _nearest_topics(embeddings, topic_embeddings)
+    nearest_ids = topic_ids[nearest]
+    reference_topics = np.asarray(reference_topics)
+    best_threshold, best_agreement = None, float(np.mean(nearest_ids == reference_topics))
+    if not np.any(reference_topics == NOISE_TOPIC_ID):
+        return best_threshold, best_agreement
+    for threshold in np.unique(np.quantile(similarities, np.linspace(0.01, 0.6, 60))):
+        predicted = np.where(similarities < threshold, NOISE_TOPIC_ID, nearest_ids)
+        agreement = float(np.mean(predicted == reference_topics))
+        if agreement > best_agreement:
+            best_threshold, best_agreement = float(threshold), agreement
+    return best_threshold, best_agreement
+
+
+class FastTopicModel:
+    """
+    بديل خفيف لـ ProblemTopicModel بنفس الواجهة (get_topics_for_texts، get_keywords_for_topic،
+    topic_catalogue) يعمل من ملفات التصدير فقط، دون استيراد bertopic أو umap أو hdbscan.
+    """
+
+    def __init__(self, export_dir: str = DEFAULT_FAST_TOPIC_MODEL_DIR,
+                 embedding_model_name: str = DEFAULT_EMBEDDING_MODEL_NAME):
+        self.export_dir = export_dir
+        self.embedding_model_name = embedding_model_name
+        self.embedding_service = None
+        self.topic_ids = None
+        self.topic_embeddings = None
+        self.outlier_threshold = None
+        self.agreement = None  # نسبة التطابق مع النموذج الكامل المقاسة عند التصدير
+        self.topic_catalogue: dict[int, dict] = {}
+        self._c_tf_idf = None
+        try:
+            self._load(export_dir)
+        except FileNotFoundError as e:
+            print(f"خطأ: ملفات نموذج الموضوعات الخفيف غير موجودة - {e}")
+        except Exception as e:
+            print(f"خطأ أثناء تحميل نموذج الموضوعات الخفيف: {e}")
+            self.topic_embeddings = None
+
+    @staticmethod
+    def export_exists(export_dir: str = DEFAULT_FAST_TOPIC_MODEL_DIR) -> bool:
+        return bool(export_dir) and os.path.exists(os.path.join(export_dir, MANIFEST_FILENAME))
+
+    def _load(self, export_dir: str):
+        with open(os.path.join(export_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != EXPORT_FORMAT or manifest.get('format_version') != EXPORT_FORMAT_VERSION:
+            raise ValueError(f"صيغة تصدير غير مدعومة: {manifest.get('format')} "
+                             f"(الإصدار {manifest.get('format_version')}).")
+        if manifest.get('embedding_model_name') and manifest['embedding_model_name'] != self.embedding_model_name:
+            print(f"تحذير: تضمينات الموضوعات محسوبة بـ '{manifest['embedding_model_name']}' "
+                  f"وليس بـ '{self.embedding_model_name}'.")
+        topic_ids = np.load(os.path.join(export_dir, 'topic_ids.npy'), allow_pickle=False)
+        topic_embeddings = np.load(os.path.join(export_dir, 'topic_embeddings.npy'), allow_pickle=False)
+        # موضوع الضوضاء ليس له تضمين ذو معنى؛ يُعين فقط عبر عتبة التشابه
+        keep = topic_ids != NOISE_TOPIC_ID
+        self.topic_ids = topic_ids[keep].astype(np.int64)
+        self.topic_embeddings = _normalize_rows(topic_embeddings[keep])
+        self.outlier_threshold = manifest.get('outlier_threshold')
+        self.agreement = manifest.get('agreement')
+        self.topic_catalogue = {int(topic_id): {'name': entry['name'],
+                                                'keywords': [tuple(keyword) for keyword in entry['keywords']],
+                                                'size': entry['size']}
+                                for topic_id, entry in manifest['topics'].items()}
+        agreement_text = f"، التطابق مع BERTopic: {self.agreement['agreement_rate']:.1%}" if self.agreement else ""
+        print(f"تم تحميل نموذج الموضوعات الخفيف ({len(self.topic_ids)} موضوع{agreement_text}).")
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.topic_embeddings is not None
+
+    def assign_embeddings(self, embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """يعين موضوعًا لكل تضمين. يعيد (أرقام الموضوعات، تشابه جيب التمام مع الموضوع الأقرب)."""
+        embeddings = np.asarray(embeddings)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        nearest, similarities = _nearest_topics(embeddings, self.topic_embeddings)
+        topics = self.topic_ids[nearest]
+        if self.outlier_threshold is not None:
+            topics = np.where(similarities < self.outlier_threshold, NOISE_TOPIC_ID, topics)
+        return topics, similarities
+
+    @traced('topic.get_topics_for_texts')
+    def get_topics_for_texts(self, texts: list[str],
+                             embeddings: np.ndarray = None) -> tuple[list[int], np.ndarray]:
+        """نفس واجهة ProblemTopicModel.get_topics_for_texts؛ الاحتمالات هي تشابه جيب التمام مع الموضوع المعين."""
+        if not self.is_loaded:
+            print("خطأ: نموذج الموضوعات الخفيف غير محمل. لا يمكن تحديد الموضوعات.")
+            return [], np.array([])
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            print("خطأ: الإدخال يجب أن يكون قائمة من السلاسل النصية.")
+            return [], np.array([])
+        if not texts:
+            return [], np.array([])
+        if embeddings is None or len(embeddings) != len(texts):
+            if self.embedding_service is None:
+                # خدمة التضمين المشتركة تُطلب فقط عند الحاجة (عادة تُمرر التضمينات من ProblemAnalyzer)
+                self.embedding_service = get_embedding_service(self.embedding_model_name)
+            if not self.embedding_service.is_available:
+                print("خطأ: نموذج التضمين غير متاح لنموذج الموضوعات الخفيف.")
+                return [], np.array([])
+            embeddings = self.embedding_service.encode(texts)
+        with span('topic.fast_assign'):
+            topics, similarities = self.assign_embeddings(embeddings)
+        return topics.tolist(), similarities
+
+    def get_topic_entry(self, topic_id: int):
+        return self.topic_catalogue.get(int(topic_id))
+
+    def get_keywords_for_topic(self, topic_id: int) -> list[tuple[str, float]]:
+        entry = self.get_topic_entry(topic_id)
+        return entry['keywords'] if entry is not None else []
+
+    def get_topic_info_df(self) -> pd.DataFrame:
+        return pd.DataFrame([{'Topic': topic_id, 'Count': entry['size'], 'Name': entry['name']}
+                             for topic_id, entry in sorted(self.topic_catalogue.items())])
+
+    @property
+    def c_tf_idf(self):
+        """مصفوفة c-TF-IDF (موضوعات × مفردات، متفرقة) تُحمّل عند أول استخدام، أو None إذا لم تُصدّر."""
+        if self._c_tf_idf is None:
+            c_tf_idf_path = os.path.join(self.export_dir, 'c_tf_idf.npz')
+            if os.path.exists(c_tf_idf_path):
+                from scipy import sparse
+                self._c_tf_idf = sparse.load_npz(c_tf_idf_path)
+        return self._c_tf_idf
+
+    def agreement_with(self, reference_topics, embeddings: np.ndarray) -> dict:
+        """يقيس نسبة تطابق الموضوعات المعينة مع موضوعات مرجعية (مثل BERTopic.transform لنفس النصوص)."""
+        reference_topics = np.asarray(reference_topics)
+        topics, _ = self.assign_embeddings(embeddings)
+        non_noise = reference_topics != NOISE_TOPIC_ID
+        return {'n_documents': int(len(reference_topics)),
+                'agreement_rate': float(np.mean(topics == reference_topics)),
+                'agreement_rate_non_noise': float(np.mean(topics[non_noise] == reference_topics[non_noise]))
+                if non_noise.any() else None}
+
+
+def export_fast_topic_model(bertopic_path: str, output_dir: str = DEFAULT_FAST_TOPIC_MODEL_DIR,
+                            reference_data_path: Optional[str] = None, text_column: str = 'processed_text',
+                            topic_column: str = 'bertopic_topic',
+                            embedding_model_name: str = DEFAULT_EMBEDDING_MODEL_NAME) -> dict:
+    """
+    يصدّر نموذج BERTopic المدرب إلى ملفات FastTopicModel. إذا توفر reference_data_path (ملف يحوي
+    النص النظيف وموضوع BERTopic لكل مشكلة)، تُعاير عتبة الضوضاء وتُقاس نسبة التطابق عليه.
+    يحتاج BERTopic (يُستورد هنا فقط).
+
+    Returns:
+        dict: manifest المحفوظ.
+    """
+    from scipy import sparse
+    from src.models.topic_modeling import ProblemTopicModel
+
+    topic_model = ProblemTopicModel(model_path=bertopic_path, embedding_model_name=embedding_model_name)
+    if topic_model.model is None:
+        raise RuntimeError(f"تعذر تحميل نموذج BERTopic من '{bertopic_path}'.")
+    model = topic_model.model
+    service = get_embedding_service(embedding_model_name)
+
+    reference_topics, reference_embeddings = None, None
+    if reference_data_path:
+        reference_df = pd.read_csv(reference_data_path, usecols=[text_column, topic_column]).dropna()
+        reference_topics = reference_df[topic_column].astype(int).to_numpy()
+        reference_embeddings = service.encode(reference_df[text_column].astype(str).tolist())
+
+    topic_ids = np.array(sorted(topic_model.topic_catalogue), dtype=np.int64)
+    topic_embeddings = getattr(model, 'topic_embeddings_', None)
+    if topic_embeddings is not None and len(topic_embeddings) == len(topic_ids):
+        topic_embeddings = np.asarray(topic_embeddings, dtype=np.float32)
+    elif reference_topics is not None:
+        # إصدارات BERTopic بدون topic_embeddings_: مركز تضمينات مستندات كل موضوع
+        print("تحذير: النموذج لا يحوي topic_embeddings_، سيتم استخدام مراكز تضمينات المستندات.")
+        topic_embeddings = np.vstack([
+            _normalize_rows(reference_embeddings[reference_topics == topic_id]).mean(axis=0)
+            if np.any(reference_topics == topic_id) else np.zeros(reference_embeddings.shape[1], np.float32)
+            for topic_id in topic_ids])
+    else:
+        raise ValueError("النموذج لا يحوي topic_embeddings_؛ مرر reference_data_path لحساب مراكز الموضوعات.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, 'topic_ids.npy'), topic_ids, allow_pickle=False)
+    np.save(os.path.join(output_dir, 'topic_embeddings.npy'), topic_embeddings, allow_pickle=False)
+    c_tf_idf = getattr(model, 'c_tf_idf_', None)
+    if c_tf_idf is not None:
+        sparse.save_npz(os.path.join(output_dir, 'c_tf_idf.npz'), sparse.csr_matrix(c_tf_idf))
+    vectorizer = getattr(model, 'vectorizer_model', None)
+    if vectorizer is not None and hasattr(vectorizer, 'get_feature_names_out'):
+        np.save(os.path.join(output_dir, 'vocabulary.npy'),
+                np.asarray(vectorizer.get_feature_names_out(), dtype=str), allow_pickle=False)
+
+    manifest = {
+        'format': EXPORT_FORMAT,
+        'format_version': EXPORT_FORMAT_VERSION,
+        'embedding_model_name': embedding_model_name,
+        'source_model': os.path.basename(bertopic_path),
+        'outlier_threshold': None,
+        'agreement': None,
+        'topics': {str(topic_id): {'name': entry['name'], 'keywords': [list(keyword) for keyword in entry['keywords']],
+                                   'size': entry['size']}
+                   for topic_id, entry in topic_model.topic_catalogue.items()},
+    }
+    if reference_topics is not None:
+        keep = topic_ids != NOISE_TOPIC_ID
+        threshold, _ = calibrate_outlier_threshold(reference_embeddings, reference_topics, topic_ids[keep],
+                                                   _normalize_rows(topic_embeddings[keep]))
+        manifest['outlier_threshold'] = threshold
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    if reference_topics is not None:
+        fast_model = FastTopicModel(output_dir, embedding_model_name=embedding_model_name)
+        manifest['agreement'] = fast_model.agreement_with(reference_topics, reference_embeddings)
+        # التطابق مع BERTopic.transform الفعلي لعينة (الموضوعات في الملف ناتجة عن fit وقد تختلف قليلًا)
+        sample_size = min(2000, len(reference_topics))
+        sample_texts = reference_df[text_column].astype(str).tolist()[:sample_size]
+        transform_topics, _ = topic_model.get_topics_for_texts(sample_texts,
+                                                               embeddings=reference_embeddings[:sample_size])
+        if len(transform_topics) == sample_size:
+            manifest['agreement']['transform_agreement_rate'] = fast_model.agreement_with(
+                transform_topics, reference_embeddings[:sample_size])['agreement_rate']
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        print(f"نسبة التطابق مع BERTopic: {manifest['agreement']}")
+    print(f"تم تصدير نموذج الموضوعات الخفيف إلى: {output_dir}")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="تصدير نموذج BERTopic إلى نموذج موضوعات خفيف (NumPy فقط).")
+    parser.add_argument('--bertopic-path', default=os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models',
+                                                                'bertopic_model.pkl'))
+    parser.add_argument('--output-dir', default=DEFAULT_FAST_TOPIC_MODEL_DIR)
+    parser.add_argument('--reference-data', default=os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'processed',
+                                                                 'final_results_with_models.csv'),
+                        help="ملف النص النظيف وموضوع BERTopic لمعايرة عتبة الضوضاء وقياس التطابق")
+    args = parser.parse_args()
+    export_fast_topic_model(args.bertopic_path, args.output_dir,
+                            args.reference_data if os.path.exists(args.reference_data) else None)
@@ -0,0 +1,480 @@
+# src/models/inference_plan.py
+import argparse
+import json
+import os
+import uuid
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_CLUSTERING_BUNDLE_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models', 'clustering_bundle')
+
+# حزمة النموذج: manifest.json + مصفوفات .npy (بدون pickle) تُحمّل عبر np.load(mmap_mode='r')
+BUNDLE_FORMAT = 'problem-clustering-bundle'
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILENAME = 'manifest.json'
+
+# القيمة التي يستبدل بها ProblemClusteringModel القيم الفئوية المفقودة قبل OneHotEncoder
+MISSING_CATEGORY = 'Unknown'
+
+
+def source_fingerprints(kmeans_path: Optional[str], ct_path: Optional[str],
+                        reducer_path: Optional[str] = None) -> dict:
+    """بصمة (الحجم، وقت التعديل) لملفات joblib التي صُدّرت منها الحزمة؛ None للملف غير الموجود."""
+    fingerprints = {}
+    for role, path in (('kmeans', kmeans_path), ('column_transformer', ct_path), ('reducer', reducer_path)):
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        fingerprints[role] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns} if stat is not None else None
+    return fingerprints
+
+
+def _final_estimator(transformer):
+    """يعيد آخر خطوة في Pipeline (مثل 'scaler' أو 'onehot') أو المحول نفسه."""
+    steps = getattr(transformer, 'steps', None)
+    if steps is None:
+        return transformer
+    if len(steps) != 1:
+        raise ValueError(f"Pipeline بعدة خطوات غير مدعوم في الخطة المترجمة: {[name for name, _ in steps]}")
+    return steps[0][1]
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+class _ScalerBlock:
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean = mean
+        self.scale = scale
+        self.n_outputs = len(mean)
+
+    @classmethod
+    def from_scaler(cls, scaler, n_features: int) -> '_ScalerBlock':
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        return cls(np.zeros(n_features) if mean is None or not scaler.with_mean else np.asarray(mean, np.float64),
+                   np.ones(n_features) if scale is None or not scaler.with_std else np.asarray(scale, np.float64))
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        values = np.where(np.isnan(values), 0.0, values)  # نفس ملء NaN بـ 0 في مسار sklearn
+        return (values - self.mean) / self.scale
+
+
+class _OneHotBlock:
+    def __init__(self, vocabularies: list[np.ndarray]):
+        """
+        vocabularies: لكل ميزة فئوية مصفوفة الفئات التي لها عمود ناتج (بدون الفئة المحذوفة)،
+        بترتيب أعمدة OneHotEncoder. الأعمدة الناتجة متتالية عبر الميزات.
+        """
+        self.vocabularies = vocabularies
+        # جدول بحث لكل ميزة: قيمة الفئة -> رقم العمود الناتج (الفئة المحذوفة والفئات المجهولة بلا عمود)
+        self.lookup_tables = []
+        offset = 0
+        for vocabulary in vocabularies:
+            self.lookup_tables.append({category: offset + i for i, category in enumerate(vocabulary.tolist())})
+            offset += len(vocabulary)
+        self.n_outputs = offset
+
+    @classmethod
+    def from_encoder(cls, encoder) -> '_OneHotBlock':
+        if getattr(encoder, 'handle_unknown', 'error') not in ('ignore', 'infrequent_if_exist'):
+            raise ValueError("الخطة المترجمة تتطلب OneHotEncoder(handle_unknown='ignore').")
+        infrequent = getattr(encoder, 'infrequent_categories_', None)
+        if infrequent is not None and any(categories is not None for categories in infrequent):
+            raise ValueError("الفئات النادرة (infrequent categories) غير مدعومة في الخطة المترجمة.")
+        drop_idx = getattr(encoder, 'drop_idx_', None)
+        vocabularies = []
+        for feature_idx, categories in enumerate(encoder.categories_):
+            dropped = None if drop_idx is None or drop_idx[feature_idx] is None else int(drop_idx[feature_idx])
+            kept = [category for category_idx, category in enumerate(categories.tolist()) if category_idx != dropped]
+            vocabularies.append(_vocabulary_array(kept))
+        return cls(vocabularies)
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        n_rows = len(values)
+        output = np.zeros((n_rows, self.n_outputs), dtype=np.float64)
+        for feature_idx, table in enumerate(self.lookup_tables):
+            for row in range(n_rows):
+                value = values[row][feature_idx]
+                column = table.get(MISSING_CATEGORY if _is_missing(value) else value)
+                if column is not None:
+                    output[row, column] = 1.0
+        return output
+
+
+class _ProjectionBlock:
+    """تقليل الأبعاد الخطي (PCA أو إسقاط عشوائي): (x - mean) @ components.T بدقة float32."""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, method: str):
+        self.mean = mean
+        self.components = components
+        self.method = method
+        self.n_inputs = components.shape[1]
+        self.n_outputs = components.shape[0]
+
+    @classmethod
+    def from_reducer(cls, reducer) -> '_ProjectionBlock':
+        reducer_type = type(reducer).__name__
+        components = reducer.components_
+        if hasattr(components, 'toarray'):  # SparseRandomProjection
+            components = components.toarray()
+        components = np.asarray(components, dtype=np.float64)
+        if reducer_type == 'PCA':
+            mean = np.asarray(reducer.mean_, dtype=np.float64)
+            if getattr(reducer, 'whiten', False):
+                components = components / np.sqrt(reducer.explained_variance_)[:, None]
+            method = 'pca'
+        elif reducer_type in ('GaussianRandomProjection', 'SparseRandomProjection'):
+            mean = np.zeros(components.shape[1])
+            method = 'random_projection'
+        else:
+            raise ValueError(f"مقلل الأبعاد ({reducer_type}) غير مدعوم في الخطة المترجمة.")
+        return cls(mean.astype(np.float32), components.astype(np.float32), method)
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        return (np.asarray(features, dtype=np.float32) - self.mean) @ self.components.T
+
+
+def _vocabulary_array(categories: list) -> np.ndarray:
+    """مصفوفة فئات قابلة للحفظ بـ np.save دون pickle (نصوص أو أرقام فقط)."""
+    if all(isinstance(category, str) for category in categories):
+        return np.array(categories, dtype=str)
+    if all(isinstance(category, (int, float, np.number)) and not isinstance(category, bool)
+           for category in categories):
+        return np.array(categories)
+    raise ValueError("فئات OneHotEncoder المختلطة (نصوص وأرقام) غير مدعومة في الخطة المترجمة.")
+
+
+class CompiledClusteringPlan:
+    """
+    خطة استدلال مترجمة إلى مصفوفات NumPy لمسار ColumnTransformer (num: StandardScaler، cat: OneHotEncoder)
+    + K-Means، تعطي نفس عناقيد مسار sklearn دون كلفة pandas/sklearn لكل طلب.
+
+    - الميزات الرقمية: (x - mean) / scale مع ملء NaN بـ 0.
+    - الميزات الفئوية: جداول بحث (فئة -> عمود)، والقيم المفقودة تُعامل كـ 'Unknown'.
+    - تقليل الأبعاد (اختياري): إسقاط خطي إلى 32–128 بُعدًا بدقة float32 قبل K-Means. في predict_arrays
+      يُدمج الإسقاط في المراكز (W = C·P) فلا تُحسب الميزات المُسقطة لكل طلب.
+    - K-Means: argmin(||c||² - 2 x·c) مع ||c||² محسوبة مسبقًا.
+    """
+
+    def __init__(self, numerical_features: list[str], categorical_features: list[str],
+                 scaler_block: Optional[_ScalerBlock], onehot_block: Optional[_OneHotBlock],
+                 block_order: list[str], centroids: np.ndarray, centroid_sq_norms: Optional[np.ndarray] = None,
+                 embedding_model_name: Optional[str] = None, projection_block: Optional[_ProjectionBlock] = None,
+                 source_fingerprints: Optional[dict] = None):
+        self.numerical_features = list(numerical_features)
+        self.categorical_features = list(categorical_features)
+        self._scaler_block = scaler_block
+        self._onehot_block = onehot_block
+        self._projection_block = projection_block
+        self._block_order = block_order
+        centroids = centroids if isinstance(centroids, np.ndarray) else np.asarray(centroids)
+        self.embedding_model_name = embedding_model_name
+        # بصمة ملفات joblib المصدر (source_fingerprints)؛ تُحفظ في manifest.json لاكتشاف الحزمة القديمة
+        self.source_fingerprints = source_fingerprints
+        # المراكز ومربعات أطوالها (والمراكز المدمجة مع الإسقاط) تُستبدل معًا كحالة واحدة (set_centroids)
+        # حتى لا يقرأ التنبؤ خليطًا منها
+        self._centroid_state = self._make_centroid_state(
+            centroids, centroid_sq_norms if centroid_sq_norms is not None else
+            np.einsum('ij,ij->i', centroids, centroids))
+        self.n_tabular_features = sum(block.n_outputs for block in (scaler_block, onehot_block) if block)
+
+    def _make_centroid_state(self, centroids: np.ndarray, centroid_sq_norms: np.ndarray) -> tuple:
+        if self._projection_block is None:
+            return centroids, centroid_sq_norms, None
+        # ||c||² - 2((x - m)Pᵀ)·c = (||c||² + 2 m·(cP)) - 2 x·(cP)
+        folded_centroids = np.asarray(centroids, dtype=np.float32) @ self._projection_block.components
+        folded_bias = np.asarray(centroid_sq_norms, dtype=np.float32) + \
+            2.0 * (folded_centroids @ self._projection_block.mean)
+        return centroids, centroid_sq_norms, (folded_centroids, folded_bias)
+
+    @property
+    def centroids(self) -> np.ndarray:
+        return self._centroid_state[0]
+
+    @property
+    def centroid_sq_norms(self) -> np.ndarray:
+        return self._centroid_state[1]
+
+    def set_centroids(self, centroids: np.ndarray):
+        """يستبدل مراكز العناقيد (مثل التحديث المباشر online) مع الحفاظ على ترتيبها وأرقامها."""
+        centroids = np.array(centroids, dtype=self.centroids.dtype)
+        if centroids.shape != self.centroids.shape:
+            raise ValueError(f"أبعاد المراكز الجديدة {centroids.shape} لا تطابق {self.centroids.shape}.")
+        self._centroid_state = self._make_centroid_state(centroids, np.einsum('ij,ij->i', centroids, centroids))
+
+    @property
+    def n_clusters(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def n_input_features(self) -> int:
+        """عدد أعمدة مخرجات ColumnTransformer + التضمينات (قبل تقليل الأبعاد إن وُجد)."""
+        return self._projection_block.n_inputs if self._projection_block else self.centroids.shape[1]
+
+    @property
+    def embedding_dim(self) -> int:
+        return self.n_input_features - self.n_tabular_features
+
+    @property
+    def reduction_method(self) -> Optional[str]:
+        return self._projection_block.method if self._projection_block else None
+
+    @classmethod
+    def compile(cls, column_transformer, kmeans_model, embedding_model_name: Optional[str] = None,
+                reducer=None) -> 'CompiledClusteringPlan':
+        """
+        يستخلص معاملات المحولات المدربة ومراكز K-Means إلى مصفوفات NumPy.
+        reducer: مقلل الأبعاد (PCA / GaussianRandomProjection) المدرب بين الميزات و K-Means، إن وُجد.
+        يثير ValueError إذا احتوى ColumnTransformer على محولات غير مدعومة.
+        """
+        numerical_features, categorical_features = [], []
+        scaler_block, onehot_block = None, None
+        block_order = []
+        for name, transformer, columns in column_transformer.transformers_:
+            if transformer == 'drop' or (isinstance(columns, (list, tuple)) and len(columns) == 0):
+                continue
+            estimator = _final_estimator(transformer)
+            estimator_type = type(estimator).__name__
+            if estimator_type == 'StandardScaler' and scaler_block is None:
+                numerical_features = list(columns)
+                scaler_block = _ScalerBlock.from_scaler(estimator, len(numerical_features))
+                block_order.append('num')
+            elif estimator_type == 'OneHotEncoder' and onehot_block is None:
+                categorical_features = list(columns)
+                onehot_block = _OneHotBlock.from_encoder(estimator)
+                block_order.append('cat')
+            else:
+                raise ValueError(f"المحول '{name}' ({estimator_type}) غير مدعوم في الخطة المترجمة.")
+        projection_block = _ProjectionBlock.from_reducer(reducer) if reducer is not None else None
+        centroids = kmeans_model.cluster_centers_
+        if projection_block is not None:
+            centroids = np.asarray(centroids, dtype=np.float32)
+        return cls(numerical_features, categorical_features, scaler_block, onehot_block, block_order,
+                   centroids, embedding_model_name=embedding_model_name, projection_block=projection_block)
+
+    # --- حزمة النموذج (بدون pickle) ---
+    def save(self, bundle_dir: str = DEFAULT_CLUSTERING_BUNDLE_DIR) -> str:
+        """
+        يحفظ الخطة كمجلد مُصدَّر: manifest.json يصف الميزات والإصدار، ومصفوفات .npy
+        (المراكز ومربعات أطوالها، معاملات StandardScaler، مفردات الفئات لكل ميزة، ومصفوفة الإسقاط إن وُجدت).
+
+        كل حفظ يكتب مصفوفاته بأسماء نسخة جديدة (<الاسم>.<النسخة>.npy) لا يقرؤها أحد بعد، ثم ينشرها باستبدال
+        manifest.json ذريًا (os.replace)؛ فالقارئ يرى النسخة السابقة كاملة أو الجديدة كاملة ولا يخلط بينهما
+        (مثل حفظ المراكز المحدثة أثناء عمل الخدمة أو إعادة التدريب). بعد النشر تُحذف ملفات النسخ السابقة.
+        """
+        os.makedirs(bundle_dir, exist_ok=True)
+        version = uuid.uuid4().hex[:12]
+        arrays = {'centroids': self.centroids, 'centroid_sq_norms': self.centroid_sq_norms}
+        if self._scaler_block is not None:
+            arrays['scaler_mean'] = self._scaler_block.mean
+            arrays['scaler_scale'] = self._scaler_block.scale
+        if self._onehot_block is not None:
+            for feature_idx, vocabulary in enumerate(self._onehot_block.vocabularies):
+                arrays[f'categories_{feature_idx}'] = vocabulary
+        if self._projection_block is not None:
+            arrays['projection_mean'] = self._projection_block.mean
+            arrays['projection_components'] = self._projection_block.components
+        array_files = {}
+        for array_name, array in arrays.items():
+            array_files[array_name] = f'{array_name}.{version}.npy'
+            np.save(os.path.join(bundle_dir, array_files[array_name]), np.ascontiguousarray(array),
+                    allow_pickle=False)
+        manifest = {
+            'format': BUNDLE_FORMAT,
+            'format_version': BUNDLE_FORMAT_VERSION,
+            'version': version,
+            'numerical_features': self.numerical_features,
+            'categorical_features': self.categorical_features,
+            'block_order': self._block_order,
+            'n_clusters': int(self.n_clusters),
+            'n_features': int(self.centroids.shape[1]),
+            'embedding_dim': int(self.embedding_dim),
+            'embedding_model_name': self.embedding_model_name,
+            'reduction': {'method': self._projection_block.method, 'input_dim': int(self._projection_block.n_inputs),
+                          'n_components': int(self._projection_block.n_outputs)}
+            if self._projection_block is not None else None,
+            'missing_category': MISSING_CATEGORY,
+            'source_fingerprints': self.source_fingerprints,
+            'arrays': array_files,
+        }
+        manifest_path = os.path.join(bundle_dir, MANIFEST_FILENAME)
+        with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        self._remove_unpublished_arrays(bundle_dir, set(array_files.values()))
+        print(f"تم حفظ حزمة نموذج التجميع في: {bundle_dir}")
+        return bundle_dir
+
+    @staticmethod
+    def _remove_unpublished_arrays(bundle_dir: str, published_files: set):
+        """
+        يحذف مصفوفات النسخ السابقة (وبقايا حفظ منقطع، ومصفوفات لم تعد في النموذج مثل projection_*.npy).
+        العمليات التي فتحتها عبر mmap تحتفظ بها حتى تغلقها؛ ومن قرأ manifest السابق قبل الحذف يعيد المحاولة في load.
+        """
+        for file_name in os.listdir(bundle_dir):
+            if file_name.endswith(('.npy', '.npy.tmp')) and file_name not in published_files:
+                try:
+                    os.remove(os.path.join(bundle_dir, file_name))
+                except OSError as e:
+                    print(f"تحذير: تعذر حذف ملف نسخة سابقة من حزمة نموذج التجميع '{file_name}': {e}")
+
+    @classmethod
+    def load(cls, bundle_dir: str = DEFAULT_CLUSTERING_BUNDLE_DIR, mmap: bool = True) -> 'CompiledClusteringPlan':
+        """
+        يحمل حزمة محفوظة بـ save(). مع mmap=True تُفتح المصفوفات بـ np.load(mmap_mode='r')،
+        فتتشارك العمليات المتعددة نسخة واحدة في ذاكرة الصفحات (page cache) دون إلغاء تسلسل.
+        """
+        try:
+            return cls._load_published_version(bundle_dir, mmap)
+        except FileNotFoundError:
+            if not cls.bundle_exists(bundle_dir):
+                raise
+            # نُشرت نسخة جديدة وحُذفت مصفوفات النسخة التي قُرئ manifest الخاص بها؛ تُقرأ النسخة الجديدة
+            return cls._load_published_version(bundle_dir, mmap)
+
+    @classmethod
+    def _load_published_version(cls, bundle_dir: str, mmap: bool) -> 'CompiledClusteringPlan':
+        with open(os.path.join(bundle_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != BUNDLE_FORMAT or manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"صيغة حزمة غير مدعومة: {manifest.get('format')} "
+                             f"(الإصدار {manifest.get('format_version')}).")
+        mmap_mode = 'r' if mmap else None
+
+        def load_array(array_name: str) -> np.ndarray:
+            return np.load(os.path.join(bundle_dir, manifest['arrays'][array_name]), mmap_mode=mmap_mode,
+                           allow_pickle=False)
+
+        scaler_block = _ScalerBlock(load_array('scaler_mean'), load_array('scaler_scale')) \
+            if 'num' in manifest['block_order'] else None
+        # المفردات صغيرة وتُحوّل إلى جداول بحث في الذاكرة، فلا فائدة من mmap لها
+        onehot_block = _OneHotBlock([np.load(os.path.join(bundle_dir, manifest['arrays'][f'categories_{i}']),
+                                             allow_pickle=False)
+                                     for i in range(len(manifest['categorical_features']))]) \
+            if 'cat' in manifest['block_order'] else None
+        reduction = manifest.get('reduction')
+        projection_block = _ProjectionBlock(load_array('projection_mean'), load_array('projection_components'),
+                                            reduction['method']) if reduction else None
+        return cls(manifest['numerical_features'], manifest['categorical_features'], scaler_block, onehot_block,
+                   manifest['block_order'], load_array('centroids'), load_array('centroid_sq_norms'),
+                   embedding_model_name=manifest.get('embedding_model_name'), projection_block=projection_block,
+                   source_fingerprints=manifest.get('source_fingerprints'))
+
+    @staticmethod
+    def bundle_exists(bundle_dir: str) -> bool:
+        return bool(bundle_dir) and os.path.exists(os.path.join(bundle_dir, MANIFEST_FILENAME))
+
+    @staticmethod
+    def stale_bundle_reason(bundle_dir: str, kmeans_path: Optional[str], ct_path: Optional[str],
+                            reducer_path: Optional[str] = None) -> Optional[str]:
+        """
+        سبب عدم صلاحية الحزمة لملفات joblib الحالية، أو None إذا كانت صالحة. الحزمة صالحة إذا طابقت بصمتها
+        المسجلة ملفات K-Means و ColumnTransformer ومقلل الأبعاد الحالية، أو إذا لم تكن ملفات joblib موجودة
+        أصلًا (نشر بالحزمة وحدها). إعادة التدريب دون إعادة التصدير تغير البصمة فتُفضّل ملفات joblib الجديدة.
+        """
+        current = source_fingerprints(kmeans_path, ct_path, reducer_path)
+        if current['kmeans'] is None or current['column_transformer'] is None:
+            return None
+        with open(os.path.join(bundle_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            recorded = json.load(f).get('source_fingerprints')
+        if recorded is None:
+            return "الحزمة لا تسجل بصمة ملفات joblib التي صُدّرت منها"
+        changed = [role for role, fingerprint in current.items() if recorded.get(role) != fingerprint]
+        if changed:
+            return f"ملفات joblib تغيرت بعد تصدير الحزمة ({', '.join(changed)})"
+        return None
+
+    def transform_arrays(self, numerical: np.ndarray, categorical) -> np.ndarray:
+        """يعيد مخرجات ColumnTransformer (بنفس ترتيب الأعمدة) من مصفوفات الميزات الخام."""
+        blocks = []
+        for block_name in self._block_order:
+            if block_name == 'num':
+                blocks.append(self._scaler_block.transform(numerical))
+            else:
+                blocks.append(self._onehot_block.transform(categorical))
+        n_rows = len(numerical) if numerical is not None else len(categorical)
+        return np.concatenate(blocks, axis=1) if blocks else np.empty((n_rows, 0))
+
+    def build_features(self, numerical: np.ndarray, categorical, embeddings: np.ndarray) -> np.ndarray:
+        """
+        يعيد مصفوفة الميزات التي يراها K-Means: مخرجات ColumnTransformer ثم التضمينات،
+        بعد تقليل الأبعاد إن وُجد.
+        """
+        embeddings = np.asarray(embeddings)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        features = np.concatenate([self.transform_arrays(numerical, categorical),
+                                   embeddings.astype(np.float64, copy=False)], axis=1)
+        if features.shape[1] != self.n_input_features:
+            raise ValueError(f"عدد الميزات ({features.shape[1]}) لا يطابق أبعاد مدخلات K-Means "
+                             f"({self.n_input_features}).")
+        if self._projection_block is not None:
+            features = self._projection_block.transform(features)
+        return features.astype(self.centroids.dtype, copy=False)
+
+    def assign(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """يعيد (رقم أقرب مركز، مربع المسافة إليه) لكل صف من مصفوفة ميزات كاملة."""
+        centroids, centroid_sq_norms, _ = self._centroid_state
+        distances = centroid_sq_norms - 2.0 * (features @ centroids.T)
+        labels = np.argmin(distances, axis=1)
+        row_sq_norms = np.einsum('ij,ij->i', features, features)
+        sq_distances = np.maximum(distances[np.arange(len(labels)), labels] + row_sq_norms, 0.0)
+        return labels.astype(np.int32), sq_distances
+
+    def predict_arrays(self, numerical: np.ndarray, categorical, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            numerical (np.ndarray): (n, len(numerical_features)) القيم الرقمية الخام (قبل التحجيم)، NaN مسموح.
+            categorical: (n, len(categorical_features)) القيم الفئوية الخام (مصفوفة object أو قائمة صفوف).
+            embeddings (np.ndarray): (n, embedding_dim) تضمينات النصوص.
+
+        Returns:
+            np.ndarray: رقم العنقود لكل صف.
+        """
+        centroids, centroid_sq_norms, folded = self._centroid_state
+        if folded is None:
+            features = self.build_features(numerical, categorical, embeddings)
+            distances = centroid_sq_norms - 2.0 * (features @ centroids.T)
+            return np.argmin(distances, axis=1).astype(np.int32)
+        embeddings = np.asarray(embeddings)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        features = np.concatenate([self.transform_arrays(numerical, categorical).astype(np.float32),
+                                   embeddings.astype(np.float32, copy=False)], axis=1)
+        if features.shape[1] != self.n_input_features:
+            raise ValueError(f"عدد الميزات ({features.shape[1]}) لا يطابق أبعاد مدخلات K-Means "
+                             f"({self.n_input_features}).")
+        folded_centroids, folded_bias = folded
+        return np.argmin(folded_bias - 2.0 * (features @ folded_centroids.T), axis=1).astype(np.int32)
+
+
+def export_clustering_bundle(kmeans_path: str, ct_path: str, bundle_dir: str = DEFAULT_CLUSTERING_BUNDLE_DIR,
+                             embedding_model_name: Optional[str] = None, reducer_path: Optional[str] = None) -> str:
+    """يحول ملفات joblib (K-Means و ColumnTransformer ومقلل الأبعاد إن وُجد) إلى حزمة manifest.json + .npy."""
+    import joblib
+    kmeans_model = joblib.load(kmeans_path)
+    column_transformer = joblib.load(ct_path)
+    reducer = joblib.load(reducer_path) if reducer_path and os.path.exists(reducer_path) else None
+    plan = CompiledClusteringPlan.compile(column_transformer, kmeans_model, embedding_model_name=embedding_model_name,
+                                          reducer=reducer)
+    plan.source_fingerprints = source_fingerprints(kmeans_path, ct_path, reducer_path)
+    return plan.save(bundle_dir)
+
+
+if __name__ == '__main__':
+    models_dir = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models')
+    parser = argparse.ArgumentParser(description="تصدير نموذج التجميع (K-Means + ColumnTransformer) إلى حزمة بدون pickle.")
+    parser.add_argument('--kmeans-path', default=os.path.join(models_dir, 'kmeans_model.pkl'))
+    parser.add_argument('--ct-path', default=os.path.join(models_dir, 'ct_num_cat_embeddings_preprocessor.pkl'))
+    parser.add_argument('--reducer-path', default=os.path.join(models_dir, 'clustering_reducer.pkl'))
+    parser.add_argument('--output-dir', default=DEFAULT_CLUSTERING_BUNDLE_DIR)
+    parser.add_argument('--embedding-model-name', default='paraphrase-multilingual-MiniLM-L12-v2')
+    args = parser.parse_args()
+    export_clustering_bundle(args.kmeans_path, args.ct_path, args.output_dir, args.embedding_model_name,
+                             args.reducer_path)
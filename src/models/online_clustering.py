@@ -0,0 +1,204 @@
+# src/models/online_clustering.py
+import json
+import os
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+try:
+    from src.models.inference_plan import CompiledClusteringPlan, DEFAULT_PROJECT_ROOT
+except ImportError:
+    import sys
+
+    project_root_online = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_online not in sys.path:
+        sys.path.insert(0, project_root_online)
+    from src.models.inference_plan import CompiledClusteringPlan, DEFAULT_PROJECT_ROOT
+
+# مجلد حالة التحديث المباشر الافتراضي (المراكز المحدثة نفسها تُحفظ في حزمة النموذج clustering_bundle)
+DEFAULT_ONLINE_STATE_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models', 'clustering_online_state')
+STATE_FILENAME = 'online_state.json'
+COUNTS_FILENAME = 'online_counts.npy'
+REFERENCE_CENTROIDS_FILENAME = 'reference_centroids.npy'
+
+# عدد آخر التحديثات المحفوظة في سجل المراقبة
+_HISTORY_SIZE = 100
+
+
+class OnlineClusteringUpdater:
+    """
+    تحديث مباشر (online) لمراكز K-Means من المشاكل المصنفة حديثًا، بأسلوب MiniBatchKMeans.partial_fit:
+    كل مركز يتحرك نحو متوسط النقاط المسندة إليه بمعدل تعلم 1/count، فتبقى أرقام العناقيد ثابتة
+    (لا إعادة تهيئة ولا إعادة ترتيب).
+
+    يراقب انحراف المراكز عن المراكز المرجعية (آخر تدريب كامل) والقصور الذاتي (inertia)
+    للدفعات الجديدة، ويطلب تدريبًا كاملًا فقط عند تجاوز العتبات.
+    """
+
+    def __init__(self, plan: CompiledClusteringPlan, initial_counts: Optional[np.ndarray] = None,
+                 prior_count: float = 100.0, drift_threshold: float = 0.15, inertia_threshold: float = 1.5,
+                 inertia_smoothing: float = 0.2, reference_inertia: Optional[float] = None,
+                 on_retrain_needed: Optional[Callable[[dict], None]] = None):
+        """
+        Args:
+            plan (CompiledClusteringPlan): الخطة التي تُحدّث مراكزها في مكانها (set_centroids).
+            initial_counts (np.ndarray, optional): عدد المشاكل التاريخية لكل عنقود (وزن المراكز الحالية).
+            prior_count (float): الوزن الافتراضي لكل مركز إذا لم تُمرر initial_counts.
+            drift_threshold (float): أقصى انحراف نسبي مسموح لأي مركز (بالنسبة لمتوسط المسافة لأقرب مركز آخر).
+            inertia_threshold (float): أقصى نسبة مسموحة بين inertia الدفعات الحديثة و inertia المرجعية.
+            inertia_smoothing (float): معامل المتوسط المتحرك الأسي (EWMA) لـ inertia الدفعات.
+            reference_inertia (float, optional): متوسط مربع المسافة للمركز في بيانات التدريب. None = أول دفعة.
+            on_retrain_needed: دالة تُستدعى بتقرير الانحراف عند تجاوز العتبات لأول مرة.
+        """
+        self.plan = plan
+        n_clusters = plan.n_clusters
+        self.counts = np.asarray(initial_counts, dtype=np.float64).copy() if initial_counts is not None \
+            else np.full(n_clusters, prior_count, dtype=np.float64)
+        if self.counts.shape != (n_clusters,):
+            raise ValueError(f"initial_counts يجب أن يحتوي {n_clusters} قيمة.")
+        self.drift_threshold = drift_threshold
+        self.inertia_threshold = inertia_threshold
+        self.inertia_smoothing = inertia_smoothing
+        self.reference_inertia = reference_inertia
+        self.on_retrain_needed = on_retrain_needed
+
+        self.inertia_ewma: Optional[float] = None
+        self.n_updates = 0
+        self.n_samples_seen = 0
+        self.retrain_requested = False
+        self.history: list[dict] = []
+        self._lock = threading.Lock()
+        self.reset_reference()
+
+    def reset_reference(self, reference_inertia: Optional[float] = None):
+        """يجعل المراكز الحالية مرجعًا جديدًا للانحراف (بعد تدريب كامل مثلًا)."""
+        self._set_reference_centroids(self.plan.centroids)
+        if reference_inertia is not None:
+            self.reference_inertia = reference_inertia
+        self.inertia_ewma = None
+        self.retrain_requested = False
+
+    def _set_reference_centroids(self, reference_centroids: np.ndarray):
+        """يضبط المراكز المرجعية ومقياس الانحراف المحسوب منها."""
+        self.reference_centroids = np.array(reference_centroids, dtype=np.float64)
+        sq_distances = np.einsum('ij,ij->i', self.reference_centroids, self.reference_centroids)[:, None] + \
+            np.einsum('ij,ij->i', self.reference_centroids, self.reference_centroids)[None, :] - \
+            2.0 * self.reference_centroids @ self.reference_centroids.T
+        np.fill_diagonal(sq_distances, np.inf)
+        nearest = np.sqrt(np.maximum(sq_distances.min(axis=1), 0.0)) if len(sq_distances) > 1 else np.ones(1)
+        # مقياس الانحراف: متوسط المسافة من كل مركز إلى أقرب مركز آخر في المرجع
+        self._drift_scale = float(np.mean(nearest[np.isfinite(nearest)])) or 1.0
+
+    # --- التحديث ---
+    def partial_fit(self, features: np.ndarray) -> dict:
+        """
+        يحدّث المراكز من دفعة مصفوفة ميزات كاملة (مخرجات plan.build_features).
+
+        Returns:
+            dict: تقرير الدفعة والانحراف (انظر drift_report).
+        """
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim != 2 or len(features) == 0:
+            return self.drift_report()
+        with self._lock:
+            labels, sq_distances = self.plan.assign(features)
+            centroids = np.array(self.plan.centroids, dtype=np.float64)
+            batch_counts = np.bincount(labels, minlength=len(centroids)).astype(np.float64)
+            batch_sums = np.zeros_like(centroids)
+            np.add.at(batch_sums, labels, features)
+            updated = batch_counts > 0
+            self.counts[updated] += batch_counts[updated]
+            # c <- c + (sum - n*c) / count  (معدل تعلم 1/count كما في MiniBatchKMeans)
+            centroids[updated] += (batch_sums[updated] - batch_counts[updated, None] * centroids[updated]) / \
+                self.counts[updated, None]
+            self.plan.set_centroids(centroids)
+
+            batch_inertia = float(sq_distances.mean())
+            if self.reference_inertia is None:
+                self.reference_inertia = batch_inertia
+            self.inertia_ewma = batch_inertia if self.inertia_ewma is None else \
+                self.inertia_smoothing * batch_inertia + (1 - self.inertia_smoothing) * self.inertia_ewma
+            self.n_updates += 1
+            self.n_samples_seen += len(features)
+
+            report = self.drift_report()
+            report['batch_size'] = len(features)
+            report['batch_inertia'] = batch_inertia
+            self.history.append({key: report[key] for key in
+                                 ('n_updates', 'batch_size', 'batch_inertia', 'max_relative_drift',
+                                  'inertia_ratio', 'needs_retrain')})
+            del self.history[:-_HISTORY_SIZE]
+            newly_requested = report['needs_retrain'] and not self.retrain_requested
+            self.retrain_requested = self.retrain_requested or report['needs_retrain']
+        if newly_requested:
+            print(f"تحذير: انحراف نموذج التجميع تجاوز العتبة (انحراف نسبي={report['max_relative_drift']:.3f}، "
+                  f"نسبة inertia={report['inertia_ratio']:.2f}). يُنصح بإعادة التدريب الكامل.")
+            if self.on_retrain_needed is not None:
+                self.on_retrain_needed(report)
+        return report
+
+    def update_from_arrays(self, numerical: np.ndarray, categorical, embeddings: np.ndarray) -> dict:
+        """يحدّث المراكز من الميزات الخام لمشاكل مصنفة حديثًا (بنفس مدخلات predict_arrays)."""
+        return self.partial_fit(self.plan.build_features(numerical, categorical, embeddings))
+
+    # --- المراقبة ---
+    def drift_report(self) -> dict:
+        movement = np.linalg.norm(np.asarray(self.plan.centroids, dtype=np.float64) - self.reference_centroids,
+                                  axis=1)
+        relative_drift = movement / self._drift_scale
+        inertia_ratio = self.inertia_ewma / self.reference_inertia \
+            if self.inertia_ewma is not None and self.reference_inertia else 1.0
+        return {
+            'n_updates': self.n_updates,
+            'n_samples_seen': self.n_samples_seen,
+            'per_cluster_relative_drift': relative_drift.round(6).tolist(),
+            'max_relative_drift': float(relative_drift.max()) if len(relative_drift) else 0.0,
+            'inertia_ewma': self.inertia_ewma,
+            'reference_inertia': self.reference_inertia,
+            'inertia_ratio': float(inertia_ratio),
+            'needs_retrain': bool(relative_drift.max() > self.drift_threshold or
+                                  inertia_ratio > self.inertia_threshold) if len(relative_drift) else False,
+        }
+
+    def needs_retrain(self) -> bool:
+        return self.drift_report()['needs_retrain']
+
+    # --- الحفظ ---
+    def save_state(self, state_dir: str):
+        """
+        يحفظ حالة التحديث (الأوزان، المراكز المرجعية، الإحصاءات). المراكز نفسها تُحفظ بـ plan.save().
+        بصمة ملفات النموذج المصدر (plan.source_fingerprints) تُحفظ معها، فلا تُطبق الحالة على نموذج أعيد تدريبه.
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        np.save(os.path.join(state_dir, COUNTS_FILENAME), self.counts, allow_pickle=False)
+        np.save(os.path.join(state_dir, REFERENCE_CENTROIDS_FILENAME), self.reference_centroids, allow_pickle=False)
+        state = {'source_fingerprints': self.plan.source_fingerprints,
+                 'n_updates': self.n_updates, 'n_samples_seen': self.n_samples_seen,
+                 'reference_inertia': self.reference_inertia, 'inertia_ewma': self.inertia_ewma,
+                 'retrain_requested': self.retrain_requested, 'history': self.history}
+        with open(os.path.join(state_dir, STATE_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    def load_state(self, state_dir: str) -> bool:
+        state_path = os.path.join(state_dir, STATE_FILENAME)
+        if not os.path.exists(state_path):
+            return False
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('source_fingerprints') != self.plan.source_fingerprints:
+            print(f"تحذير: حالة التحديث المباشر في '{state_dir}' تخص نموذجًا سابقًا (قبل إعادة التدريب). "
+                  f"سيتم تجاهلها.")
+            return False
+        counts = np.load(os.path.join(state_dir, COUNTS_FILENAME), allow_pickle=False)
+        reference_centroids = np.load(os.path.join(state_dir, REFERENCE_CENTROIDS_FILENAME), allow_pickle=False)
+        if counts.shape != self.counts.shape or reference_centroids.shape != self.reference_centroids.shape:
+            print(f"تحذير: حالة التحديث المباشر في '{state_dir}' لا تطابق النموذج الحالي. سيتم تجاهلها.")
+            return False
+        # المقياس من المراكز المرجعية المحفوظة، لا من مراكز الحزمة المحدثة
+        self._set_reference_centroids(reference_centroids)
+        self.counts = counts.astype(np.float64)
+        self.n_updates, self.n_samples_seen = state['n_updates'], state['n_samples_seen']
+        self.reference_inertia, self.inertia_ewma = state['reference_inertia'], state['inertia_ewma']
+        self.retrain_requested, self.history = state['retrain_requested'], state['history']
+        return True
@@ -0,0 +1,416 @@
+# src/models/online_topic_modeling.py
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+try:
+    from src.models.topic_modeling import ProblemTopicModel, DEFAULT_BERTOPIC_MODEL_PATH, _import_bertopic
+except ImportError:
+    import sys
+
+    project_root_online_topic = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_online_topic not in sys.path:
+        sys.path.insert(0, project_root_online_topic)
+    from src.models.topic_modeling import ProblemTopicModel, DEFAULT_BERTOPIC_MODEL_PATH, _import_bertopic
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_ONLINE_TOPIC_STATE_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models', 'online_topic_state')
+
+STATE_FILENAME = 'online_topic_state.json'
+# المشاكل المعلقة تُلحق بالملفين عند كل إضافة (سطر JSON لكل نص، وصف float32 لكل تضمين)،
+# وتُعاد كتابتهما كاملين فقط عند أخذ المعلقة للدمج أو partial_fit
+PENDING_TEXTS_FILENAME = 'pending_texts.jsonl'
+PENDING_EMBEDDINGS_FILENAME = 'pending_embeddings.f32'
+
+# عدد آخر عمليات الدمج المحفوظة في السجل
+_HISTORY_SIZE = 50
+
+
+def _replace_file(path: str, write_fn, mode: str = 'w'):
+    """يكتب الملف في ملف مؤقت ثم يستبدله (os.replace)، فلا يبقى ملف نصف مكتوب عند توقف العملية."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, mode, **({'encoding': 'utf-8'} if 'b' not in mode else {})) as f:
+        write_fn(f)
+    os.replace(temp_path, path)
+
+
+def supports_partial_fit(bertopic_model) -> bool:
+    """
+    هل بُني النموذج بمكونات قابلة للتعلم التدريجي (مثل IncrementalPCA و MiniBatchKMeans)؟
+    نموذج UMAP + HDBSCAN الافتراضي لا يدعم partial_fit، فيُحدّث بالدمج الدوري (merge_models).
+    """
+    return all(hasattr(getattr(bertopic_model, name, None), 'partial_fit')
+               for name in ('umap_model', 'hdbscan_model'))
+
+
+def check_topic_ids_stable(base_model, merged_model) -> list[int]:
+    """
+    يتحقق أن كل موضوع في النموذج الأساسي بقي برقمه وكلماته في النموذج المدمج.
+
+    Returns:
+        list[int]: أرقام الموضوعات التي تغيرت أو اختفت (قائمة فارغة = الأرقام مستقرة).
+    """
+    base_topics = base_model.get_topics()
+    merged_topics = merged_model.get_topics()
+    changed = []
+    for topic_id, keywords in base_topics.items():
+        merged_keywords = merged_topics.get(topic_id)
+        if merged_keywords is None or [word for word, _ in merged_keywords] != [word for word, _ in keywords]:
+            changed.append(int(topic_id))
+    return changed
+
+
+class IncrementalTopicUpdater:
+    """
+    تحديث تدريجي لنموذج BERTopic في ProblemTopicModel بدلًا من إعادة تشغيل UMAP و HDBSCAN على كامل البيانات:
+
+      * إذا كان النموذج مبنيًا بمكونات تدعم partial_fit: تحديث مباشر على دفعات صغيرة.
+      * خلاف ذلك (الحالة الافتراضية): تُجمع المشاكل الجديدة مع تضميناتها، وعند بلوغ min_merge_size
+        يُدرَّب نموذج صغير على البيانات الحديثة فقط ثم يُدمج بـ BERTopic.merge_models. الدمج يُبقي
+        موضوعات النموذج الأساسي بأرقامها، ويضيف الموضوعات الجديدة فقط بأرقام تالية.
+
+    التضمينات تؤخذ من المُمرر أو من خدمة التضمين المشتركة (ذاكرتها المؤقتة على القرص)، فلا يُعاد ترميز
+    المشاكل التاريخية، ولا يُعاد تجميعها أصلًا.
+    """
+
+    def __init__(self, topic_model: ProblemTopicModel, min_merge_size: int = 200,
+                 min_similarity: float = 0.7, min_topic_size: Optional[int] = None,
+                 partial_fit_batch_size: int = 64, state_dir: Optional[str] = DEFAULT_ONLINE_TOPIC_STATE_DIR):
+        """
+        Args:
+            topic_model (ProblemTopicModel): النموذج المحمل الذي يُحدّث في مكانه.
+            min_merge_size (int): أقل عدد من المشاكل الجديدة قبل تدريب نموذج حديث ودمجه.
+            min_similarity (float): عتبة تشابه الموضوعات في merge_models؛ الموضوع الحديث الأقل تشابهًا
+                من هذه العتبة مع كل الموضوعات الحالية يُضاف كموضوع جديد.
+            min_topic_size (int, optional): أصغر حجم موضوع للنموذج الحديث. None = نفس قيمة النموذج الأساسي.
+            partial_fit_batch_size (int): حجم الدفعة في مسار partial_fit.
+            state_dir (str, optional): مجلد حفظ المشاكل المعلقة وسجل الدمج. None لتعطيل الحفظ.
+        """
+        self.topic_model = topic_model
+        self.min_merge_size = min_merge_size
+        self.min_similarity = min_similarity
+        self.min_topic_size = min_topic_size
+        self.partial_fit_batch_size = partial_fit_batch_size
+        self.state_dir = state_dir
+
+        self.pending_texts: list[str] = []
+        self.pending_embeddings: list[np.ndarray] = []
+        self.n_merges = 0
+        self.n_partial_fits = 0
+        self.n_documents_added = 0
+        self.consumed_inputs: dict = {}  # مسار ملف مشاكل جديدة -> بصمته (الحجم، وقت التعديل) عند إضافته
+        self.history: list[dict] = []
+        self._lock = threading.Lock()  # يحمي المشاكل المعلقة وملفاتها معًا
+        self._n_pending_on_disk: Optional[int] = None  # None = الملفات لا تطابق بداية القائمة (تُعاد كتابتها)
+        if state_dir:
+            self.load_state(state_dir)
+
+    @property
+    def n_pending(self) -> int:
+        return len(self.pending_texts)
+
+    def _embeddings_for(self, texts: list[str], embeddings: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        if embeddings is not None and len(embeddings) == len(texts):
+            return np.asarray(embeddings, dtype=np.float32)
+        service = self.topic_model.embedding_service
+        if service is None or not service.is_available:
+            print("خطأ: لا توجد تضمينات مُمررة ولا خدمة تضمين متاحة للتحديث التدريجي للموضوعات.")
+            return None
+        # الخدمة تعيد المحفوظ في ذاكرتها المؤقتة ولا ترمّز إلا النصوص الجديدة فعلًا
+        return np.asarray(service.encode(texts), dtype=np.float32)
+
+    # --- الإضافة ---
+    def add_problems(self, texts: list[str], embeddings: Optional[np.ndarray] = None,
+                     auto_update: bool = True) -> Optional[dict]:
+        """
+        يضيف مشاكل جديدة (نصوص نظيفة كعمود 'processed_text') إلى مسار التحديث.
+
+        Returns:
+            dict | None: تقرير التحديث إذا نُفذ تحديث (partial_fit أو دمج)، وإلا None.
+        """
+        if not texts:
+            return None
+        if not self.topic_model.is_loaded:
+            print("خطأ: نموذج BERTopic غير محمل. لا يمكن تحديث الموضوعات.")
+            return None
+        vectors = self._embeddings_for(texts, embeddings)
+        if vectors is None:
+            return None
+        with self._lock:
+            n_pending_before = len(self.pending_texts)
+            self.pending_texts.extend(texts)
+            self.pending_embeddings.extend(vectors)
+            self.n_documents_added += len(texts)
+            if self.state_dir:
+                # تُحفظ المشاكل المعلقة فور إضافتها، لا بعد الدمج فقط، فلا تضيع إذا توقفت العملية قبل الدمج؛
+                # بالإلحاق فقط إذا طابقت الملفات ما قبلها، فتكلفة الإضافة بحجمها لا بحجم كل المعلقة
+                if self._n_pending_on_disk == n_pending_before:
+                    self._append_pending_locked(self.state_dir, texts, vectors)
+                else:
+                    self._save_state_locked(self.state_dir)
+        if not auto_update:
+            return None
+        if supports_partial_fit(self.topic_model.model):
+            return self.partial_fit_pending() if self.n_pending >= self.partial_fit_batch_size else None
+        return self.merge_pending() if self.n_pending >= self.min_merge_size else None
+
+    def add_problems_from_file(self, data_path: str, text_column: str = 'processed_text') -> int:
+        """
+        يضيف مشاكل ملف CSV إلى المعلقة مرة واحدة فقط: الملف (بحجمه ووقت تعديله) يُسجل في الحالة، فإعادة
+        التشغيل بنفس الملف بعد دمج مرفوض أو مؤجل لا تضيف مشاكله مرتين. الملف المعدّل يُعامل كملف جديد.
+
+        Returns:
+            int: عدد المشاكل المضافة (0 إذا أضيف الملف سابقًا).
+        """
+        import pandas as pd
+
+        stat = os.stat(data_path)
+        input_key = os.path.abspath(data_path)
+        fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if self.consumed_inputs.get(input_key) == fingerprint:
+            print(f"مشاكل الملف '{data_path}' مضافة سابقًا ({self.n_pending} مشكلة معلقة).")
+            return 0
+        texts = pd.read_csv(data_path)[text_column].fillna('').astype(str)
+        texts = texts[texts.str.strip() != ''].tolist()
+        n_pending_before = self.n_pending
+        self.add_problems(texts, auto_update=False)
+        n_added = self.n_pending - n_pending_before
+        if texts and not n_added:
+            return 0  # تعذر التضمين؛ الملف لا يُسجل فيُعاد في التشغيل التالي
+        with self._lock:
+            self.consumed_inputs[input_key] = fingerprint
+            if self.state_dir:
+                self._write_state_file(self.state_dir, self._pending_embedding_dim())
+        return n_added
+
+    def _pending_embedding_dim(self) -> Optional[int]:
+        return len(self.pending_embeddings[0]) if self.pending_embeddings else None
+
+    def _take_pending(self) -> tuple[list[str], np.ndarray]:
+        with self._lock:
+            texts, vectors = self.pending_texts, self.pending_embeddings
+            self.pending_texts, self.pending_embeddings = [], []
+            self._n_pending_on_disk = None
+        return texts, np.vstack(vectors).astype(np.float32) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def _restore_pending(self, texts: list[str], vectors: np.ndarray):
+        with self._lock:
+            self.pending_texts = texts + self.pending_texts
+            self.pending_embeddings = list(vectors) + self.pending_embeddings
+            self._n_pending_on_disk = None
+
+    # --- التحديث المباشر ---
+    def partial_fit_pending(self) -> dict:
+        """يمرر المشاكل المعلقة إلى BERTopic.partial_fit على دفعات (للنماذج ذات المكونات التدريجية فقط)."""
+        model = self.topic_model.model
+        if not supports_partial_fit(model):
+            raise ValueError("نموذج BERTopic الحالي لا يدعم partial_fit؛ استخدم merge_pending بدلًا منه.")
+        if not self.n_pending:
+            return {'mode': 'partial_fit', 'n_documents': 0}
+        texts, vectors = self._take_pending()
+        start_time = time.perf_counter()
+        for start in range(0, len(texts), self.partial_fit_batch_size):
+            end = start + self.partial_fit_batch_size
+            model.partial_fit(texts[start:end], embeddings=vectors[start:end])
+        self.n_partial_fits += 1
+        self.topic_model.build_topic_catalogue()
+        return self._record({'mode': 'partial_fit', 'n_documents': len(texts),
+                             'seconds': round(time.perf_counter() - start_time, 3)})
+
+    # --- الدمج الدوري ---
+    def _fit_recent_model(self, texts: list[str], vectors: np.ndarray):
+        """يدرّب نموذج BERTopic صغيرًا على المشاكل الحديثة فقط بنفس إعدادات تمثيل النموذج الأساسي."""
+        BERTopic = _import_bertopic()
+        base_model = self.topic_model.model
+        vectorizer_model = getattr(base_model, 'vectorizer_model', None)
+        if vectorizer_model is not None:
+            from sklearn.base import clone
+            vectorizer_model = clone(vectorizer_model)
+        min_topic_size = self.min_topic_size or getattr(base_model, 'min_topic_size', 10)
+        recent_model = BERTopic(embedding_model=self._embedding_model(), vectorizer_model=vectorizer_model,
+                                min_topic_size=min_topic_size, language=getattr(base_model, 'language', 'english'))
+        recent_model.fit(texts, embeddings=vectors)
+        return recent_model
+
+    def _embedding_model(self):
+        service = self.topic_model.embedding_service
+        return service.sentence_transformer if service is not None else None
+
+    def merge_pending(self, force: bool = False, save_path: Optional[str] = None) -> dict:
+        """
+        يدرّب نموذجًا على المشاكل المعلقة فقط ويدمجه مع النموذج الحالي بـ merge_models.
+        يُرفض الدمج (ويبقى النموذج الحالي) إذا تغير رقم أو كلمات أي موضوع موجود.
+
+        Args:
+            force (bool): الدمج حتى لو كان عدد المشاكل المعلقة أقل من min_merge_size.
+            save_path (str, optional): مسار حفظ النموذج المدمج (مثل DEFAULT_BERTOPIC_MODEL_PATH).
+
+        Returns:
+            dict: تقرير الدمج (الموضوعات الجديدة، المدة، هل قُبل الدمج).
+        """
+        if not self.topic_model.is_loaded:
+            return {'mode': 'merge', 'merged': False, 'reason': 'model_not_loaded'}
+        if self.n_pending < self.min_merge_size and not force:
+            return {'mode': 'merge', 'merged': False, 'reason': 'not_enough_documents', 'n_pending': self.n_pending}
+        BERTopic = _import_bertopic()
+        if BERTopic is None:
+            return {'mode': 'merge', 'merged': False, 'reason': 'bertopic_unavailable'}
+
+        texts, vectors = self._take_pending()
+        start_time = time.perf_counter()
+        base_model = self.topic_model.model
+        try:
+            recent_model = self._fit_recent_model(texts, vectors)
+            merged_model = BERTopic.merge_models([base_model, recent_model], min_similarity=self.min_similarity,
+                                                 embedding_model=self._embedding_model())
+        except Exception as e:
+            print(f"حدث خطأ أثناء تدريب أو دمج نموذج الموضوعات الحديث: {e}")
+            self._restore_pending(texts, vectors)
+            return {'mode': 'merge', 'merged': False, 'reason': f'error: {e}'}
+
+        changed_topics = check_topic_ids_stable(base_model, merged_model)
+        if changed_topics:
+            print(f"تحذير: الدمج غيّر الموضوعات الحالية {changed_topics}. تم رفضه والإبقاء على النموذج الحالي.")
+            self._restore_pending(texts, vectors)
+            return self._record({'mode': 'merge', 'merged': False, 'reason': 'unstable_topic_ids',
+                                 'changed_topics': changed_topics, 'n_documents': len(texts)})
+
+        new_topics = sorted(int(t) for t in set(merged_model.get_topics()) - set(base_model.get_topics()))
+        # استبدال المرجع دفعة واحدة: الطلبات الجارية تكمل على النموذج القديم
+        self.topic_model.model = merged_model
+        self.topic_model.build_topic_catalogue()
+        self.n_merges += 1
+        if save_path:
+            self.save_model(save_path)
+        print(f"تم دمج {len(texts)} مشكلة جديدة في نموذج الموضوعات ({len(new_topics)} موضوع جديد: {new_topics}).")
+        return self._record({'mode': 'merge', 'merged': True, 'n_documents': len(texts), 'new_topics': new_topics,
+                             'seconds': round(time.perf_counter() - start_time, 3)})
+
+    def _record(self, report: dict) -> dict:
+        report['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.history.append(report)
+        del self.history[:-_HISTORY_SIZE]
+        if self.state_dir:
+            self.save_state(self.state_dir)
+        return report
+
+    # --- الحفظ ---
+    def save_model(self, model_path: str = DEFAULT_BERTOPIC_MODEL_PATH):
+        """يحفظ النموذج المحدث بنفس صيغة pickle، مع إبقاء النسخة السابقة بامتداد .prev."""
+        temp_path = f"{model_path}.tmp"
+        self.topic_model.model.save(temp_path, serialization='pickle', save_embedding_model=False)
+        if os.path.exists(model_path):
+            os.replace(model_path, f"{model_path}.prev")
+        os.replace(temp_path, model_path)
+        print(f"تم حفظ نموذج الموضوعات المحدث في: {model_path}")
+
+    def save_state(self, state_dir: str):
+        """يحفظ المشاكل المعلقة وتضميناتها وسجل التحديثات، لتستأنف بعد إعادة التشغيل دون إعادة ترميز."""
+        with self._lock:
+            self._save_state_locked(state_dir)
+
+    def _save_state_locked(self, state_dir: str):
+        """يعيد كتابة ملفات المعلقة كاملة، كل ملف ذريًا (ملف مؤقت ثم os.replace)."""
+        os.makedirs(state_dir, exist_ok=True)
+        vectors = np.vstack(self.pending_embeddings).astype(np.float32) if self.pending_embeddings \
+            else np.empty((0, 0), dtype=np.float32)
+        _replace_file(os.path.join(state_dir, PENDING_EMBEDDINGS_FILENAME), vectors.tofile, mode='wb')
+        _replace_file(os.path.join(state_dir, PENDING_TEXTS_FILENAME),
+                      lambda f: f.writelines(json.dumps(text, ensure_ascii=False) + '\n'
+                                             for text in self.pending_texts))
+        self._n_pending_on_disk = len(self.pending_texts)
+        self._write_state_file(state_dir, self._pending_embedding_dim())
+
+    def _append_pending_locked(self, state_dir: str, texts: list[str], vectors: np.ndarray):
+        # التضمينات أولًا ثم النصوص: إذا توقفت العملية بينهما يُحمّل الجزء المتسق فقط (load_state)
+        with open(os.path.join(state_dir, PENDING_EMBEDDINGS_FILENAME), 'ab') as f:
+            np.ascontiguousarray(vectors, dtype=np.float32).tofile(f)
+        with open(os.path.join(state_dir, PENDING_TEXTS_FILENAME), 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(text, ensure_ascii=False) + '\n' for text in texts)
+        self._n_pending_on_disk += len(texts)
+        self._write_state_file(state_dir, self._pending_embedding_dim())
+
+    def _write_state_file(self, state_dir: str, embedding_dim: Optional[int]):
+        state = {'n_merges': self.n_merges, 'n_partial_fits': self.n_partial_fits,
+                 'n_documents_added': self.n_documents_added, 'embedding_dim': embedding_dim,
+                 'consumed_inputs': self.consumed_inputs, 'history': self.history}
+        _replace_file(os.path.join(state_dir, STATE_FILENAME),
+                      lambda f: json.dump(state, f, ensure_ascii=False, indent=2))
+
+    def load_state(self, state_dir: str) -> bool:
+        state_path = os.path.join(state_dir, STATE_FILENAME)
+        if not os.path.exists(state_path):
+            return False
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        texts, vectors, files_consistent = self._read_pending_files(state_dir, state.get('embedding_dim'))
+        with self._lock:
+            self.pending_texts, self.pending_embeddings = texts, list(vectors)
+            self._n_pending_on_disk = len(texts) if files_consistent else None
+            self.n_merges, self.n_partial_fits = state['n_merges'], state['n_partial_fits']
+            self.n_documents_added, self.history = state['n_documents_added'], state['history']
+            self.consumed_inputs = state.get('consumed_inputs', {})
+        return True
+
+    @staticmethod
+    def _read_pending_files(state_dir: str, embedding_dim: Optional[int]) -> tuple[list[str], np.ndarray, bool]:
+        """
+        يقرأ الصفوف المكتملة في الملفين ويأخذ أطول بداية مشتركة بينهما؛ ما زاد (إلحاق انقطع في منتصفه)
+        يُهمل، وتُعاد كتابة الملفين عند الحفظ التالي بدلًا من الإلحاق بهما.
+        """
+        texts_path = os.path.join(state_dir, PENDING_TEXTS_FILENAME)
+        vectors_path = os.path.join(state_dir, PENDING_EMBEDDINGS_FILENAME)
+        texts = []
+        if os.path.exists(texts_path):
+            with open(texts_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    texts.append(json.loads(line))
+        vectors = np.fromfile(vectors_path, dtype=np.float32) if embedding_dim and os.path.exists(vectors_path) \
+            else np.empty(0, dtype=np.float32)
+        n_vector_rows = len(vectors) // embedding_dim if embedding_dim else 0
+        vectors = vectors[:n_vector_rows * embedding_dim].reshape(n_vector_rows, embedding_dim or 0)
+        n_rows = min(len(texts), n_vector_rows)
+        files_consistent = n_rows == len(texts) == n_vector_rows and \
+            (not os.path.exists(vectors_path) or os.path.getsize(vectors_path) == vectors.nbytes)
+        if not files_consistent:
+            print(f"تحذير: آخر إضافة في حالة تحديث الموضوعات في '{state_dir}' غير مكتملة. "
+                  f"تم استئناف {n_rows} مشكلة معلقة.")
+        return texts[:n_rows], vectors[:n_rows], files_consistent
+
+
+# --- تشغيل من سطر الأوامر ---
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="دمج المشاكل الجديدة في نموذج الموضوعات دون إعادة تدريب UMAP/HDBSCAN على كامل البيانات.")
+    parser.add_argument('--new-data', required=True, help="ملف CSV بالمشاكل الجديدة فقط.")
+    parser.add_argument('--text-column', default='processed_text', help="عمود النص النظيف.")
+    parser.add_argument('--model-path', default=DEFAULT_BERTOPIC_MODEL_PATH, help="مسار نموذج BERTopic.")
+    parser.add_argument('--state-dir', default=DEFAULT_ONLINE_TOPIC_STATE_DIR, help="مجلد حالة التحديث التدريجي.")
+    parser.add_argument('--min-merge-size', type=int, default=200, help="أقل عدد من المشاكل قبل الدمج.")
+    parser.add_argument('--min-similarity', type=float, default=0.7, help="عتبة التشابه في merge_models.")
+    parser.add_argument('--force', action='store_true', help="الدمج حتى لو كان عدد المشاكل أقل من الحد الأدنى.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+    topic_model_instance = ProblemTopicModel(model_path=args.model_path)
+    if not topic_model_instance.is_loaded:
+        raise SystemExit("لم يتم تحميل نموذج BERTopic.")
+    updater = IncrementalTopicUpdater(topic_model_instance, min_merge_size=args.min_merge_size,
+                                      min_similarity=args.min_similarity, state_dir=args.state_dir)
+    updater.add_problems_from_file(args.new_data, args.text_column)
+    if supports_partial_fit(topic_model_instance.model):
+        result = updater.partial_fit_pending()
+        if result['n_documents']:
+            updater.save_model(args.model_path)
+    else:
+        result = updater.merge_pending(force=args.force, save_path=args.model_path)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,192 @@
+# src/models/onnx_encoder.py
+import argparse
+import json
+import os
+
+import numpy as np
+
+# ملاحظة: هذه الوحدة لا تستورد torch أو sentence_transformers إلا داخل دالة التصدير (export)،
+# فيبقى مسار الاستدلال (inference) معتمدًا على onnxruntime و tokenizers فقط.
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_ONNX_ENCODER_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models', 'onnx_encoder')
+
+ONNX_MODEL_FILENAME = 'model.onnx'
+ONNX_QUANTIZED_MODEL_FILENAME = 'model_int8.onnx'
+ENCODER_META_FILENAME = 'encoder_meta.json'
+TOKENIZER_FILENAME = 'tokenizer.json'
+
+
+def export_onnx_encoder(model_name: str, output_dir: str = DEFAULT_ONNX_ENCODER_DIR,
+                        quantize: bool = True, opset_version: int = 14) -> str:
+    """
+    يصدّر نموذج SentenceTransformer (الجزء Transformer فقط) إلى ONNX مرة واحدة،
+    مع المُرمّز السريع (tokenizer.json) وملف وصف للتجميع (pooling).
+    اختياريًا يُنشئ نسخة مكممة ديناميكيًا (int8) للمعالج.
+
+    Args:
+        model_name (str): اسم أو مسار نموذج SentenceTransformer (نفس الاسم المستخدم في مسار PyTorch).
+        output_dir (str): مجلد الحفظ.
+        quantize (bool): إنشاء model_int8.onnx بتكميم ديناميكي.
+        opset_version (int): إصدار ONNX opset.
+
+    Returns:
+        str: مسار المجلد الذي حُفظت فيه الملفات.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"تحميل نموذج PyTorch للتصدير: {model_name}")
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer_module = st_model[0]
+    auto_model = transformer_module.auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    module_names = [type(module).__name__ for module in st_model]
+    pooling_module = next((module for module in st_model if type(module).__name__ == 'Pooling'), None)
+    if pooling_module is None or not getattr(pooling_module, 'pooling_mode_mean_tokens', False):
+        raise ValueError(f"نموذج التضمين '{model_name}' لا يستخدم mean pooling؛ التصدير غير مدعوم حاليًا.")
+
+    sample = tokenizer(["نص تجريبي للتصدير", "sample export text"], padding=True, return_tensors='pt')
+    input_names = ['input_ids', 'attention_mask']
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    onnx_path = os.path.join(output_dir, ONNX_MODEL_FILENAME)
+    print(f"تصدير النموذج إلى ONNX: {onnx_path}")
+
+    class _EncoderWrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    with torch.no_grad():
+        torch.onnx.export(_EncoderWrapper(auto_model),
+                          (sample['input_ids'], sample['attention_mask']),
+                          onnx_path,
+                          input_names=input_names,
+                          output_names=['last_hidden_state'],
+                          dynamic_axes=dynamic_axes,
+                          opset_version=opset_version,
+                          do_constant_folding=True)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantized_path = os.path.join(output_dir, ONNX_QUANTIZED_MODEL_FILENAME)
+        print(f"تكميم ديناميكي (int8) للنموذج: {quantized_path}")
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)  # يكتب tokenizer.json للمُرمّز السريع
+    meta = {
+        'model_name': model_name,
+        'max_seq_length': int(st_model.max_seq_length),
+        'embedding_dim': int(st_model.get_sentence_embedding_dimension()),
+        'pooling': 'mean',
+        'normalize': 'Normalize' in module_names,
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': int(tokenizer.pad_token_id),
+        'quantized_available': bool(quantize),
+    }
+    with open(os.path.join(output_dir, ENCODER_META_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print("اكتمل تصدير نموذج التضمين إلى ONNX.")
+    return output_dir
+
+
+class OnnxSentenceEncoder:
+    """
+    بديل خفيف لـ SentenceTransformer.encode على المعالج (CPU) عبر ONNX Runtime ومُرمّز tokenizers السريع.
+    يوفر نفس توقيع encode() المستخدم في EmbeddingService، فيمكن اختياره من الإعدادات دون تغيير المستدعين.
+    """
+
+    def __init__(self, model_dir: str = DEFAULT_ONNX_ENCODER_DIR, use_quantized: bool = True,
+                 intra_op_num_threads: int = 0):
+        """
+        Args:
+            model_dir (str): المجلد الناتج عن export_onnx_encoder.
+            use_quantized (bool): استخدام نسخة int8 إذا كانت موجودة.
+            intra_op_num_threads (int): عدد خيوط ONNX Runtime داخل العملية (0 = الافتراضي).
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        meta_path = os.path.join(model_dir, ENCODER_META_FILENAME)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"ملف وصف نموذج ONNX غير موجود: {meta_path}. "
+                                    f"شغّل export_onnx_encoder أولًا.")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.model_name = self.meta['model_name']
+        self.max_seq_length = self.meta['max_seq_length']
+
+        quantized_path = os.path.join(model_dir, ONNX_QUANTIZED_MODEL_FILENAME)
+        self.model_path = quantized_path if use_quantized and os.path.exists(quantized_path) \
+            else os.path.join(model_dir, ONNX_MODEL_FILENAME)
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_num_threads:
+            session_options.intra_op_num_threads = intra_op_num_threads
+        print(f"تحميل نموذج التضمين (ONNX Runtime): {self.model_path}")
+        self.session = ort.InferenceSession(self.model_path, session_options,
+                                            providers=['CPUExecutionProvider'])
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILENAME))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.meta['pad_token_id'], pad_token=self.meta['pad_token'])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta['embedding_dim']
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self._input_names:
+            feeds['token_type_ids'] = np.zeros_like(input_ids)
+        last_hidden_state = self.session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+
+        # mean pooling مع مراعاة قناع الانتباه (مطابق لوحدة Pooling في sentence-transformers)
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (last_hidden_state * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+        if self.meta.get('normalize'):
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """
+        يحول النصوص إلى تضمينات (float32). الدفعات مرتبة حسب الطول لتقليل الحشو (padding)،
+        ثم تُعاد النتائج بترتيب المدخلات الأصلي.
+        """
+        single_input = isinstance(sentences, str)
+        texts = [sentences] if single_input else [str(text) for text in sentences]
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch_positions = order[start:start + batch_size]
+            embeddings[batch_positions] = self._encode_batch([texts[i] for i in batch_positions])
+        return embeddings[0] if single_input else embeddings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="تصدير نموذج التضمين إلى ONNX (مع تكميم int8 اختياري).")
+    parser.add_argument('--model-name', default='paraphrase-multilingual-MiniLM-L12-v2')
+    parser.add_argument('--output-dir', default=DEFAULT_ONNX_ENCODER_DIR)
+    parser.add_argument('--no-quantize', action='store_true', help="عدم إنشاء النسخة المكممة int8.")
+    args = parser.parse_args()
+
+    export_onnx_encoder(args.model_name, args.output_dir, quantize=not args.no_quantize)
+    encoder = OnnxSentenceEncoder(args.output_dir, use_quantized=not args.no_quantize)
+    sample_embeddings = encoder.encode(["الشبكة بطيئة جدا في قسم المحاسبة", "printer does not print"])
+    print(f"أبعاد التضمينات الناتجة من ONNX: {sample_embeddings.shape}")
@@ -11,28 +11,56 @@ DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '
 DEFAULT_MODELS_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models')
 DEFAULT_BERTOPIC_MODEL_PATH = os.path.join(DEFAULT_MODELS_DIR, 'bertopic_model.pkl')
 
-# نحتاج إلى استيراد BERTopic للتحميل
-# تأكد من أن bertopic و sentence_transformers مثبتتان في بيئتك
+# اسم غريب يظهر أحيانًا لموضوع الضوضاء (-1) في النموذج المدرب
+ODD_NOISE_TOPIC_NAME = "-1_ ভট্টাচার্য್ಯ"
+NOISE_TOPIC_KEYWORDS = [("Noise/Outlier Topic", 1.0)]
+
+
+def _import_bertopic():
+    """
+    يستورد BERTopic عند الحاجة فقط: استيراده يجر umap و hdbscan، فلا ندفع كلفته عند مجرد استيراد
+    هذه الوحدة (مثلًا عند استخدام FastTopicModel بدلًا منه).
+    """
+    try:
+        from bertopic import BERTopic
+        return BERTopic
+    except ImportError:
+        print("تحذير: مكتبة BERTopic أو SentenceTransformer غير مثبتة.")
+        print("يرجى تثبيتها: pip install bertopic sentence-transformers")
+        return None
+
+
 try:
-    from bertopic import BERTopic
-    # from sentence_transformers import SentenceTransformer # قد لا نحتاجه مباشرة هنا إذا كان النموذج محملًا بالكامل
+    from src.models.embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL_NAME
+    from src.utils.tracing import span, traced
 except ImportError:
-    print("تحذير: مكتبة BERTopic أو SentenceTransformer غير مثبتة.")
-    print("يرجى تثبيتها: pip install bertopic sentence-transformers")
-    BERTopic = None  # لتعريف المتغير وتجنب أخطاء لاحقة إذا فشل الاستيراد
+    import sys
+
+    project_root_topic = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_topic not in sys.path:
+        sys.path.insert(0, project_root_topic)
+    from src.models.embedding_service import get_embedding_service, DEFAULT_EMBEDDING_MODEL_NAME
+    from src.utils.tracing import span, traced
 
 
 class ProblemTopicModel:
-    def __init__(self, model_path: str = DEFAULT_BERTOPIC_MODEL_PATH):
+    def __init__(self, model_path: str = DEFAULT_BERTOPIC_MODEL_PATH,
+                 embedding_model_name: str = DEFAULT_EMBEDDING_MODEL_NAME):
         """
         تهيئة نموذج تحليل الموضوعات. يقوم بتحميل نموذج BERTopic من المسار المحدد.
 
         Args:
             model_path (str): مسار ملف نموذج BERTopic المحفوظ (.pkl).
+            embedding_model_name (str): اسم نموذج التضمين الذي دُرب به BERTopic. يُستخدم من خلال
+                خدمة التضمين المشتركة بدلًا من النسخة المضمنة داخل ملف pickle.
         """
         self.model = None
         self.model_path = model_path
-        if BERTopic is not None:  # فقط حاول التحميل إذا تم استيراد BERTopic بنجاح
+        self.embedding_model_name = embedding_model_name
+        self.embedding_service = None
+        # topic_id -> {'name', 'keywords': [(كلمة، وزن)...], 'size'}؛ يُبنى مرة واحدة عند تحميل النموذج
+        self.topic_catalogue: dict[int, dict] = {}
+        if _import_bertopic() is not None:  # فقط حاول التحميل إذا تم استيراد BERTopic بنجاح
             self.load_model(self.model_path)
         else:
             print("لا يمكن تهيئة ProblemTopicModel لأن مكتبة BERTopic غير متاحة.")
@@ -47,6 +75,7 @@ class ProblemTopicModel:
         Returns:
             bool: True إذا تم التحميل بنجاح، False خلاف ذلك.
         """
+        BERTopic = _import_bertopic()
         if BERTopic is None:
             print("خطأ: مكتبة BERTopic غير متاحة، لا يمكن تحميل النموذج.")
             return False
@@ -56,10 +85,19 @@ class ProblemTopicModel:
                 print(f"خطأ: ملف النموذج غير موجود في المسار: {model_path}")
                 self.model = None
                 return False
-            # BERTopic.load يتطلب أحيانًا تحديد embedding_model إذا لم يتم حفظه بالكامل
-            # ولكن إذا استخدمنا serialization="pickle" عند الحفظ، يجب أن يكون كل شيء مضمنًا.
-            self.model = BERTopic.load(model_path)
+            # نمرر نموذج التضمين المشترك ليحل محل النسخة المضمنة في ملف pickle،
+            # فتبقى نسخة واحدة فقط من أوزان SentenceTransformer في الذاكرة.
+            self.embedding_service = get_embedding_service(self.embedding_model_name)
+            if self.embedding_service.sentence_transformer is not None:
+                self.model = BERTopic.load(model_path, embedding_model=self.embedding_service.sentence_transformer)
+            else:
+                self.model = BERTopic.load(model_path)
+                if self.embedding_service.is_available:
+                    # الواجهة الخلفية ليست PyTorch (مثل ONNX): التضمينات تُمرر دائمًا إلى transform
+                    # من الخدمة المشتركة، فلا حاجة للإبقاء على نسخة المُرمّز المضمنة في ملف pickle.
+                    self.model.embedding_model = None
             print("تم تحميل نموذج BERTopic بنجاح.")
+            self.build_topic_catalogue()
             return True
         except FileNotFoundError:
             print(f"خطأ في تحميل نموذج BERTopic: ملف غير موجود - {model_path}")
@@ -69,13 +107,17 @@ class ProblemTopicModel:
             self.model = None
         return False
 
-    def get_topics_for_texts(self, texts: list[str]) -> tuple[list[int], np.ndarray]:
+    @traced('topic.get_topics_for_texts')
+    def get_topics_for_texts(self, texts: list[str],
+                             embeddings: np.ndarray = None) -> tuple[list[int], np.ndarray]:
         """
         يحدد الموضوعات والاحتمالات لقائمة من النصوص الجديدة.
 
         Args:
             texts (list[str]): قائمة بالنصوص (يجب أن تكون نصوصًا نظيفة،
                                  كما هو الحال في عمود 'processed_text').
+            embeddings (np.ndarray, optional): تضمينات محسوبة مسبقًا للنصوص بنفس الترتيب.
+                إذا لم تُمرر، تُحسب عبر خدمة التضمين المشتركة ثم تُمرر إلى BERTopic.transform.
 
         Returns:
             tuple[list[int], np.ndarray]:
@@ -97,14 +139,55 @@ class ProblemTopicModel:
 
         print(f"\nتحديد الموضوعات لـ {len(texts)} نص(نصوص) جديدة...")
         try:
-            # BERTopic.transform يتوقع قائمة من النصوص
-            topics, probabilities = self.model.transform(texts)
+            if embeddings is None and self.embedding_service is not None and self.embedding_service.is_available:
+                embeddings = self.embedding_service.encode(texts)
+            with span('topic.bertopic_transform'):
+                if embeddings is not None and len(embeddings) == len(texts):
+                    topics, probabilities = self.model.transform(texts, embeddings=np.asarray(embeddings))
+                else:
+                    # BERTopic.transform يتوقع قائمة من النصوص
+                    topics, probabilities = self.model.transform(texts)
             print(f"تم تحديد الموضوعات بنجاح.")
             return topics, probabilities
         except Exception as e:
             print(f"حدث خطأ أثناء استدعاء model.transform(): {e}")
             return [], np.array([])
 
+    @property
+    def is_loaded(self) -> bool:
+        return self.model is not None
+
+    def build_topic_catalogue(self) -> dict[int, dict]:
+        """
+        يبني فهرس الموضوعات (الاسم، الكلمات الرئيسية وأوزانها، عدد مستندات التدريب) باستدعاء
+        get_topic_info و get_topics مرة واحدة، حتى لا يستدعي مسار الطلبات BERTopic لكل موضوع.
+        يُستدعى تلقائيًا عند load_model، ويُعاد استدعاؤه إذا تغير النموذج (مثل تحديث الموضوعات).
+        """
+        if self.model is None:
+            self.topic_catalogue = {}
+            return self.topic_catalogue
+        try:
+            topic_info = self.model.get_topic_info()
+            topics_keywords = self.model.get_topics()
+        except Exception as e:
+            print(f"حدث خطأ أثناء بناء فهرس الموضوعات: {e}")
+            return self.topic_catalogue
+        catalogue = {}
+        for topic_id, name, size in zip(topic_info['Topic'].tolist(), topic_info['Name'].tolist(),
+                                        topic_info['Count'].tolist()):
+            topic_id = int(topic_id)
+            keywords = NOISE_TOPIC_KEYWORDS if topic_id == -1 and name == ODD_NOISE_TOPIC_NAME else \
+                [(word, float(score)) for word, score in (topics_keywords.get(topic_id) or [])]
+            catalogue[topic_id] = {'name': str(name), 'keywords': keywords, 'size': int(size)}
+        # استبدال القاموس كاملًا (وليس تعديله) فيرى القراء المتزامنون إما الفهرس القديم أو الجديد
+        self.topic_catalogue = catalogue
+        print(f"تم بناء فهرس الموضوعات ({len(catalogue)} موضوع).")
+        return catalogue
+
+    def get_topic_entry(self, topic_id: int):
+        """يعيد مدخل الموضوع من الفهرس ({'name', 'keywords', 'size'}) أو None إذا لم يكن معروفًا."""
+        return self.topic_catalogue.get(int(topic_id))
+
     def get_topic_info_df(self) -> pd.DataFrame:
         """
         يعيد DataFrame بمعلومات عن جميع الموضوعات المكتشفة بواسطة النموذج المحمل.
@@ -125,10 +208,13 @@ class ProblemTopicModel:
         if self.model is None:
             print("خطأ: نموذج BERTopic غير محمل.")
             return []
+        entry = self.get_topic_entry(topic_id)
+        if entry is not None:
+            return entry['keywords']
         try:
-            if topic_id == -1 and "-1_ ভট্টাচার্য್ಯ" in self.model.get_topic_info()[
+            if topic_id == -1 and ODD_NOISE_TOPIC_NAME in self.model.get_topic_info()[
                 "Name"].values:  # معالجة خاصة لاسم غريب للضوضاء أحيانًا
-                return [("Noise/Outlier Topic", 1.0)]
+                return NOISE_TOPIC_KEYWORDS
             return self.model.get_topic(topic_id)
         except Exception as e:
             print(f"حدث خطأ أثناء الحصول على الكلمات الرئيسية للموضوع {topic_id}: {e}")
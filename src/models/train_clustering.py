@@ -0,0 +1,436 @@
+# src/models/train_clustering.py
+"""
+تدريب نموذج التجميع (K-Means + ColumnTransformer) من سطر الأوامر، بديلًا عن الخلية 1 و 2
+في 02_model_training.ipynb:
+
+    python src/models/train_clustering.py --k-min 2 --k-max 12 --workers 4
+
+- التضمينات تمر عبر خدمة التضمين المشتركة، فالنصوص المضمّنة سابقًا تُقرأ من ذاكرة التضمينات المؤقتة.
+- قيم k المرشحة تُدرب بالتوازي في عمليات منفصلة، وكل k يُدرب مرة واحدة فقط: inertia (الكوع)
+  و silhouette من نفس التدريب.
+- silhouette يُحسب على عينة ثابتة (نفس الصفوف لكل k) بدلًا من O(n²) على كل البيانات.
+- تقليل الأبعاد اختياري (--reduction pca|random_projection --n-components 64): K-Means يُدرب على
+  ميزات float32 مُسقطة، ويقارن التقرير السرعة والذاكرة وتطابق العناقيد مع التدريب على الميزات الكاملة.
+- يحفظ kmeans_model.pkl و ct_num_cat_embeddings_preprocessor.pkl (و clustering_reducer.pkl) وحزمة
+  النموذج بدون pickle وتقرير JSON بالأزمنة والدرجات.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+try:
+    from src.models.embedding_service import get_embedding_service
+    from src.models.inference_plan import CompiledClusteringPlan, DEFAULT_CLUSTERING_BUNDLE_DIR, source_fingerprints
+except ImportError:
+    import sys
+
+    project_root_training = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_training not in sys.path:
+        sys.path.insert(0, project_root_training)
+    from src.models.embedding_service import get_embedding_service
+    from src.models.inference_plan import CompiledClusteringPlan, DEFAULT_CLUSTERING_BUNDLE_DIR, source_fingerprints
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_TRAINING_DATA_PATH = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'processed', 'processed_problems_data.csv')
+DEFAULT_MODELS_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models')
+DEFAULT_LABELS_OUTPUT_PATH = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'processed',
+                                          'problems_with_kmeans_clusters.csv')
+REPORT_FILENAME = 'clustering_training_report.json'
+REDUCER_FILENAME = 'clustering_reducer.pkl'
+REDUCTION_METHODS = ('pca', 'random_projection')
+
+# نفس اختيار الميزات في 02_model_training.ipynb
+NUMERICAL_FEATURES = ['estimated_cost_numeric', 'overall_budget_numeric', 'estimated_time_days',
+                      'processed_text_length']
+CATEGORICAL_FEATURES = ['domain', 'complexity_level', 'status', 'problem_source', 'sentiment_label']
+TEXT_FEATURE_COL = 'processed_text'
+DATE_COLUMNS = ['date_identified', 'date_closed', 'date_chosen', 'start_date_planned', 'end_date_planned',
+                'start_date_actual', 'end_date_actual']
+
+
+def prepare_tabular_features(df: pd.DataFrame, numerical_features: Optional[list] = None,
+                             categorical_features: Optional[list] = None):
+    """
+    يملأ القيم المفقودة (الوسيط للرقمي، 'Unknown' للفئوي) ويدرب ColumnTransformer كما في الدفتر.
+
+    Returns:
+        tuple: (column_transformer, tabular_features (np.ndarray), numerical_features, categorical_features)
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    numerical_features = [col for col in (numerical_features or NUMERICAL_FEATURES)
+                          if col in df.columns and pd.api.types.is_numeric_dtype(df[col])]
+    categorical_features = [col for col in (categorical_features or CATEGORICAL_FEATURES) if col in df.columns]
+    df_for_features = df[numerical_features + categorical_features].copy()
+    for col in numerical_features:
+        if df_for_features[col].isnull().any():
+            df_for_features[col] = df_for_features[col].fillna(df_for_features[col].median())
+    for col in categorical_features:
+        df_for_features[col] = df_for_features[col].astype(object).where(df_for_features[col].notna(), 'Unknown')
+        df_for_features[col] = df_for_features[col].astype(str)
+
+    column_transformer = ColumnTransformer(
+        transformers=[
+            ('num', Pipeline([('scaler', StandardScaler())]), numerical_features),
+            ('cat', Pipeline([('onehot', OneHotEncoder(handle_unknown='ignore', drop='first',
+                                                       sparse_output=False))]), categorical_features),
+        ], remainder='drop')
+    tabular_features = np.asarray(column_transformer.fit_transform(df_for_features), dtype=np.float64)
+    return column_transformer, tabular_features, numerical_features, categorical_features
+
+
+def fit_reducer(features: np.ndarray, method: str, n_components: int = 64, random_state: int = 42,
+                fit_sample_size: Optional[int] = 50000):
+    """
+    يدرب مقلل أبعاد خطي على مصفوفة الميزات الكاملة (PCA العشوائي على عينة، أو إسقاط عشوائي غاوسي).
+    """
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"طريقة تقليل الأبعاد '{method}' غير مدعومة. الخيارات: {REDUCTION_METHODS}")
+    n_components = min(n_components, features.shape[1])
+    if method == 'pca':
+        from sklearn.decomposition import PCA
+        n_components = min(n_components, len(features))
+        fit_features = features
+        if fit_sample_size and len(features) > fit_sample_size:
+            sample_indices = np.random.default_rng(random_state).choice(len(features), fit_sample_size,
+                                                                        replace=False)
+            fit_features = features[np.sort(sample_indices)]
+        return PCA(n_components=n_components, svd_solver='randomized', random_state=random_state).fit(fit_features)
+    from sklearn.random_projection import GaussianRandomProjection
+    return GaussianRandomProjection(n_components=n_components, random_state=random_state).fit(features)
+
+
+def _matched_agreement(labels_a: np.ndarray, labels_b: np.ndarray) -> float:
+    """نسبة الصفوف المتطابقة بعد أفضل مطابقة بين أرقام عناقيد نموذجين (Hungarian)."""
+    from scipy.optimize import linear_sum_assignment
+
+    contingency = np.zeros((labels_a.max() + 1, labels_b.max() + 1), dtype=np.int64)
+    np.add.at(contingency, (labels_a, labels_b), 1)
+    rows, cols = linear_sum_assignment(-contingency)
+    return float(contingency[rows, cols].sum() / len(labels_a))
+
+
+def compare_reduced_clustering(df: pd.DataFrame, column_transformer, full_features: np.ndarray, reducer,
+                               reduced_model, numerical_features: list, categorical_features: list,
+                               random_state: int = 42, n_timing_rows: int = 2000) -> dict:
+    """
+    يدرب K-Means بنفس k على الميزات الكاملة (float64) ويقارنه بالنموذج المدرب على الميزات المُسقطة:
+    زمن التدريب، زمن التنبؤ عبر الخطة المترجمة، الذاكرة، وتطابق العناقيد (ARI ونسبة التطابق بعد المطابقة).
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import adjusted_rand_score
+
+    k = reduced_model.n_clusters
+    started_at = time.perf_counter()
+    full_model = KMeans(n_clusters=k, init='k-means++', n_init='auto', random_state=random_state).fit(full_features)
+    full_fit_seconds = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    reduced_features = reducer.transform(full_features).astype(np.float32)
+    KMeans(n_clusters=k, init='k-means++', n_init='auto', random_state=random_state).fit(reduced_features)
+    reduced_fit_seconds = time.perf_counter() - started_at
+
+    full_plan = CompiledClusteringPlan.compile(column_transformer, full_model)
+    reduced_plan = CompiledClusteringPlan.compile(column_transformer, reduced_model, reducer=reducer)
+    timing_rows = df.iloc[:n_timing_rows]
+    numerical = timing_rows[numerical_features].to_numpy(dtype=np.float64)
+    categorical = timing_rows[categorical_features].to_numpy(dtype=object)
+    embeddings = full_features[:n_timing_rows, full_plan.n_tabular_features:]
+    predict_ms = {}
+    for name, plan in (('full', full_plan), ('reduced', reduced_plan)):
+        plan.predict_arrays(numerical, categorical, embeddings)  # تسخين
+        started_at = time.perf_counter()
+        plan.predict_arrays(numerical, categorical, embeddings)
+        predict_ms[name] = (time.perf_counter() - started_at) * 1000.0
+    started_at = time.perf_counter()
+    full_model.predict(full_features[:n_timing_rows])
+    full_assign_ms = (time.perf_counter() - started_at) * 1000.0
+    started_at = time.perf_counter()
+    reduced_model.predict(reduced_features[:n_timing_rows])
+    reduced_assign_ms = (time.perf_counter() - started_at) * 1000.0
+
+    return {
+        'n_clusters': int(k),
+        'input_dim': int(full_features.shape[1]),
+        'reduced_dim': int(reduced_features.shape[1]),
+        'feature_matrix_mb': {'full_float64': round(full_features.astype(np.float64, copy=False).nbytes / 2 ** 20, 3),
+                              'reduced_float32': round(reduced_features.nbytes / 2 ** 20, 3)},
+        'fit_seconds': {'full': round(full_fit_seconds, 3), 'reduced': round(reduced_fit_seconds, 3)},
+        'kmeans_predict_ms': {'full': round(full_assign_ms, 3), 'reduced': round(reduced_assign_ms, 3),
+                              'rows': int(len(timing_rows))},
+        'compiled_plan_predict_ms': {name: round(ms, 3) for name, ms in predict_ms.items()},
+        'adjusted_rand_index': round(float(adjusted_rand_score(full_model.labels_, reduced_model.labels_)), 4),
+        'matched_agreement': round(_matched_agreement(full_model.labels_, reduced_model.labels_), 4),
+    }
+
+
+def _elbow_k(k_values: list, inertias: list) -> Optional[int]:
+    """نقطة الكوع: k الأبعد عن الخط الواصل بين أول وآخر نقطة في منحنى inertia (بعد التطبيع)."""
+    if len(k_values) < 3:
+        return None
+    k_arr = np.asarray(k_values, dtype=np.float64)
+    inertia_arr = np.asarray(inertias, dtype=np.float64)
+    x = (k_arr - k_arr[0]) / (k_arr[-1] - k_arr[0])
+    span = inertia_arr[0] - inertia_arr[-1]
+    y = (inertia_arr - inertia_arr[-1]) / span if span > 0 else np.zeros_like(inertia_arr)
+    # الخط من (0, 1) إلى (1, 0): المسافة تتناسب مع |x + y - 1|
+    return int(k_values[int(np.argmax(np.abs(x + y - 1.0)))])
+
+
+def _fit_candidate_k(features_path: str, k: int, sample_indices_path: Optional[str], random_state: int,
+                     n_init, threads_per_worker: Optional[int]) -> dict:
+    """يدرب K-Means لقيمة k واحدة ويحسب inertia و silhouette (على العينة) من نفس التدريب. يعمل داخل عملية عاملة."""
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
+
+    try:
+        from threadpoolctl import threadpool_limits
+        # تقسيم أنوية المعالج بين العمليات بدلًا من أن تستخدم كل عملية جميع الأنوية
+        limiter = threadpool_limits(limits=threads_per_worker) if threads_per_worker else None
+    except ImportError:
+        limiter = None
+    try:
+        features = np.load(features_path, mmap_mode='r')
+        started_at = time.perf_counter()
+        kmeans = KMeans(n_clusters=k, init='k-means++', n_init=n_init, random_state=random_state)
+        labels = kmeans.fit_predict(features)
+        fit_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        if sample_indices_path is not None:
+            sample_indices = np.load(sample_indices_path)
+            sample_features, sample_labels = np.asarray(features[sample_indices]), labels[sample_indices]
+        else:
+            sample_features, sample_labels = np.asarray(features), labels
+        n_labels = len(np.unique(sample_labels))
+        silhouette = float(silhouette_score(sample_features, sample_labels)) \
+            if 1 < n_labels < len(sample_labels) else -1.0
+        silhouette_seconds = time.perf_counter() - started_at
+    finally:
+        if limiter is not None:
+            limiter.unregister()
+    return {'k': k, 'inertia': float(kmeans.inertia_), 'silhouette': silhouette, 'n_iter': int(kmeans.n_iter_),
+            'cluster_sizes': np.bincount(labels, minlength=k).tolist(),
+            'fit_seconds': round(fit_seconds, 3), 'silhouette_seconds': round(silhouette_seconds, 3),
+            'model': kmeans}
+
+
+def run_k_sweep(features: np.ndarray, k_values: list, silhouette_sample_size: Optional[int] = 10000,
+                workers: Optional[int] = None, random_state: int = 42, n_init='auto') -> list[dict]:
+    """
+    يدرب K-Means لكل k في k_values (بالتوازي عبر ProcessPoolExecutor إذا workers > 1).
+    المصفوفة تُكتب مرة واحدة إلى ملف .npy مؤقت وتقرؤها العمليات عبر mmap بدلًا من نسخها لكل عملية.
+
+    Returns:
+        list[dict]: نتيجة لكل k (بنفس ترتيب k_values) تتضمن 'model' (KMeans المدرب).
+    """
+    # الميزات المُسقطة تبقى float32 (نصف الذاكرة ومراكز float32)؛ غير ذلك float64 كما في الدفتر
+    features = np.ascontiguousarray(features, dtype=np.float32 if features.dtype == np.float32 else np.float64)
+    n_rows = len(features)
+    k_values = [k for k in k_values if 2 <= k < n_rows]
+    if not k_values:
+        raise ValueError(f"لا توجد قيم k صالحة لعدد صفوف = {n_rows}.")
+    workers = max(1, min(workers or os.cpu_count() or 1, len(k_values)))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+
+    with tempfile.TemporaryDirectory(prefix='kmeans_sweep_') as tmp_dir:
+        features_path = os.path.join(tmp_dir, 'features.npy')
+        np.save(features_path, features)
+        sample_indices_path = None
+        if silhouette_sample_size and n_rows > silhouette_sample_size:
+            sample_indices = np.sort(np.random.default_rng(random_state).choice(n_rows, silhouette_sample_size,
+                                                                                replace=False))
+            sample_indices_path = os.path.join(tmp_dir, 'silhouette_sample.npy')
+            np.save(sample_indices_path, sample_indices)
+
+        job_args = [(features_path, k, sample_indices_path, random_state, n_init, threads_per_worker)
+                    for k in k_values]
+        if workers == 1:
+            results = [_fit_candidate_k(*args) for args in job_args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_fit_candidate_k, *args) for args in job_args]
+                results = [future.result() for future in futures]
+    for result in results:
+        print(f"k={result['k']}: Inertia={result['inertia']:.2f}, Silhouette={result['silhouette']:.3f} "
+              f"(تدريب {result['fit_seconds']:.2f}ث، silhouette {result['silhouette_seconds']:.2f}ث)")
+    return results
+
+
+def train_clustering(data_path: str = DEFAULT_TRAINING_DATA_PATH, models_dir: str = DEFAULT_MODELS_DIR,
+                     k_values: Optional[list] = None, silhouette_sample_size: Optional[int] = 10000,
+                     workers: Optional[int] = None, random_state: int = 42,
+                     embeddings: Optional[np.ndarray] = None, labels_output_path: Optional[str] = None,
+                     export_bundle: bool = True, report_path: Optional[str] = None,
+                     reduction: Optional[str] = None, n_components: int = 64,
+                     compare_reduction: bool = True) -> dict:
+    """
+    يشغل خط التدريب كاملًا ويعيد التقرير (dict) الذي يُحفظ أيضًا كـ JSON.
+
+    Args:
+        data_path (str): مسار processed_problems_data.csv.
+        models_dir (str): مجلد حفظ النماذج.
+        k_values (list, optional): قيم k المرشحة. None = من 2 إلى 7 كما في الدفتر.
+        silhouette_sample_size (int, optional): حجم عينة silhouette. None = كل البيانات.
+        workers (int, optional): عدد العمليات المتوازية. None = عدد الأنوية.
+        embeddings (np.ndarray, optional): تضمينات جاهزة لعمود processed_text (تتجاوز خدمة التضمين).
+        labels_output_path (str, optional): مسار حفظ البيانات مع عمود cluster_kmeans.
+        export_bundle (bool): تصدير حزمة النموذج بدون pickle (clustering_bundle) أيضًا.
+        report_path (str, optional): مسار تقرير JSON. None = models_dir/clustering_training_report.json.
+        reduction (str, optional): 'pca' أو 'random_projection' لتدريب K-Means على ميزات float32 مُسقطة.
+        n_components (int): عدد أبعاد الميزات بعد التقليل (32–128 عادة).
+        compare_reduction (bool): مقارنة النموذج المُسقط بنموذج على الميزات الكاملة في التقرير.
+    """
+    timings = {}
+    total_started_at = time.perf_counter()
+
+    started_at = time.perf_counter()
+    parse_dates = [col for col in DATE_COLUMNS if col in pd.read_csv(data_path, nrows=0).columns]
+    df = pd.read_csv(data_path, parse_dates=parse_dates)
+    if df.empty:
+        raise ValueError(f"ملف بيانات التدريب '{data_path}' فارغ.")
+    timings['load_data'] = time.perf_counter() - started_at
+    print(f"تم تحميل بيانات التدريب: {df.shape}")
+
+    started_at = time.perf_counter()
+    embedding_model_name = None
+    if embeddings is None:
+        service = get_embedding_service()
+        embedding_model_name = service.model_name
+        texts = df[TEXT_FEATURE_COL].fillna('').astype(str).tolist()
+        print(f"تضمين {len(texts)} نص (النصوص المخزنة مؤقتًا لا يُعاد تضمينها)...")
+        embeddings = service.encode(texts)
+        if embeddings.size == 0:
+            raise RuntimeError("تعذر إنشاء تضمينات نصوص التدريب.")
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    if len(embeddings) != len(df):
+        raise ValueError(f"عدد التضمينات ({len(embeddings)}) لا يطابق عدد الصفوف ({len(df)}).")
+    timings['embeddings'] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    column_transformer, tabular_features, numerical_features, categorical_features = prepare_tabular_features(df)
+    features = np.concatenate([tabular_features, embeddings], axis=1)
+    timings['features'] = time.perf_counter() - started_at
+    print(f"أبعاد مصفوفة الميزات النهائية: {features.shape}")
+
+    reducer, clustering_features = None, features
+    if reduction:
+        started_at = time.perf_counter()
+        reducer = fit_reducer(features, reduction, n_components, random_state=random_state)
+        clustering_features = reducer.transform(features).astype(np.float32)
+        timings['reduction'] = time.perf_counter() - started_at
+        print(f"تم تقليل الأبعاد ({reduction}): {features.shape[1]} -> {clustering_features.shape[1]} (float32)")
+
+    started_at = time.perf_counter()
+    k_values = list(k_values) if k_values else list(range(2, min(7, len(df) - 1) + 1))
+    results = run_k_sweep(clustering_features, k_values, silhouette_sample_size=silhouette_sample_size, workers=workers,
+                          random_state=random_state)
+    timings['k_sweep'] = time.perf_counter() - started_at
+
+    evaluated_k = [result['k'] for result in results]
+    elbow_k = _elbow_k(evaluated_k, [result['inertia'] for result in results])
+    best = max(results, key=lambda result: result['silhouette'])
+    chosen_k = best['k']
+    print(f"k المختار (أعلى Silhouette): {chosen_k}. نقطة الكوع: {elbow_k}")
+
+    started_at = time.perf_counter()
+    os.makedirs(models_dir, exist_ok=True)
+    kmeans_model_path = os.path.join(models_dir, 'kmeans_model.pkl')
+    ct_path = os.path.join(models_dir, 'ct_num_cat_embeddings_preprocessor.pkl')
+    joblib.dump(best['model'], kmeans_model_path)
+    joblib.dump(column_transformer, ct_path)
+    artifacts = {'kmeans_model': kmeans_model_path, 'column_transformer': ct_path}
+    reducer_path = os.path.join(models_dir, REDUCER_FILENAME)
+    if reducer is not None:
+        joblib.dump(reducer, reducer_path)
+        artifacts['reducer'] = reducer_path
+    elif os.path.exists(reducer_path):
+        # مقلل أبعاد من تدريب سابق لا يناسب النموذج الجديد، وإلا طبقه ProblemClusteringModel خطأً
+        os.remove(reducer_path)
+    bundle_dir = os.path.join(models_dir, os.path.basename(DEFAULT_CLUSTERING_BUNDLE_DIR))
+    if export_bundle:
+        plan = CompiledClusteringPlan.compile(column_transformer, best['model'],
+                                              embedding_model_name=embedding_model_name, reducer=reducer)
+        plan.source_fingerprints = source_fingerprints(kmeans_model_path, ct_path, reducer_path)
+        plan.save(bundle_dir)
+        artifacts['bundle'] = bundle_dir
+    elif os.path.exists(bundle_dir):
+        # حزمة من تدريب سابق تصف النموذج القديم؛ تُحذف مثل مقلل الأبعاد فلا تُحمّل بدل النموذج الجديد
+        shutil.rmtree(bundle_dir)
+    if labels_output_path:
+        df_with_clusters = df.copy()
+        df_with_clusters['cluster_kmeans'] = best['model'].labels_
+        df_with_clusters.to_csv(labels_output_path, index=False, encoding='utf-8-sig')
+        artifacts['labels'] = labels_output_path
+    timings['save_artifacts'] = time.perf_counter() - started_at
+
+    reduction_report = None
+    if reducer is not None:
+        reduction_report = {'method': reduction, 'n_components': int(clustering_features.shape[1])}
+        if hasattr(reducer, 'explained_variance_ratio_'):
+            reduction_report['explained_variance_ratio'] = round(float(reducer.explained_variance_ratio_.sum()), 4)
+        if compare_reduction:
+            started_at = time.perf_counter()
+            reduction_report['comparison'] = compare_reduced_clustering(
+                df, column_transformer, features, reducer, best['model'], numerical_features, categorical_features,
+                random_state=random_state)
+            timings['reduction_comparison'] = time.perf_counter() - started_at
+            print(f"مقارنة تقليل الأبعاد: {reduction_report['comparison']}")
+    timings['total'] = time.perf_counter() - total_started_at
+
+    report = {
+        'data_path': data_path,
+        'n_rows': int(len(df)),
+        'n_features': int(features.shape[1]),
+        'reduction': reduction_report,
+        'numerical_features': numerical_features,
+        'categorical_features': categorical_features,
+        'embedding_model_name': embedding_model_name,
+        'silhouette_sample_size': min(silhouette_sample_size, len(df)) if silhouette_sample_size else len(df),
+        'workers': max(1, min(workers or os.cpu_count() or 1, len(results))),
+        'chosen_k': chosen_k,
+        'elbow_k': elbow_k,
+        'candidates': [{key: value for key, value in result.items() if key != 'model'} for result in results],
+        'timings_seconds': {name: round(seconds, 3) for name, seconds in timings.items()},
+        'artifacts': artifacts,
+    }
+    report_path = report_path or os.path.join(models_dir, REPORT_FILENAME)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"تم حفظ النموذج (k={chosen_k}) وتقرير التدريب في: {report_path}")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="تدريب نموذج K-Means مع اختيار k بالتوازي.")
+    parser.add_argument('--data', default=DEFAULT_TRAINING_DATA_PATH, help="مسار processed_problems_data.csv")
+    parser.add_argument('--models-dir', default=DEFAULT_MODELS_DIR)
+    parser.add_argument('--k-min', type=int, default=2)
+    parser.add_argument('--k-max', type=int, default=7)
+    parser.add_argument('--silhouette-sample-size', type=int, default=10000,
+                        help="0 لحساب silhouette على كل البيانات")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--labels-output', default=DEFAULT_LABELS_OUTPUT_PATH)
+    parser.add_argument('--no-bundle', action='store_true', help="عدم تصدير حزمة النموذج بدون pickle")
+    parser.add_argument('--report', default=None)
+    parser.add_argument('--reduction', choices=REDUCTION_METHODS, default=None,
+                        help="تقليل أبعاد الميزات قبل K-Means (float32)")
+    parser.add_argument('--n-components', type=int, default=64)
+    parser.add_argument('--skip-reduction-comparison', action='store_true')
+    args = parser.parse_args()
+    train_clustering(args.data, args.models_dir, k_values=list(range(args.k_min, args.k_max + 1)),
+                     silhouette_sample_size=args.silhouette_sample_size or None, workers=args.workers,
+                     random_state=args.random_state, labels_output_path=args.labels_output,
+                     export_bundle=not args.no_bundle, report_path=args.report, reduction=args.reduction,
+                     n_components=args.n_components, compare_reduction=not args.skip_reduction_comparison)
@@ -0,0 +1,254 @@
+# src/models/vector_index.py
+import argparse
+import json
+import numbers
+import os
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_VECTOR_INDEX_DIR = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'models', 'problem_vector_index')
+
+VECTORS_FILENAME = 'vectors.f32'  # متجهات float32 مطبّعة، مرتبة حسب القائمة (list) لتكون كل قائمة شريحة متصلة
+IDS_FILENAME = 'ids.npy'  # problem_id لكل صف (بنفس ترتيب vectors.f32)
+CENTROIDS_FILENAME = 'centroids.npy'  # مراكز قوائم IVF
+LIST_OFFSETS_FILENAME = 'list_offsets.npy'  # بداية كل قائمة في vectors.f32 (n_lists + 1)
+META_FILENAME = 'meta.json'
+
+# أقل من هذا العدد من الصفوف يكون البحث الشامل (brute force) أسرع من IVF
+_BRUTE_FORCE_MAX_ROWS = 20000
+_SCAN_CHUNK_ROWS = 65536
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def _assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _SCAN_CHUNK_ROWS):
+        block = np.asarray(vectors[start:start + _SCAN_CHUNK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _train_spherical_kmeans(vectors: np.ndarray, n_lists: int, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign_to_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_lists)
+        empty_lists = np.flatnonzero(counts == 0)
+        if len(empty_lists):  # إعادة تهيئة القوائم الفارغة بنقاط عشوائية
+            sums[empty_lists] = vectors[rng.choice(len(vectors), size=len(empty_lists), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class ProblemVectorIndex:
+    """
+    فهرس أقرب الجيران (cosine) لتضمينات المشاكل التاريخية، مبني بـ NumPy فقط.
+
+    البنية من نوع IVF (inverted file):
+      - المتجهات مطبّعة ومخزنة كمصفوفة float32 واحدة على القرص تُقرأ عبر np.memmap.
+      - الصفوف مرتبة حسب أقرب مركز (قائمة)، فكل قائمة شريحة متصلة في الملف.
+      - عند البحث تُفحص فقط أقرب n_probe قوائم إلى الاستعلام بدلًا من كل الصفوف.
+    للفهارس الصغيرة (قائمة واحدة) يكون البحث شاملًا ودقيقًا.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray, centroids: np.ndarray,
+                 list_offsets: np.ndarray, model_name: Optional[str] = None, n_probe: int = 8):
+        self.vectors = vectors
+        self.ids = ids
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.model_name = model_name
+        self.n_probe = n_probe
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    # --- البناء والحفظ ---
+    @classmethod
+    def build(cls, embeddings: np.ndarray, ids, n_lists: Optional[int] = None, n_iter: int = 15,
+              train_sample_size: int = 100000, model_name: Optional[str] = None,
+              random_state: int = 42) -> 'ProblemVectorIndex':
+        """
+        Args:
+            embeddings (np.ndarray): تضمينات المشاكل التاريخية (n, dim).
+            ids: معرّف لكل صف (problem_id).
+            n_lists (int, optional): عدد قوائم IVF. None = قائمة واحدة للفهارس الصغيرة و sqrt(n) للكبيرة.
+            n_iter (int): عدد تكرارات K-Means الكروي لتدريب المراكز.
+            train_sample_size (int): حجم العينة المستخدمة لتدريب المراكز.
+            model_name (str, optional): اسم نموذج التضمين (للتحقق عند التحميل).
+        """
+        vectors = _normalize_rows(embeddings)
+        ids = np.asarray(ids)
+        if ids.dtype == object:
+            ids = ids.astype(str)
+        if len(ids) != len(vectors):
+            raise ValueError(f"عدد المعرفات ({len(ids)}) لا يطابق عدد التضمينات ({len(vectors)}).")
+        n_rows = len(vectors)
+        if n_lists is None:
+            n_lists = 1 if n_rows <= _BRUTE_FORCE_MAX_ROWS else int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        if n_lists == 1:
+            centroids = _normalize_rows(vectors.mean(axis=0)) if n_rows else np.zeros((1, vectors.shape[1]), np.float32)
+            assignments = np.zeros(n_rows, dtype=np.int32)
+        else:
+            rng = np.random.default_rng(random_state)
+            sample = vectors if n_rows <= train_sample_size else \
+                vectors[rng.choice(n_rows, size=train_sample_size, replace=False)]
+            centroids = _train_spherical_kmeans(sample, n_lists, n_iter, rng)
+            assignments = _assign_to_centroids(vectors, centroids)
+
+        order = np.argsort(assignments, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+        return cls(vectors[order], ids[order], centroids, list_offsets, model_name=model_name)
+
+    def save(self, index_dir: str = DEFAULT_VECTOR_INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        np.ascontiguousarray(self.vectors, dtype=np.float32).tofile(os.path.join(index_dir, VECTORS_FILENAME))
+        np.save(os.path.join(index_dir, IDS_FILENAME), self.ids, allow_pickle=False)
+        np.save(os.path.join(index_dir, CENTROIDS_FILENAME), self.centroids.astype(np.float32), allow_pickle=False)
+        np.save(os.path.join(index_dir, LIST_OFFSETS_FILENAME), self.list_offsets, allow_pickle=False)
+        meta = {'n_rows': len(self), 'dim': int(self.dim), 'n_lists': self.n_lists,
+                'dtype': 'float32', 'metric': 'cosine', 'model_name': self.model_name}
+        with open(os.path.join(index_dir, META_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        print(f"تم حفظ فهرس المتجهات ({len(self)} صف، {self.n_lists} قائمة) في: {index_dir}")
+
+    @classmethod
+    def load(cls, index_dir: str = DEFAULT_VECTOR_INDEX_DIR, n_probe: int = 8) -> 'ProblemVectorIndex':
+        """يحمل الفهرس؛ مصفوفة المتجهات تُفتح عبر np.memmap ولا تُنسخ إلى الذاكرة."""
+        with open(os.path.join(index_dir, META_FILENAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        vectors = np.memmap(os.path.join(index_dir, VECTORS_FILENAME), dtype=np.float32, mode='r',
+                            shape=(meta['n_rows'], meta['dim']))
+        ids = np.load(os.path.join(index_dir, IDS_FILENAME), allow_pickle=False)
+        centroids = np.load(os.path.join(index_dir, CENTROIDS_FILENAME), allow_pickle=False)
+        list_offsets = np.load(os.path.join(index_dir, LIST_OFFSETS_FILENAME), allow_pickle=False)
+        return cls(vectors, ids, centroids, list_offsets, model_name=meta.get('model_name'), n_probe=n_probe)
+
+    # --- البحث ---
+    def _candidate_ranges(self, query: np.ndarray, n_probe: int) -> list[tuple[int, int]]:
+        if n_probe >= self.n_lists:
+            return [(0, len(self))]
+        probe_lists = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        return [(int(self.list_offsets[i]), int(self.list_offsets[i + 1])) for i in np.sort(probe_lists)
+                if self.list_offsets[i + 1] > self.list_offsets[i]]
+
+    def _search_one(self, query: np.ndarray, k: int, n_probe: int, exclude_ids) -> tuple[np.ndarray, np.ndarray]:
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for range_start, range_end in self._candidate_ranges(query, n_probe):
+            for start in range(range_start, range_end, _SCAN_CHUNK_ROWS):
+                end = min(start + _SCAN_CHUNK_ROWS, range_end)
+                scores = np.asarray(self.vectors[start:end]) @ query
+                if exclude_ids is not None:
+                    scores[np.isin(self.ids[start:end], exclude_ids)] = -np.inf
+                rows = np.arange(start, end)
+                if len(scores) > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    rows, scores = rows[top], scores[top]
+                best_rows = np.concatenate([best_rows, rows])
+                best_scores = np.concatenate([best_scores, scores])
+                if len(best_scores) > k:
+                    top = np.argpartition(-best_scores, k - 1)[:k]
+                    best_rows, best_scores = best_rows[top], best_scores[top]
+        keep = np.isfinite(best_scores)
+        best_rows, best_scores = best_rows[keep], best_scores[keep]
+        order = np.argsort(-best_scores, kind='stable')
+        return self.ids[best_rows[order]], best_scores[order]
+
+    def _comparable_ids(self, ids) -> Optional[np.ndarray]:
+        """
+        المعرفات التي تساوي معرفات الفهرس بمقارنة == كما في GroupRecommendationIndex، دون تحويل النوع:
+        '12' لا يطابق المشكلة 12، فيتفق البحث والفهرس المقلوب على المشكلة المستبعدة.
+        """
+        ids = [ids] if np.isscalar(ids) else list(ids)
+        id_type = numbers.Number if self.ids.dtype.kind in 'iuf' else str
+        ids = [value for value in ids if isinstance(value, id_type)]
+        return np.asarray(ids) if ids else None
+
+    def search(self, query_embeddings: np.ndarray, k: int = 10, n_probe: Optional[int] = None,
+               exclude_ids=None) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        يعيد لكل استعلام أقرب k مشاكل تاريخية بتشابه cosine.
+
+        Args:
+            query_embeddings (np.ndarray): تضمين واحد (dim,) أو عدة تضمينات (m, dim).
+            k (int): عدد الجيران.
+            n_probe (int, optional): عدد قوائم IVF المفحوصة (أكبر = أدق وأبطأ). None = قيمة الفهرس.
+            exclude_ids: معرفات تُستبعد من النتائج (مثل problem_id للمشكلة الحالية).
+
+        Returns:
+            list[tuple[np.ndarray, np.ndarray]]: لكل استعلام (المعرفات، درجات التشابه) مرتبة تنازليًا.
+        """
+        queries = _normalize_rows(query_embeddings)
+        if len(self) == 0 or k <= 0:
+            return [(self.ids[:0], np.empty(0, dtype=np.float32)) for _ in queries]
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"أبعاد الاستعلام ({queries.shape[1]}) لا تطابق أبعاد الفهرس ({self.dim}).")
+        n_probe = self.n_probe if n_probe is None else n_probe
+        if exclude_ids is not None:
+            exclude_ids = self._comparable_ids(exclude_ids)
+        return [self._search_one(query, k, max(1, n_probe), exclude_ids) for query in queries]
+
+
+def build_problem_vector_index(historical_data_path: Optional[str] = None, index_dir: str = DEFAULT_VECTOR_INDEX_DIR,
+                               text_column: str = 'processed_text', id_column: str = 'problem_id',
+                               n_lists: Optional[int] = None, batch_size: int = 64) -> ProblemVectorIndex:
+    """
+    يبني الفهرس من ملف النتائج التاريخية: يضمّن عمود النص النظيف (نفس نص التجميع الذي
+    يُضمّن للمشكلة الجديدة في ProblemAnalyzer) عبر خدمة التضمين المشتركة ثم يحفظه.
+    الملف يكرر كل مشكلة مرة لكل صف مدمج، فيُفهرس الصف الأول فقط لكل problem_id (كما يقرأ RecommendationEngine
+    صفوف الجيران)، وإلا أعاد البحث نفس المشكلة عدة مرات ضمن أقرب k.
+    """
+    import pandas as pd
+    try:
+        from src.models.embedding_service import get_embedding_service
+    except ImportError:
+        import sys
+        if DEFAULT_PROJECT_ROOT not in sys.path:
+            sys.path.insert(0, DEFAULT_PROJECT_ROOT)
+        from src.models.embedding_service import get_embedding_service
+
+    if historical_data_path is None:
+        historical_data_path = os.path.join(DEFAULT_PROJECT_ROOT, 'data', 'processed', 'final_results_with_models.csv')
+    df = pd.read_csv(historical_data_path, usecols=[id_column, text_column])
+    df = df.drop_duplicates(id_column, keep='first')
+    texts = df[text_column].fillna('').astype(str).tolist()
+    service = get_embedding_service()
+    print(f"تضمين {len(texts)} مشكلة تاريخية لبناء فهرس المتجهات...")
+    embeddings = service.encode(texts, batch_size=batch_size)
+    if embeddings.size == 0:
+        raise RuntimeError("تعذر إنشاء تضمينات المشاكل التاريخية.")
+    index = ProblemVectorIndex.build(embeddings, df[id_column].to_numpy(), n_lists=n_lists,
+                                     model_name=service.model_name)
+    index.save(index_dir)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="بناء فهرس أقرب الجيران لتضمينات المشاكل التاريخية.")
+    parser.add_argument('--data', default=None, help="مسار final_results_with_models.csv")
+    parser.add_argument('--output-dir', default=DEFAULT_VECTOR_INDEX_DIR)
+    parser.add_argument('--n-lists', type=int, default=None)
+    args = parser.parse_args()
+    build_problem_vector_index(args.data, args.output_dir, n_lists=args.n_lists)
@@ -0,0 +1,297 @@
+# src/serving/inference_service.py
+"""
+خدمة HTTP (JSON) للاستدلال فوق ProblemAnalyzer و RecommendationEngine محملين مسبقًا، بمكتبة Python
+القياسية فقط (http.server) دون أي اعتماديات إضافية.
+
+    python src/serving/inference_service.py --port 8000 --workers 4
+
+نقاط النهاية:
+    GET  /health          جاهزية المكونات (readiness).
+    GET  /stats           عدد الطلبات والأخطاء وملخص أزمنة المقاطع (p50/p95/p99).
+    POST /analyze         {"problem": {...}, "include_recommendations": false}
+    POST /analyze_batch   {"problems": [{...}, ...], "include_recommendations": false}
+    POST /recommend       {"problem": {...}} أو {"analysis": {...نتيجة /analyze...}}، مع "top_n" اختياري.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from config.model_config import MODEL_CONFIG
+    from src.utils.process_memory import read_process_memory
+    from src.utils.tracing import get_latency_summary, span
+except ImportError:
+    import sys
+
+    project_root_service = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_service not in sys.path:
+        sys.path.insert(0, project_root_service)
+    from config.model_config import MODEL_CONFIG
+    from src.utils.process_memory import read_process_memory
+    from src.utils.tracing import get_latency_summary, span
+
+SERVING_CONFIG = MODEL_CONFIG.get('serving', {})
+# أقصى حجم لجسم الطلب بالبايت (حماية من الطلبات الضخمة)
+MAX_REQUEST_BYTES = 10 * 1024 * 1024
+
+
+def to_jsonable(value):
+    """يحول نتائج التحليل إلى قيم JSON: المصفوفات إلى قوائم، وقيم NumPy إلى Python، و NaN/NaT إلى null."""
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return to_jsonable(value.tolist())
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return None if pd.isna(value) else value.isoformat()
+    if value is not None and not isinstance(value, (str, int, float, bool)):
+        return None if pd.isna(value) else str(value)
+    return value
+
+
+class InferenceService:
+    """
+    منطق نقاط النهاية مستقلًا عن HTTP: يتحقق من المدخلات، يستدعي المحلل ومحرك التوصيات المحملين مرة
+    واحدة، ويعيد قواميس قابلة للتحويل إلى JSON. المدخلات غير الصالحة ترفع ValueError (استجابة 400).
+    """
+
+    def __init__(self, analyzer, recommender=None, top_n: int = 3, max_batch_size: int = 256):
+        """
+        Args:
+            analyzer: ProblemAnalyzer محمل (أو أي كائن بنفس analyze_new_problem/analyze_many).
+            recommender: RecommendationEngine محمل. None لتعطيل التوصيات.
+            top_n (int): عدد التوصيات الافتراضي لكل فئة.
+            max_batch_size (int): أقصى عدد مشاكل في طلب /analyze_batch واحد.
+        """
+        self.analyzer = analyzer
+        self.recommender = recommender
+        self.top_n = top_n
+        self.max_batch_size = max_batch_size
+        self.started_at = time.time()
+        self._counts_lock = threading.Lock()
+        self.request_counts: dict[str, int] = {}
+        self.error_counts: dict[str, int] = {}
+
+    def count_request(self, path: str, failed: bool = False):
+        with self._counts_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+            if failed:
+                self.error_counts[path] = self.error_counts.get(path, 0) + 1
+
+    @staticmethod
+    def _problem_from_payload(payload: dict, key: str = 'problem') -> dict:
+        problem = payload.get(key)
+        if not isinstance(problem, dict) or not problem:
+            raise ValueError(f"الحقل '{key}' يجب أن يكون كائن JSON غير فارغ ببيانات المشكلة.")
+        return problem
+
+    def _top_n(self, payload: dict) -> int:
+        top_n = payload.get('top_n', self.top_n)
+        if not isinstance(top_n, int) or isinstance(top_n, bool) or top_n < 1:
+            raise ValueError("الحقل 'top_n' يجب أن يكون عددًا صحيحًا موجبًا.")
+        return top_n
+
+    def _recommend(self, analysis_results: dict, top_n: int) -> dict:
+        if self.recommender is None:
+            raise ValueError("محرك التوصيات غير محمل في هذه الخدمة.")
+        return self.recommender.get_recommendations(analysis_results, top_n=top_n)
+
+    def analyze(self, payload: dict) -> dict:
+        problem = self._problem_from_payload(payload)
+        analysis_results = self.analyzer.analyze_new_problem(problem)
+        response = {'analysis': analysis_results}
+        if payload.get('include_recommendations'):
+            response['recommendations'] = self._recommend(analysis_results, self._top_n(payload))
+        return to_jsonable(response)
+
+    def analyze_batch(self, payload: dict) -> dict:
+        problems = payload.get('problems')
+        if not isinstance(problems, list) or not problems:
+            raise ValueError("الحقل 'problems' يجب أن يكون قائمة غير فارغة.")
+        if len(problems) > self.max_batch_size:
+            raise ValueError(f"عدد المشاكل ({len(problems)}) يتجاوز الحد الأقصى للدفعة ({self.max_batch_size}).")
+        analyses = self.analyzer.analyze_many(problems)
+        response = {'analyses': analyses}
+        if payload.get('include_recommendations'):
+            top_n = self._top_n(payload)
+            response['recommendations'] = [self._recommend(analysis_results, top_n) for analysis_results in analyses]
+        return to_jsonable(response)
+
+    def recommend(self, payload: dict) -> dict:
+        top_n = self._top_n(payload)
+        if 'analysis' in payload:
+            analysis_results = dict(self._problem_from_payload(payload, 'analysis'))
+            # التضمين يصل كقائمة JSON؛ فهرس المتجهات يتوقع مصفوفة
+            if analysis_results.get('problem_embedding') is not None:
+                analysis_results['problem_embedding'] = np.asarray(analysis_results['problem_embedding'],
+                                                                   dtype=np.float32)
+        else:
+            analysis_results = self.analyzer.analyze_new_problem(self._problem_from_payload(payload))
+        return to_jsonable({'recommendations': self._recommend(analysis_results, top_n)})
+
+    def health(self) -> dict:
+        readiness = self.analyzer.readiness() if hasattr(self.analyzer, 'readiness') else {}
+        return to_jsonable({'status': 'ok', 'recommender_loaded': self.recommender is not None,
+                            'readiness': readiness})
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            counts = {'requests': dict(self.request_counts), 'errors': dict(self.error_counts)}
+        try:
+            memory = read_process_memory()
+        except (OSError, ValueError, IndexError):  # /proc غير متاح (غير Linux)
+            memory = None
+        return to_jsonable({'pid': os.getpid(), 'uptime_seconds': round(time.time() - self.started_at, 3),
+                            **counts, 'memory': memory, 'latency': get_latency_summary()})
+
+    def routes(self) -> dict:
+        return {('GET', '/health'): self.health, ('GET', '/stats'): self.stats,
+                ('POST', '/analyze'): self.analyze, ('POST', '/analyze_batch'): self.analyze_batch,
+                ('POST', '/recommend'): self.recommend}
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'ProblemAdvisorInference/1.0'
+
+    def log_message(self, format, *args):
+        # سجل كل طلب على stderr يبطئ الخدمة تحت الحمل؛ الإحصاءات متاحة عبر /stats
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        encoded = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _read_json_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError(f"حجم الطلب ({length} بايت) يتجاوز الحد الأقصى ({MAX_REQUEST_BYTES}).")
+        try:
+            payload = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"جسم الطلب ليس JSON صالحًا: {e}")
+        if not isinstance(payload, dict):
+            raise ValueError("جسم الطلب يجب أن يكون كائن JSON.")
+        return payload
+
+    def _dispatch(self, method: str):
+        service: InferenceService = self.server.service
+        path = self.path.split('?', 1)[0].rstrip('/') or '/'
+        handler = service.routes().get((method, path))
+        if handler is None:
+            service.count_request(path, failed=True)
+            self._send_json(404, {'error': f"نقطة النهاية غير موجودة: {method} {path}"})
+            return
+        try:
+            with span(f"http.{path.strip('/')}"):
+                body = handler(self._read_json_body()) if method == 'POST' else handler()
+        except ValueError as e:
+            service.count_request(path, failed=True)
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            service.count_request(path, failed=True)
+            print(f"خطأ غير متوقع أثناء معالجة {method} {path}: {e}")
+            self._send_json(500, {'error': f"خطأ داخلي: {e}"})
+            return
+        service.count_request(path)
+        self._send_json(200, body)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+class InferenceHTTPServer(ThreadingHTTPServer):
+    """
+    خادم HTTP بعدد ثابت من خيوط العمل (workers): الطلبات الزائدة تنتظر في طابور المجمع بدلًا من إنشاء
+    خيط لكل اتصال، فلا يتزاحم أكثر من workers طلب على النماذج في الوقت نفسه.
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address, service: InferenceService, workers: int = 4,
+                 bind_and_activate: bool = True):
+        self.service = service
+        self.workers = max(1, workers)
+        # يُنشأ المجمع عند أول طلب في العملية التي تخدم فعلًا (في وضع pre-fork: كل عامل بعد fork)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        super().__init__(server_address, InferenceRequestHandler, bind_and_activate=bind_and_activate)
+
+    def process_request(self, request, client_address):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference-worker')
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def create_server(service: InferenceService, host: Optional[str] = None, port: Optional[int] = None,
+                  workers: Optional[int] = None) -> InferenceHTTPServer:
+    """ينشئ الخادم (port=0 يختار منفذًا حرًا، مفيد للاختبارات). القيم None تؤخذ من MODEL_CONFIG['serving']."""
+    host = SERVING_CONFIG.get('host', '127.0.0.1') if host is None else host
+    port = SERVING_CONFIG.get('port', 8000) if port is None else port
+    workers = SERVING_CONFIG.get('workers', 4) if workers is None else workers
+    return InferenceHTTPServer((host, port), service, workers=workers)
+
+
+def load_service(loading_mode: str = 'eager', top_n: Optional[int] = None) -> InferenceService:
+    """يحمل ProblemAnalyzer و RecommendationEngine مرة واحدة ويعيد الخدمة جاهزة للطلبات."""
+    from src.analysis.problem_analyzer import ProblemAnalyzer
+    from src.analysis.recommendation_engine import RecommendationEngine
+
+    analyzer = ProblemAnalyzer(loading_mode=loading_mode)
+    recommender = RecommendationEngine()
+    if recommender.historical_data is None:
+        print("تحذير: لم يتم تحميل البيانات التاريخية؛ /recommend سيعيد تحذيرات فقط.")
+    return InferenceService(analyzer, recommender,
+                            top_n=SERVING_CONFIG.get('top_n', 3) if top_n is None else top_n,
+                            max_batch_size=SERVING_CONFIG.get('max_batch_size', 256))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="خدمة HTTP (JSON) لتحليل المشاكل والتوصيات.")
+    parser.add_argument('--host', default=SERVING_CONFIG.get('host', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=SERVING_CONFIG.get('port', 8000))
+    parser.add_argument('--workers', type=int, default=SERVING_CONFIG.get('workers', 4),
+                        help="عدد خيوط معالجة الطلبات المتزامنة.")
+    parser.add_argument('--loading-mode', default='eager', choices=['eager', 'background', 'lazy'])
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+    inference_service = load_service(loading_mode=args.loading_mode)
+    http_server = create_server(inference_service, host=args.host, port=args.port, workers=args.workers)
+    print(f"خدمة الاستدلال تعمل على {http_server.url} ({http_server.workers} عامل). Ctrl+C للإيقاف.")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nإيقاف خدمة الاستدلال...")
+    finally:
+        http_server.server_close()
@@ -0,0 +1,167 @@
+# src/serving/load_generator.py
+"""
+مولد حمل لخدمة الاستدلال (src/serving/inference_service.py): يرسل طلبات متزامنة من عدة خيوط ويقيس
+الإنتاجية (طلب/ثانية) ومئينات زمن الاستجابة.
+
+    python src/serving/load_generator.py --url http://127.0.0.1:8000 --endpoint /analyze \
+        --concurrency 8 --requests 500 --data data/processed/final_results_with_models.csv
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+# حقول المشكلة المرسلة عند القراءة من ملف CSV
+PROBLEM_FIELDS = ['problem_id', 'title', 'description_initial', 'refined_problem_statement_final', 'domain',
+                  'complexity_level', 'status', 'problem_source', 'sentiment_label', 'estimated_cost',
+                  'overall_budget', 'estimated_time_to_implement']
+
+SAMPLE_PROBLEMS = [
+    {'title': 'الشبكة بطيئة جدا في قسم المحاسبة',
+     'description_initial': 'يشتكي الموظفون في قسم المحاسبة من بطء شديد في الوصول إلى الملفات.',
+     'domain': 'تقني', 'complexity_level': 'متوسط', 'estimated_cost': '5000 دولار',
+     'estimated_time_to_implement': 'حوالي 3 اسابيع'},
+    {'title': 'طابعة لا تطبع', 'description_initial': 'الطابعة لا تستجيب لأوامر الطباعة إطلاقا.',
+     'domain': 'تقني', 'complexity_level': 'بسيط'},
+    {'title': 'تأخر تسليم الطلبات للعملاء', 'description_initial': 'تتأخر الشحنات عن موعدها بعدة أيام.',
+     'domain': 'إداري', 'complexity_level': 'معقد', 'overall_budget': '20000'},
+]
+
+
+def load_problems_from_csv(path: str, limit: Optional[int] = None) -> list[dict]:
+    """يقرأ مشاكل من ملف CSV (الحقول المعروفة فقط، والقيم المفقودة تُحذف)."""
+    df = pd.read_csv(path, nrows=limit)
+    columns = [col for col in PROBLEM_FIELDS if col in df.columns]
+    return [{key: value for key, value in row.items() if pd.notna(value)}
+            for row in df[columns].astype(object).to_dict(orient='records')]
+
+
+def build_payload(endpoint: str, problems: list[dict], position: int, batch_size: int = 16) -> dict:
+    """جسم الطلب لنقطة النهاية: مشكلة واحدة لـ /analyze و /recommend، ودفعة لـ /analyze_batch."""
+    if endpoint == '/analyze_batch':
+        start = (position * batch_size) % len(problems)
+        return {'problems': [problems[(start + i) % len(problems)] for i in range(batch_size)]}
+    return {'problem': problems[position % len(problems)]}
+
+
+def latency_summary(latencies_seconds: list[float]) -> dict:
+    """مئينات زمن الاستجابة (بالمللي ثانية) من العينات الفعلية."""
+    if not latencies_seconds:
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    latencies_ms = np.asarray(latencies_seconds) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {'mean_ms': round(float(latencies_ms.mean()), 3), 'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(latencies_ms.max()), 3)}
+
+
+def run_load_test(url: str, endpoint: str = '/analyze', problems: Optional[list[dict]] = None,
+                  concurrency: int = 4, n_requests: int = 200, duration_seconds: Optional[float] = None,
+                  batch_size: int = 16, timeout_seconds: float = 60.0, warm_up_requests: int = 1) -> dict:
+    """
+    يشغل اختبار الحمل على خدمة محلية.
+
+    Args:
+        url (str): عنوان الخدمة، مثل http://127.0.0.1:8000.
+        endpoint (str): '/analyze' أو '/analyze_batch' أو '/recommend'.
+        problems (list[dict], optional): المشاكل المرسلة بالتناوب. None = SAMPLE_PROBLEMS.
+        concurrency (int): عدد الخيوط المرسلة بالتوازي (كل خيط ينتظر استجابته قبل الطلب التالي).
+        n_requests (int): إجمالي عدد الطلبات (يُتجاهل إذا حُددت duration_seconds).
+        duration_seconds (float, optional): مدة الاختبار بالثواني بدلًا من عدد ثابت من الطلبات.
+        batch_size (int): عدد المشاكل في كل طلب /analyze_batch.
+        warm_up_requests (int): طلبات تمهيدية لا تدخل في القياس (تحميل كسول، ذاكرة مؤقتة باردة).
+
+    Returns:
+        dict: عدد الطلبات والأخطاء، المدة، الإنتاجية (طلب/ثانية ومشكلة/ثانية)، ومئينات زمن الاستجابة.
+    """
+    problems = problems or SAMPLE_PROBLEMS
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    positions = itertools.count()
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def send(payload: dict) -> tuple[int, bytes]:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        connection = http.client.HTTPConnection(host, port, timeout=timeout_seconds)
+        try:
+            connection.request('POST', endpoint, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    for position in range(warm_up_requests):
+        send(build_payload(endpoint, problems, position, batch_size))
+
+    deadline = None if duration_seconds is None else time.perf_counter() + duration_seconds
+
+    def worker():
+        while True:
+            position = next(positions)
+            if deadline is None and position >= n_requests:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            payload = build_payload(endpoint, problems, position, batch_size)
+            request_started_at = time.perf_counter()
+            try:
+                status, response_body = send(payload)
+                error = None if status == 200 else f"HTTP {status}: {response_body[:200].decode('utf-8', 'replace')}"
+            except (OSError, http.client.HTTPException) as e:
+                error = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - request_started_at
+            with lock:
+                if error is None:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(error)
+
+    started_at = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f'load-generator-{i}', daemon=True)
+               for i in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total_seconds = time.perf_counter() - started_at
+
+    problems_per_request = batch_size if endpoint == '/analyze_batch' else 1
+    return {'endpoint': endpoint, 'concurrency': concurrency, 'requests': len(latencies) + len(errors),
+            'errors': len(errors), 'error_samples': errors[:5], 'seconds': round(total_seconds, 3),
+            'requests_per_second': round(len(latencies) / total_seconds, 2) if total_seconds else 0.0,
+            'problems_per_second': round(len(latencies) * problems_per_request / total_seconds, 2)
+            if total_seconds else 0.0,
+            'latency': latency_summary(latencies)}
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="اختبار حمل لخدمة الاستدلال (إنتاجية ومئينات زمن الاستجابة).")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--endpoint', default='/analyze', choices=['/analyze', '/analyze_batch', '/recommend'])
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=None, help="مدة الاختبار بالثواني (بدلًا من --requests).")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--data', default=None, help="ملف CSV للمشاكل المرسلة (افتراضيًا مشاكل تجريبية مدمجة).")
+    parser.add_argument('--limit', type=int, default=1000, help="أقصى عدد مشاكل تُقرأ من --data.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+    if args.data and not os.path.exists(args.data):
+        raise SystemExit(f"ملف البيانات '{args.data}' غير موجود.")
+    sample_problems = load_problems_from_csv(args.data, args.limit) if args.data else None
+    report = run_load_test(args.url, endpoint=args.endpoint, problems=sample_problems,
+                           concurrency=args.concurrency, n_requests=args.requests,
+                           duration_seconds=args.duration, batch_size=args.batch_size)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
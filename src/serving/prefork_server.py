@@ -0,0 +1,234 @@
+# src/serving/prefork_server.py
+"""
+وضع خدمة pre-fork (Linux/Unix): العملية الأم تحمل ProblemAnalyzer و RecommendationEngine مرة واحدة، تجمّد
+الكائنات المحملة (gc.freeze) ثم تنشئ العمال بـ fork، فتتشارك كل العمليات صفحات أوزان MiniLM وكائن BERTopic
+وبيانات الملفات التعريفية (copy-on-write) بدلًا من نسخة مستقلة لكل عامل.
+
+    python src/serving/prefork_server.py --processes 4 --threads 4 --memory-report-after 30
+    kill -USR1 <pid الأم>   # طباعة تقرير الذاكرة: الذاكرة الخاصة (unique) مقابل المشتركة (shared) لكل عامل
+
+gc.freeze ينقل كل الكائنات الموجودة إلى جيل دائم لا يفحصه جامع القمامة، فلا يكتب الجامع في ترويسات
+الكائنات الموروثة ولا تُنسخ صفحاتها في كل عامل. (عدادات المراجع نفسها تبقى تكتب في الكائنات التي تُستخدم
+فعلًا؛ المصفوفات الكبيرة تبقى مشتركة لأن بياناتها في ذاكرة منفصلة عن ترويسة الكائن.)
+"""
+import argparse
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Optional
+
+try:
+    from config.model_config import MODEL_CONFIG
+    from src.models.embedding_service import loaded_embedding_services
+    from src.serving.inference_service import InferenceService, create_server, load_service
+    from src.utils.process_memory import memory_report
+except ImportError:
+    project_root_prefork = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    if project_root_prefork not in sys.path:
+        sys.path.insert(0, project_root_prefork)
+    from config.model_config import MODEL_CONFIG
+    from src.models.embedding_service import loaded_embedding_services
+    from src.serving.inference_service import InferenceService, create_server, load_service
+    from src.utils.process_memory import memory_report
+
+SERVING_CONFIG = MODEL_CONFIG.get('serving', {})
+# عامل ينتهي خلال هذه المدة من إنشائه يُعتبر فاشلًا عند البدء، ويُنتظر قبل إعادة إنشائه
+_MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+
+def freeze_heap() -> int:
+    """يجمع القمامة ثم يجمد كل الكائنات الحالية (gc.freeze). يعيد عدد الكائنات المجمدة."""
+    gc.collect()
+    gc.freeze()
+    return gc.get_freeze_count()
+
+
+def _prepare_embedding_services_for_fork() -> list[tuple]:
+    """
+    يوقف خيوط تجميع طلبات التضمين قبل fork (الخيوط لا تنتقل إلى العملية الابنة). يعيد إعدادات
+    التجميع لكل خدمة ليعاد تفعيلها داخل كل عامل.
+    """
+    batching = []
+    for embedding_service in loaded_embedding_services():
+        batcher = embedding_service.batcher
+        if batcher is not None:
+            batching.append((embedding_service, batcher.max_batch_size, batcher.max_wait_ms))
+            embedding_service.disable_micro_batching()
+    return batching
+
+
+def _set_up_worker_process(embedding_batching: list[tuple], n_processes: int):
+    """تهيئة العامل بعد fork: قراءة فقط من مخزن التضمينات، خيوط torch مقسمة، وإعادة تفعيل التجميع."""
+    for embedding_service in loaded_embedding_services():
+        if embedding_service.cache is not None:
+            # عملية كاتبة واحدة لكل مجلد تخزين (انظر EmbeddingCache)؛ العمال يقرؤون القرص ويكتبون في الذاكرة
+            embedding_service.cache.disk_writes_enabled = False
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, n_processes)))
+    for embedding_service, max_batch_size, max_wait_ms in embedding_batching:
+        embedding_service.enable_micro_batching(max_batch_size, max_wait_ms)
+
+
+class PreforkServer:
+    """
+    خادم HTTP الاستدلال (InferenceHTTPServer) مع عدة عمليات عمال تتشارك مقبس الاستماع والنماذج المحملة.
+    كل عامل يعالج الطلبات بمجمع خيوط خاص به (threads_per_process).
+    """
+
+    def __init__(self, service: InferenceService, host: Optional[str] = None, port: Optional[int] = None,
+                 processes: Optional[int] = None, threads_per_process: Optional[int] = None):
+        """
+        Args:
+            service (InferenceService): الخدمة بنماذج محملة مسبقًا (loading_mode='eager').
+            processes (int, optional): عدد عمليات العمال. None = MODEL_CONFIG['serving']['processes'].
+            threads_per_process (int, optional): خيوط معالجة الطلبات في كل عامل.
+                None = MODEL_CONFIG['serving']['workers'].
+        """
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("وضع pre-fork يتطلب os.fork (Linux/Unix).")
+        self.processes = max(1, SERVING_CONFIG.get('processes', 2) if processes is None else processes)
+        self.server = create_server(service, host=host, port=port, workers=threads_per_process)
+        # كل العمال ينتظرون على نفس المقبس؛ غير الحاجب حتى لا يعلق عامل في accept إذا سبقه عامل آخر للاتصال
+        self.server.socket.setblocking(False)
+        self.worker_pids: dict[int, int] = {}  # رقم الخانة -> pid
+        self._worker_started_at: dict[int, float] = {}
+        self._embedding_batching: list[tuple] = []
+        self._stopping = False
+        self.frozen_objects = 0
+
+    @property
+    def url(self) -> str:
+        return self.server.url
+
+    def start(self):
+        """يجمد الكائنات المحملة وينشئ العمال. يعود فورًا (الإشراف على العمال في supervise)."""
+        self._embedding_batching = _prepare_embedding_services_for_fork()
+        self.frozen_objects = freeze_heap()
+        print(f"تم تجميد {self.frozen_objects} كائن قبل إنشاء {self.processes} عامل.")
+        for slot in range(self.processes):
+            self._spawn_worker(slot)
+
+    def _spawn_worker(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self._run_worker()
+            except BaseException as e:
+                exit_code = 1
+                if not isinstance(e, (KeyboardInterrupt, SystemExit)):
+                    print(f"خطأ في عامل الخدمة {os.getpid()}: {e}")
+            finally:
+                os._exit(exit_code)  # لا يعود العامل أبدًا إلى شيفرة العملية الأم
+        self.worker_pids[slot] = pid
+        self._worker_started_at[slot] = time.monotonic()
+
+    def _run_worker(self):
+        # Ctrl+C يصل لكل مجموعة العمليات؛ الأم وحدها توقف العمال بـ SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=self.server.shutdown,
+                                                                              daemon=True).start())
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)  # تقرير الذاكرة تطبعه الأم
+        _set_up_worker_process(self._embedding_batching, self.processes)
+        self.server.serve_forever(poll_interval=0.5)
+
+    def supervise(self):
+        """ينتظر العمال ويعيد إنشاء أي عامل ينتهي بشكل غير متوقع، حتى استدعاء stop()."""
+        while self.worker_pids and not self._stopping:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            slot = next((slot for slot, worker_pid in self.worker_pids.items() if worker_pid == pid), None)
+            if slot is None or self._stopping:
+                continue
+            lifetime = time.monotonic() - self._worker_started_at[slot]
+            print(f"انتهى العامل {pid} (الحالة {os.waitstatus_to_exitcode(status)}) بعد {lifetime:.1f} ثانية؛ "
+                  f"إعادة إنشائه.")
+            if lifetime < _MIN_WORKER_LIFETIME_SECONDS:
+                time.sleep(_MIN_WORKER_LIFETIME_SECONDS)
+            self._spawn_worker(slot)
+
+    def stop(self, timeout_seconds: float = 10.0):
+        """يوقف العمال (SIGTERM ثم SIGKILL بعد المهلة) ويغلق المقبس ويلغي تجميد الكائنات."""
+        self._stopping = True
+        for pid in self.worker_pids.values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout_seconds
+        for pid in list(self.worker_pids.values()):
+            while True:
+                try:
+                    finished_pid, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if finished_pid == pid:
+                    break
+                if time.monotonic() >= deadline:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                    break
+                time.sleep(0.05)
+        self.worker_pids.clear()
+        self.server.server_close()
+        gc.unfreeze()
+
+    def memory_report(self) -> dict:
+        """ذاكرة الأم وكل عامل: الخاصة (unique) مقابل المشتركة (shared)، مع مجموع RSS مقابل مجموع PSS."""
+        pids = {'parent': os.getpid(), **{f"worker-{slot}": pid for slot, pid in sorted(self.worker_pids.items())}}
+        report = memory_report(pids)
+        report['frozen_objects'] = self.frozen_objects
+        return report
+
+
+def format_memory_report(report: dict) -> str:
+    lines = [f"{'العملية':<10} {'pid':>8} {'RSS':>10} {'unique':>10} {'shared':>10} {'PSS':>10}  (MB)"]
+    for name, memory in report['processes'].items():
+        if 'error' in memory:
+            lines.append(f"{name:<10} {memory['pid']:>8}  {memory['error']}")
+        else:
+            lines.append(f"{name:<10} {memory['pid']:>8} {memory['rss_mb']:>10.1f} {memory['unique_mb']:>10.1f} "
+                         f"{memory['shared_mb']:>10.1f} {memory['pss_mb']:>10.1f}")
+    totals = report['totals']
+    lines.append(f"مجموع RSS (تكلفة عمليات مستقلة تقريبًا): {totals['sum_rss_mb']:.1f} MB؛ "
+                 f"مجموع PSS (الفعلي): {totals['sum_pss_mb']:.1f} MB؛ "
+                 f"وفر المشاركة: {totals['saved_by_sharing_mb']:.1f} MB.")
+    return "\n".join(lines)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="خدمة الاستدلال بعمال pre-fork يتشاركون النماذج المحملة.")
+    parser.add_argument('--host', default=SERVING_CONFIG.get('host', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=SERVING_CONFIG.get('port', 8000))
+    parser.add_argument('--processes', type=int, default=SERVING_CONFIG.get('processes', 2))
+    parser.add_argument('--threads', type=int, default=SERVING_CONFIG.get('workers', 4),
+                        help="خيوط معالجة الطلبات في كل عامل.")
+    parser.add_argument('--memory-report-after', type=float, default=None,
+                        help="طباعة تقرير الذاكرة بعد هذا العدد من الثواني.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+    prefork_server = PreforkServer(load_service(loading_mode='eager'), host=args.host, port=args.port,
+                                   processes=args.processes, threads_per_process=args.threads)
+    prefork_server.start()
+    print(f"خدمة الاستدلال (pre-fork) تعمل على {prefork_server.url}: {prefork_server.processes} عامل × "
+          f"{prefork_server.server.workers} خيط. الأم {os.getpid()}؛ kill -USR1 لتقرير الذاكرة.")
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print(format_memory_report(prefork_server.memory_report())))
+    signal.signal(signal.SIGTERM, lambda signum, frame: prefork_server.stop())
+    if args.memory_report_after:
+        threading.Timer(args.memory_report_after,
+                        lambda: print(format_memory_report(prefork_server.memory_report()))).start()
+    try:
+        prefork_server.supervise()
+    except KeyboardInterrupt:
+        print("\nإيقاف خدمة الاستدلال...")
+    finally:
+        prefork_server.stop()
@@ -0,0 +1,107 @@
+# src/utils/branch_executor.py
+import contextvars
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+# حالات تنفيذ الفرع
+BRANCH_OK = 'ok'
+BRANCH_ERROR = 'error'
+BRANCH_TIMEOUT = 'timeout'
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+_TORCH_THREADS_TUNED = False
+
+
+def _reset_after_fork():
+    # خيوط المجمع لا تنتقل إلى العملية الابنة بعد fork (خادم pre-fork): تُنشأ من جديد عند أول طلب
+    global _EXECUTOR, _EXECUTOR_LOCK, _TORCH_THREADS_TUNED
+    _EXECUTOR = None
+    _EXECUTOR_LOCK = threading.Lock()
+    _TORCH_THREADS_TUNED = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_branch_executor(max_workers: Optional[int] = None) -> ThreadPoolExecutor:
+    """
+    يعيد مجمع الخيوط المشترك لفروع التحليل (ينشئه عند أول طلب فقط؛ max_workers يؤخذ بعين الاعتبار حينها).
+    الفروع تقضي معظم وقتها في شيفرة أصلية (torch، NumPy) تحرر GIL، فالخيوط كافية دون عمليات منفصلة.
+    """
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        return _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max_workers or min(8, (os.cpu_count() or 1) + 2),
+                                           thread_name_prefix='analysis-branch')
+    return _EXECUTOR
+
+
+def tune_torch_threads(n_concurrent_branches: int = 2) -> Optional[int]:
+    """
+    يقسم أنوية المعالج على الفروع المتزامنة بتقليل خيوط torch الداخلية (intra-op)، حتى لا يطلب كل فرع
+    كل الأنوية فيتزاحمان. يُطبق مرة واحدة في العملية، وفقط إذا كان torch محملًا أصلًا (لا نستورده هنا).
+
+    Returns:
+        int | None: عدد خيوط torch بعد الضبط، أو None إذا لم يكن torch محملًا.
+    """
+    global _TORCH_THREADS_TUNED
+    torch = sys.modules.get('torch')
+    if torch is None:
+        return None
+    if _TORCH_THREADS_TUNED:
+        return torch.get_num_threads()
+    with _EXECUTOR_LOCK:
+        if not _TORCH_THREADS_TUNED:
+            threads_per_branch = max(1, (os.cpu_count() or 1) // max(1, n_concurrent_branches))
+            if torch.get_num_threads() > threads_per_branch:
+                torch.set_num_threads(threads_per_branch)
+                print(f"تم ضبط خيوط torch الداخلية على {threads_per_branch} لتشغيل {n_concurrent_branches} فرع بالتوازي.")
+            _TORCH_THREADS_TUNED = True
+    return torch.get_num_threads()
+
+
+def run_branches(branches: dict[str, Callable[[], Any]], timeout_seconds: Optional[float] = None,
+                 executor: Optional[ThreadPoolExecutor] = None) -> dict[str, dict]:
+    """
+    يشغل فروعًا مستقلة بالتوازي على المجمع المشترك ويعزل أخطاءها: استثناء أو تجاوز مهلة في فرع
+    لا يوقف الفروع الأخرى.
+
+    Args:
+        branches (dict): اسم الفرع -> دالة بدون معاملات.
+        timeout_seconds (float, optional): مهلة كل فرع (من بدء التشغيل). الفرع المتجاوز يُعلَّم 'timeout'
+            ويكمل في الخلفية دون أن تُستخدم نتيجته.
+
+    Returns:
+        dict: اسم الفرع -> {'status', 'value', 'error', 'seconds'}.
+    """
+    def timed(branch: Callable[[], Any]):
+        branch_started_at = time.perf_counter()
+        return branch(), time.perf_counter() - branch_started_at
+
+    executor = executor or get_branch_executor()
+    started_at = time.perf_counter()
+    # كل فرع يعمل في نسخة من سياق المستدعي (contextvars) فتُنسب مقاطع التتبع داخله إلى نفس الطلب
+    futures = {name: executor.submit(contextvars.copy_context().run, timed, branch)
+               for name, branch in branches.items()}
+    outcomes = {}
+    for name, future in futures.items():
+        remaining = None if timeout_seconds is None else max(0.0, timeout_seconds - (time.perf_counter() - started_at))
+        try:
+            value, seconds = future.result(timeout=remaining)
+            outcomes[name] = {'status': BRANCH_OK, 'value': value, 'error': None, 'seconds': seconds}
+        except FutureTimeoutError:
+            outcomes[name] = {'status': BRANCH_TIMEOUT, 'value': None,
+                              'error': f"تجاوز الفرع '{name}' المهلة ({timeout_seconds} ثانية).",
+                              'seconds': time.perf_counter() - started_at}
+        except Exception as e:
+            outcomes[name] = {'status': BRANCH_ERROR, 'value': None, 'error': str(e),
+                              'seconds': time.perf_counter() - started_at}
+    return outcomes
@@ -1,91 +1,161 @@
 # src/utils/feature_engineering_utils.py
+import re
+from functools import lru_cache
+from typing import Optional, Union
+
 import pandas as pd
 import numpy as np
-import re
+
+# --- قواعد (grammar) تحليل الكميات: أنماط مُترجمة مسبقًا مرة واحدة عند الاستيراد ---
+# رقم عشري اختياري: "5", "2.5", "25000" (\d تشمل الأرقام العربية الشرقية أيضًا)
+_NUMBER_RE = re.compile(r'\d+\.?\d*')
+# ما يدل على نطاق بين رقمين: "5000-7000", "2 الى 4", "2 إلى 4"
+_RANGE_MARKER_RE = re.compile(r'-|الى|إلى')
+_IMMEDIATE_RE = re.compile(r'فوري')
+
+# الكلمات الوصفية للتكلفة، مرتبة حسب الأولوية (أول تطابق يفوز)
+_COST_LEVEL_RULES = (
+    (re.compile(r'عالي|مرتفع'), 10000.0),
+    (re.compile(r'(?=.*متوسط)(?=.*جدا)', re.DOTALL), 7500.0),  # "متوسط جدا"
+    (re.compile(r'متوسط'), 5000.0),
+    (re.compile(r'منخفض'), 1000.0),
+)
+
+# وحدات الوقت ومعامل تحويلها إلى أيام، مرتبة حسب الأولوية كما في المنطق الأصلي
+_TIME_UNIT_RULES = (
+    (re.compile(r'شهر|اشهر|أشهر'), 30.0),
+    (re.compile(r'اسبوع|أسبوع|اسابيع|أسابيع'), 7.0),
+    (re.compile(r'يوم|ايام|أيام'), 1.0),
+    (re.compile(r'ساعه|ساعة|ساعات'), 1.0 / 24),
+    (re.compile(r'دقيقه|دقيقة|دقائق'), 1.0 / (24 * 60)),
+)
+
+# حجم جدول الذاكرة (memo): البيانات الحقيقية تحتوي على عدد صغير من النصوص المميزة المتكررة
+_MEMO_SIZE = 4096
+
+
+def _normalize_quantity_text(value) -> Optional[str]:
+    """يحول القيمة المدخلة إلى نص موحد (أحرف صغيرة بدون مسافات طرفية) أو None إذا كانت فارغة/مفقودة."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        text = value.strip().lower()
+        return text or None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    text = str(value).strip().lower()
+    return text or None
+
+
+def _extract_amount(text: str) -> Optional[float]:
+    """
+    يستخلص القيمة الرقمية من النص: رقم واحد، أو متوسط النطاق ("5000-7000", "2 الى 4").
+    إذا وُجدت عدة أرقام بدون ما يدل على نطاق، يؤخذ الرقم الأول.
+    """
+    numbers_found = _NUMBER_RE.findall(text)
+    if not numbers_found:
+        return None
+    first_value = float(numbers_found[0])
+    if len(numbers_found) > 1 and _RANGE_MARKER_RE.search(text):
+        return (first_value + float(numbers_found[-1])) / 2
+    return first_value
+
+
+@lru_cache(maxsize=_MEMO_SIZE)
+def _parse_cost_text(text: str) -> float:
+    amount = _extract_amount(text)
+    if amount is not None:
+        return amount
+    for pattern, level_value in _COST_LEVEL_RULES:
+        if pattern.search(text):
+            return level_value
+    return np.nan
+
+
+@lru_cache(maxsize=_MEMO_SIZE)
+def _parse_time_text(text: str) -> float:
+    if _IMMEDIATE_RE.search(text):
+        return 0.0
+    amount = _extract_amount(text)
+    if amount is None:
+        return np.nan
+    for pattern, days_factor in _TIME_UNIT_RULES:
+        if pattern.search(text):
+            return amount * days_factor
+    # رقم بدون وحدة زمنية واضحة: الافتراض بأنها أيام قد يكون خاطئًا، لذا نعيد NaN
+    return np.nan
 
 
 def parse_cost_value(cost_str: str) -> float:
     """
     يحلل قيمة التكلفة من نص ويحولها إلى رقم float.
-    يعالج الأرقام، النطاقات، والكلمات الوصفية (عالي، متوسط، منخفض).
+    يعالج الأرقام، النطاقات، والكلمات الوصفية (عالي، متوسط جدا، متوسط، منخفض).
+    القيمة غير النصية (مثل 2500 من عمود CSV رقمي أو من JSON) تُحلل كنصها، كما كان يفعل
+    data_preprocessor قبل توحيد المحللين؛ النسخة السابقة هنا كانت تعيد NaN لها.
     """
-    if pd.isna(cost_str) or not isinstance(cost_str, str) or cost_str.strip() == '':
+    text = _normalize_quantity_text(cost_str)
+    if text is None:
         return np.nan
-
-    cost_str = str(cost_str).lower()  # توحيد حالة الأحرف
-    numeric_value = np.nan
-
-    numbers_found = re.findall(r'\d+\.?\d*', cost_str)
-
-    if numbers_found:
-        if len(numbers_found) == 1:
-            numeric_value = float(numbers_found[0])
-        elif len(numbers_found) > 1 and ('-' in cost_str or 'الى' in cost_str or 'إلى' in cost_str):
-            try:
-                numeric_value = (float(numbers_found[0]) + float(numbers_found[-1])) / 2
-            except ValueError:
-                numeric_value = float(numbers_found[0])  # إذا فشل، خذ الرقم الأول
-        else:  # إذا كان هناك عدة أرقام غير مرتبطة بنطاق واضح، خذ الأول كافتراض
-            numeric_value = float(numbers_found[0])
-    else:
-        if "عالي" in cost_str or "مرتفع" in cost_str:
-            numeric_value = 10000.0
-        elif "متوسط" in cost_str:  # يمكنك إضافة "متوسط جدا" هنا إذا أردت
-            if "جدا" in cost_str and "متوسط" in cost_str:  # معالجة "متوسط جدا"
-                numeric_value = 7500.0  # أو أي قيمة تراها مناسبة
-            elif "متوسط" in cost_str:
-                numeric_value = 5000.0
-        elif "منخفض" in cost_str:
-            numeric_value = 1000.0
-
-    return numeric_value
+    return _parse_cost_text(text)
 
 
 def parse_time_to_implement(time_str: str) -> float:
     """
     يحلل وقت التنفيذ من نص ويحوله إلى عدد الأيام (float).
     يعالج "فوري"، الأرقام مع وحدات (شهر، أسبوع، يوم، ساعة، دقيقة)، والنطاقات.
+    القيمة غير النصية تُحلل كنصها (انظر parse_cost_value)؛ الرقم المجرد بدون وحدة يبقى NaN.
     """
-    if pd.isna(time_str) or not isinstance(time_str, str) or time_str.strip() == '':
+    text = _normalize_quantity_text(time_str)
+    if text is None:
         return np.nan
+    return _parse_time_text(text)
 
-    time_str = str(time_str).lower()
-    days = np.nan
 
-    if "فوري" in time_str:
-        return 0.0
+def _parse_values_vectorized(values, scalar_parser):
+    """
+    يطبق محللًا أحاديًا على مصفوفة/Series في تمريرة واحدة:
+    يتم تحليل كل نص مميز مرة واحدة فقط (pd.factorize) ثم تُوزع النتائج على كل الصفوف.
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    codes, uniques = pd.factorize(pd.Series(values, copy=False) if index is None else values)
+    parsed_uniques = np.fromiter((scalar_parser(value) for value in uniques),
+                                 dtype=np.float64, count=len(uniques))
+    # القيم المفقودة يعطيها factorize الرمز -1
+    result = np.full(len(codes), np.nan, dtype=np.float64)
+    valid_mask = codes >= 0
+    result[valid_mask] = parsed_uniques[codes[valid_mask]]
+    if index is not None:
+        return pd.Series(result, index=index, name=values.name)
+    return result
+
+
+def parse_cost_series(values) -> Union[pd.Series, np.ndarray]:
+    """
+    النسخة المتجهة من parse_cost_value.
 
-    numbers_found = re.findall(r'\d+\.?\d*', time_str)
-    avg_value = None
-    if numbers_found:
-        value1 = float(numbers_found[0])
-        avg_value = value1
-        if len(numbers_found) > 1 and ('-' in time_str or 'الى' in time_str or 'إلى' in time_str):
-            value2 = float(numbers_found[-1])
-            avg_value = (value1 + value2) / 2
+    Args:
+        values: pd.Series أو مصفوفة/قائمة من قيم التكلفة النصية.
 
-    if avg_value is None:  # إذا لم يتم العثور على أرقام بعد "فوري"
-        return np.nan
+    Returns:
+        pd.Series بنفس الفهرس إذا كان المدخل Series، وإلا مصفوفة NumPy من نوع float64.
+    """
+    return _parse_values_vectorized(values, parse_cost_value)
 
-    if "شهر" in time_str or "اشهر" in time_str or "أشهر" in time_str:
-        days = avg_value * 30
-    elif "اسبوع" in time_str or "أسبوع" in time_str or "اسابيع" in time_str or "أسابيع" in time_str:
-        days = avg_value * 7
-    elif "يوم" in time_str or "ايام" in time_str or "أيام" in time_str:
-        days = avg_value
-    elif "ساعه" in time_str or "ساعة" in time_str or "ساعات" in time_str:
-        days = avg_value / 24
-    elif "دقيقه" in time_str or "دقيقة" in time_str or "دقائق" in time_str:
-        days = avg_value / (24 * 60)
-    elif numbers_found:  # إذا وجدت أرقام ولكن لم يتم تحديد وحدة واضحة
-        # يمكنك أن تقرر هنا، هل تفترض أنها أيام؟ أم تتركها NaN؟
-        # الافتراض بأنها أيام قد يكون خاطئًا. من الأفضل تركها NaN إذا لم تكن الوحدة واضحة.
-        # print(f"تحذير: تم العثور على رقم '{avg_value}' في '{time_str}' بدون وحدة زمنية واضحة. سيتم إرجاع NaN.")
-        return np.nan
-    else:  # لا أرقام ولا كلمة "فوري" ولا وحدات زمنية واضحة
-        return np.nan
 
-    return days
+def parse_time_series(values) -> Union[pd.Series, np.ndarray]:
+    """
+    النسخة المتجهة من parse_time_to_implement (النتيجة بعدد الأيام).
+
+    Args:
+        values: pd.Series أو مصفوفة/قائمة من قيم وقت التنفيذ النصية.
+
+    Returns:
+        pd.Series بنفس الفهرس إذا كان المدخل Series، وإلا مصفوفة NumPy من نوع float64.
+    """
+    return _parse_values_vectorized(values, parse_time_to_implement)
 
 
 if __name__ == '__main__':
@@ -100,7 +170,13 @@ if __name__ == '__main__':
 
     print(f"'3 اسابيع': {parse_time_to_implement('3 اسابيع')} (Expected: 21.0)")
     print(f"'حوالي 2-4 أشهر': {parse_time_to_implement('حوالي 2-4 أشهر')} (Expected: 90.0)")
+    print(f"'2 الى 4 ايام': {parse_time_to_implement('2 الى 4 ايام')} (Expected: 3.0)")
     print(f"'فوري': {parse_time_to_implement('فوري')} (Expected: 0.0)")
     print(f"'12 ساعة': {parse_time_to_implement('12 ساعة')} (Expected: 0.5)")
     print(f"'نص بدون رقم أو وحدة': {parse_time_to_implement('نص بدون رقم أو وحدة')} (Expected: nan)")
-    print(f"'30': {parse_time_to_implement('30')} (Expected: nan, because no unit)")  # أو 30.0 إذا أردت افتراض أيام
\ No newline at end of file
+    print(f"'30': {parse_time_to_implement('30')} (Expected: nan, because no unit)")  # أو 30.0 إذا أردت افتراض أيام
+
+    print("\n--- اختبار النسخة المتجهة ---")
+    sample_series = pd.Series(['منخفض', '5000-7000 دولار', None, 'منخفض', 'متوسط جدا'] * 200_000)
+    print(parse_cost_series(sample_series).head(5).tolist())
+    print(parse_time_series(['3 اسابيع', 'فوري', np.nan]))
@@ -0,0 +1,79 @@
+# src/utils/lazy_loading.py
+import threading
+import time
+from typing import Any, Callable, Optional
+
+# حالات تحميل المكون
+STATE_PENDING = 'pending'  # لم يبدأ التحميل بعد (سيُحمّل عند أول استخدام)
+STATE_LOADING = 'loading'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
+
+class LazyComponent:
+    """
+    مكون يُحمّل عند أول استخدام (get) أو في خيط خلفي (start_background)، مرة واحدة فقط.
+    الاستدعاءات المتزامنة لـ get أثناء التحميل تنتظر نفس عملية التحميل بدلًا من تكرارها.
+
+    الدالة loader تعيد المكون أو تثير استثناء؛ عند الفشل تصبح القيمة None وتُسجل رسالة الخطأ.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._state = STATE_PENDING
+        self._error: Optional[str] = None
+        self._load_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def _load(self):
+        with self._lock:
+            if self._state != STATE_PENDING:
+                return
+            self._state = STATE_LOADING
+        started_at = time.perf_counter()
+        try:
+            value, state, error = self._loader(), STATE_READY, None
+        except Exception as e:
+            value, state, error = None, STATE_FAILED, str(e)
+            print(f"خطأ أثناء تحميل المكون '{self.name}': {e}")
+        self._value, self._error = value, error
+        self._load_seconds = time.perf_counter() - started_at
+        self._state = state
+        self._done.set()
+
+    def start_background(self) -> 'LazyComponent':
+        """يبدأ التحميل في خيط خلفي (daemon) إذا لم يكن قد بدأ بعد."""
+        if self._state == STATE_PENDING:
+            threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True).start()
+        return self
+
+    def get(self, timeout: Optional[float] = None):
+        """يعيد المكون، محملًا إياه الآن إذا لزم الأمر أو منتظرًا التحميل الجاري."""
+        if self._state == STATE_PENDING:
+            self._load()
+        self._done.wait(timeout)
+        return self._value
+
+    def set(self, value):
+        """يعين قيمة جاهزة مباشرة (بدون loader)."""
+        with self._lock:
+            self._value = value
+            self._state = STATE_READY
+            self._error = None
+            self._done.set()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._state == STATE_READY
+
+    @property
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def status(self) -> dict:
+        return {'state': self._state,
+                'load_seconds': round(self._load_seconds, 3) if self._load_seconds is not None else None,
+                'error': self._error}
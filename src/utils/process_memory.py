@@ -0,0 +1,52 @@
+# src/utils/process_memory.py
+import os
+
+# حقول smaps المستخدمة (بالكيلوبايت)
+_SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def _read_smaps_totals(pid: int) -> dict[str, int]:
+    """مجاميع حقول smaps للعملية: smaps_rollup (Linux 4.14+) أو جمع smaps الكامل في الأنوية الأقدم."""
+    totals = dict.fromkeys(_SMAPS_FIELDS, 0)
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        path = f"/proc/{pid}/smaps"
+    with open(path, 'r') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in totals:
+                totals[key] += int(rest.split()[0])
+    return totals
+
+
+def read_process_memory(pid: int = None) -> dict:
+    """
+    ذاكرة عملية واحدة بالميجابايت (Linux فقط):
+      rss_mb: كل الصفحات المقيمة، unique_mb: الصفحات الخاصة بالعملية وحدها (USS)،
+      shared_mb: الصفحات المشتركة مع عمليات أخرى (مثل صفحات النماذج الموروثة بعد fork)،
+      pss_mb: الحصة النسبية (المشتركة مقسومة على عدد العمليات المشاركة).
+    """
+    totals = _read_smaps_totals(os.getpid() if pid is None else pid)
+    return {'rss_mb': round(totals['Rss'] / 1024, 2), 'pss_mb': round(totals['Pss'] / 1024, 2),
+            'unique_mb': round((totals['Private_Clean'] + totals['Private_Dirty']) / 1024, 2),
+            'shared_mb': round((totals['Shared_Clean'] + totals['Shared_Dirty']) / 1024, 2)}
+
+
+def memory_report(pids: dict[str, int]) -> dict:
+    """
+    تقرير ذاكرة لمجموعة عمليات (الاسم -> pid): ذاكرة كل عملية، ومجموع RSS (تقريبًا تكلفة عمليات مستقلة
+    يحمل كل منها نسخته) مقابل مجموع PSS (الذاكرة الفعلية المستهلكة مع المشاركة).
+    """
+    processes = {}
+    for name, pid in pids.items():
+        try:
+            processes[name] = {'pid': pid, **read_process_memory(pid)}
+        except (OSError, ValueError, IndexError) as e:
+            processes[name] = {'pid': pid, 'error': str(e)}
+    measured = [memory for memory in processes.values() if 'error' not in memory]
+    sum_rss = sum(memory['rss_mb'] for memory in measured)
+    sum_pss = sum(memory['pss_mb'] for memory in measured)
+    return {'processes': processes,
+            'totals': {'sum_rss_mb': round(sum_rss, 2), 'sum_pss_mb': round(sum_pss, 2),
+                       'sum_unique_mb': round(sum(memory['unique_mb'] for memory in measured), 2),
+                       'saved_by_sharing_mb': round(sum_rss - sum_pss, 2)}}
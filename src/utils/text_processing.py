@@ -82,6 +82,34 @@ def remove_urls_emails_hashtags_mentions(text: str) -> str:
     return text
 
 
+# --- اكتشاف اللغة ---
+def language_detection_sample(text: str) -> str:
+    """
+    عينة النص التي يُكتشف منها اللغة في preprocess_text_pipeline (أول 200 حرف بعد التنظيف الأولي).
+    نصان لهما نفس العينة تُكتشف لهما نفس اللغة، فيمكن مشاركة نتيجة الاكتشاف بينهما.
+    """
+    if not isinstance(text, str) or pd.isna(text) or text.strip() == '':
+        return ""
+    return _language_sample_of_prepared_text(remove_urls_emails_hashtags_mentions(text.lower()))
+
+
+def _language_sample_of_prepared_text(text: str) -> str:
+    # langdetect قد يخطئ مع النصوص القصيرة جداً، لذا نأخذ أول 200 حرف فقط من النصوص الطويلة
+    sample_text_for_lang_detect = text[:200] if len(text) > 20 else text
+    return sample_text_for_lang_detect if sample_text_for_lang_detect.strip() else ""
+
+
+def detect_sample_language(sample_text: str) -> str:
+    """يكتشف لغة عينة من language_detection_sample. يعيد "" لعينة فارغة و "unknown" إذا تعذر الاكتشاف."""
+    if not sample_text:
+        return ""
+    try:
+        return detect(sample_text)
+    except LangDetectException:
+        print(f"تحذير: لم يتمكن langdetect من تحديد لغة النص: '{sample_text[:50]}...'. سيتم تطبيق التنظيف العام فقط.")
+        return "unknown"  # أو أي رمز افتراضي
+
+
 # --- خط أنابيب المعالجة الرئيسي ---
 def preprocess_text_pipeline(text: str,
                              language_code: str = None,
@@ -97,17 +125,9 @@ def preprocess_text_pipeline(text: str,
     # 2. اكتشاف اللغة إذا لم يتم توفيرها
     detected_lang = language_code
     if not detected_lang:
-        try:
-            # اكتشاف اللغة من جزء من النص (أول 200 حرف مثلاً لزيادة الدقة)
-            # langdetect قد يخطئ مع النصوص القصيرة جداً
-            sample_text_for_lang_detect = text[:200] if len(text) > 20 else text
-            if sample_text_for_lang_detect.strip():
-                detected_lang = detect(sample_text_for_lang_detect)
-            else:  # إذا كان النص فارغًا بعد التنظيفات الأولية
-                return ""
-        except LangDetectException:
-            print(f"تحذير: لم يتمكن langdetect من تحديد لغة النص: '{text[:50]}...'. سيتم تطبيق التنظيف العام فقط.")
-            detected_lang = "unknown"  # أو أي رمز افتراضي
+        detected_lang = detect_sample_language(_language_sample_of_prepared_text(text))
+        if not detected_lang:  # إذا كان النص فارغًا بعد التنظيفات الأولية
+            return ""
 
     # 3. معالجة خاصة بالعربية
     if detected_lang == 'ar':
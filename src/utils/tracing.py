@@ -0,0 +1,164 @@
+# src/utils/tracing.py
+import bisect
+import functools
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# حدود فئات المدرج التكراري: تدرج هندسي من 1 ميكروثانية إلى 100 ثانية بعرض ~5% لكل فئة،
+# فتكون المئينات تقريبية بخطأ نسبي لا يتجاوز 5% مع ذاكرة ثابتة مهما كثرت الطلبات
+_BUCKET_GROWTH = 1.05
+_MIN_BUCKET_SECONDS = 1e-6
+_BUCKET_UPPER_BOUNDS = [_MIN_BUCKET_SECONDS * _BUCKET_GROWTH ** i
+                        for i in range(int(math.log(1e8) / math.log(_BUCKET_GROWTH)) + 2)]
+
+_current_trace: ContextVar[Optional['RequestTrace']] = ContextVar('analysis_request_trace', default=None)
+_current_span_path: ContextVar[tuple] = ContextVar('analysis_span_path', default=())
+
+_HISTOGRAMS: dict[str, 'LatencyHistogram'] = {}
+_HISTOGRAMS_LOCK = threading.Lock()
+
+
+class LatencyHistogram:
+    """مدرج تكراري لأزمنة مقطع (span) واحد بفئات لوغاريتمية ثابتة، يعطي p50/p95/p99 تقريبية."""
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_UPPER_BOUNDS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        bucket = bisect.bisect_left(_BUCKET_UPPER_BOUNDS, seconds)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def percentile(self, q: float) -> float:
+        """المئين q (بين 0 و 100) بالثواني: الحد الأعلى للفئة التي تقع فيها الرتبة المطلوبة."""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            rank = max(1, math.ceil(q / 100.0 * self.count))
+            cumulative = 0
+            for bucket, bucket_count in enumerate(self.counts):
+                cumulative += bucket_count
+                if cumulative >= rank:
+                    upper = _BUCKET_UPPER_BOUNDS[bucket] if bucket < len(_BUCKET_UPPER_BOUNDS) else self.max_seconds
+                    return min(upper, self.max_seconds)
+            return self.max_seconds
+
+    def summary(self) -> dict:
+        return {'count': self.count,
+                'mean_ms': round(self.total_seconds / self.count * 1000, 3) if self.count else 0.0,
+                'p50_ms': round(self.percentile(50) * 1000, 3), 'p95_ms': round(self.percentile(95) * 1000, 3),
+                'p99_ms': round(self.percentile(99) * 1000, 3), 'max_ms': round(self.max_seconds * 1000, 3)}
+
+
+def record_latency(name: str, seconds: float):
+    histogram = _HISTOGRAMS.get(name)
+    if histogram is None:
+        with _HISTOGRAMS_LOCK:
+            histogram = _HISTOGRAMS.setdefault(name, LatencyHistogram())
+    histogram.record(seconds)
+
+
+def get_latency_summary() -> dict[str, dict]:
+    """ملخص المدرجات التكرارية لكل مقطع في هذه العملية: العدد، المتوسط، p50/p95/p99، الأقصى (بالمللي ثانية)."""
+    with _HISTOGRAMS_LOCK:
+        histograms = dict(_HISTOGRAMS)
+    return {name: histogram.summary() for name, histogram in sorted(histograms.items())}
+
+
+def reset_latency_histograms():
+    with _HISTOGRAMS_LOCK:
+        _HISTOGRAMS.clear()
+
+
+class RequestTrace:
+    """المقاطع المسجلة لطلب واحد (بترتيب انتهائها) مع أزمنتها النسبية لبداية الطلب."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.total_seconds: Optional[float] = None
+        self.spans: list[dict] = []
+
+    def timings(self) -> dict:
+        """كتلة 'timings' التي تُرفق بنتيجة التحليل."""
+        total_seconds = self.total_seconds if self.total_seconds is not None \
+            else time.perf_counter() - self.started_at
+        return {'request': self.name, 'total_ms': round(total_seconds * 1000, 3),
+                'spans': sorted(self.spans, key=lambda record: record['start_ms'])}
+
+
+class span:
+    """
+    مقطع زمني مسمى (with span('clustering.kmeans'): ...). يُسجل دائمًا في المدرج التكراري لاسمه،
+    ويُضاف إلى تتبع الطلب الحالي (إن وُجد) مع عمقه واسم المقطع الأب. المقاطع المتداخلة تُحسب من السياق
+    (contextvars)، فتعمل مع الخيوط إذا شُغلت الدوال عبر contextvars.copy_context().run.
+    """
+    __slots__ = ('name', '_started_at', '_path_token')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> 'span':
+        self._path_token = _current_span_path.set(_current_span_path.get() + (self.name,))
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        seconds = time.perf_counter() - self._started_at
+        path = _current_span_path.get()
+        _current_span_path.reset(self._path_token)
+        record_latency(self.name, seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            record = {'name': self.name, 'parent': path[-2] if len(path) > 1 else None, 'depth': len(path) - 1,
+                      'start_ms': round((self._started_at - trace.started_at) * 1000, 3),
+                      'duration_ms': round(seconds * 1000, 3)}
+            if exc_type is not None:
+                record['error'] = exc_type.__name__
+            trace.spans.append(record)  # list.append آمنة بين الخيوط
+        return False
+
+
+class trace_request:
+    """
+    يبدأ تتبع طلب جديد (with trace_request('analyze_new_problem') as trace: ...). الطلب نفسه مقطع جذري
+    يُسجل في المدرج التكراري، و trace.timings() تعيد كل المقاطع المسجلة داخله.
+    """
+    __slots__ = ('trace', '_root_span', '_trace_token')
+
+    def __init__(self, name: str):
+        self.trace = RequestTrace(name)
+        self._root_span = span(name)
+
+    def __enter__(self) -> RequestTrace:
+        self._trace_token = _current_trace.set(self.trace)
+        self._root_span.__enter__()
+        self.trace.started_at = self._root_span._started_at
+        return self.trace
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self._root_span.__exit__(exc_type, exc_value, traceback)
+        self.trace.total_seconds = time.perf_counter() - self.trace.started_at
+        _current_trace.reset(self._trace_token)
+        return False
+
+
+def traced(name: str) -> Callable:
+    """مُزخرف يلف الدالة كاملة في مقطع بالاسم المحدد."""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
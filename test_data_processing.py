@@ -0,0 +1,57 @@
+# test_data_processing.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.feature_engineering_utils import (parse_cost_value, parse_time_to_implement,
+                                                 parse_cost_series, parse_time_series)
+
+
+@pytest.mark.parametrize("raw_value, expected", [
+    ('150 ريال', 150.0),
+    ('5000-7000 دولار', 6000.0),
+    ('2 الى 4 الف', 3.0),
+    ('عالي', 10000.0),
+    ('متوسط جدا', 7500.0),
+    ('متوسط', 5000.0),
+    ('منخفض', 1000.0),
+    (2500, 2500.0),
+])
+def test_parse_cost_value(raw_value, expected):
+    assert parse_cost_value(raw_value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("raw_value, expected", [
+    ('3 اسابيع', 21.0),
+    ('حوالي 2-4 أشهر', 90.0),
+    ('2 إلى 4 ايام', 3.0),
+    ('فوري', 0.0),
+    ('12 ساعة', 0.5),
+])
+def test_parse_time_to_implement(raw_value, expected):
+    assert parse_time_to_implement(raw_value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("raw_value", [None, np.nan, '', '   ', 'نص بدون رقم أو وحدة', '30'])
+def test_parse_time_to_implement_returns_nan_without_unit(raw_value):
+    assert np.isnan(parse_time_to_implement(raw_value))
+
+
+def test_numeric_cells_parse_like_their_text():
+    # عمود CSV يقرؤه pandas كأرقام (نفس سلوك المحلل السابق في data_preprocessor)
+    parsed = parse_cost_series(pd.Series([2500, np.nan, 1200.5]))
+    np.testing.assert_array_equal(parsed.to_numpy(), [2500.0, np.nan, 1200.5])
+    assert parse_cost_value(np.int64(300)) == 300.0
+    assert np.isnan(parse_time_to_implement(30))
+
+
+def test_series_api_matches_scalar_api():
+    raw_costs = pd.Series(['منخفض', '5000-7000 دولار', None, 'منخفض', 'متوسط جدا', ''], index=list('abcdef'))
+    parsed = parse_cost_series(raw_costs)
+    expected = raw_costs.map(parse_cost_value)
+    assert parsed.index.equals(raw_costs.index)
+    np.testing.assert_array_equal(parsed.to_numpy(), expected.to_numpy(dtype=float))
+
+    raw_times = ['3 اسابيع', 'فوري', np.nan, '3 اسابيع']
+    np.testing.assert_array_equal(parse_time_series(raw_times),
+                                  np.array([parse_time_to_implement(v) for v in raw_times]))
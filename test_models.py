@@ -0,0 +1,1163 @@
+# test_models.py
+import asyncio
+import subprocess
+import sys
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis.bulk_scoring import BulkScoringJob
+from src.analysis.profile_index import GroupProfileIndex
+from src.analysis.recommendation_engine import GroupRecommendationIndex, RecommendationEngine
+from src.analysis import result_cache
+from src.analysis.result_cache import AnalysisResultCache
+from src.models.embedding_batcher import AsyncEmbeddingBatcher
+from src.models.embedding_cache import EmbeddingCache, embedding_cache_key
+from src.models.fast_topic_model import FastTopicModel, calibrate_outlier_threshold
+from src.models.inference_plan import CompiledClusteringPlan
+from src.models.online_clustering import OnlineClusteringUpdater
+from src.models import online_topic_modeling
+from src.models.online_topic_modeling import IncrementalTopicUpdater
+from src.models.topic_modeling import ProblemTopicModel
+from src.models.train_clustering import train_clustering
+from src.models.onnx_encoder import (DEFAULT_ONNX_ENCODER_DIR, ENCODER_META_FILENAME,
+                                     ONNX_QUANTIZED_MODEL_FILENAME)
+from src.models.vector_index import ProblemVectorIndex
+from src.serving.inference_service import InferenceService, create_server
+from src.serving.load_generator import run_load_test
+from src.serving.prefork_server import PreforkServer
+from src.utils.branch_executor import run_branches
+from src.utils.lazy_loading import LazyComponent
+from src.utils.tracing import (get_latency_summary, reset_latency_histograms, span, trace_request,
+                                traced)
+
+SAMPLE_TEXTS = [
+    "الشبكة بطيئة جدا في قسم المحاسبة",
+    "الطابعة لا تستجيب لأوامر الطباعة",
+    "تأخر صرف الرواتب بسبب مشكلة في النظام المالي",
+    "ضعف تفاعل الطلاب مع المنصة التعليمية الجديدة",
+    "سيارتي لا تعمل صباحا والمفتاح لا يدور",
+    "the vpn disconnects every few minutes for remote staff",
+    "customer complaints about late deliveries increased this month",
+    "",
+]
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a_norm = np.linalg.norm(a, axis=1)
+    b_norm = np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.clip(a_norm * b_norm, 1e-12, None)
+
+
+@pytest.fixture(scope="module")
+def torch_and_onnx_encoders():
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    if not os.path.exists(os.path.join(DEFAULT_ONNX_ENCODER_DIR, ENCODER_META_FILENAME)):
+        pytest.skip("نموذج ONNX غير مُصدّر. شغّل: python src/models/onnx_encoder.py")
+    from src.models.onnx_encoder import OnnxSentenceEncoder
+
+    onnx_fp32 = OnnxSentenceEncoder(DEFAULT_ONNX_ENCODER_DIR, use_quantized=False)
+    torch_model = sentence_transformers.SentenceTransformer(onnx_fp32.model_name)
+    encoders = {'fp32': onnx_fp32}
+    if os.path.exists(os.path.join(DEFAULT_ONNX_ENCODER_DIR, ONNX_QUANTIZED_MODEL_FILENAME)):
+        encoders['int8'] = OnnxSentenceEncoder(DEFAULT_ONNX_ENCODER_DIR, use_quantized=True)
+    return torch_model, encoders
+
+
+def test_onnx_encoder_cosine_agreement_with_torch(torch_and_onnx_encoders):
+    torch_model, onnx_encoders = torch_and_onnx_encoders
+    torch_embeddings = torch_model.encode(SAMPLE_TEXTS, convert_to_numpy=True)
+    min_cosine = {'fp32': 0.999, 'int8': 0.95}
+    for variant, encoder in onnx_encoders.items():
+        onnx_embeddings = encoder.encode(SAMPLE_TEXTS)
+        assert onnx_embeddings.shape == torch_embeddings.shape
+        assert _cosine_rows(torch_embeddings, onnx_embeddings).min() >= min_cosine[variant], variant
+
+
+def test_onnx_encoder_cluster_assignment_agreement_with_torch(torch_and_onnx_encoders):
+    from src.models.clustering_model import ProblemClusteringModel, DEFAULT_KMEANS_PATH, DEFAULT_CT_PATH
+    if not (os.path.exists(DEFAULT_KMEANS_PATH) and os.path.exists(DEFAULT_CT_PATH)):
+        pytest.skip("ملفات نموذج K-Means أو ColumnTransformer غير موجودة في data/models.")
+    torch_model, onnx_encoders = torch_and_onnx_encoders
+    clustering_model = ProblemClusteringModel()
+    if clustering_model.kmeans_model is None or clustering_model.column_transformer is None:
+        pytest.skip("تعذر تحميل مكونات نموذج التجميع.")
+
+    problems = {clustering_model.text_feature_col: SAMPLE_TEXTS}
+    for col in clustering_model.numerical_features:
+        problems[col] = [np.nan] * len(SAMPLE_TEXTS)
+    for col in clustering_model.categorical_features:
+        problems[col] = [None] * len(SAMPLE_TEXTS)
+    problems_df = pd.DataFrame(problems)
+
+    torch_clusters = clustering_model.predict(problems_df,
+                                              embeddings=torch_model.encode(SAMPLE_TEXTS, convert_to_numpy=True))
+    for variant, encoder in onnx_encoders.items():
+        onnx_clusters = clustering_model.predict(problems_df, embeddings=encoder.encode(SAMPLE_TEXTS))
+        agreement = np.mean(torch_clusters == onnx_clusters)
+        assert agreement >= 0.85, f"{variant}: agreement={agreement:.2f}"
+
+
+def test_embedding_cache_persists_recovers_partial_rows_and_evicts(tmp_path):
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache = EmbeddingCache('model/a', cache_dir=str(tmp_path), max_memory_items=2)
+    cache.put_many(['أ', 'ب', 'ج'], vectors)
+    assert cache.stats()['memory_items'] == 2  # LRU: 'أ' خرج من الذاكرة وبقي على القرص
+    np.testing.assert_array_equal(cache.get_many(['أ'])[0], vectors[0])
+    assert list(cache._memory) == [embedding_cache_key(text, 'model/a') for text in ['ج', 'أ']]
+
+    # صف ناقص في نهاية الملف (كتابة متقطعة) يُتجاهل، والإضافة التالية تكتب مكانه
+    vectors_path = os.path.join(cache.cache_dir, 'vectors.f32')
+    with open(vectors_path, 'r+b') as f:
+        f.truncate(os.path.getsize(vectors_path) - 6)
+    restarted = EmbeddingCache('model/a', cache_dir=str(tmp_path))
+    assert restarted.get_many(['ج'])[0] is None
+    np.testing.assert_array_equal(np.vstack(restarted.get_many(['أ', 'ب'])), vectors[:2])
+    restarted.put_many(['د'], vectors[2:] + 100)
+    assert os.path.getsize(vectors_path) == 3 * 4 * 4
+
+    reloaded = EmbeddingCache('model/a', cache_dir=str(tmp_path))
+    assert reloaded.get_many(['ج'])[0] is None
+    np.testing.assert_array_equal(reloaded.get_many(['د'])[0], vectors[2] + 100)
+
+    reloaded.put_many(['هـ'], np.ones((1, 8)))  # أبعاد مختلفة: لا تخزين
+    assert reloaded.get_many(['هـ'])[0] is None and reloaded.stats()['disk_items'] == 3
+
+
+def test_embedding_cache_writers_sharing_a_directory_keep_rows_consistent(tmp_path):
+    first = EmbeddingCache('model/a', cache_dir=str(tmp_path))
+    second = EmbeddingCache('model/a', cache_dir=str(tmp_path))
+    first.put_many(['alpha'], np.full((1, 4), 1.0))
+    second.put_many(['beta'], np.full((1, 4), 2.0))
+    first.put_many(['gamma'], np.full((1, 4), 3.0))
+    reloaded = EmbeddingCache('model/a', cache_dir=str(tmp_path))
+    assert [vector[0] for vector in reloaded.get_many(['alpha', 'beta', 'gamma'])] == [1.0, 2.0, 3.0]
+
+    # اسم نموذج آخر ينتهي إلى نفس المجلد: يُقرأ كمخزن فارغ ولا يُكتب فيه
+    other_model = EmbeddingCache('model:a', cache_dir=str(tmp_path))
+    assert other_model.cache_dir == reloaded.cache_dir and not other_model.disk_writes_enabled
+    other_model.put_many(['beta'], np.full((1, 8), 9.0))
+    assert EmbeddingCache('model/a', cache_dir=str(tmp_path)).get_many(['beta'])[0][0] == 2.0
+
+
+def _require_nltk_corpora():
+    """src/utils/text_processing.py يحمّل الكلمات الشائعة ويستخدم word_tokenize عند الاستيراد والتنظيف."""
+    nltk = pytest.importorskip("nltk")
+    pytest.importorskip("langdetect")
+    try:
+        nltk.corpus.stopwords.words('arabic')
+        nltk.word_tokenize("test text")
+    except LookupError as e:
+        pytest.skip(f"موارد NLTK غير متوفرة: {e}")
+
+
+class _StubClusteringModel:
+    text_feature_col = 'processed_text'
+    numerical_features = ['processed_text_length', 'estimated_cost_numeric']
+    categorical_features = ['domain']
+    embedding_service = None
+    is_loaded = True
+
+    def predict(self, df, embeddings=None):
+        return np.array([(length + (domain == 'تقني')) % 3
+                         for length, domain in zip(df['processed_text_length'], df['domain'])])
+
+
+class _StubTopicModel:
+    is_loaded = True
+    topic_catalogue = {}
+
+    def get_topics_for_texts(self, texts, embeddings=None):
+        return [len(text.split()) % 4 for text in texts], None
+
+
+def test_analyze_many_matches_analyze_new_problem_and_isolates_invalid_entries():
+    _require_nltk_corpora()
+    from src.analysis.problem_analyzer import ProblemAnalyzer
+
+    analyzer = ProblemAnalyzer(loading_mode='lazy', warm_up=False, concurrent_branches=False)
+    analyzer.clustering_model = _StubClusteringModel()
+    analyzer.topic_model = _StubTopicModel()
+    analyzer.df_profile_data = None
+    problems = [
+        {'title': 'الشبكة بطيئة جدا في قسم المحاسبة', 'description_initial': 'بطء شديد في الوصول إلى الملفات',
+         'domain': 'تقني', 'estimated_cost': '5000 دولار'},
+        None,
+        {'title': 'Printer does not respond', 'description_initial': 'The office printer ignores print jobs',
+         'solution_description': 'Reinstall the driver'},
+        {},
+        {'domain': 'إداري', 'what_went_well': 'تعاون الفريق'},  # نص الموضوعات فارغ
+        {'title': 'الشبكة بطيئة جدا في قسم المحاسبة', 'domain': 'إداري'},
+    ]
+
+    results = analyzer.analyze_many(problems, batch_size=2)
+    assert [result['input_problem_data'] for result in results] == problems
+    assert [position for position, result in enumerate(results) if 'error' in result] == [1, 3]
+    assert results[4]['bertopic_topic'] is None and results[4]['kmeans_cluster'] is not None
+    assert all(results[position]['kmeans_cluster'] is not None for position in (0, 2, 4, 5))
+    assert all(results[position]['bertopic_topic'] is not None for position in (0, 2, 5))
+    for problem, result in zip(problems, results):
+        assert result == analyzer.analyze_new_problem(problem)
+
+
+def test_featurisation_cleaned_text_matches_pipeline_on_combined_text():
+    _require_nltk_corpora()
+    from src.analysis.featurisation import ProblemFeaturisationContext
+    from src.analysis.problem_analyzer import CLUSTERING_TEXT_FIELDS, TOPIC_TEXT_FIELDS
+    from src.utils.text_processing import preprocess_text_pipeline
+
+    problems = [
+        {'title': 'بطء شديد في الشبكة الداخلية', 'description_initial': 'الموظفون لا يستطيعون الوصول إلى الخوادم',
+         'solution_description': 'تمت إعادة تشغيل المحولات وتحديث البرامج الثابتة.'},
+        {'title': 'Printer keeps jamming', 'description_initial': 'The office printers jam several times a day.',
+         'what_went_well': 'Quick vendor response', 'key_takeaways': '  Replace old rollers!  '},
+        {'title': 'انقطاع خدمة VPN للموظفين', 'description_initial': 'The VPN client fails بعد التحديث الأخير',
+         'stakeholders_involved': 'IT, الموارد البشرية'},
+        {'title': 'None', 'description_initial': None, 'problem_source': np.nan, 'key_takeaways': '   ',
+         'solution_description': 'راسلنا support@example.com وراجعنا https://status.example.com/incidents?id=42'},
+        {'title': '', 'description_initial': None},
+    ]
+    shared_fields, shared_languages = {}, {}
+    for problem in problems:
+        for fields in (CLUSTERING_TEXT_FIELDS, TOPIC_TEXT_FIELDS):
+            raw_values = [problem.get(field) for field in fields]
+            combined = " ".join(str(value).strip() for value in raw_values
+                                if pd.notna(value) and str(value).strip())
+            expected = preprocess_text_pipeline(combined)
+            assert ProblemFeaturisationContext(problem).cleaned_text(fields) == expected
+            # القواميس المشتركة (التحليل الجماعي) تعطي نفس النتيجة
+            assert ProblemFeaturisationContext(problem, shared_fields, shared_languages).cleaned_text(fields) \
+                == expected
+
+
+def test_embedding_batcher_groups_concurrent_requests_and_preserves_order():
+    encode_calls = []
+
+    def fake_encode(texts):
+        encode_calls.append(list(texts))
+        return np.array([[len(text), i] for i, text in enumerate(texts)], dtype=np.float32)
+
+    async def run():
+        async with AsyncEmbeddingBatcher(fake_encode, max_batch_size=64, max_wait_ms=20) as batcher:
+            requests = [[f"نص {i}" * (i + 1)] for i in range(10)] + [["أ", "بب", "ججج"]]
+            results = await asyncio.gather(*(batcher.encode(texts) for texts in requests))
+            return requests, results, batcher.metrics()
+
+    requests, results, metrics = asyncio.run(run())
+    assert len(encode_calls) < len(requests)
+    for texts, embeddings in zip(requests, results):
+        assert embeddings.shape == (len(texts), 2)
+        assert embeddings[:, 0].tolist() == [len(text) for text in texts]
+    assert metrics['requests_total'] == len(requests)
+    assert metrics['texts_total'] == sum(len(texts) for texts in requests)
+    assert metrics['batches_total'] == len(encode_calls)
+
+
+def test_embedding_batcher_stop_fails_requests_of_the_current_batch():
+    encode_started, release_encode = threading.Event(), threading.Event()
+
+    def blocking_encode(texts):
+        encode_started.set()
+        release_encode.wait(5)
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    async def run():
+        # طلب يُضمّن الآن، وطلب أُخذ من الطابور وينتظر اكتمال نافذة التجميع
+        encoding = AsyncEmbeddingBatcher(blocking_encode, max_batch_size=8, max_wait_ms=1)
+        collecting = AsyncEmbeddingBatcher(blocking_encode, max_batch_size=8, max_wait_ms=60000)
+        requests = []
+        for batcher in (encoding, collecting):
+            await batcher.start()
+            requests.append(asyncio.ensure_future(batcher.encode(["نص"])))
+        while not encode_started.is_set():
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        for batcher in (encoding, collecting):
+            await asyncio.wait_for(batcher.stop(), 1)
+        return await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), 1)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        release_encode.set()
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_vector_index_ivf_recall_and_persistence(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(50, 32))
+    embeddings = (centers[rng.integers(0, 50, 5000)] + 0.3 * rng.normal(size=(5000, 32))).astype(np.float32)
+    problem_ids = np.arange(1000, 6000)
+    index = ProblemVectorIndex.build(embeddings, problem_ids, n_lists=40)
+    index.save(str(tmp_path))
+    loaded = ProblemVectorIndex.load(str(tmp_path))
+    assert isinstance(loaded.vectors, np.memmap) and len(loaded) == len(embeddings)
+
+    queries = embeddings[:20] + 0.05 * rng.normal(size=(20, 32)).astype(np.float32)
+    approximate = loaded.search(queries, k=10, n_probe=8)
+    exact = loaded.search(queries, k=10, n_probe=loaded.n_lists)
+    recall = np.mean([len(set(a_ids) & set(e_ids)) / 10 for (a_ids, _), (e_ids, _) in zip(approximate, exact)])
+    assert recall >= 0.9
+    for (_, scores) in exact:
+        assert np.all(np.diff(scores) <= 1e-6)
+
+    neighbour_ids, _ = loaded.search(embeddings[0], k=5, exclude_ids=[problem_ids[0]])[0]
+    assert problem_ids[0] not in neighbour_ids and len(neighbour_ids) == 5
+    # المعرفات تُقارن دون تحويل النوع، مثل GroupRecommendationIndex
+    for exclude_id in (np.int32(problem_ids[0]), float(problem_ids[0])):
+        assert problem_ids[0] not in loaded.search(embeddings[0], k=5, exclude_ids=exclude_id)[0][0]
+    assert problem_ids[0] in loaded.search(embeddings[0], k=5, exclude_ids=[str(problem_ids[0])])[0][0]
+
+
+def test_vector_index_build_keeps_one_vector_per_problem(tmp_path, monkeypatch):
+    from src.models import embedding_service as embedding_service_module
+    from src.models.vector_index import build_problem_vector_index
+
+    class _FakeEmbeddingService:
+        model_name = 'fake'
+
+        def encode(self, texts, batch_size=64):
+            return np.stack([np.eye(8, dtype=np.float32)[len(text) % 8] for text in texts])
+
+    monkeypatch.setattr(embedding_service_module, 'get_embedding_service', lambda: _FakeEmbeddingService())
+    # كل مشكلة مكررة مرة لكل صف مدمج، كما في final_results_with_models.csv
+    data_path = tmp_path / 'final_results_with_models.csv'
+    pd.DataFrame({'problem_id': [1, 1, 1, 2, 2, 3, 4],
+                  'processed_text': ['a', 'a', 'a', 'ab', 'ab', 'a', 'abc'],
+                  'title': ['x'] * 7}).to_csv(data_path, index=False)
+    index = build_problem_vector_index(str(data_path), str(tmp_path / 'index'))
+    assert len(index) == 4 and sorted(index.ids.tolist()) == [1, 2, 3, 4]
+    neighbour_ids, _ = index.search(np.eye(8, dtype=np.float32)[1], k=3)[0]
+    assert len(set(neighbour_ids.tolist())) == 3
+
+
+def _fit_synthetic_clustering_model(rng: np.random.Generator, n_rows: int = 400, embedding_dim: int = 16):
+    from sklearn.cluster import KMeans
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    from src.models.clustering_model import ProblemClusteringModel
+
+    numerical_features = ['estimated_cost_numeric', 'estimated_time_days', 'processed_text_length']
+    categorical_features = ['domain', 'complexity_level', 'status']
+    train_df = pd.DataFrame({
+        'estimated_cost_numeric': rng.lognormal(8, 1, n_rows),
+        'estimated_time_days': rng.integers(1, 120, n_rows).astype(float),
+        'processed_text_length': rng.integers(3, 200, n_rows).astype(float),
+        'domain': rng.choice(['تقني', 'إداري', 'مالي', 'تعليمي'], n_rows),
+        'complexity_level': rng.choice(['بسيط', 'متوسط', 'معقد', 'Unknown'], n_rows),
+        'status': rng.choice(['مفتوحة', 'مغلقة', 'قيد التنفيذ'], n_rows),
+    })
+    column_transformer = ColumnTransformer([
+        ('num', Pipeline([('scaler', StandardScaler())]), numerical_features),
+        ('cat', Pipeline([('onehot', OneHotEncoder(handle_unknown='ignore', drop='first', sparse_output=False))]),
+         categorical_features),
+    ], remainder='drop')
+    tabular = column_transformer.fit_transform(train_df)
+    embeddings = rng.normal(size=(n_rows, embedding_dim)).astype(np.float32)
+    kmeans = KMeans(n_clusters=8, n_init='auto', random_state=42).fit(np.concatenate([tabular, embeddings], axis=1))
+
+    model = ProblemClusteringModel.__new__(ProblemClusteringModel)
+    model.kmeans_model, model.column_transformer = kmeans, column_transformer
+    model.sentence_model, model.embedding_service, model.inference_plan = object(), None, None
+    model.online_updater, model.reducer = None, None
+    model.embedding_model_name, model.text_feature_col = 'test', 'processed_text'
+    model.numerical_features, model.categorical_features = numerical_features, categorical_features
+    return model
+
+
+def test_compiled_inference_plan_matches_sklearn_path():
+    pytest.importorskip("sklearn")
+    rng = np.random.default_rng(7)
+    model = _fit_synthetic_clustering_model(rng)
+
+    n_rows = 300
+    new_df = pd.DataFrame({
+        'processed_text': ['نص'] * n_rows,
+        'estimated_cost_numeric': np.where(rng.random(n_rows) < 0.2, np.nan, rng.lognormal(8, 1, n_rows)),
+        'estimated_time_days': np.where(rng.random(n_rows) < 0.2, np.nan, rng.integers(1, 120, n_rows)),
+        'processed_text_length': rng.integers(3, 200, n_rows).astype(float),
+        'domain': rng.choice(['تقني', 'إداري', 'مالي', 'تعليمي', 'صحي', None], n_rows),  # 'صحي' غير معروفة
+        'complexity_level': rng.choice(['بسيط', 'متوسط', 'معقد', None], n_rows),
+        'status': rng.choice(['مفتوحة', 'مغلقة', 'قيد التنفيذ'], n_rows),
+    })
+    embeddings = rng.normal(size=(n_rows, 16)).astype(np.float32)
+
+    sklearn_clusters = model.predict(new_df, embeddings=embeddings)
+    model.inference_plan = CompiledClusteringPlan.compile(model.column_transformer, model.kmeans_model)
+    compiled_clusters = model.predict(new_df, embeddings=embeddings)
+    np.testing.assert_array_equal(compiled_clusters, sklearn_clusters)
+
+    array_clusters = model.predict_arrays(new_df[model.numerical_features].to_numpy(dtype=np.float64),
+                                          new_df[model.categorical_features].to_numpy(dtype=object), embeddings)
+    np.testing.assert_array_equal(array_clusters, sklearn_clusters)
+
+
+def test_lazy_component_loads_once_and_reports_state():
+    load_calls = []
+
+    def slow_loader():
+        load_calls.append(1)
+        time.sleep(0.05)
+        return "model"
+
+    component = LazyComponent('model', slow_loader)
+    assert component.status()['state'] == 'pending'
+    component.start_background()
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(component.get())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert values == ["model"] * 5 and len(load_calls) == 1
+    assert component.status()['state'] == 'ready' and component.status()['load_seconds'] >= 0.05
+
+    failing = LazyComponent('broken', lambda: 1 / 0)
+    assert failing.get() is None
+    assert failing.status()['state'] == 'failed' and 'division' in failing.status()['error']
+
+
+def test_clustering_bundle_roundtrip_is_pickle_free_and_memory_mapped(tmp_path):
+    pytest.importorskip("sklearn")
+    rng = np.random.default_rng(11)
+    model = _fit_synthetic_clustering_model(rng)
+    plan = CompiledClusteringPlan.compile(model.column_transformer, model.kmeans_model, embedding_model_name='test')
+    plan.save(str(tmp_path))
+
+    manifest = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+    assert manifest['format_version'] == 1 and manifest['n_clusters'] == 8 and manifest['embedding_dim'] == 16
+    for array_file in manifest['arrays'].values():
+        np.load(tmp_path / array_file, allow_pickle=False)  # يفشل إذا احتاج الملف إلى pickle
+
+    bundle_model = model.__class__.__new__(model.__class__)
+    bundle_model.embedding_model_name, bundle_model.kmeans_model, bundle_model.column_transformer = 'test', None, None
+    bundle_model.sentence_model = object()
+    bundle_model._load_bundle(str(tmp_path))
+    assert isinstance(bundle_model.inference_plan.centroids, np.memmap) and bundle_model.is_loaded
+
+    numerical = rng.lognormal(3, 1, size=(50, 3))
+    categorical = np.array([rng.choice(['تقني', 'مالي', 'صحي', None], 50), rng.choice(['بسيط', 'معقد'], 50),
+                            rng.choice(['مفتوحة', 'مغلقة'], 50)], dtype=object).T
+    embeddings = rng.normal(size=(50, 16)).astype(np.float32)
+    np.testing.assert_array_equal(bundle_model.predict_arrays(numerical, categorical, embeddings),
+                                  plan.predict_arrays(numerical, categorical, embeddings))
+
+
+def test_clustering_bundle_is_not_used_when_source_pickles_changed(tmp_path):
+    pytest.importorskip("sklearn")
+    import joblib
+    from src.models.inference_plan import export_clustering_bundle
+
+    rng = np.random.default_rng(13)
+    model = _fit_synthetic_clustering_model(rng)
+    kmeans_path, ct_path = str(tmp_path / 'kmeans_model.pkl'), str(tmp_path / 'ct.pkl')
+    reducer_path, bundle_dir = str(tmp_path / 'reducer.pkl'), str(tmp_path / 'bundle')
+    joblib.dump(model.kmeans_model, kmeans_path)
+    joblib.dump(model.column_transformer, ct_path)
+    export_clustering_bundle(kmeans_path, ct_path, bundle_dir, 'test', reducer_path)
+
+    def load_predictor(prefer_bundle=True):
+        loaded = _fit_synthetic_clustering_model(rng, n_rows=20)
+        loaded.kmeans_model, loaded.column_transformer = None, None
+        loaded._load_predictor(kmeans_path, ct_path, bundle_dir, reducer_path, prefer_bundle)
+        return loaded
+
+    assert load_predictor().kmeans_model is None  # الحزمة تطابق ملفات joblib
+    assert load_predictor(prefer_bundle=False).kmeans_model is not None  # مسارات صريحة
+
+    from sklearn.cluster import KMeans
+    n_features = model.kmeans_model.cluster_centers_.shape[1]
+    joblib.dump(KMeans(n_clusters=5, n_init='auto', random_state=0).fit(rng.normal(size=(100, n_features))),
+                kmeans_path)  # إعادة تدريب دون إعادة تصدير الحزمة
+    stale = load_predictor()
+    assert stale.kmeans_model is not None and stale.inference_plan.n_clusters == 5
+
+    manifest_path = os.path.join(bundle_dir, 'manifest.json')  # حزمة قديمة بلا بصمة
+    manifest = json.loads(open(manifest_path, encoding='utf-8').read())
+    manifest['source_fingerprints'] = None
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    assert load_predictor().kmeans_model is not None
+    os.remove(kmeans_path)  # نشر بالحزمة وحدها
+    assert load_predictor().inference_plan.n_clusters == 8
+
+
+def test_online_clustering_updates_keep_cluster_ids_and_flag_drift(tmp_path):
+    pytest.importorskip("sklearn")
+    rng = np.random.default_rng(5)
+    model = _fit_synthetic_clustering_model(rng)
+    model.inference_plan = CompiledClusteringPlan.compile(model.column_transformer, model.kmeans_model)
+    train_features = np.asarray(rng.normal(size=(200, model.inference_plan.centroids.shape[1])))
+    labels_before, _ = model.inference_plan.assign(train_features)
+
+    retrain_reports = []
+    updater = OnlineClusteringUpdater(model.inference_plan, prior_count=200, drift_threshold=0.3,
+                                      on_retrain_needed=retrain_reports.append)
+    # دفعات من نفس التوزيع: حركة صغيرة، نفس أرقام العناقيد، لا حاجة لإعادة التدريب
+    for _ in range(3):
+        report = updater.partial_fit(rng.normal(size=train_features.shape))
+    labels_after, _ = model.inference_plan.assign(train_features)
+    assert not report['needs_retrain'] and not retrain_reports
+    assert np.mean(labels_before == labels_after) > 0.9
+
+    # دفعات منزاحة بقوة: الانحراف يتجاوز العتبة ويُطلب التدريب الكامل مرة واحدة
+    for _ in range(5):
+        report = updater.partial_fit(rng.normal(loc=3.0, size=train_features.shape))
+    assert report['needs_retrain'] and len(retrain_reports) == 1
+    assert updater.n_samples_seen == 8 * len(train_features)
+
+    updater.save_state(str(tmp_path))
+    restored = OnlineClusteringUpdater(model.inference_plan)
+    assert restored.load_state(str(tmp_path))
+    np.testing.assert_array_equal(restored.counts, updater.counts)
+    assert restored.history == updater.history and restored.retrain_requested
+
+
+def test_train_clustering_parallel_sweep_picks_k_and_writes_report(tmp_path):
+    pytest.importorskip("sklearn")
+    rng = np.random.default_rng(3)
+    n_rows = 600
+    centers = rng.normal(scale=10.0, size=(4, 8))
+    true_labels = rng.integers(0, 4, n_rows)
+    embeddings = centers[true_labels] + rng.normal(size=(n_rows, 8))
+    data_path = tmp_path / 'processed_problems_data.csv'
+    pd.DataFrame({
+        'processed_text': ['نص'] * n_rows,
+        'estimated_time_days': rng.integers(1, 120, n_rows).astype(float),
+        'domain': rng.choice(['تقني', 'مالي', None], n_rows),
+    }).to_csv(data_path, index=False)
+
+    report = train_clustering(str(data_path), str(tmp_path / 'models'), k_values=[2, 3, 4, 5, 6],
+                              silhouette_sample_size=200, workers=2, embeddings=embeddings * 5.0)
+    assert report['chosen_k'] == 4
+    assert [candidate['k'] for candidate in report['candidates']] == [2, 3, 4, 5, 6]
+    assert report['silhouette_sample_size'] == 200 and report['workers'] == 2
+    saved_report = json.loads((tmp_path / 'models' / 'clustering_training_report.json').read_text(encoding='utf-8'))
+    assert saved_report['chosen_k'] == 4 and 'k_sweep' in saved_report['timings_seconds']
+    assert CompiledClusteringPlan.load(report['artifacts']['bundle']).n_clusters == 4
+
+    # إعادة التدريب بدون حزمة تحذف حزمة التدريب السابق
+    report = train_clustering(str(data_path), str(tmp_path / 'models'), k_values=[3],
+                              embeddings=embeddings * 5.0, export_bundle=False)
+    assert 'bundle' not in report['artifacts']
+    assert not os.path.exists(tmp_path / 'models' / 'clustering_bundle')
+
+
+def test_reduced_clustering_plan_matches_sklearn_and_roundtrips(tmp_path):
+    pytest.importorskip("sklearn")
+    from sklearn.cluster import KMeans
+    from src.models.train_clustering import fit_reducer
+
+    rng = np.random.default_rng(13)
+    model = _fit_synthetic_clustering_model(rng, n_rows=500, embedding_dim=48)
+    n_rows = 500
+    train_df = pd.DataFrame({
+        'estimated_cost_numeric': rng.lognormal(8, 1, n_rows),
+        'estimated_time_days': rng.integers(1, 120, n_rows).astype(float),
+        'processed_text_length': rng.integers(3, 200, n_rows).astype(float),
+        'domain': rng.choice(['تقني', 'إداري', 'مالي'], n_rows),
+        'complexity_level': rng.choice(['بسيط', 'معقد'], n_rows),
+        'status': rng.choice(['مفتوحة', 'مغلقة'], n_rows),
+        'processed_text': ['نص'] * n_rows,
+    })
+    embeddings = rng.normal(size=(n_rows, 48)).astype(np.float32)
+    full_features = np.concatenate([model.column_transformer.transform(train_df), embeddings], axis=1)
+    for method in ('pca', 'random_projection'):
+        model.reducer = fit_reducer(full_features, method, n_components=16)
+        model.kmeans_model = KMeans(n_clusters=6, n_init='auto', random_state=0).fit(
+            model.reducer.transform(full_features).astype(np.float32))
+        model.inference_plan = None
+        sklearn_clusters = model.predict(train_df, embeddings=embeddings)
+
+        plan = CompiledClusteringPlan.compile(model.column_transformer, model.kmeans_model, reducer=model.reducer)
+        assert plan.centroids.dtype == np.float32 and plan.centroids.shape == (6, 16)
+        numerical = train_df[model.numerical_features].to_numpy(dtype=np.float64)
+        categorical = train_df[model.categorical_features].to_numpy(dtype=object)
+        assert np.mean(plan.predict_arrays(numerical, categorical, embeddings) == sklearn_clusters) > 0.99
+        # المسار المدمج (W = C·P) يطابق الإسقاط الصريح ثم assign
+        explicit_labels, _ = plan.assign(plan.build_features(numerical, categorical, embeddings))
+        assert np.mean(plan.predict_arrays(numerical, categorical, embeddings) == explicit_labels) > 0.99
+
+        plan.save(str(tmp_path / method))
+        loaded = CompiledClusteringPlan.load(str(tmp_path / method))
+        assert loaded.reduction_method == method and loaded.embedding_dim == 48
+        np.testing.assert_array_equal(loaded.predict_arrays(numerical, categorical, embeddings),
+                                      plan.predict_arrays(numerical, categorical, embeddings))
+
+    # حفظ نموذج بدون مقلل أبعاد فوق الحزمة ينشر نسخة جديدة كاملة ويحذف ملفات النسخة السابقة
+    bundle_dir = tmp_path / 'pca'
+    reader_centroids = np.array(loaded.centroids)
+    unreduced_plan = CompiledClusteringPlan.compile(model.column_transformer, KMeans(
+        n_clusters=4, n_init='auto', random_state=0).fit(np.concatenate(
+            [model.column_transformer.transform(train_df), embeddings], axis=1)))
+    unreduced_plan.save(str(bundle_dir))
+    manifest = json.loads((bundle_dir / 'manifest.json').read_text(encoding='utf-8'))
+    assert sorted(path.name for path in bundle_dir.glob('*.npy')) == sorted(manifest['arrays'].values())
+    assert not any(name.startswith('projection_') for name in manifest['arrays'])
+    reloaded = CompiledClusteringPlan.load(str(bundle_dir))
+    assert reloaded.reduction_method is None and reloaded.n_clusters == 4
+    # القارئ الذي فتح النسخة السابقة عبر mmap يبقى عليها
+    np.testing.assert_array_equal(loaded.centroids, reader_centroids)
+
+
+class _CountingTopicModel:
+    """نموذج شبيه بـ BERTopic يعدّ استدعاءات الدوال المنتجة لـ DataFrame."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_topic_info(self, topic_id=None):
+        self.calls += 1
+        return pd.DataFrame({'Topic': [-1, 0, 1], 'Count': [5, 12, 7],
+                             'Name': ['-1_ضوضاء', '0_شبكة_بطء', '1_طابعة_حبر']})
+
+    def get_topics(self):
+        return {-1: [('ضوضاء', 0.1)], 0: [('شبكة', 0.5), ('بطء', 0.4)], 1: [('طابعة', 0.6)]}
+
+    def get_topic(self, topic_id):
+        self.calls += 1
+        return self.get_topics().get(topic_id, False)
+
+
+def test_topic_catalogue_serves_keywords_without_bertopic_calls():
+    topic_model = ProblemTopicModel.__new__(ProblemTopicModel)
+    topic_model.model = _CountingTopicModel()
+    catalogue = topic_model.build_topic_catalogue()
+    assert topic_model.model.calls == 1
+    assert catalogue[0] == {'name': '0_شبكة_بطء', 'keywords': [('شبكة', 0.5), ('بطء', 0.4)], 'size': 12}
+
+    for _ in range(10):
+        assert topic_model.get_keywords_for_topic(1) == [('طابعة', 0.6)]
+        assert topic_model.get_topic_entry(-1)['size'] == 5
+    assert topic_model.model.calls == 1
+    # موضوع غير موجود في الفهرس يرجع إلى النموذج
+    assert topic_model.get_keywords_for_topic(7) is False and topic_model.model.calls == 2
+
+
+def test_fast_topic_model_assigns_by_cosine_and_reports_agreement(tmp_path):
+    rng = np.random.default_rng(17)
+    topic_ids = np.array([-1, 0, 1, 2])
+    topic_embeddings = rng.normal(size=(4, 32)).astype(np.float32)
+    np.save(tmp_path / 'topic_ids.npy', topic_ids)
+    np.save(tmp_path / 'topic_embeddings.npy', topic_embeddings)
+
+    # مستندات قريبة من مواضيعها، ومستندات ضوضاء عشوائية بعيدة عن كل المواضيع
+    doc_topics = rng.integers(0, 3, 300)
+    doc_embeddings = topic_embeddings[doc_topics + 1] + 0.3 * rng.normal(size=(300, 32))
+    noise_embeddings = rng.normal(size=(60, 32))
+    embeddings = np.vstack([doc_embeddings, noise_embeddings])
+    reference_topics = np.concatenate([doc_topics, np.full(60, -1)])
+    threshold, agreement = calibrate_outlier_threshold(embeddings, reference_topics, topic_ids[1:],
+                                                       topic_embeddings[1:] / np.linalg.norm(
+                                                           topic_embeddings[1:], axis=1, keepdims=True))
+    assert threshold is not None and agreement > 0.95
+
+    manifest = {'format': 'fast-topic-model', 'format_version': 1, 'embedding_model_name': None,
+                'outlier_threshold': threshold, 'agreement': {'agreement_rate': agreement},
+                'topics': {str(t): {'name': f'{t}_موضوع', 'keywords': [['كلمة', 0.5]], 'size': 10} for t in topic_ids}}
+    (tmp_path / 'manifest.json').write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+    fast_model = FastTopicModel(str(tmp_path))
+    assert fast_model.is_loaded and fast_model.embedding_service is None
+    topics, similarities = fast_model.get_topics_for_texts(['نص'] * len(embeddings), embeddings=embeddings)
+    assert fast_model.agreement_with(reference_topics, embeddings)['agreement_rate'] == pytest.approx(agreement)
+    assert np.mean(np.array(topics[:300]) == doc_topics) > 0.98 and len(similarities) == len(embeddings)
+    assert fast_model.get_keywords_for_topic(2) == [('كلمة', 0.5)] and fast_model.get_topic_entry(0)['size'] == 10
+
+    # وقت التشغيل لا يستورد bertopic ولا umap ولا hdbscan
+    loaded_modules = subprocess.run(
+        [sys.executable, '-c', 'import sys; import src.models.fast_topic_model, src.models.topic_modeling; '
+                               'print(sorted(m for m in ("bertopic", "umap", "hdbscan") if m in sys.modules))'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+    assert loaded_modules.strip().splitlines()[-1] == '[]'
+
+
+class _MergeableTopicModel:
+    """نموذج شبيه بـ BERTopic يدعم fit و merge_models بالحد الأدنى اللازم للاختبار."""
+
+    def __init__(self, topics=None, **kwargs):
+        self.topics = dict(topics or {})
+        self.fitted_on = None
+
+    def fit(self, documents, embeddings=None):
+        assert embeddings is not None and len(embeddings) == len(documents)
+        self.fitted_on = len(documents)
+        self.topics = {-1: [('ضوضاء', 0.1)], 0: [('شبكة', 0.5)], 1: [('سحابة', 0.7)]}
+        return self
+
+    @classmethod
+    def merge_models(cls, models, min_similarity=0.7, embedding_model=None):
+        base, recent = models
+        merged = dict(base.topics)
+        for keywords in recent.topics.values():
+            if all(keywords[0][0] != existing[0][0] for existing in merged.values()):
+                merged[max(merged) + 1] = keywords
+        return cls(merged)
+
+    def get_topics(self):
+        return self.topics
+
+    def get_topic_info(self):
+        return pd.DataFrame({'Topic': list(self.topics), 'Count': [1] * len(self.topics),
+                             'Name': [f'{t}_{k[0][0]}' for t, k in self.topics.items()]})
+
+
+def test_incremental_topic_merge_keeps_topic_ids_and_persists_pending(tmp_path, monkeypatch):
+    monkeypatch.setattr(online_topic_modeling, '_import_bertopic', lambda: _MergeableTopicModel)
+    topic_model = ProblemTopicModel.__new__(ProblemTopicModel)
+    topic_model.model = _MergeableTopicModel({-1: [('ضوضاء', 0.1)], 0: [('شبكة', 0.5)], 1: [('طابعة', 0.6)]})
+    topic_model.embedding_service, topic_model.topic_catalogue = None, {}
+    state_dir = str(tmp_path / 'state')
+
+    updater = IncrementalTopicUpdater(topic_model, min_merge_size=5, state_dir=state_dir)
+    assert updater.add_problems(['مشكلة سحابة'] * 3, embeddings=np.ones((3, 8))) is None
+    # المشاكل المعلقة وتضميناتها تُستأنف بعد إعادة التشغيل دون إعادة ترميز
+    resumed = IncrementalTopicUpdater(topic_model, min_merge_size=5, state_dir=state_dir)
+    assert resumed.n_pending == 3 and resumed.pending_embeddings[0].shape == (8,)
+
+    report = resumed.add_problems(['مشكلة سحابة'] * 2, embeddings=np.ones((2, 8)))
+    assert report['merged'] and report['new_topics'] == [2] and resumed.n_pending == 0
+    assert topic_model.get_topic_entry(1)['keywords'] == [('طابعة', 0.6)]
+    assert topic_model.get_topic_entry(2)['keywords'] == [('سحابة', 0.7)]
+
+    # دمج يغير كلمات موضوع موجود يُرفض وتبقى المشاكل معلقة
+    previous_model = topic_model.model
+    monkeypatch.setattr(online_topic_modeling, 'check_topic_ids_stable', lambda base, merged: [0])
+    resumed.add_problems(['نص'], embeddings=np.ones((1, 8)), auto_update=False)
+    rejected = resumed.merge_pending(force=True)
+    assert rejected['merged'] is False and rejected['changed_topics'] == [0]
+    assert topic_model.model is previous_model and resumed.n_pending == 1
+
+
+def test_incremental_topic_pending_problems_survive_restart_without_merge(tmp_path):
+    topic_model = ProblemTopicModel.__new__(ProblemTopicModel)
+    topic_model.model = _MergeableTopicModel({-1: [('ضوضاء', 0.1)], 0: [('شبكة', 0.5)]})
+    topic_model.embedding_service, topic_model.topic_catalogue = None, {}
+    state_dir = str(tmp_path / 'state')
+
+    updater = IncrementalTopicUpdater(topic_model, min_merge_size=5, state_dir=state_dir)
+    assert updater.add_problems(['مشكلة سحابة', 'مشكلة طابعة'], embeddings=np.ones((2, 8))) is None
+    skipped = updater.merge_pending()
+    assert skipped['merged'] is False and skipped['reason'] == 'not_enough_documents'
+
+    resumed = IncrementalTopicUpdater(topic_model, min_merge_size=5, state_dir=state_dir)
+    assert resumed.n_pending == 2 and resumed.pending_texts == ['مشكلة سحابة', 'مشكلة طابعة']
+    assert resumed.n_documents_added == 2
+
+    # الإضافات المتتالية تُلحق بالملفات ولا تعيد كتابتها
+    texts_path = tmp_path / 'state' / online_topic_modeling.PENDING_TEXTS_FILENAME
+    vectors_path = tmp_path / 'state' / online_topic_modeling.PENDING_EMBEDDINGS_FILENAME
+    inodes = (texts_path.stat().st_ino, vectors_path.stat().st_ino)
+    for i in range(3):
+        resumed.add_problems([f'نص {i}'], embeddings=np.full((1, 8), i, dtype=np.float32))
+    assert (texts_path.stat().st_ino, vectors_path.stat().st_ino) == inodes
+    assert vectors_path.stat().st_size == 5 * 8 * 4
+
+    # إلحاق انقطع في منتصفه (تضمين كامل ونص ناقص) لا يُسقط المشاكل المعلقة السابقة
+    with open(vectors_path, 'ab') as f:
+        np.ones((1, 8), dtype=np.float32).tofile(f)
+    with open(texts_path, 'a', encoding='utf-8') as f:
+        f.write('"نص ناق')
+    recovered = IncrementalTopicUpdater(topic_model, min_merge_size=50, state_dir=state_dir)
+    assert recovered.pending_texts == ['مشكلة سحابة', 'مشكلة طابعة', 'نص 0', 'نص 1', 'نص 2']
+    assert recovered.pending_embeddings[4].tolist() == [2.0] * 8
+    recovered.add_problems(['نص 3'], embeddings=np.zeros((1, 8)))
+    assert IncrementalTopicUpdater(topic_model, state_dir=state_dir).pending_texts[-2:] == ['نص 2', 'نص 3']
+
+
+def test_incremental_topic_input_file_is_queued_once(tmp_path):
+    topic_model = ProblemTopicModel.__new__(ProblemTopicModel)
+    topic_model.model = _MergeableTopicModel({-1: [('ضوضاء', 0.1)], 0: [('شبكة', 0.5)]})
+    topic_model.embedding_service = type('_Service', (), {
+        'is_available': True, 'encode': staticmethod(lambda texts: np.ones((len(texts), 8)))})()
+    topic_model.topic_catalogue = {}
+    state_dir = str(tmp_path / 'state')
+    data_path = tmp_path / 'new_problems.csv'
+    pd.DataFrame({'processed_text': ['مشكلة سحابة', '  ', None, 'مشكلة طابعة']}).to_csv(data_path, index=False)
+
+    updater = IncrementalTopicUpdater(topic_model, min_merge_size=5, state_dir=state_dir)
+    assert updater.add_problems_from_file(str(data_path)) == 2
+    assert updater.merge_pending()['reason'] == 'not_enough_documents'
+    # إعادة التشغيل بنفس الملف بعد دمج مؤجل لا تضيف مشاكله مرتين
+    rerun = IncrementalTopicUpdater(topic_model, min_merge_size=5, state_dir=state_dir)
+    assert rerun.add_problems_from_file(str(data_path)) == 0 and rerun.n_pending == 2
+
+    pd.DataFrame({'processed_text': ['مشكلة خادم']}).to_csv(data_path, index=False)
+    os.utime(data_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert rerun.add_problems_from_file(str(data_path)) == 1 and rerun.n_pending == 3
+
+
+def test_group_profile_index_matches_per_cluster_filtering():
+    rng = np.random.default_rng(5)
+    n_rows = 400
+    df = pd.DataFrame({
+        'cluster_kmeans': rng.integers(0, 4, n_rows).astype(float),
+        'estimated_cost_numeric': np.where(rng.random(n_rows) < 0.3, np.nan, rng.random(n_rows) * 100),
+        'estimated_time_days': rng.random(n_rows) * 10,
+        'domain': rng.choice(['تقني', 'إداري', None], n_rows),
+        'processed_text': [' '.join(rng.choice(['شبكة', 'بطء', 'طابعة', 'حبر', 'خادم'], rng.integers(0, 6)))
+                           for _ in range(n_rows)],
+    })
+    df.loc[df['cluster_kmeans'] == 3, 'estimated_cost_numeric'] = np.nan
+    index = GroupProfileIndex(df, 'cluster_kmeans')
+
+    for cluster_id in range(4):
+        cluster_data = df[df['cluster_kmeans'] == cluster_id]
+        profile = index.get(np.int32(cluster_id))
+        assert profile['size'] == len(cluster_data)
+        assert profile['means'].get('estimated_cost_numeric') == (
+            None if cluster_id == 3 else pytest.approx(cluster_data['estimated_cost_numeric'].mean()))
+        expected_values = cluster_data['domain'].value_counts(normalize=True).head(2)
+        assert [value for value, _ in profile['top_values']['domain']] == expected_values.index.tolist()
+        assert [share for _, share in profile['top_values']['domain']] == pytest.approx(expected_values.tolist())
+        expected_words = Counter(' '.join(cluster_data['processed_text']).split()).most_common(7)
+        assert profile['keywords'] == expected_words
+    assert index.get(9) is None and sum(index.sizes().values()) == n_rows
+
+
+def test_group_recommendation_index_matches_filtered_extraction():
+    rng = np.random.default_rng(11)
+    n_rows = 300
+    lessons = ['إعادة تشغيل الخادم', ' إعادة تشغيل الخادم', 'تحديث التعريفات', 'تدريب الموظفين', '  ', None]
+    df = pd.DataFrame({
+        'problem_id': rng.integers(0, 40, n_rows),
+        'cluster_kmeans': np.where(rng.random(n_rows) < 0.1, np.nan, rng.integers(0, 3, n_rows)),
+        **{field: rng.choice(np.array(lessons, dtype=object), n_rows)
+           for field in ['solution_description', 'what_went_well', 'what_could_be_improved',
+                         'recommendations_for_future']},
+    })
+    index = GroupRecommendationIndex(df, 'cluster_kmeans')
+
+    for cluster_id in [0, 1, 2, 5]:
+        for exclude_problem_id in [None, *df['problem_id'].unique()[:15]]:
+            mask = df['cluster_kmeans'] == cluster_id
+            if exclude_problem_id is not None:
+                mask &= df['problem_id'] != exclude_problem_id
+            for top_n in [1, 3]:
+                expected = RecommendationEngine._extract_recommendations_from_df(None, df[mask], top_n)
+                assert index.recommendations(np.int32(cluster_id), top_n, exclude_problem_id) == expected
+            assert index.count_rows(float(cluster_id), exclude_problem_id) == mask.sum()
+    # معرف نصي لا يستبعد المشكلة الرقمية (نفس مقارنة ProblemVectorIndex.search)
+    problem_id = int(df['problem_id'].iloc[0])
+    cluster_id = df['cluster_kmeans'].iloc[0]
+    if pd.notna(cluster_id):
+        assert index.count_rows(cluster_id, str(problem_id)) == index.count_rows(cluster_id)
+
+
+def test_run_branches_overlaps_branches_and_isolates_failures():
+    def slow_branch(seconds, value):
+        def branch():
+            time.sleep(seconds)
+            return value
+        return branch
+
+    started_at = time.perf_counter()
+    outcomes = run_branches({'topic': slow_branch(0.2, 'topic'), 'cluster': slow_branch(0.2, 'cluster')})
+    assert time.perf_counter() - started_at < 0.35
+    assert {name: outcome['value'] for name, outcome in outcomes.items()} == {'topic': 'topic', 'cluster': 'cluster'}
+
+    outcomes = run_branches({'topic': slow_branch(0.5, 'late'), 'cluster': lambda: 1 / 0,
+                             'profile': slow_branch(0.0, 'ok')}, timeout_seconds=0.1)
+    assert outcomes['topic']['status'] == 'timeout' and outcomes['topic']['value'] is None
+    assert outcomes['cluster']['status'] == 'error' and 'division' in outcomes['cluster']['error']
+    assert outcomes['profile']['status'] == 'ok' and outcomes['profile']['value'] == 'ok'
+
+
+def test_analysis_result_cache_shares_disk_tier_and_invalidates_on_model_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, '_VERSION_RECHECK_SECONDS', 0.0)
+    versions = {'current': 'v1'}
+    sqlite_path = str(tmp_path / 'results.sqlite')
+    cache = AnalysisResultCache(lambda: versions['current'], max_items=1, sqlite_path=sqlite_path)
+    fields = ['title', 'domain']
+    key = cache.make_key({'title': ' الشبكة بطيئة ', 'domain': 'تقني', 'ignored': 1}, fields)
+    assert key == cache.make_key({'title': 'الشبكة بطيئة', 'domain': 'تقني', 'ignored': 2}, fields)
+    assert cache.get(key) is None
+
+    result = {'kmeans_cluster': np.int32(2), 'bertopic_topic': 5,
+              'problem_embedding': np.arange(4, dtype=np.float32)}
+    cache.put(key, result)
+    assert cache.get(key)['kmeans_cluster'] == 2 and cache.stats()['memory_hits'] == 1
+
+    # عملية أخرى على نفس الجهاز تقرأ من مستوى SQLite
+    other_cache = AnalysisResultCache(lambda: versions['current'], sqlite_path=sqlite_path)
+    shared = other_cache.get(key)
+    assert other_cache.stats()['disk_hits'] == 1
+    assert shared['problem_embedding'].dtype == np.float32 and shared['problem_embedding'].tolist() == [0, 1, 2, 3]
+
+    # تعديل النتيجة المعادة أو الأصل المخزن في مكانه لا يغير القراءات التالية من أي مستوى
+    nested = {'cluster_profile_summary': {'keywords': [['شبكة', 3]]}, 'problem_embedding': np.zeros(3)}
+    nested_key = cache.make_key({'title': 'طابعة', 'domain': 'تقني'}, fields)
+    cache.put(nested_key, nested)
+    nested['cluster_profile_summary']['keywords'].append(['حبر', 1])
+    for reader in (cache, other_cache, cache):
+        hit = reader.get(nested_key)
+        assert hit['cluster_profile_summary'] == {'keywords': [['شبكة', 3]]}
+        assert hit['problem_embedding'].tolist() == [0.0, 0.0, 0.0]
+        hit['cluster_profile_summary']['keywords'].clear()
+        hit['problem_embedding'][:] = 7
+
+    versions['current'] = 'v2'
+    new_key = cache.make_key({'title': 'الشبكة بطيئة', 'domain': 'تقني'}, fields)
+    assert new_key != key and cache.stats()['invalidations'] == 1
+    assert cache.get(key) is None and other_cache.get(key) is None
+
+
+def test_request_trace_nests_spans_across_branch_threads_and_reports_percentiles():
+    reset_latency_histograms()
+
+    @traced('test.branch')
+    def branch(seconds):
+        with span('test.inner'):
+            time.sleep(seconds)
+        return seconds
+
+    with trace_request('test.request') as trace:
+        with span('test.featurisation'):
+            time.sleep(0.01)
+        outcomes = run_branches({'a': lambda: branch(0.02), 'b': lambda: branch(0.03)})
+    assert all(outcome['status'] == 'ok' for outcome in outcomes.values())
+
+    timings = trace.timings()
+    spans = timings['spans']
+    assert [record['name'] for record in spans].count('test.branch') == 2
+    inner = [record for record in spans if record['name'] == 'test.inner']
+    assert len(inner) == 2 and all(record['parent'] == 'test.branch' and record['depth'] == 2 for record in inner)
+    assert spans[0]['name'] == 'test.request' and spans[0]['parent'] is None
+    assert timings['total_ms'] >= 40 and [record['start_ms'] for record in spans] == sorted(
+        record['start_ms'] for record in spans)
+
+    for _ in range(98):
+        with span('test.fast'):
+            pass
+    with span('test.fast'):
+        time.sleep(0.02)
+    summary = get_latency_summary()
+    assert summary['test.fast']['count'] == 99 and summary['test.branch']['count'] == 2
+    assert summary['test.fast']['p50_ms'] < 1 and summary['test.fast']['p99_ms'] >= 19
+
+
+class _EchoAnalyzer:
+    def analyze_new_problem(self, problem):
+        time.sleep(0.005)
+        return {'input_problem_data': problem, 'kmeans_cluster': np.int32(len(problem['title']) % 3),
+                'bertopic_topic': -1, 'problem_embedding': np.ones(3, dtype=np.float32)}
+
+    def analyze_many(self, problems):
+        return [self.analyze_new_problem(problem) for problem in problems]
+
+
+class _EmbeddingRecommender:
+    def get_recommendations(self, analysis_results, top_n=3):
+        embedding = analysis_results['problem_embedding']
+        return {'based_on_similar_problems': [f"similarity={float(embedding.sum())}"] * top_n}
+
+
+def test_inference_service_serves_json_endpoints_under_load():
+    server = create_server(InferenceService(_EchoAnalyzer(), _EmbeddingRecommender()), host='127.0.0.1',
+                           port=0, workers=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        report = run_load_test(server.url, '/analyze', concurrency=4, n_requests=40)
+        assert report['requests'] == 40 and report['errors'] == 0
+        assert report['requests_per_second'] > 0 and report['latency']['p99_ms'] >= report['latency']['p50_ms'] >= 5
+
+        batch_report = run_load_test(server.url, '/analyze_batch', concurrency=2, n_requests=4, batch_size=5)
+        assert batch_report['errors'] == 0 and batch_report['problems_per_second'] > 0
+
+        service = server.service
+        analysis = service.analyze({'problem': {'title': 'abcd'}})['analysis']
+        assert analysis['kmeans_cluster'] == 1 and analysis['problem_embedding'] == [1.0, 1.0, 1.0]
+        json.dumps(analysis)
+        recommended = service.recommend({'analysis': analysis, 'top_n': 2})['recommendations']
+        assert recommended == {'based_on_similar_problems': ['similarity=3.0'] * 2}
+
+        bad_report = run_load_test(server.url, '/recommend', problems=[{}], concurrency=1, n_requests=2,
+                                   warm_up_requests=0)
+        assert bad_report['errors'] == 2 and 'HTTP 400' in bad_report['error_samples'][0]
+        assert service.stats()['requests']['/analyze'] >= 40
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _LengthAnalyzer:
+    def analyze_many(self, problems):
+        return [{'kmeans_cluster': np.int64(len(problem['title']) % 3), 'bertopic_topic': problem['problem_id'] % 2}
+                for problem in problems]
+
+    def _model_version(self):
+        return 'v1'
+
+
+class _PagedProblemSource:
+    def __init__(self, n_problems):
+        # المشكلة 5 مكررة كما يحدث مع ربط جداول واحد-لكثير
+        self.df = pd.DataFrame({'problem_id': list(range(1, n_problems + 1)) + [5],
+                                'title': ['x' * i for i in range(1, n_problems + 1)] + ['xxxxx'],
+                                'domain': [None] * (n_problems + 1)}).sort_values('problem_id', kind='stable')
+        self.requested_after = []
+
+    def count_problems(self):
+        return self.df['problem_id'].nunique()
+
+    def iter_problem_batches(self, batch_size, after_problem_id=None):
+        self.requested_after.append(after_problem_id)
+        ids = sorted(self.df['problem_id'].unique())
+        ids = [i for i in ids if after_problem_id is None or i > after_problem_id]
+        for start in range(0, len(ids), batch_size):
+            yield self.df[self.df['problem_id'].isin(ids[start:start + batch_size])]
+
+
+def _length_analyzer_factory():
+    return _LengthAnalyzer()
+
+
+def test_bulk_scoring_resumes_from_checkpoint_and_matches_parallel_run(tmp_path):
+    source = _PagedProblemSource(23)
+    output_path = str(tmp_path / 'labels.sqlite')
+    job = BulkScoringJob(source, output_path=output_path, batch_size=5, n_workers=0,
+                         analyzer_factory=_length_analyzer_factory)
+    first_run = job.run(max_batches=2)
+    assert first_run['scored_this_run'] == 10 and first_run['last_problem_id'] == 10
+    job.close()
+
+    # تشغيل جديد (بعد انقطاع) يستأنف من آخر دفعة مكتملة
+    resumed_job = BulkScoringJob(source, output_path=output_path, batch_size=5, n_workers=0,
+                                 analyzer_factory=_length_analyzer_factory)
+    resumed = resumed_job.run()
+    assert source.requested_after == [None, 10]
+    assert resumed['scored_this_run'] == 13 and resumed['problems_scored'] == 23
+    labels = resumed_job.labels()
+    assert labels['problem_id'].tolist() == list(range(1, 24)) and (labels['model_version'] == 'v1').all()
+    assert labels['kmeans_cluster'].tolist() == [i % 3 for i in range(1, 24)]
+    assert resumed_job.run()['scored_this_run'] == 0
+    resumed_job.close()
+
+    parallel_job = BulkScoringJob(_PagedProblemSource(23), output_path=str(tmp_path / 'parallel.sqlite'),
+                                  batch_size=4, n_workers=2, analyzer_factory=_length_analyzer_factory)
+    assert parallel_job.run()['problems_scored'] == 23
+    pd.testing.assert_frame_equal(parallel_job.labels().drop(columns='scored_at'), labels.drop(columns='scored_at'))
+    csv_path = tmp_path / 'labels.csv'
+    assert parallel_job.export_csv(str(csv_path)) == 23
+    assert 'cluster_kmeans' in pd.read_csv(csv_path).columns
+    parallel_job.close()
+
+
+class _FeatureAnalyzer(_LengthAnalyzer):
+    def __init__(self, plan, rng):
+        self.plan, self.rng = plan, rng
+
+    def analyze_many(self, problems, include_cluster_features=False):
+        results = super().analyze_many(problems)
+        if include_cluster_features:
+            # دفعات منزاحة عن بيانات التدريب فتتحرك المراكز
+            numerical = self.rng.normal(size=(len(problems), 3)) + 50.0
+            categorical = np.array([['تقني', 'معقد', 'مفتوحة']] * len(problems), dtype=object)
+            features = self.plan.build_features(numerical, categorical,
+                                                self.rng.normal(size=(len(problems), 16)) + 3.0)
+            for result, row in zip(results, features):
+                result['cluster_features'] = row
+        return results
+
+
+def test_bulk_scoring_persists_online_centroid_updates(tmp_path):
+    pytest.importorskip("sklearn")
+    from src.models.inference_plan import CompiledClusteringPlan
+
+    model = _fit_synthetic_clustering_model(np.random.default_rng(3))
+    model._compile_inference_plan()
+    model.bundle_dir, model.online_state_dir = str(tmp_path / 'bundle'), None
+    original_centroids = np.array(model.inference_plan.centroids)
+    state_dir = str(tmp_path / 'online_state')
+
+    def clustering_model_factory():
+        model.enable_online_updates(state_dir=state_dir)
+        return model
+
+    job = BulkScoringJob(_PagedProblemSource(23), output_path=str(tmp_path / 'labels.sqlite'), batch_size=5,
+                         n_workers=0, analyzer_factory=lambda: _FeatureAnalyzer(model.inference_plan,
+                                                                                np.random.default_rng(0)),
+                         online_updates=True, clustering_model_factory=clustering_model_factory)
+    result = job.run()
+    job.close()
+    assert result['problems_scored'] == 23
+    assert result['clustering_drift']['samples_this_run'] == 23
+    assert result['clustering_drift']['n_samples_seen'] == 23
+    assert os.path.exists(os.path.join(state_dir, 'online_state.json'))
+
+    saved_plan = CompiledClusteringPlan.load(model.bundle_dir)
+    np.testing.assert_allclose(saved_plan.centroids, model.inference_plan.centroids)
+    assert not np.allclose(saved_plan.centroids, original_centroids)
+
+    # عملية جديدة تحمل الحزمة المحدثة وتستأنف حالة التحديث
+    reloaded = _fit_synthetic_clustering_model(np.random.default_rng(3))
+    reloaded.inference_plan, reloaded.kmeans_model = saved_plan, None
+    reloaded.enable_online_updates(state_dir=state_dir)
+    assert reloaded.online_updater.n_samples_seen == 23
+    # الانحراف بعد الاستئناف يُقاس بنفس مقياس المراكز المرجعية، لا بمراكز الحزمة المحدثة
+    saved_report, resumed_report = model.online_updater.drift_report(), reloaded.online_updater.drift_report()
+    assert resumed_report['max_relative_drift'] == pytest.approx(saved_report['max_relative_drift'])
+    assert resumed_report['needs_retrain'] == saved_report['needs_retrain']
+
+    # بدون تحديث مباشر لا يُنشأ نموذج التجميع ولا يظهر تقرير الانحراف
+    plain_job = BulkScoringJob(_PagedProblemSource(5), output_path=str(tmp_path / 'plain.sqlite'), batch_size=5,
+                               n_workers=0, analyzer_factory=_length_analyzer_factory, online_updates=False,
+                               clustering_model_factory=lambda: pytest.fail("لا يجب تحميل نموذج التجميع"))
+    assert 'clustering_drift' not in plain_job.run()
+    plain_job.close()
+
+
+def test_bulk_scoring_workers_do_not_write_the_embedding_cache(tmp_path, monkeypatch):
+    from src.analysis import bulk_scoring
+    from src.models import embedding_service as embedding_service_module
+
+    monkeypatch.setattr(embedding_service_module, '_SERVICES', {})
+    monkeypatch.setattr(bulk_scoring, '_WORKER_ANALYZER', None)
+    cache_dir = str(tmp_path / 'embedding_cache')
+
+    def analyzer_factory():
+        embedding_service_module.get_embedding_service('bulk-worker-test-model', cache_dir=cache_dir)
+        return _LengthAnalyzer()
+
+    bulk_scoring._init_worker(analyzer_factory)
+    services = embedding_service_module.loaded_embedding_services()
+    assert len(services) == 1 and services[0].cache.disk_writes_enabled is False
+    assert isinstance(bulk_scoring._WORKER_ANALYZER, _LengthAnalyzer)
+
+
+class _LargeModelAnalyzer(_EchoAnalyzer):
+    def __init__(self, megabytes):
+        self.weights = np.ones(megabytes * 1024 * 1024 // 8)  # صفحات مقيمة تُشارك مع العمال بعد fork
+
+    def analyze_new_problem(self, problem):
+        result = super().analyze_new_problem(problem)
+        result['bertopic_topic'] = int(self.weights[:10].sum())
+        return result
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup') or not hasattr(os, 'fork'),
+                    reason="يتطلب fork و /proc/<pid>/smaps_rollup (Linux)")
+def test_prefork_workers_share_loaded_model_pages():
+    server = PreforkServer(InferenceService(_LargeModelAnalyzer(64)), host='127.0.0.1', port=0, processes=2,
+                           threads_per_process=2)
+    server.start()
+    try:
+        assert server.frozen_objects > 0 and len(server.worker_pids) == 2
+        report = run_load_test(server.url, '/analyze', concurrency=4, n_requests=40)
+        assert report['errors'] == 0 and report['requests'] == 40
+        memory = server.memory_report()
+        for slot in range(2):
+            worker_memory = memory['processes'][f'worker-{slot}']
+            assert worker_memory['shared_mb'] >= 60 and worker_memory['unique_mb'] < 40
+        assert memory['totals']['saved_by_sharing_mb'] >= 60
+    finally:
+        server.stop()
+    assert not server.worker_pids